@@ -0,0 +1,37 @@
+"""add_audit_rollup_coverage
+
+Revision ID: a8c3e5f1b9d2
+Revises: f5a9c2e7d4b8
+Create Date: 2026-10-16 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c3e5f1b9d2'
+down_revision: Union[str, None] = 'f5a9c2e7d4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Earliest instant the audit rollups are complete from. Rollups only see
+    # events written after they were deployed, so coverage starts now; older
+    # ranges are summarised from audit_logs until rebuild_rollups backfills them.
+    op.create_table('audit_rollup_coverage',
+    sa.Column('id', sa.SmallInteger(), server_default='1', nullable=False),
+    sa.Column('covered_from', sa.DateTime(timezone=True), nullable=False),
+    sa.CheckConstraint('id = 1', name='ck_audit_rollup_coverage_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO audit_rollup_coverage (id, covered_from) VALUES (1, now())")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('audit_rollup_coverage')
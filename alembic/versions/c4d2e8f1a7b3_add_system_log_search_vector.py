@@ -0,0 +1,35 @@
+"""add_system_log_search_vector
+
+Revision ID: c4d2e8f1a7b3
+Revises: ab51fd3c9f8c
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e8f1a7b3'
+down_revision: Union[str, None] = 'ab51fd3c9f8c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Generated tsvector so full-text log search hits a GIN index instead of ILIKE scans
+    op.execute("""
+        ALTER TABLE system_logs ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('english', coalesce(message, '') || ' ' || coalesce(source, ''))
+        ) STORED
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_log_search ON system_logs USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_log_search")
+    op.execute("ALTER TABLE system_logs DROP COLUMN IF EXISTS search_vector")
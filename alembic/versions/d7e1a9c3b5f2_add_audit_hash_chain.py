@@ -0,0 +1,54 @@
+"""add_audit_hash_chain
+
+Revision ID: d7e1a9c3b5f2
+Revises: c4d2e8f1a7b3
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e1a9c3b5f2'
+down_revision: Union[str, None] = 'c4d2e8f1a7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Per-chain sequence and hash links for tamper-evident audit logs
+    op.execute("ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS chain_id VARCHAR(255)")
+    op.execute("ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS sequence BIGINT")
+    op.execute("ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS prev_hash CHAR(64)")
+    op.execute("ALTER TABLE audit_logs ADD COLUMN IF NOT EXISTS chain_hash CHAR(64)")
+    # Not unique: spool replay is at-least-once, and verification reports duplicates
+    op.execute("CREATE INDEX IF NOT EXISTS idx_audit_chain_sequence ON audit_logs (chain_id, sequence)")
+
+    op.create_table('audit_checkpoints',
+    sa.Column('chain_id', sa.String(length=255), nullable=False),
+    sa.Column('block_index', sa.BigInteger(), nullable=False),
+    sa.Column('first_sequence', sa.BigInteger(), nullable=False),
+    sa.Column('last_sequence', sa.BigInteger(), nullable=False),
+    sa.Column('merkle_root', sa.CHAR(length=64), nullable=False),
+    sa.Column('last_chain_hash', sa.CHAR(length=64), nullable=False),
+    sa.Column('prev_checkpoint_hash', sa.CHAR(length=64), nullable=False),
+    sa.Column('checkpoint_hash', sa.CHAR(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('chain_id', 'block_index')
+    )
+    op.create_index('idx_audit_checkpoint_range', 'audit_checkpoints', ['chain_id', 'first_sequence', 'last_sequence'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_audit_checkpoint_range', table_name='audit_checkpoints')
+    op.drop_table('audit_checkpoints')
+    op.execute("DROP INDEX IF EXISTS idx_audit_chain_sequence")
+    op.execute("ALTER TABLE audit_logs DROP COLUMN IF EXISTS chain_hash")
+    op.execute("ALTER TABLE audit_logs DROP COLUMN IF EXISTS prev_hash")
+    op.execute("ALTER TABLE audit_logs DROP COLUMN IF EXISTS sequence")
+    op.execute("ALTER TABLE audit_logs DROP COLUMN IF EXISTS chain_id")
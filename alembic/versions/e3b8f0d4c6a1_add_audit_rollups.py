@@ -0,0 +1,49 @@
+"""add_audit_rollups
+
+Revision ID: e3b8f0d4c6a1
+Revises: d7e1a9c3b5f2
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8f0d4c6a1'
+down_revision: Union[str, None] = 'd7e1a9c3b5f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Audit event counts per minute and per hour, maintained by the audit writer
+    for table in ('audit_rollups_minute', 'audit_rollups_hour'):
+        op.create_table(table,
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('severity', sa.String(length=20), nullable=False),
+        sa.Column('result', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket', 'event_type', 'severity', 'result')
+        )
+
+    # Space-Saving sketches of the busiest usernames / source IPs per hour
+    op.create_table('audit_heavy_hitters',
+    sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('event_type', sa.String(length=50), nullable=False),
+    sa.Column('dimension', sa.String(length=10), nullable=False),
+    sa.Column('sketch', postgresql.JSONB(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'event_type', 'dimension')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('audit_heavy_hitters')
+    op.drop_table('audit_rollups_hour')
+    op.drop_table('audit_rollups_minute')
@@ -0,0 +1,44 @@
+"""add_security_finding_search_vector
+
+Revision ID: f5a9c2e7d4b8
+Revises: e3b8f0d4c6a1
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a9c2e7d4b8'
+down_revision: Union[str, None] = 'e3b8f0d4c6a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The trigger-maintained column becomes a generated one; a BEFORE trigger
+    # assigning to a generated column would fail every insert.
+    op.execute("DROP TRIGGER IF EXISTS security_finding_search_vector_trigger ON security_findings")
+    op.execute("DROP FUNCTION IF EXISTS update_security_finding_search_vector()")
+    op.execute("DROP INDEX IF EXISTS idx_finding_search")
+    op.execute("ALTER TABLE security_findings DROP COLUMN IF EXISTS search_vector")
+    op.execute("""
+        ALTER TABLE security_findings ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(cve_id, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_finding_search ON security_findings USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_finding_search")
+    op.execute("ALTER TABLE security_findings DROP COLUMN IF EXISTS search_vector")
+    op.execute("ALTER TABLE security_findings ADD COLUMN search_vector tsvector")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_finding_search ON security_findings USING gin (search_vector)")
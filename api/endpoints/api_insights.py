@@ -17,6 +17,7 @@ from io import StringIO
 import csv
 
 from database.database import Database
+from src.log_templates import TemplateMiner
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
@@ -346,9 +347,16 @@ async def _train_isolation_forest_model(model_id: str, training_data: List[Dict]
         numeric_columns = df.select_dtypes(include=[np.number]).columns
         if len(numeric_columns) == 0:
             # Create features from text data if no numeric columns
-            df['message_length'] = df.get('message', '').astype(str).str.len()
-            df['word_count'] = df.get('message', '').astype(str).str.split().str.len()
-            numeric_columns = ['message_length', 'word_count']
+            messages = df.get('message', '').astype(str)
+            df['message_length'] = messages.str.len()
+            df['word_count'] = messages.str.split().str.len()
+            # Template frequency/rarity from an online Drain-style miner
+            miner = TemplateMiner()
+            template_ids = [miner.add(message).template_id for message in messages]
+            frequency = np.array([miner.frequency(t) for t in template_ids], dtype=float) / max(miner.total, 1)
+            df['template_frequency'] = frequency
+            df['template_rarity'] = -np.log(np.maximum(frequency, 1e-12))
+            numeric_columns = ['message_length', 'word_count', 'template_frequency', 'template_rarity']
         
         X = df[numeric_columns].fillna(0)
         
@@ -3,8 +3,11 @@ SecureNet Security Audit Logging System
 Day 3 Sprint 1: Security audit logging and event tracking
 """
 
+import asyncio
 import json
 import logging
+import os
+import socket
 import time
 import hashlib
 from datetime import datetime, timedelta
@@ -12,7 +15,15 @@ from typing import Dict, List, Any, Optional, Union
 from enum import Enum
 from dataclasses import dataclass, asdict
 from utils.cache_service import cache_service
+from utils.windowed_counters import failed_login_counters
+from security.behavior_profiles import behavior_profiles
 from database.postgresql_adapter import get_db_connection
+from auth.audit_pipeline import AUDIT_COLUMNS, AuditWriter, UserRiskScores
+from auth.audit_rollups import AuditRollups, rebuild_rollups, rollup_summary, rollups_cover
+from auth.audit_chain import (
+    CHECKPOINT_COLUMNS, AuditChain, build_event_proof, export_chain,
+    load_chain_state, verify_event_proof, verify_range
+)
 
 logger = logging.getLogger(__name__)
 
@@ -109,6 +120,24 @@ class SecurityAuditLogger:
             "suspicious_activity_score": 80,
             "critical_events_per_hour": 10
         }
+        self.risk_scores = UserRiskScores()
+        self.rollups = AuditRollups(AUDIT_COLUMNS)
+        self.writer = AuditWriter(
+            lambda: get_db_connection(),
+            lambda: cache_service.redis_client,
+            spool_path=os.getenv("AUDIT_SPOOL_PATH", "data/audit_spool.jsonl"),
+            batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.05")),
+            queue_size=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+            hooks=[self.rollups]
+        )
+        self.chain = AuditChain(
+            # One chain per process: uvicorn/gunicorn workers on a host must not share sequences
+            os.getenv("AUDIT_CHAIN_ID") or f"{socket.gethostname()}-{os.getpid()}",
+            block_size=int(os.getenv("AUDIT_CHECKPOINT_BLOCK_SIZE", "1024")),
+            checkpoint_interval=float(os.getenv("AUDIT_CHECKPOINT_INTERVAL", "300"))
+        )
+        self._chain_lock: Optional[asyncio.Lock] = None
     
     async def log_event(self, 
                        event_type: AuditEventType,
@@ -149,11 +178,24 @@ class SecurityAuditLogger:
                 organization_id=organization_id
             )
             
-            # Store in database
-            await self._store_audit_event(event)
+            # Count failed logins in memory so detectors never re-count audit_logs
+            if event_type == AuditEventType.LOGIN_FAILED:
+                await failed_login_counters.record(source_ip, username)
             
-            # Cache recent events for real-time monitoring
-            await self._cache_recent_event(event)
+            # Keep resident behavior profiles current without rescanning audit_logs
+            if user_id:
+                behavior_profiles.observe(
+                    user_id, event_type.value, event.timestamp.timestamp(),
+                    source_ip=source_ip, user_agent=user_agent, resource=resource
+                )
+            
+            # Keep per-user risk scores current for real-time alerting
+            if user_id:
+                self.risk_scores.record(user_id, event_type.value, event.timestamp.timestamp())
+            
+            # Queue for batched storage and recent-event caching
+            await self._ensure_chain()
+            self._store_audit_event(event)
             
             # Check for real-time alerts
             if self.real_time_alerts:
@@ -170,52 +212,90 @@ class SecurityAuditLogger:
             await self._fallback_file_log(event_type, severity, details)
             raise
     
-    async def _store_audit_event(self, event: AuditEvent):
-        """Store audit event in database"""
-        try:
-            async with get_db_connection() as conn:
-                await conn.execute("""
-                    INSERT INTO audit_logs (
-                        event_id, event_hash, event_type, severity,
-                        user_id, username, user_role, source_ip, user_agent,
-                        resource, action, result, details, timestamp,
-                        session_id, request_id, organization_id
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17)
-                """, 
-                    event.event_id, event.event_hash, event.event_type.value, event.severity.value,
-                    event.user_id, event.username, event.user_role, event.source_ip, event.user_agent,
-                    event.resource, event.action, event.result, json.dumps(event.details), event.timestamp,
-                    event.session_id, event.request_id, event.organization_id
-                )
-                
-        except Exception as e:
-            logger.error(f"Database audit logging failed: {e}")
-            raise
+    def _store_audit_event(self, event: AuditEvent):
+        """Queue audit event for batched insert (spooled to disk if it cannot be written)"""
+        record = {
+            "event_id": event.event_id,
+            "event_hash": event.event_hash,
+            "event_type": event.event_type.value,
+            "severity": event.severity.value,
+            "user_id": event.user_id,
+            "username": event.username,
+            "user_role": event.user_role,
+            "source_ip": event.source_ip,
+            "user_agent": event.user_agent,
+            "resource": event.resource,
+            "action": event.action,
+            "result": event.result,
+            "details": json.dumps(event.details),
+            "timestamp": event.timestamp,
+            "session_id": event.session_id,
+            "request_id": event.request_id,
+            "organization_id": event.organization_id
+        }
+        # Link into the tamper-evident chain (adds chain_id, sequence, prev_hash, chain_hash)
+        self.chain.append(record)
+        row = tuple(record[column] for column in AUDIT_COLUMNS)
+        # Summary kept in the Redis recent-events list (last 100 events)
+        recent = {
+            "event_id": event.event_id,
+            "event_type": event.event_type.value,
+            "severity": event.severity.value,
+            "user_id": event.user_id,
+            "username": event.username,
+            "action": event.action,
+            "result": event.result,
+            "timestamp": event.timestamp.isoformat(),
+            "source_ip": event.source_ip
+        }
+        self.writer.submit(row, recent)
+        self._submit_checkpoint(self.chain.checkpoint())
     
-    async def _cache_recent_event(self, event: AuditEvent):
-        """Cache recent events for real-time monitoring"""
-        try:
-            # Add to recent events list (last 100 events)
-            recent_key = "audit:recent_events"
-            event_data = {
-                "event_id": event.event_id,
-                "event_type": event.event_type.value,
-                "severity": event.severity.value,
-                "user_id": event.user_id,
-                "username": event.username,
-                "action": event.action,
-                "result": event.result,
-                "timestamp": event.timestamp.isoformat(),
-                "source_ip": event.source_ip
-            }
+    def _submit_checkpoint(self, checkpoint: Optional[Dict[str, Any]]):
+        """Queue a sealed block's Merkle checkpoint behind its events"""
+        if checkpoint:
+            self.writer.submit_checkpoint(tuple(checkpoint[column] for column in CHECKPOINT_COLUMNS))
+    
+    async def _ensure_chain(self):
+        """Resume the hash chain from the database and spool before the first append"""
+        if self.chain.loaded:
+            return
+        if self._chain_lock is None:
+            self._chain_lock = asyncio.Lock()
+        async with self._chain_lock:
+            if self.chain.loaded:
+                return
+            checkpoint, unsealed = None, []
+            try:
+                async with get_db_connection() as conn:
+                    checkpoint, unsealed = await load_chain_state(conn, self.chain.chain_id)
+            except Exception as e:
+                # Never reuse sequence numbers blindly; start a visibly separate segment
+                logger.error(f"Failed to load audit chain head, starting a new chain segment: {e}")
+                self.chain.chain_id = f"{self.chain.chain_id}:{int(time.time())}"
             
-            # Use Redis list with limited size
-            await cache_service.redis_client.lpush(recent_key, json.dumps(event_data))
-            await cache_service.redis_client.ltrim(recent_key, 0, 99)  # Keep only last 100
-            await cache_service.redis_client.expire(recent_key, 3600)  # 1 hour TTL
+            # Rows still in the spool are part of the chain even though not yet stored
+            for row in self.writer.pending_rows("checkpoint"):
+                spooled = dict(zip(CHECKPOINT_COLUMNS, row))
+                if spooled["chain_id"] == self.chain.chain_id and (
+                        checkpoint is None or spooled["block_index"] > checkpoint["block_index"]):
+                    checkpoint = spooled
+            for row in self.writer.pending_rows("event"):
+                spooled = dict(zip(AUDIT_COLUMNS, row))
+                if spooled["chain_id"] == self.chain.chain_id:
+                    unsealed.append((int(spooled["sequence"]), spooled["chain_hash"]))
             
-        except Exception as e:
-            logger.error(f"Failed to cache audit event: {e}")
+            self.chain.restore(checkpoint, unsealed)
+    
+    async def flush(self):
+        """Wait until queued audit events are stored (or spooled)"""
+        await self.writer.flush()
+    
+    async def close(self):
+        """Seal the open chain block, flush queued audit events and stop the writer (shutdown hook)"""
+        if self.chain.loaded:
+            self._submit_checkpoint(self.chain.checkpoint(force=True))
+        await self.writer.close()
     
     async def _check_real_time_alerts(self, event: AuditEvent):
         """Check for real-time security alerts"""
@@ -264,17 +344,7 @@ class SecurityAuditLogger:
     async def _count_recent_failed_logins(self, source_ip: str) -> int:
         """Count failed login attempts from IP in last minute"""
         try:
-            one_minute_ago = datetime.now() - timedelta(minutes=1)
-            
-            async with get_db_connection() as conn:
-                result = await conn.fetchval("""
-                    SELECT COUNT(*) FROM audit_logs 
-                    WHERE event_type = $1 
-                    AND source_ip = $2 
-                    AND timestamp > $3
-                """, AuditEventType.LOGIN_FAILED.value, source_ip, one_minute_ago)
-                
-            return result or 0
+            return await failed_login_counters.count("ip", 60, source_ip=source_ip)
             
         except Exception as e:
             logger.error(f"Failed to count recent failed logins: {e}")
@@ -283,34 +353,7 @@ class SecurityAuditLogger:
     async def _calculate_user_risk_score(self, user_id: str) -> int:
         """Calculate user risk score based on recent activity"""
         try:
-            # This is a simplified risk scoring algorithm
-            risk_score = 0
-            last_hour = datetime.now() - timedelta(hours=1)
-            
-            async with get_db_connection() as conn:
-                # Count different types of events
-                events = await conn.fetch("""
-                    SELECT event_type, COUNT(*) as count 
-                    FROM audit_logs 
-                    WHERE user_id = $1 AND timestamp > $2 
-                    GROUP BY event_type
-                """, user_id, last_hour)
-                
-                for event in events:
-                    event_type = event['event_type']
-                    count = event['count']
-                    
-                    # Score based on event patterns
-                    if event_type == AuditEventType.LOGIN_FAILED.value:
-                        risk_score += count * 15
-                    elif event_type == AuditEventType.PERMISSION_DENIED.value:
-                        risk_score += count * 10
-                    elif event_type == AuditEventType.DATA_ACCESS.value and count > 20:
-                        risk_score += count * 2
-                    elif event_type == AuditEventType.API_ERROR.value:
-                        risk_score += count * 5
-            
-            return min(risk_score, 100)  # Cap at 100
+            return self.risk_scores.score(user_id)
             
         except Exception as e:
             logger.error(f"Risk score calculation failed: {e}")
@@ -319,13 +362,8 @@ class SecurityAuditLogger:
     async def _send_security_alert(self, alert: Dict[str, Any]):
         """Send security alert to monitoring systems"""
         try:
-            # Cache alert for dashboard
-            alert_key = f"security_alerts:{int(time.time())}"
-            await cache_service.set(alert_key, alert, ttl=3600)
-            
-            # Add to alerts list
-            await cache_service.redis_client.lpush("security:active_alerts", json.dumps(alert))
-            await cache_service.redis_client.ltrim("security:active_alerts", 0, 49)  # Keep 50 alerts
+            # Cache alert for dashboard with the next audit batch
+            self.writer.submit_alert(alert)
             
             # Log alert
             logger.warning(f"Security Alert: {alert}")
@@ -357,14 +395,37 @@ class SecurityAuditLogger:
                                start_time: Optional[datetime] = None,
                                end_time: Optional[datetime] = None,
                                user_id: Optional[str] = None,
-                               event_type: Optional[AuditEventType] = None) -> Dict[str, Any]:
-        """Get audit log summary and statistics"""
+                               event_type: Optional[AuditEventType] = None,
+                               exact: bool = False) -> Dict[str, Any]:
+        """
+        Get audit log summary and statistics
+        Served from rollups unless ``exact`` is set, a user filter is given or
+        the range starts before rollup coverage (see ``rebuild_audit_rollups``)
+        """
+        if not start_time:
+            start_time = datetime.now() - timedelta(hours=24)
+        if not end_time:
+            end_time = datetime.now()
+        
+        if not exact and not user_id:
+            try:
+                async with get_db_connection() as conn:
+                    if await rollups_cover(conn, start_time):
+                        return await rollup_summary(
+                            conn, start_time, end_time, event_type.value if event_type else None
+                        )
+            except Exception as e:
+                logger.warning(f"Audit rollup summary failed, recomputing from audit_logs: {e}")
+        
+        return await self._exact_audit_summary(start_time, end_time, user_id, event_type)
+    
+    async def _exact_audit_summary(self,
+                                   start_time: datetime,
+                                   end_time: datetime,
+                                   user_id: Optional[str] = None,
+                                   event_type: Optional[AuditEventType] = None) -> Dict[str, Any]:
+        """Recompute the audit summary from audit_logs"""
         try:
-            if not start_time:
-                start_time = datetime.now() - timedelta(hours=24)
-            if not end_time:
-                end_time = datetime.now()
-            
             async with get_db_connection() as conn:
                 # Base query conditions
                 conditions = ["timestamp BETWEEN $1 AND $2"]
@@ -432,7 +493,8 @@ class SecurityAuditLogger:
                         "failed_events": failed_events,
                         "critical_events": critical_events,
                         "unique_users": len(user_activity),
-                        "unique_ips": len(ip_activity)
+                        "unique_ips": len(ip_activity),
+                        "source": "exact"
                     },
                     "event_breakdown": [dict(row) for row in event_counts],
                     "top_users": [dict(row) for row in user_activity],
@@ -443,6 +505,11 @@ class SecurityAuditLogger:
             logger.error(f"Failed to get audit summary: {e}")
             return {"error": str(e)}
     
+    async def rebuild_audit_rollups(self, start_time: datetime, end_time: datetime):
+        """Recompute audit rollups for a range from audit_logs (backfill or repair)"""
+        async with get_db_connection() as conn:
+            await rebuild_rollups(conn, start_time, end_time)
+    
     async def get_recent_events(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent audit events from cache"""
         try:
@@ -463,6 +530,51 @@ class SecurityAuditLogger:
             logger.error(f"Failed to get security alerts: {e}")
             return []
 
+    async def verify_event_integrity(self, event_id: str) -> Dict[str, Any]:
+        """Prove one audit event against its Merkle checkpoint (O(log n) hashes)"""
+        try:
+            async with get_db_connection() as conn:
+                bundle = await build_event_proof(conn, event_id)
+            if bundle is None:
+                return {"event_id": event_id, "found": False, "verified": False}
+            return {
+                "event_id": event_id,
+                "found": True,
+                "sealed": bundle["checkpoint"] is not None,
+                "verified": verify_event_proof(bundle) if bundle["checkpoint"] else False,
+                "proof": bundle
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to verify audit event {event_id}: {e}")
+            return {"event_id": event_id, "error": str(e)}
+    
+    async def verify_audit_integrity(self,
+                                     start_time: Optional[datetime] = None,
+                                     end_time: Optional[datetime] = None,
+                                     chain_id: Optional[str] = None) -> Dict[str, Any]:
+        """Verify the hash chain and checkpoints for a time range (default: last 24 hours)"""
+        try:
+            if not start_time:
+                start_time = datetime.now() - timedelta(hours=24)
+            if not end_time:
+                end_time = datetime.now()
+            
+            async with get_db_connection() as conn:
+                return await verify_range(conn, chain_id or self.chain.chain_id, start_time, end_time)
+                
+        except Exception as e:
+            logger.error(f"Audit integrity verification failed: {e}")
+            return {"valid": False, "error": str(e)}
+    
+    async def export_audit_chain(self,
+                                 start_time: Optional[datetime] = None,
+                                 end_time: Optional[datetime] = None,
+                                 chain_id: Optional[str] = None) -> Dict[str, Any]:
+        """Export whole chain blocks with checkpoints for offline verification"""
+        async with get_db_connection() as conn:
+            return await export_chain(conn, chain_id or self.chain.chain_id, start_time, end_time)
+
 # Global audit logger instance
 security_audit_logger = SecurityAuditLogger()
 
@@ -0,0 +1,575 @@
+"""
+SecureNet Buffered Audit Pipeline
+
+Keeps audit logging off the request path for ``SecurityAuditLogger``:
+- ``AuditWriter`` owns a bounded in-process queue; one writer task drains it
+  in batches (``batch_size`` rows or ``flush_interval`` seconds), inserts each
+  batch with a single ``COPY`` (``executemany`` when COPY is unavailable) and
+  sends the batch's recent-event and alert updates to Redis in one pipeline
+- ``AuditSpool`` is an fsync'd JSON-lines file that takes events when the
+  queue is full or the database is unavailable; it is replayed into
+  ``audit_logs`` once inserts succeed again, so events are never dropped;
+  worker processes sharing a spool serialise on ``flock``, and only one of
+  them replays it at a time
+- a batch the database rejects (bad data, constraint violation) is bisected
+  so its good rows still commit; each rejected row is quarantined to a
+  ``.rejected`` file next to the spool instead of blocking later rows
+- ``UserRiskScores`` keeps per-user event counts in sliding windows, so the
+  real-time risk score no longer runs a GROUP BY over ``audit_logs``
+
+Hash-chain checkpoints (``auth.audit_chain``) go through the same batches and
+spool, after the events they seal. Batch ``hooks`` (e.g. ``auth.audit_rollups``)
+run inside the insert transaction, so derived tables commit with their events.
+
+Delivery is at-least-once: a crash between a replayed batch committing and
+its spool file being removed replays those rows again.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: one worker per spool
+    fcntl = None
+
+from auth.audit_chain import CHECKPOINT_COLUMNS
+from utils.windowed_counters import WindowedCounterStore
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = (
+    "event_id", "event_hash", "event_type", "severity",
+    "user_id", "username", "user_role", "source_ip", "user_agent",
+    "resource", "action", "result", "details", "timestamp",
+    "session_id", "request_id", "organization_id",
+    "chain_id", "sequence", "prev_hash", "chain_hash",
+)
+
+# Table each queued row kind is written to, with its columns and datetime column
+AUDIT_TABLES = {
+    "event": ("audit_logs", AUDIT_COLUMNS, "timestamp"),
+    "checkpoint": ("audit_checkpoints", CHECKPOINT_COLUMNS, "created_at"),
+}
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    return "INSERT INTO {} ({}) VALUES ({})".format(
+        table, ", ".join(columns), ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+    )
+
+
+# SQLSTATE classes caused by row contents: data exception, integrity constraint violation
+REJECTED_SQLSTATE_CLASSES = ("22", "23")
+UNIQUE_VIOLATION = "23505"
+
+
+def _row_rejected(error: Exception) -> bool:
+    """Whether ``error`` rejects the rows themselves (retrying cannot help) rather than an outage"""
+    sqlstate = getattr(error, "sqlstate", None)
+    if sqlstate:
+        return sqlstate[:2] in REJECTED_SQLSTATE_CLASSES
+    # Client-side encoding failures (asyncpg's DataError is a ValueError)
+    return isinstance(error, (ValueError, TypeError))
+
+
+RECENT_EVENTS_KEY = "audit:recent_events"
+ACTIVE_ALERTS_KEY = "security:active_alerts"
+
+# Points per event in the last hour; data access only counts past 20 events
+RISK_WEIGHTS = {
+    "login_failed": 15,
+    "permission_denied": 10,
+    "data_access": 2,
+    "api_error": 5,
+}
+DATA_ACCESS_ALLOWANCE = 20
+
+
+class UserRiskScores:
+    """Per-user risk score over the trailing hour, updated as events are logged."""
+
+    def __init__(self, window: float = 3600, resolution: int = 60, max_users: int = 100000):
+        self._stores = {
+            event_type: WindowedCounterStore(window, resolution, max_users)
+            for event_type in RISK_WEIGHTS
+        }
+
+    def record(self, user_id: str, event_type: str, now: Optional[float] = None) -> int:
+        """Count one event and return the user's updated score."""
+        now = time.time() if now is None else now
+        store = self._stores.get(event_type)
+        if store is not None:
+            store.increment(user_id, now)
+        return self.score(user_id, now)
+
+    def score(self, user_id: str, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        score = 0
+        for event_type, store in self._stores.items():
+            count = store.count(user_id, now)
+            if event_type == "data_access" and count <= DATA_ACCESS_ALLOWANCE:
+                continue
+            score += count * RISK_WEIGHTS[event_type]
+        return min(score, 100)  # Cap at 100
+
+
+class AuditSpool:
+    """
+    Append-only, fsync'd spill file for audit rows that could not be inserted.
+
+    ``take`` moves the live file aside and returns its rows; ``release``
+    deletes that file once the rows are committed and ``retain`` keeps only
+    the rows still missing. A file left aside by a failed replay (or a crash)
+    is returned again by the next ``take``, followed by rows spilled since.
+    Rows the database rejects are moved to ``rejected_path`` by ``quarantine``.
+
+    Several processes may share one spool: file updates hold an exclusive
+    ``flock`` on ``<path>.lock``, and ``take`` only returns rows once it owns
+    ``<path>.replay.lock``, held until ``finish`` so no other process adds to
+    or deletes the replay file mid-replay.
+    """
+
+    def __init__(self, path: str, datetime_index: int):
+        self.path = path
+        self.replay_path = f"{path}.replay"
+        self.rejected_path = f"{path}.rejected"
+        self.datetime_index = datetime_index
+        self._replay_lock = None
+
+    def _open_lock(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(path, "a")
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access to the spool files across processes"""
+        if fcntl is None:
+            yield
+            return
+        with self._open_lock(f"{self.path}.lock") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _own_replay(self) -> bool:
+        if self._replay_lock is not None or fcntl is None:
+            return True
+        lock = self._open_lock(f"{self.replay_path}.lock")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        self._replay_lock = lock
+        return True
+
+    def finish(self):
+        """End a replay started by ``take``, letting other processes replay"""
+        lock, self._replay_lock = self._replay_lock, None
+        if lock is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            lock.close()
+
+    def pending(self) -> bool:
+        return any(os.path.exists(p) and os.path.getsize(p) > 0
+                   for p in (self.path, self.replay_path))
+
+    def append(self, rows: Sequence[Sequence[Any]]):
+        with self._locked():
+            self._write(self.path, rows)
+
+    def quarantine(self, rows: Sequence[Sequence[Any]]):
+        with self._locked():
+            self._write(self.rejected_path, rows)
+
+    def _write(self, path: str, rows: Sequence[Sequence[Any]], mode: str = "a"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, mode, encoding="utf-8") as f:
+            for row in rows:
+                record = list(row)
+                if isinstance(record[self.datetime_index], datetime):
+                    record[self.datetime_index] = record[self.datetime_index].isoformat()
+                f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def take(self) -> List[Tuple[Any, ...]]:
+        """Start a replay; empty when nothing is spooled or another process is replaying."""
+        if not self._own_replay():
+            return []
+        with self._locked():
+            if os.path.exists(self.path):
+                if os.path.exists(self.replay_path):
+                    # Queue rows spilled since a failed replay behind its leftovers
+                    with open(self.path, "rb") as src, open(self.replay_path, "ab") as dst:
+                        dst.write(src.read())
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.replay_path)
+            elif not os.path.exists(self.replay_path):
+                return []
+            return self._read(self.replay_path)
+
+    def peek(self) -> List[Tuple[Any, ...]]:
+        """Every spooled row, in write order, without taking them."""
+        with self._locked():
+            return [row for path in (self.replay_path, self.path)
+                    if os.path.exists(path) for row in self._read(path)]
+
+    def _read(self, path: str) -> List[Tuple[Any, ...]]:
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash mid-write
+                    logger.warning("Skipping unreadable audit spool line")
+                    continue
+                record[self.datetime_index] = datetime.fromisoformat(record[self.datetime_index])
+                rows.append(tuple(record))
+        return rows
+
+    def release(self):
+        if os.path.exists(self.replay_path):
+            os.remove(self.replay_path)
+
+    def retain(self, rows: Sequence[Sequence[Any]]):
+        """Replace the taken rows with ``rows``, those a partial replay left unwritten."""
+        tmp_path = f"{self.replay_path}.tmp"
+        self._write(tmp_path, rows, mode="w")
+        os.replace(tmp_path, self.replay_path)
+
+
+class AuditWriter:
+    """
+    Single writer task batching audit rows into ``audit_logs`` and Redis.
+
+    ``connect`` returns an async context manager yielding an asyncpg-style
+    connection; ``redis`` returns the current Redis client (or ``None``).
+    """
+
+    def __init__(self, connect: Callable[[], Any], redis: Callable[[], Any] = lambda: None,
+                 spool_path: str = "data/audit_spool.jsonl", batch_size: int = 500,
+                 flush_interval: float = 0.05, queue_size: int = 10000,
+                 recent_events: int = 100, active_alerts: int = 50, use_copy: bool = True,
+                 hooks: Sequence[Any] = ()):
+        self.connect = connect
+        self.redis = redis
+        self.hooks = list(hooks)
+        base, ext = os.path.splitext(spool_path)
+        self.spools = {
+            kind: AuditSpool(spool_path if kind == "event" else f"{base}.{kind}s{ext}",
+                             columns.index(datetime_column))
+            for kind, (_, columns, datetime_column) in AUDIT_TABLES.items()
+        }
+        self.spool = self.spools["event"]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.recent_events = recent_events
+        self.active_alerts = active_alerts
+        self.use_copy = use_copy
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self.rejected = {kind: 0 for kind in AUDIT_TABLES}  # quarantined rows per kind
+        self.stats: Dict[str, float] = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "rejected": 0,
+            "duplicates": 0,
+            "insert_errors": 0,
+            "redis_errors": 0,
+            "last_batch_size": 0,
+            "last_commit_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = loop.create_task(self._writer())
+
+    def _submit_row(self, kind: str, row: Sequence[Any], recent: Optional[Dict[str, Any]] = None) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, tuple(row), recent))
+            return True
+        except asyncio.QueueFull:
+            self.spools[kind].append([row])
+            self.stats["spilled"] += 1
+            return False
+
+    def submit(self, row: Sequence[Any], recent: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Queue one ``audit_logs`` row (in ``AUDIT_COLUMNS`` order) without waiting.
+
+        Returns ``False`` when the queue was full and the row went straight to
+        the spool instead.
+        """
+        self.stats["submitted"] += 1
+        return self._submit_row("event", row, recent)
+
+    def submit_checkpoint(self, row: Sequence[Any]) -> bool:
+        """Queue one ``audit_checkpoints`` row (in ``CHECKPOINT_COLUMNS`` order)."""
+        return self._submit_row("checkpoint", row)
+
+    def submit_alert(self, alert: Dict[str, Any]):
+        """Queue an alert for the dashboard cache; dropped if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(("alert", alert, None))
+        except asyncio.QueueFull:
+            logger.warning("Audit queue full, alert not cached for dashboard")
+
+    def pending_rows(self, kind: str = "event") -> List[Tuple[Any, ...]]:
+        """Rows of ``kind`` waiting in the spool (not yet in the database)."""
+        return self.spools[kind].peek()
+
+    async def flush(self):
+        """Wait until everything queued so far has been written or spooled."""
+        if self._task is None or self._loop is not asyncio.get_running_loop() or self._task.done():
+            return
+        future = self._loop.create_future()
+        await self._queue.put(("flush", future, None))
+        await future
+
+    async def close(self):
+        """Flush pending events and stop the writer task."""
+        if self._task is None:
+            return
+        if self._loop is asyncio.get_running_loop() and not self._task.done():
+            await self.flush()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _next_batch(self) -> List[Tuple[str, Any, Any]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1][0] != "flush":
+            try:
+                if self._queue.empty():
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+        return batch
+
+    async def _writer(self):
+        if self._spooled():
+            await self._replay_spools()
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"Audit writer batch failed: {str(e)}")
+            finally:
+                for kind, future, _ in batch:
+                    if kind == "flush" and not future.done():
+                        future.set_result(None)
+
+    def _spooled(self) -> bool:
+        return any(spool.pending() for spool in self.spools.values())
+
+    async def _process(self, batch: List[Tuple[str, Any, Any]]):
+        rows = {kind: [row for k, row, _ in batch if k == kind] for kind in AUDIT_TABLES}
+        recent = [entry for kind, _, entry in batch if kind == "event" and entry]
+        alerts = [alert for kind, alert, _ in batch if kind == "alert"]
+
+        if any(rows.values()):
+            started = time.perf_counter()
+            rejected = self.rejected["event"]
+            unwritten = await self._write_rows(rows)
+            written = len(rows["event"]) - len(unwritten.get("event", ())) - (self.rejected["event"] - rejected)
+            self.stats["written"] += written
+            if not unwritten:
+                self.stats["batches"] += 1
+                self.stats["last_batch_size"] = written
+                self.stats["last_commit_ms"] = (time.perf_counter() - started) * 1000
+                if self._spooled():
+                    await self._replay_spools()
+            else:
+                for kind, kind_rows in unwritten.items():
+                    self.spools[kind].append(kind_rows)
+                self.stats["spilled"] += sum(len(kind_rows) for kind_rows in unwritten.values())
+
+        if recent or alerts:
+            await self._update_redis(recent, alerts)
+
+    async def _write_rows(self, rows: Dict[str, List[Tuple[Any, ...]]]) -> Dict[str, List[Tuple[Any, ...]]]:
+        """
+        Insert a batch in one transaction, isolating rows the database rejects.
+
+        Returns the rows per kind an outage left unwritten (to be spooled).
+        """
+        try:
+            await self._insert(rows)
+            return {}
+        except Exception as e:
+            error = e
+        if not _row_rejected(error):
+            self.stats["insert_errors"] += 1
+            count = sum(len(kind_rows) for kind_rows in rows.values())
+            logger.error(f"Audit batch insert failed, spooling {count} rows: {str(error)}")
+            return {kind: list(kind_rows) for kind, kind_rows in rows.items() if kind_rows}
+
+        logger.warning(f"Audit batch rejected, isolating bad rows: {str(error)}")
+        kinds = [kind for kind in AUDIT_TABLES if rows.get(kind)]
+        unwritten: Dict[str, List[Tuple[Any, ...]]] = {}
+        for kind in kinds:
+            if unwritten:
+                # Outage part-way: checkpoints stay behind the events they seal
+                unwritten[kind] = list(rows[kind])
+                continue
+            left = await self._write_isolating(kind, rows[kind], error if len(kinds) == 1 else None)
+            if left:
+                unwritten[kind] = left
+        return unwritten
+
+    async def _write_isolating(self, kind: str, kind_rows: List[Tuple[Any, ...]],
+                               error: Optional[Exception] = None) -> List[Tuple[Any, ...]]:
+        """
+        Insert ``kind_rows``, bisecting around rows the database rejects.
+
+        ``error`` is a failed attempt at exactly these rows. Rejected rows are
+        quarantined; returns the rows an outage left unwritten.
+        """
+        if error is None:
+            try:
+                await self._insert({kind: kind_rows})
+                return []
+            except Exception as e:
+                error = e
+        if not _row_rejected(error):
+            self.stats["insert_errors"] += 1
+            logger.error(f"Audit insert failed, spooling {len(kind_rows)} rows: {str(error)}")
+            return list(kind_rows)
+        if len(kind_rows) == 1:
+            self._reject(kind, kind_rows, error)
+            return []
+        middle = len(kind_rows) // 2
+        unwritten = await self._write_isolating(kind, kind_rows[:middle])
+        if unwritten:
+            return unwritten + list(kind_rows[middle:])
+        return await self._write_isolating(kind, kind_rows[middle:])
+
+    def _reject(self, kind: str, kind_rows: List[Tuple[Any, ...]], error: Exception):
+        if getattr(error, "sqlstate", None) == UNIQUE_VIOLATION:
+            # Already stored, e.g. a replay after a crash before the spool was released
+            self.stats["duplicates"] += len(kind_rows)
+            return
+        spool = self.spools[kind]
+        spool.quarantine(kind_rows)
+        self.rejected[kind] += len(kind_rows)
+        self.stats["rejected"] += len(kind_rows)
+        logger.error(f"Audit {kind} row rejected by the database, quarantined to "
+                     f"{spool.rejected_path}: {str(error)}")
+
+    async def _insert(self, rows: Dict[str, List[Tuple[Any, ...]]]):
+        async with self.connect() as conn:
+            # Events before the checkpoints that seal them, in one transaction
+            transaction = conn.transaction() if hasattr(conn, "transaction") else None
+            if transaction is not None:
+                await transaction.start()
+            try:
+                for kind, kind_rows in rows.items():
+                    if not kind_rows:
+                        continue
+                    table, columns, _ = AUDIT_TABLES[kind]
+                    if self.use_copy and hasattr(conn, "copy_records_to_table"):
+                        await conn.copy_records_to_table(table, records=kind_rows, columns=list(columns))
+                    else:
+                        await conn.executemany(_insert_sql(table, columns), kind_rows)
+                    if kind == "event":
+                        for hook in self.hooks:
+                            await hook.apply(conn, kind_rows)
+            except Exception:
+                if transaction is not None:
+                    await transaction.rollback()
+                raise
+            if transaction is not None:
+                await transaction.commit()
+
+    async def _replay_spools(self):
+        try:
+            await self._replay_taken()
+        finally:
+            for spool in self.spools.values():
+                spool.finish()
+
+    async def _replay_taken(self):
+        try:
+            spooled = {kind: spool.take() for kind, spool in self.spools.items()}
+        except Exception as e:
+            logger.error(f"Failed to read audit spool: {str(e)}")
+            return
+        # Checkpoints only after every event they seal is back in
+        replayed = 0
+        for kind in AUDIT_TABLES:
+            kind_rows = spooled[kind]
+            for start in range(0, len(kind_rows), self.batch_size):
+                chunk = kind_rows[start:start + self.batch_size]
+                unwritten = (await self._write_rows({kind: chunk})).get(kind, [])
+                replayed += len(chunk) - len(unwritten)
+                if unwritten:
+                    # Keep only what is still missing for the next replay
+                    self.spools[kind].retain(unwritten + kind_rows[start + self.batch_size:])
+                    self.stats["replayed"] += replayed
+                    return
+            if kind_rows:
+                self.spools[kind].release()
+        self.stats["replayed"] += replayed
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled audit rows")
+
+    async def _update_redis(self, recent: List[Dict[str, Any]], alerts: List[Dict[str, Any]]):
+        client = self.redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            if recent:
+                # LPUSH with several values leaves the last one at the head
+                pipe.lpush(RECENT_EVENTS_KEY, *(json.dumps(entry) for entry in recent))
+                pipe.ltrim(RECENT_EVENTS_KEY, 0, self.recent_events - 1)
+                pipe.expire(RECENT_EVENTS_KEY, 3600)
+            if alerts:
+                now = int(time.time())
+                for alert in alerts:
+                    pipe.setex(f"security_alerts:{now}", 3600, json.dumps(alert, default=str))
+                pipe.lpush(ACTIVE_ALERTS_KEY, *(json.dumps(alert, default=str) for alert in alerts))
+                pipe.ltrim(ACTIVE_ALERTS_KEY, 0, self.active_alerts - 1)
+            await pipe.execute()
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.error(f"Failed to cache audit events: {str(e)}")
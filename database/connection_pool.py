@@ -0,0 +1,187 @@
+"""
+SecureNet SQLite Connection Pool
+
+Long-lived, per-process connection management for the SQLite ``Database``:
+- a small pool of aiosqlite reader connections
+- one dedicated writer connection, serialized with an asyncio lock
+- WAL journaling, ``synchronous=NORMAL``, mmap and page-cache pragmas
+- a larger sqlite3 prepared-statement cache per connection
+- thread-local long-lived sqlite3 connections for the synchronous code paths
+
+Connections are opened lazily and reused for the life of the process, so a
+call no longer pays connect + schema parse + journal setup each time.
+"""
+
+import asyncio
+import contextvars
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRAGMAS: Tuple[Tuple[str, str], ...] = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", "5000"),
+    ("cache_size", "-65536"),    # 64 MiB page cache
+    ("mmap_size", "268435456"),  # 256 MiB
+    ("temp_store", "MEMORY"),
+)
+CACHED_STATEMENTS = 512
+
+# Connection held by the current task, so nested Database calls reuse it
+_current_connection: contextvars.ContextVar = contextvars.ContextVar("sqlite_pool_connection", default=None)
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas=DEFAULT_PRAGMAS):
+    for name, value in pragmas:
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+class SQLiteConnectionPool:
+    """
+    Reader pool plus single writer for one SQLite database file.
+
+    aiosqlite connections are not bound to an event loop, so they survive
+    across loops; only the asyncio primitives are rebuilt when the running
+    loop changes (e.g. between ``asyncio.run`` calls in scripts and tests).
+    """
+
+    def __init__(self, db_path: str, readers: int = 4,
+                 cached_statements: int = CACHED_STATEMENTS, pragmas=DEFAULT_PRAGMAS):
+        self.db_path = db_path
+        self.readers = readers
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self._idle: Deque[aiosqlite.Connection] = deque()
+        self._all: list = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._loop = None
+        self._reader_slots: Optional[asyncio.Semaphore] = None
+        self._writer_lock: Optional[asyncio.Lock] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+        self._local = threading.local()
+        self._sync_connections: list = []
+        self._sync_lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "connections_opened": 0,
+            "reader_acquires": 0,
+            "writer_acquires": 0,
+            "reentrant_acquires": 0,
+            "writer_wait_ms": 0.0,
+        }
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._reader_slots = asyncio.Semaphore(self.readers)
+            self._writer_lock = asyncio.Lock()
+            self._open_lock = asyncio.Lock()
+
+    async def _open(self) -> aiosqlite.Connection:
+        conn = aiosqlite.connect(self.db_path, cached_statements=self.cached_statements)
+        # Pooled connections live until process exit; don't let their worker
+        # threads block interpreter shutdown if close() was never awaited.
+        conn.daemon = True
+        await conn
+        for name, value in self.pragmas:
+            await conn.execute(f"PRAGMA {name} = {value}")
+        self._all.append(conn)
+        self.stats["connections_opened"] += 1
+        return conn
+
+    async def _release(self, conn: aiosqlite.Connection):
+        # Never hand the next caller an open transaction or a row factory
+        if conn.in_transaction:
+            await conn.rollback()
+        conn.row_factory = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a pooled connection for reads."""
+        held = _current_connection.get()
+        if held is not None:
+            self.stats["reentrant_acquires"] += 1
+            yield held
+            return
+
+        self._bind_loop()
+        await self._reader_slots.acquire()
+        conn = None
+        token = None
+        try:
+            conn = self._idle.pop() if self._idle else await self._open()
+            self.stats["reader_acquires"] += 1
+            token = _current_connection.set(conn)
+            yield conn
+        finally:
+            if token is not None:
+                _current_connection.reset(token)
+            if conn is not None:
+                try:
+                    await self._release(conn)
+                    self._idle.append(conn)
+                except Exception as e:
+                    logger.warning(f"Discarding pooled SQLite connection: {e}")
+            self._reader_slots.release()
+
+    @asynccontextmanager
+    async def writer(self):
+        """Hold the single writer connection; writers are serialized."""
+        held = _current_connection.get()
+        if held is not None and held is self._writer:
+            self.stats["reentrant_acquires"] += 1
+            yield held
+            return
+
+        self._bind_loop()
+        started = time.perf_counter()
+        async with self._writer_lock:
+            self.stats["writer_wait_ms"] += (time.perf_counter() - started) * 1000
+            if self._writer is None:
+                self._writer = await self._open()
+            self.stats["writer_acquires"] += 1
+            token = _current_connection.set(self._writer)
+            try:
+                yield self._writer
+            finally:
+                _current_connection.reset(token)
+                await self._release(self._writer)
+
+    def sync_connection(self) -> sqlite3.Connection:
+        """Long-lived sqlite3 connection for the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements)
+            apply_pragmas(conn, self.pragmas)
+            self._local.conn = conn
+            with self._sync_lock:
+                self._sync_connections.append(conn)
+        return conn
+
+    async def close(self):
+        """Close every pooled connection (call on application shutdown)."""
+        for conn in self._all:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.debug(f"Error closing pooled connection: {e}")
+        self._all.clear()
+        self._idle.clear()
+        self._writer = None
+        with self._sync_lock:
+            for conn in self._sync_connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass  # Owned by another thread; closed at exit
+            self._sync_connections.clear()
+        self._local = threading.local()
@@ -13,6 +13,13 @@ from enum import Enum
 
 import aiosqlite
 from src.security import get_password_hash
+from database.connection_pool import SQLiteConnectionPool
+from database.write_queue import WriteQueue
+from database.pagination import KEYSET_ORDER, CountCache, keyset_condition
+from database.fulltext import (LOG_FTS_AFTER, LOG_FTS_MATCH, LOG_FTS_RECENT_ORDER,
+                               LOG_FTS_RELEVANCE_ORDER, LOG_FTS_SCHEMA, LOG_FTS_SELECT,
+                               LOG_FTS_SNIPPETS, build_fts5_query)
+from database.pagination import decode_cursor
 
 # Configure logging for the database module
 logger = logging.getLogger(__name__)
@@ -66,11 +73,48 @@ class Database:
     def _ensure_db_directory(self):
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
 
+    # ===== CONNECTION MANAGEMENT =====
+
+    def _get_pool(self) -> SQLiteConnectionPool:
+        pool = getattr(self, "_pool", None)
+        if pool is None or pool.db_path != self.db_path:
+            pool = self._pool = SQLiteConnectionPool(self.db_path)
+        return pool
+
+    @property
+    def write_queue(self) -> WriteQueue:
+        """Group-committing single writer for high-rate inserts."""
+        pool = self._get_pool()
+        queue = getattr(self, "_write_queue", None)
+        if queue is None or queue.pool is not pool:
+            queue = self._write_queue = WriteQueue(pool)
+        return queue
+
+    def _get_count_cache(self) -> CountCache:
+        cache = getattr(self, "_count_cache", None)
+        if cache is None:
+            cache = self._count_cache = CountCache()
+        return cache
+
+    def read_connection(self):
+        """Borrow a pooled aiosqlite connection for reads."""
+        return self._get_pool().reader()
+
+    def write_connection(self):
+        """Hold the dedicated writer connection (writes are serialized)."""
+        return self._get_pool().writer()
+
+    async def close(self):
+        """Flush queued writes and close pooled connections; call on shutdown."""
+        await self.write_queue.close()
+        await self._get_pool().close()
+
     def get_db(self):
-        return sqlite3.connect(self.db_path)
+        """Long-lived, WAL-tuned sqlite3 connection for the calling thread."""
+        return self._get_pool().sync_connection()
 
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.write_connection() as conn:
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS assets (
                     id SERIAL PRIMARY KEY,
@@ -106,8 +150,9 @@ class Database:
             ''')
             await conn.commit()
 
-    async def get_db_async(self):
-        return aiosqlite.connect(self.db_path)
+    def get_db_async(self):
+        """Pooled read connection; use as ``async with db.get_db_async() as conn``."""
+        return self.read_connection()
 
     def _init_db(self):
         """Internal method to initialize database."""
@@ -141,7 +186,7 @@ class Database:
     async def create_organization(self, name: str, owner_email: str, plan: PlanType = PlanType.FREE) -> str:
         """Create a new organization for multi-tenant SaaS."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 org_id = str(uuid.uuid4())
                 api_key = f"sk-{secrets.token_urlsafe(32)}"
                 
@@ -166,7 +211,7 @@ class Database:
     async def get_organization_by_api_key(self, api_key: str) -> Optional[Dict]:
         """Get organization by API key for tenant scoping."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, name, owner_email, status, plan_type, device_limit,
                            created_at, updated_at
@@ -194,7 +239,7 @@ class Database:
     async def get_organization_usage(self, org_id: str) -> Dict:
         """Get organization usage metrics for billing."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 # Count devices
                 cursor = await conn.execute("""
                     SELECT COUNT(*) FROM network_devices WHERE organization_id = ?
@@ -229,7 +274,7 @@ class Database:
     async def add_user_to_organization(self, org_id: str, user_id: int, role: str = "member") -> bool:
         """Add user to organization with role."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     INSERT OR REPLACE INTO org_users (organization_id, user_id, role, created_at)
                     VALUES (?, ?, ?, ?)
@@ -244,7 +289,7 @@ class Database:
     async def get_user_organizations(self, user_id: int) -> List[Dict]:
         """Get all organizations for a user."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT o.id, o.name, o.status, o.plan_type, ou.role
                     FROM organizations o
@@ -396,10 +441,11 @@ class Database:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
 
     def get_db(self):
-        return sqlite3.connect(self.db_path)
+        """Long-lived, WAL-tuned sqlite3 connection for the calling thread."""
+        return self._get_pool().sync_connection()
 
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as conn:
+        async with self.write_connection() as conn:
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS assets (
                     id SERIAL PRIMARY KEY,
@@ -435,8 +481,9 @@ class Database:
             ''')
             await conn.commit()
 
-    async def get_db_async(self):
-        return aiosqlite.connect(self.db_path)
+    def get_db_async(self):
+        """Pooled read connection; use as ``async with db.get_db_async() as conn``."""
+        return self.read_connection()
 
     def _init_db(self):
         """Internal method to initialize database."""
@@ -660,7 +707,7 @@ class Database:
     async def get_log_stats(self, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Dict:
         """Get log statistics."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Build query conditions
@@ -785,7 +832,7 @@ class Database:
     async def get_threats_trend_async(self, days: int = 7) -> float:
         """Asynchronous version of get_threats_trend."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT COUNT(*) FROM scan_findings
                     WHERE timestamp >= datetime('now', ?)
@@ -1476,7 +1523,7 @@ class Database:
     async def get_health_trend(self, metric_name: str, hours: int = 24) -> List[Dict]:
         """Get health trend data for a specific metric"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Create health_trends table if it doesn't exist
                 await conn.execute("""
                     CREATE TABLE IF NOT EXISTS health_trends (
@@ -1511,7 +1558,7 @@ class Database:
     async def get_security_metrics(self) -> Dict:
         """Get security metrics including real network data analysis"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row  # Enable dictionary-style access
                 
                 # Get active scans
@@ -1636,7 +1683,7 @@ class Database:
     async def get_recent_alerts(self, limit: int = 50) -> List[Dict]:
         """Get recent alerts"""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 query = '''
                     SELECT id, type, severity, message, source, status, created_at, resolved_at
                     FROM alerts
@@ -1734,7 +1781,7 @@ class Database:
     async def get_active_scans_async(self) -> List[Dict]:
         """Get all active security scans asynchronously."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, type, target, status, progress, findings_count,
                            start_time, metadata
@@ -1766,7 +1813,7 @@ class Database:
     async def get_recent_findings_async(self, limit: int = 50) -> List[Dict]:
         """Get recent security findings asynchronously."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row  # Enable dictionary-style access
                 cursor = await conn.execute("""
                     SELECT f.id, f.scan_id, f.timestamp, f.type, f.severity,
@@ -1804,7 +1851,7 @@ class Database:
     async def get_scan_statistics_async(self) -> Dict:
         """Get scan statistics asynchronously."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 # Get total scans
                 cursor = await conn.execute("SELECT COUNT(*) FROM scans")
                 total_scans = (await cursor.fetchone())[0] or 0
@@ -2004,18 +2051,17 @@ class Database:
     async def initialize_db(self):
         """Initialize the database and create default users with proper roles."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                cursor = await conn.cursor()
-                # Ensure schema is up to date before any queries
-                await self.update_db_schema()
+            # Both steps write through their own pooled connections
+            # Ensure schema is up to date before any queries
+            await self.update_db_schema()
 
-                # Seed the 3 default development users
-                await self.seed_default_users()
+            # Seed the 3 default development users
+            await self.seed_default_users()
 
-                # Update schema (skip sample data for real network monitoring)
-                await self.update_db_schema()
-                # await self.insert_sample_data()  # Disabled for real network scanning
-                logger.info("Database initialized successfully - ready for real network scanning")
+            # Update schema (skip sample data for real network monitoring)
+            await self.update_db_schema()
+            # await self.insert_sample_data()  # Disabled for real network scanning
+            logger.info("Database initialized successfully - ready for real network scanning")
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             raise
@@ -2044,45 +2090,59 @@ class Database:
                 "updated_at": row[8],
             }
 
-    async def get_anomalies(self, page: int = 1, page_size: int = 20, filters: dict = None) -> List[Dict]:
-        """Get anomalies with pagination and filtering."""
+    @staticmethod
+    def _anomaly_conditions(filters: dict = None) -> Tuple[List[str], List]:
+        conditions = []
+        params = []
+        if filters:
+            if filters.get('status'):
+                conditions.append("status = ?")
+                params.append(filters['status'])
+            if filters.get('severity'):
+                conditions.append("severity = ?")
+                params.append(filters['severity'])
+            if filters.get('type'):
+                conditions.append("type = ?")
+                params.append(filters['type'])
+            if filters.get('start_date'):
+                conditions.append("timestamp >= ?")
+                params.append(filters['start_date'])
+            if filters.get('end_date'):
+                conditions.append("timestamp <= ?")
+                params.append(filters['end_date'])
+        return conditions, params
+
+    async def get_anomalies(self, page: int = 1, page_size: int = 20, filters: dict = None,
+                            cursor: str = None) -> List[Dict]:
+        """
+        Get anomalies with pagination and filtering.
+
+        Pass ``cursor`` (see ``database.pagination.next_cursor``) for keyset
+        paging; ``page`` is only used for OFFSET paging when no cursor is given.
+        """
+        keyset, keyset_params = keyset_condition(cursor)  # ValueError on a bad cursor
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                conn.row_factory = aiosqlite.Row
-                cursor = await conn.cursor()
-
-                # Build query conditions
-                conditions = []
-                params = []
-                if filters:
-                    if filters.get('status'):
-                        conditions.append("status = ?")
-                        params.append(filters['status'])
-                    if filters.get('severity'):
-                        conditions.append("severity = ?")
-                        params.append(filters['severity'])
-                    if filters.get('type'):
-                        conditions.append("type = ?")
-                        params.append(filters['type'])
-                    if filters.get('start_date'):
-                        conditions.append("timestamp >= ?")
-                        params.append(filters['start_date'])
-                    if filters.get('end_date'):
-                        conditions.append("timestamp <= ?")
-                        params.append(filters['end_date'])
-
-                # Build the query
-                query = ["SELECT * FROM anomalies"]
-                if conditions:
-                    query.append("WHERE " + " AND ".join(conditions))
-                query.append("ORDER BY timestamp DESC")
+            conditions, params = self._anomaly_conditions(filters)
+            if keyset:
+                conditions.append(keyset)
+                params.extend(keyset_params)
+
+            query = ["SELECT * FROM anomalies"]
+            if conditions:
+                query.append("WHERE " + " AND ".join(conditions))
+            query.append(KEYSET_ORDER)
+            if keyset:
+                query.append("LIMIT ?")
+                params.append(page_size)
+            else:
                 query.append("LIMIT ? OFFSET ?")
                 params.extend([page_size, (page - 1) * page_size])
 
-                # Execute query
-                await cursor.execute(" ".join(query), params)
-                rows = await cursor.fetchall()
-                await cursor.close()
+            async with self.read_connection() as conn:
+                conn.row_factory = aiosqlite.Row
+                result = await conn.execute(" ".join(query), params)
+                rows = await result.fetchall()
+                await result.close()
 
                 # Convert rows to dictionaries
                 anomalies = []
@@ -2098,42 +2158,10 @@ class Database:
             return []
 
     async def get_anomalies_count(self, filters: dict = None) -> int:
-        """Get total count of anomalies with optional filtering."""
+        """Get total count of anomalies (cached; approximate when unfiltered)."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                cursor = await conn.cursor()
-
-                # Build query conditions
-                conditions = []
-                params = []
-                if filters:
-                    if filters.get('status'):
-                        conditions.append("status = ?")
-                        params.append(filters['status'])
-                    if filters.get('severity'):
-                        conditions.append("severity = ?")
-                        params.append(filters['severity'])
-                    if filters.get('type'):
-                        conditions.append("type = ?")
-                        params.append(filters['type'])
-                    if filters.get('start_date'):
-                        conditions.append("timestamp >= ?")
-                        params.append(filters['start_date'])
-                    if filters.get('end_date'):
-                        conditions.append("timestamp <= ?")
-                        params.append(filters['end_date'])
-
-                # Build the query
-                query = ["SELECT COUNT(*) FROM anomalies"]
-                if conditions:
-                    query.append("WHERE " + " AND ".join(conditions))
-
-                # Execute query
-                await cursor.execute(" ".join(query), params)
-                count = (await cursor.fetchone())[0]
-                await cursor.close()
-
-                return count or 0
+            conditions, params = self._anomaly_conditions(filters)
+            return await self._cached_count("anomalies", conditions, params, filters)
         except Exception as e:
             logger.error(f"Error getting anomalies count: {str(e)}")
             return 0
@@ -2141,7 +2169,7 @@ class Database:
     async def get_recent_scans(self, limit: int = 10) -> List[Dict]:
         """Get recent security scans."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT id, timestamp, type, target, status, progress, findings_count,
@@ -2169,7 +2197,7 @@ class Database:
     async def store_security_scan(self, scan_data: Dict) -> bool:
         """Store a security scan in the database."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 now = datetime.now().isoformat()
                 # Don't insert into id column since it's AUTOINCREMENT
                 await conn.execute("""
@@ -2200,29 +2228,27 @@ class Database:
     async def store_security_finding(self, finding_data: Dict) -> bool:
         """Store a security finding in the database."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                now = datetime.now().isoformat()
-                finding_id = f"finding_{finding_data.get('scan_id')}_{int(time.time())}"
-                await conn.execute("""
-                    INSERT INTO security_findings (id, scan_id, type, severity, description,
-                                                  details, timestamp, status, remediation,
-                                                  created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    finding_id,
-                    finding_data.get('scan_id'),
-                    finding_data.get('type'),
-                    finding_data.get('severity'),
-                    finding_data.get('description'),
-                    json.dumps(finding_data.get('metadata', {})),
-                    now,
-                    finding_data.get('status', 'active'),
-                    finding_data.get('metadata', {}).get('recommendation', ''),
-                    now,
-                    now
-                ))
-                await conn.commit()
-                return True
+            now = datetime.now().isoformat()
+            finding_id = f"finding_{finding_data.get('scan_id')}_{int(time.time())}"
+            await self.write_queue.write("""
+                INSERT INTO security_findings (id, scan_id, type, severity, description,
+                                              details, timestamp, status, remediation,
+                                              created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                finding_id,
+                finding_data.get('scan_id'),
+                finding_data.get('type'),
+                finding_data.get('severity'),
+                finding_data.get('description'),
+                json.dumps(finding_data.get('metadata', {})),
+                now,
+                finding_data.get('status', 'active'),
+                finding_data.get('metadata', {}).get('recommendation', ''),
+                now,
+                now
+            ))
+            return True
         except Exception as e:
             logger.error(f"Error storing security finding: {str(e)}")
             return False
@@ -2230,7 +2256,7 @@ class Database:
     async def initialize_network_monitoring(self) -> None:
         """Initialize network monitoring tables and settings."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Create network_metrics table if it doesn't exist
                 await conn.execute("""
                     CREATE TABLE IF NOT EXISTS network_metrics (
@@ -2278,7 +2304,7 @@ class Database:
     async def store_security_scan_config(self, config: Dict) -> str:
         """Store security scan configuration and return scan ID."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Don't insert into id column since it's AUTOINCREMENT
                 cursor = await conn.execute("""
                     INSERT INTO security_scans (
@@ -2307,7 +2333,7 @@ class Database:
     async def get_settings(self) -> Dict:
         """Get all system settings."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.cursor()
                 
@@ -2382,7 +2408,7 @@ class Database:
     async def update_settings(self, settings: Dict) -> None:
         """Update system settings."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Create settings table if it doesn't exist
                 await conn.execute("""
                     CREATE TABLE IF NOT EXISTS settings (
@@ -2547,49 +2573,90 @@ class Database:
             logger.error(f"Error resetting password for user '{username}': {str(e)}")
             return False
 
-    async def get_logs(self, page: int = 1, page_size: int = 20, filters: dict = None) -> List[Dict]:
-        """Get logs with optional filtering and pagination."""
+    @staticmethod
+    def _log_conditions(filters: dict = None, fts_query: str = None) -> Tuple[List[str], List]:
+        # Columns are qualified so the same conditions work joined to logs_fts
+        conditions = []
+        params = []
+        if filters:
+            if filters.get('level'):
+                conditions.append("logs.level = ?")
+                params.append(filters['level'])
+            if filters.get('category'):
+                conditions.append("logs.category = ?")
+                params.append(filters['category'])
+            if filters.get('source'):
+                conditions.append("logs.source = ?")
+                params.append(filters['source'])
+            if filters.get('start_date'):
+                conditions.append("logs.timestamp >= ?")
+                params.append(filters['start_date'])
+            if filters.get('end_date'):
+                conditions.append("logs.timestamp <= ?")
+                params.append(filters['end_date'])
+            if fts_query:
+                conditions.append(LOG_FTS_MATCH)
+                params.append(fts_query)
+            elif filters.get('search'):
+                conditions.append("(logs.message LIKE ? OR logs.source LIKE ?)")
+                search_term = f"%{filters['search']}%"
+                params.extend([search_term, search_term])
+        return conditions, params
+
+    async def _log_fts_query(self, filters: dict = None) -> Optional[str]:
+        if not filters or not filters.get('search') or not await self._log_search_enabled():
+            return None
+        return build_fts5_query(filters['search'])
+
+    async def get_logs(self, page: int = 1, page_size: int = 20, filters: dict = None,
+                       cursor: str = None) -> List[Dict]:
+        """
+        Get logs with optional filtering and pagination.
+
+        Pass ``cursor`` (see ``database.pagination.next_cursor``) for keyset
+        paging; ``page`` is only used for OFFSET paging when no cursor is given.
+        ``filters['search']`` uses the full-text index (phrases, ``prefix*``),
+        returns the newest-ingested matches first and adds a highlighted
+        ``snippet``; ``filters['sort'] == 'relevance'`` ranks matches instead.
+        """
+        keyset, keyset_params = keyset_condition(cursor)  # ValueError on a bad cursor
+        if keyset and (filters or {}).get('search') and filters.get('sort') == 'relevance':
+            raise ValueError("Cursor paging is not supported with relevance sort")
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                conn.row_factory = aiosqlite.Row
-                cursor = await conn.cursor()
-
-                # Build query conditions
-                conditions = []
-                params = []
-                if filters:
-                    if filters.get('level'):
-                        conditions.append("level = ?")
-                        params.append(filters['level'])
-                    if filters.get('category'):
-                        conditions.append("category = ?")
-                        params.append(filters['category'])
-                    if filters.get('source'):
-                        conditions.append("source = ?")
-                        params.append(filters['source'])
-                    if filters.get('start_date'):
-                        conditions.append("timestamp >= ?")
-                        params.append(filters['start_date'])
-                    if filters.get('end_date'):
-                        conditions.append("timestamp <= ?")
-                        params.append(filters['end_date'])
-                    if filters.get('search'):
-                        conditions.append("(message LIKE ? OR source LIKE ?)")
-                        search_term = f"%{filters['search']}%"
-                        params.extend([search_term, search_term])
-
-                # Build the query
+            fts_query = await self._log_fts_query(filters)
+            if fts_query:
+                # The MATCH replaces the LIKE search condition
+                conditions, params = self._log_conditions({**filters, 'search': None})
+                if keyset:
+                    conditions.append(LOG_FTS_AFTER)
+                    params.append(decode_cursor(cursor)[1])
+                query = [LOG_FTS_SELECT]
+                params.insert(0, fts_query)
+                if conditions:
+                    query.append("AND " + " AND ".join(conditions))
+                by_relevance = filters.get('sort') == 'relevance'
+                query.append(LOG_FTS_RELEVANCE_ORDER if by_relevance else LOG_FTS_RECENT_ORDER)
+            else:
+                conditions, params = self._log_conditions(filters)
+                if keyset:
+                    conditions.append(keyset)
+                    params.extend(keyset_params)
                 query = ["SELECT * FROM logs"]
                 if conditions:
                     query.append("WHERE " + " AND ".join(conditions))
-                query.append("ORDER BY timestamp DESC")
+                query.append(KEYSET_ORDER)
+            if keyset:
+                query.append("LIMIT ?")
+                params.append(page_size)
+            else:
                 query.append("LIMIT ? OFFSET ?")
                 params.extend([page_size, (page - 1) * page_size])
 
-                # Execute query
-                await cursor.execute(" ".join(query), params)
-                rows = await cursor.fetchall()
-                await cursor.close()
+            async with self.read_connection() as conn:
+                conn.row_factory = aiosqlite.Row
+                result = await conn.execute(" ".join(query), params)
+                rows = await result.fetchall()
+                await result.close()
 
                 logs = []
                 for row in rows:
@@ -2598,60 +2665,129 @@ class Database:
                         log['metadata'] = json.loads(log['metadata'])
                     logs.append(log)
 
+                if fts_query and logs:
+                    await self._attach_log_snippets(conn, logs, fts_query)
                 return logs
         except Exception as e:
             logger.error(f"Error getting logs: {str(e)}")
             return []
 
+    async def _attach_log_snippets(self, conn, logs: List[Dict], fts_query: str):
+        """Add highlighted ``snippet`` excerpts, computed only for this page."""
+        by_rowid = {log.pop('fts_rowid'): log for log in logs}
+        placeholders = ", ".join("?" for _ in by_rowid)
+        conn.row_factory = None
+        result = await conn.execute(f"{LOG_FTS_SNIPPETS}({placeholders})", [fts_query, *by_rowid])
+        for rowid, snippet in await result.fetchall():
+            by_rowid[rowid]['snippet'] = snippet
+        await result.close()
+
     async def get_logs_count(self, filters: dict = None) -> int:
-        """Get total count of logs with optional filtering."""
+        """Get total count of logs (cached; approximate when unfiltered)."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                cursor = await conn.cursor()
+            conditions, params = self._log_conditions(filters, await self._log_fts_query(filters))
+            return await self._cached_count("logs", conditions, params, filters)
+        except Exception as e:
+            logger.error(f"Error getting logs count: {str(e)}")
+            return 0
 
-                # Build query conditions
-                conditions = []
-                params = []
-                if filters:
-                    if filters.get('level'):
-                        conditions.append("level = ?")
-                        params.append(filters['level'])
-                    if filters.get('category'):
-                        conditions.append("category = ?")
-                        params.append(filters['category'])
-                    if filters.get('source'):
-                        conditions.append("source = ?")
-                        params.append(filters['source'])
-                    if filters.get('start_date'):
-                        conditions.append("timestamp >= ?")
-                        params.append(filters['start_date'])
-                    if filters.get('end_date'):
-                        conditions.append("timestamp <= ?")
-                        params.append(filters['end_date'])
-                    if filters.get('search'):
-                        conditions.append("(message LIKE ? OR source LIKE ?)")
-                        search_term = f"%{filters['search']}%"
-                        params.extend([search_term, search_term])
-
-                # Build the query
-                query = ["SELECT COUNT(*) FROM logs"]
-                if conditions:
-                    query.append("WHERE " + " AND ".join(conditions))
+    @staticmethod
+    def _finding_conditions(filters: dict = None) -> Tuple[List[str], List]:
+        conditions = []
+        params = []
+        if filters:
+            for column in ('scan_id', 'severity', 'status', 'type'):
+                if filters.get(column):
+                    conditions.append(f"{column} = ?")
+                    params.append(filters[column])
+            if filters.get('start_date'):
+                conditions.append("timestamp >= ?")
+                params.append(filters['start_date'])
+            if filters.get('end_date'):
+                conditions.append("timestamp <= ?")
+                params.append(filters['end_date'])
+        return conditions, params
+
+    async def get_security_findings(self, page_size: int = 50, filters: dict = None,
+                                    cursor: str = None) -> List[Dict]:
+        """Get security findings newest first, keyset-paged by ``cursor``."""
+        keyset, keyset_params = keyset_condition(cursor)  # ValueError on a bad cursor
+        try:
+            conditions, params = self._finding_conditions(filters)
+            if keyset:
+                conditions.append(keyset)
+                params.extend(keyset_params)
+
+            query = ["SELECT * FROM security_findings"]
+            if conditions:
+                query.append("WHERE " + " AND ".join(conditions))
+            query.append(KEYSET_ORDER)
+            query.append("LIMIT ?")
+            params.append(page_size)
+
+            async with self.read_connection() as conn:
+                conn.row_factory = aiosqlite.Row
+                result = await conn.execute(" ".join(query), params)
+                rows = await result.fetchall()
+                await result.close()
 
-                # Execute query
-                await cursor.execute(" ".join(query), params)
-                count = (await cursor.fetchone())[0]
-                await cursor.close()
+                findings = []
+                for row in rows:
+                    finding = dict(row)
+                    for field in ('details', 'metadata'):
+                        if finding.get(field):
+                            try:
+                                finding[field] = json.loads(finding[field])
+                            except (TypeError, ValueError):
+                                pass
+                    findings.append(finding)
+                return findings
+        except Exception as e:
+            logger.error(f"Error getting security findings: {str(e)}")
+            return []
 
-                return count or 0
+    async def get_security_findings_count(self, filters: dict = None) -> int:
+        """Get total count of security findings (cached; approximate when unfiltered)."""
+        try:
+            conditions, params = self._finding_conditions(filters)
+            return await self._cached_count("security_findings", conditions, params, filters)
         except Exception as e:
-            logger.error(f"Error getting logs count: {str(e)}")
+            logger.error(f"Error getting security findings count: {str(e)}")
             return 0
 
+    async def _cached_count(self, table: str, conditions: List[str], params: List, filters: dict = None) -> int:
+        """
+        Row count for a paged list, served from ``count_cache`` when fresh.
+
+        Unfiltered totals are estimated from the rowid range (two index
+        probes) instead of a full ``COUNT(*)``; gaps from deletes make this
+        an overestimate, which is fine for a pager.
+        """
+        cache = self._get_count_cache()
+        key = cache.key(table, filters)
+        count = cache.get(key)
+        if count is not None:
+            return count
+
+        async with self.read_connection() as conn:
+            if conditions:
+                cursor = await conn.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE " + " AND ".join(conditions), params
+                )
+            else:
+                cursor = await conn.execute(
+                    f"SELECT COALESCE(MAX(rowid) - MIN(rowid) + 1, 0) FROM {table}"
+                )
+            count = (await cursor.fetchone())[0] or 0
+            await cursor.close()
+
+        cache.set(key, count)
+        return count
+
     async def get_logs_stats(self, start_date: str = None, end_date: str = None) -> Dict:
         """Get log statistics."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Build date filter
@@ -2726,7 +2862,7 @@ class Database:
     async def get_security_metrics(self) -> Dict:
         """Get security metrics."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Get active scans count
@@ -2782,7 +2918,7 @@ class Database:
     async def get_recent_findings(self, limit: int = 10) -> List[Dict]:
         """Get recent security findings."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT id, scan_id, type, severity, status, description,
@@ -2808,7 +2944,7 @@ class Database:
     async def get_network_devices(self) -> List[Dict]:
         """Get network devices."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT id, name, type, status, last_seen, metadata
@@ -2832,7 +2968,7 @@ class Database:
     async def get_network_connections(self) -> List[Dict]:
         """Get network connections."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT 
@@ -2868,7 +3004,7 @@ class Database:
     async def get_network_traffic(self, limit: int = 100) -> List[Dict]:
         """Get network traffic data."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 conn.row_factory = aiosqlite.Row
                 cursor = await conn.execute("""
                     SELECT timestamp, bytes_in, bytes_out, packets_in, packets_out,
@@ -2894,7 +3030,7 @@ class Database:
     async def get_network_protocols(self) -> List[Dict]:
         """Get network protocol distribution."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
                 await cursor.execute("""
                     SELECT protocol, COUNT(*) as count
@@ -2921,7 +3057,7 @@ class Database:
     async def get_network_stats(self) -> Dict:
         """Get network statistics."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Get total devices
@@ -2965,7 +3101,7 @@ class Database:
     async def get_anomalies_stats(self) -> Dict:
         """Get anomalies statistics."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Get total anomalies
@@ -3031,7 +3167,7 @@ class Database:
     async def update_db_schema(self):
         """Update database schema."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Enable foreign key support
                 await conn.execute("PRAGMA foreign_keys = ON")
                 cursor = await conn.cursor()
@@ -3409,6 +3545,23 @@ class Database:
                 if await column_exists("anomalies", "type"):
                     await cursor.execute("CREATE INDEX IF NOT EXISTS idx_anomalies_type ON anomalies(type)")
 
+                # Composite (filter, timestamp, id) indexes for keyset-paged lists:
+                # each API filter seeks straight to the cursor and reads in order
+                keyset_indexes = {
+                    "logs": [(), ("level",), ("category",), ("source",)],
+                    "anomalies": [(), ("status",), ("severity",), ("type",)],
+                    "security_findings": [(), ("scan_id",), ("severity",), ("status",)],
+                }
+                for table, prefixes in keyset_indexes.items():
+                    if not await column_exists(table, "timestamp"):
+                        continue
+                    for prefix in prefixes:
+                        if prefix and not await column_exists(table, prefix[0]):
+                            continue
+                        name = "_".join(("idx", table) + prefix + ("ts_id",))
+                        columns = ", ".join(prefix + ("timestamp", "id"))
+                        await cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+
                 # Create indexes for multi-tenant tables (only if tables exist)
                 try:
                     await cursor.execute("CREATE INDEX IF NOT EXISTS idx_organizations_api_key ON organizations(api_key)")
@@ -3440,15 +3593,53 @@ class Database:
                     await cursor.execute("CREATE INDEX IF NOT EXISTS idx_findings_org_id ON security_findings(organization_id)")
 
                 await conn.commit()
+                await self.ensure_log_search()
                 logger.info("Database schema updated successfully")
         except Exception as e:
             logger.error(f"Error updating database schema: {str(e)}")
             raise
 
+    async def ensure_log_search(self) -> bool:
+        """
+        Create the ``logs_fts`` full-text index and its sync triggers.
+
+        The index is back-filled from ``logs`` the first time it is created.
+        Returns False (and search falls back to ``LIKE``) when this SQLite
+        build lacks FTS5.
+        """
+        try:
+            async with self.write_connection() as conn:
+                cursor = await conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'"
+                )
+                exists = await cursor.fetchone() is not None
+                await cursor.close()
+                await conn.executescript(LOG_FTS_SCHEMA)
+                if not exists:
+                    await conn.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+                    logger.info("Built full-text index for logs")
+                await conn.commit()
+            self._fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text log search unavailable, using LIKE: {str(e)}")
+            self._fts_enabled = False
+        return self._fts_enabled
+
+    async def _log_search_enabled(self) -> bool:
+        enabled = getattr(self, "_fts_enabled", None)
+        if enabled is None:
+            async with self.read_connection() as conn:
+                cursor = await conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'"
+                )
+                enabled = self._fts_enabled = await cursor.fetchone() is not None
+                await cursor.close()
+        return enabled
+
     async def insert_sample_data(self):
         """Insert sample data for development and testing."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.cursor()
 
                 # Sample logs
@@ -3537,7 +3728,7 @@ class Database:
     async def create_ml_model(self, name: str, model_type: str, org_id: str = None) -> str:
         """Create a new ML model for anomaly detection."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 model_id = str(uuid.uuid4())
                 version = "1.0.0"
                 file_path = f"models/{model_id}_{model_type}.pkl"
@@ -3562,7 +3753,7 @@ class Database:
     async def start_ml_training_session(self, model_id: str, data_size: int, org_id: str = None) -> str:
         """Start a new ML training session."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 session_id = str(uuid.uuid4())
                 
                 await conn.execute("""
@@ -3584,7 +3775,7 @@ class Database:
     async def complete_ml_training_session(self, session_id: str, accuracy: float, training_time: float) -> bool:
         """Complete an ML training session with results."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE ml_training_sessions 
                     SET accuracy = ?, training_time = ?, status = 'completed',
@@ -3602,7 +3793,7 @@ class Database:
     async def get_ml_models(self, org_id: str = None) -> List[Dict]:
         """Get ML models for organization."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 if org_id:
                     cursor = await conn.execute("""
                         SELECT id, name, type, version, file_path, accuracy, status,
@@ -3641,59 +3832,30 @@ class Database:
         """Track usage for billing purposes."""
         try:
             current_month = datetime.now().strftime('%Y-%m')
-            
-            async with aiosqlite.connect(self.db_path) as conn:
-                # Get or create billing record for this month
-                cursor = await conn.execute("""
-                    SELECT device_count, scan_count, log_count, api_requests
-                    FROM billing_usage
-                    WHERE organization_id = ? AND month = ?
-                """, (org_id, current_month))
-                
-                row = await cursor.fetchone()
-                if row:
-                    # Update existing record
-                    current_device_count, current_scan_count, current_log_count, current_api_requests = row
-                    
-                    if usage_type == 'device':
-                        current_device_count = max(current_device_count, count)  # Track max devices
-                    elif usage_type == 'scan':
-                        current_scan_count += count
-                    elif usage_type == 'log':
-                        current_log_count += count
-                    elif usage_type == 'api':
-                        current_api_requests += count
-                    
-                    await conn.execute("""
-                        UPDATE billing_usage 
-                        SET device_count = ?, scan_count = ?, log_count = ?, 
-                            api_requests = ?, updated_at = ?
-                        WHERE organization_id = ? AND month = ?
-                    """, (
-                        current_device_count, current_scan_count, current_log_count,
-                        current_api_requests, datetime.now().isoformat(),
-                        org_id, current_month
-                    ))
-                else:
-                    # Create new record
-                    device_count = count if usage_type == 'device' else 0
-                    scan_count = count if usage_type == 'scan' else 0
-                    log_count = count if usage_type == 'log' else 0
-                    api_requests = count if usage_type == 'api' else 0
-                    
-                    await conn.execute("""
-                        INSERT INTO billing_usage (
-                            organization_id, month, device_count, scan_count,
-                            log_count, api_requests, created_at, updated_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        org_id, current_month, device_count, scan_count,
-                        log_count, api_requests, datetime.now().isoformat(),
-                        datetime.now().isoformat()
-                    ))
-                
-                await conn.commit()
-                return True
+            now = datetime.now().isoformat()
+            device_count = count if usage_type == 'device' else 0
+            scan_count = count if usage_type == 'scan' else 0
+            log_count = count if usage_type == 'log' else 0
+            api_requests = count if usage_type == 'api' else 0
+
+            # Single upsert (no read-modify-write) so concurrent calls coalesce
+            # into one executemany batch on the write queue
+            await self.write_queue.write("""
+                INSERT INTO billing_usage (
+                    organization_id, month, device_count, scan_count,
+                    log_count, api_requests, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(organization_id, month) DO UPDATE SET
+                    device_count = MAX(device_count, excluded.device_count),
+                    scan_count = scan_count + excluded.scan_count,
+                    log_count = log_count + excluded.log_count,
+                    api_requests = api_requests + excluded.api_requests,
+                    updated_at = excluded.updated_at
+            """, (
+                org_id, current_month, device_count, scan_count,
+                log_count, api_requests, now, now
+            ))
+            return True
         except Exception as e:
             logger.error(f"Error tracking billing usage: {str(e)}")
             return False
@@ -3701,7 +3863,7 @@ class Database:
     async def get_billing_usage(self, org_id: str, months: int = 12) -> List[Dict]:
         """Get billing usage history for organization."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT month, device_count, scan_count, log_count, api_requests
                     FROM billing_usage
@@ -3725,7 +3887,7 @@ class Database:
     async def update_organization_plan(self, org_id: str, plan_type: str, device_limit: int = None) -> bool:
         """Update organization subscription plan."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 if device_limit is not None:
                     await conn.execute("""
                         UPDATE organizations 
@@ -3749,7 +3911,7 @@ class Database:
     async def check_organization_limits(self, org_id: str) -> Dict:
         """Check if organization is within subscription limits."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 # Get organization info
                 cursor = await conn.execute("""
                     SELECT plan_type, device_limit, status
@@ -3797,7 +3959,7 @@ class Database:
                                 severity: str = "info", org_id: str = None, user_id: int = None) -> int:
         """Create a new notification with organization scoping."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     INSERT INTO notifications (
                         title, message, category, severity, organization_id,
@@ -3821,7 +3983,7 @@ class Database:
                               unread_only: bool = False, limit: int = 50) -> List[Dict]:
         """Get notifications with organization/user scoping."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 query = """
                     SELECT id, title, message, category, severity, read,
                            created_at, metadata
@@ -3864,7 +4026,7 @@ class Database:
     async def mark_notification_read(self, notification_id: int, org_id: str = None) -> bool:
         """Mark notification as read with organization scoping."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 if org_id:
                     cursor = await conn.execute("""
                         UPDATE notifications SET read = 1
@@ -3886,7 +4048,7 @@ class Database:
     async def ensure_default_organization(self) -> str:
         """Ensure a default organization exists for backward compatibility."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id FROM organizations WHERE owner_email = 'admin@securenet.local'
                 """)
@@ -3924,7 +4086,7 @@ class Database:
     async def get_network_devices_scoped(self, org_id: str) -> List[Dict]:
         """Get network devices scoped to organization."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, name, type, ip_address, mac_address, status,
                            last_seen, metadata, created_at, updated_at
@@ -3953,7 +4115,7 @@ class Database:
     async def get_security_scans_scoped(self, org_id: str, limit: int = 50) -> List[Dict]:
         """Get security scans scoped to organization."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, timestamp, type, status, target, progress,
                            findings_count, start_time, end_time, created_at
@@ -3984,7 +4146,7 @@ class Database:
         """Get anomalies scoped to organization."""
         try:
             offset = (page - 1) * page_size
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, timestamp, type, severity, status, source,
                            description, evidence, resolution, created_at
@@ -4016,7 +4178,7 @@ class Database:
     async def update_user_login(self, user_id: int) -> bool:
         """Update user login timestamp and count."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE users 
                     SET last_login = ?, login_count = login_count + 1, updated_at = ?
@@ -4033,7 +4195,7 @@ class Database:
     async def update_user_logout(self, user_id: int) -> bool:
         """Update user logout timestamp."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE users 
                     SET last_logout = ?, updated_at = ?
@@ -4050,7 +4212,7 @@ class Database:
     async def get_user_with_session_info(self, user_id: int) -> Optional[Dict]:
         """Get user with session and role information."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, username, email, role, is_active, 
                            last_login, last_logout, login_count, created_at
@@ -4082,7 +4244,7 @@ class Database:
             if new_role not in [role.value for role in UserRole]:
                 raise ValueError(f"Invalid role: {new_role}")
                 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE users 
                     SET role = ?, updated_at = ?
@@ -4104,7 +4266,7 @@ class Database:
             if requesting_user_role not in allowed_roles:
                 raise PermissionError("Only platform_owner or platform_founder can view all users")
                 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT u.id, u.username, u.email, u.role, u.is_active,
                            u.last_login, u.last_logout, u.login_count, u.created_at,
@@ -4144,7 +4306,7 @@ class Database:
             if requesting_user_role not in [UserRole.PLATFORM_OWNER.value, UserRole.SECURITY_ADMIN.value]:
                 raise PermissionError("Insufficient permissions to view organization users")
                 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT u.id, u.username, u.email, u.role, u.is_active,
                            u.last_login, u.last_logout, u.login_count, ou.role as org_role
@@ -4178,7 +4340,7 @@ class Database:
     async def create_platform_owner_user(self, username: str, email: str, password_hash: str) -> int:
         """Create a platform_owner user (for initial setup)."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     INSERT INTO users (username, email, password_hash, role, is_active, created_at, updated_at)
                     VALUES (?, ?, ?, ?, 1, ?, ?)
@@ -4204,7 +4366,7 @@ class Database:
             if requesting_user_role not in allowed_roles:
                 raise PermissionError("Only platform_owner or platform_founder can view audit logs")
                 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT l.id, l.timestamp, l.level, l.category, l.source, l.message, 
                            l.metadata, o.name as organization_name
@@ -4243,7 +4405,7 @@ class Database:
             if requesting_user_role not in allowed_roles:
                 raise PermissionError("Only platform_owner or platform_founder can view all organizations")
                 
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT o.id, o.name, o.owner_email, o.plan_type, o.status,
                            o.device_limit, o.created_at, o.updated_at,
@@ -4312,7 +4474,7 @@ class Database:
     async def seed_default_users(self) -> bool:
         """Seed the 3 default development users with proper roles and organization setup."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.cursor()
                 
                 # Check if users already exist
@@ -4411,7 +4573,7 @@ class Database:
     async def _create_sample_org_data(self, org_id: str) -> None:
         """Create sample data for the default organization."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.cursor()
                 
                 # Create sample logs
@@ -4489,7 +4651,7 @@ class Database:
     async def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email address."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, username, email, role, is_active, created_at
                     FROM users 
@@ -4519,7 +4681,7 @@ class Database:
             pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
             password_hash = pwd_context.hash(password)
             
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Create user
                 cursor = await conn.execute("""
                     INSERT INTO users (username, email, password_hash, role, is_active, created_at, updated_at)
@@ -4555,7 +4717,7 @@ class Database:
     async def delete_user_admin(self, user_id: int) -> bool:
         """Delete a user (admin operation)."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 # Remove from organization relationships
                 await conn.execute("DELETE FROM org_users WHERE user_id = ?", (user_id,))
                 
@@ -4596,7 +4758,7 @@ class Database:
             values.append(datetime.now().isoformat())
             values.append(user_id)
             
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = ?"
                 await conn.execute(query, values)
                 await conn.commit()
@@ -4610,20 +4772,19 @@ class Database:
     async def store_log(self, log_data: Dict) -> bool:
         """Store a log entry in the database."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
-                await conn.execute("""
-                    INSERT INTO logs (timestamp, level, category, source, message, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    log_data.get('timestamp', datetime.now().isoformat()),
-                    log_data.get('level', 'info'),
-                    log_data.get('category', 'system'),
-                    log_data.get('source', 'unknown'),
-                    log_data.get('message', ''),
-                    json.dumps(log_data.get('metadata', {}))
-                ))
-                await conn.commit()
-                return True
+            # Group-committed with other queued writes; resolves once durable
+            await self.write_queue.write("""
+                INSERT INTO logs (timestamp, level, category, source, message, metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                log_data.get('timestamp', datetime.now().isoformat()),
+                log_data.get('level', 'info'),
+                log_data.get('category', 'system'),
+                log_data.get('source', 'unknown'),
+                log_data.get('message', ''),
+                json.dumps(log_data.get('metadata', {}))
+            ))
+            return True
         except Exception as e:
             logger.error(f"Error storing log: {str(e)}")
             return False
@@ -4652,7 +4813,7 @@ class Database:
             
             query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = ?"
             
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute(query, values)
                 await conn.commit()
                 return True
@@ -4665,7 +4826,7 @@ class Database:
         try:
             password_hash = get_password_hash(new_password)
             
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE users 
                     SET password_hash = ?, updated_at = ?
@@ -4680,7 +4841,7 @@ class Database:
     async def update_user_2fa_status(self, user_id: int, enabled: bool) -> bool:
         """Update user's 2FA status."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     UPDATE users 
                     SET two_factor_enabled = ?, updated_at = ?
@@ -4695,7 +4856,7 @@ class Database:
     async def get_user_api_keys(self, user_id: int) -> List[Dict]:
         """Get user's API keys."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, name, key, created_at, last_used
                     FROM user_api_keys
@@ -4720,7 +4881,7 @@ class Database:
     async def create_user_api_key(self, user_id: int, name: str, key: str) -> Optional[int]:
         """Create a new API key for user."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     INSERT INTO user_api_keys (user_id, name, key, created_at, is_active)
                     VALUES (?, ?, ?, ?, 1)
@@ -4735,7 +4896,7 @@ class Database:
     async def delete_user_api_key(self, user_id: int, key_id: str) -> bool:
         """Delete user's API key."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     UPDATE user_api_keys 
                     SET is_active = 0, updated_at = ?
@@ -4751,7 +4912,7 @@ class Database:
     async def get_user_sessions(self, user_id: int) -> List[Dict]:
         """Get user's active sessions."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, device, browser, location, ip_address, last_active, is_current
                     FROM user_sessions
@@ -4778,7 +4939,7 @@ class Database:
     async def terminate_user_session(self, user_id: int, session_id: str) -> bool:
         """Terminate a user session."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 cursor = await conn.execute("""
                     UPDATE user_sessions 
                     SET is_active = 0, updated_at = ?
@@ -4794,7 +4955,7 @@ class Database:
     async def log_user_activity(self, user_id: int, action: str, ip_address: str, user_agent: str) -> bool:
         """Log user activity."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.write_connection() as conn:
                 await conn.execute("""
                     INSERT INTO user_activity_log (user_id, action, ip_address, user_agent, timestamp)
                     VALUES (?, ?, ?, ?, ?)
@@ -4809,7 +4970,7 @@ class Database:
     async def get_user_activity_log(self, user_id: int, limit: int = 50) -> List[Dict]:
         """Get user's activity log."""
         try:
-            async with aiosqlite.connect(self.db_path) as conn:
+            async with self.read_connection() as conn:
                 cursor = await conn.execute("""
                     SELECT id, action, ip_address, user_agent, timestamp
                     FROM user_activity_log
@@ -14,9 +14,11 @@ from contextlib import asynccontextmanager
 import asyncpg
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select, update, delete, func, and_, or_
+from sqlalchemy import select, update, delete, func, and_, or_, tuple_
 from sqlalchemy.exc import IntegrityError, NoResultFound
 
+from database.fulltext import build_tsquery
+from database.pagination import decode_cursor
 from database.models import (
     Base, Organization, User, UserAPIKey, NetworkDevice, SecurityScan, 
     SecurityFinding, ThreatDetection, AuditLog, SystemLog, Notification, 
@@ -399,9 +401,38 @@ class PostgreSQLDatabase:
             
             return finding_id
     
+    @staticmethod
+    def _keyset_condition(timestamp_column, id_column, cursor: str = None):
+        """``(timestamp, id) < cursor`` condition (or None); ``ValueError`` if malformed"""
+        if not cursor:
+            return None
+        timestamp, row_id = decode_cursor(cursor)
+        try:
+            key = (datetime.fromisoformat(timestamp), uuid.UUID(str(row_id)))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid pagination cursor: {cursor!r}") from e
+        return tuple_(timestamp_column, id_column) < key
+
+    @staticmethod
+    def _finding_conditions(filters: dict = None) -> List:
+        filters = filters or {}
+        conditions = []
+        if filters.get('scan_id'):
+            conditions.append(SecurityFinding.scan_id == filters['scan_id'])
+        if filters.get('severity'):
+            conditions.append(SecurityFinding.severity == ThreatSeverity(filters['severity']))
+        if filters.get('status'):
+            conditions.append(SecurityFinding.status == filters['status'])
+        return conditions
+
     async def get_security_findings(self, scan_id: str = None, org_id: str = None, 
-                                  limit: int = 100) -> List[Dict]:
-        """Get security findings"""
+                                  limit: int = 100, page_size: int = None,
+                                  filters: dict = None, cursor: str = None) -> List[Dict]:
+        """Get security findings newest first, keyset-paged by ``cursor``"""
+        keyset = self._keyset_condition(SecurityFinding.created_at, SecurityFinding.id, cursor)
+        conditions = self._finding_conditions(filters)
+        if keyset is not None:
+            conditions.append(keyset)
         async with self.get_session() as session:
             query = select(SecurityFinding).options(
                 selectinload(SecurityFinding.scan),
@@ -412,8 +443,11 @@ class PostgreSQLDatabase:
                 query = query.where(SecurityFinding.scan_id == scan_id)
             elif org_id:
                 query = query.join(SecurityScan).where(SecurityScan.organization_id == org_id)
+            if conditions:
+                query = query.where(and_(*conditions))
             
-            query = query.order_by(SecurityFinding.created_at.desc()).limit(limit)
+            query = query.order_by(SecurityFinding.created_at.desc(), SecurityFinding.id.desc())
+            query = query.limit(page_size or limit)
             
             result = await session.execute(query)
             findings = result.scalars().all()
@@ -437,10 +471,21 @@ class PostgreSQLDatabase:
                     'false_positive': finding.false_positive,
                     'evidence': finding.evidence,
                     'additional_data': finding.additional_data,
-                    'created_at': finding.created_at.isoformat()
+                    'created_at': finding.created_at.isoformat(),
+                    'timestamp': finding.created_at.isoformat()  # keyset cursor field
                 }
                 for finding in findings
             ]
+
+    async def get_security_findings_count(self, filters: dict = None) -> int:
+        """Get total count of security findings"""
+        async with self.get_session() as session:
+            query = select(func.count(SecurityFinding.id))
+            conditions = self._finding_conditions(filters)
+            if conditions:
+                query = query.where(and_(*conditions))
+            result = await session.scalar(query)
+            return result or 0
     
     # ===== THREAT DETECTION =====
     
@@ -586,11 +631,32 @@ class PostgreSQLDatabase:
             
             return log_id
     
+    @staticmethod
+    def _log_search_query(search: str = None):
+        """``to_tsquery`` expression for a user search string (see database/fulltext.py)"""
+        tsquery = build_tsquery(search) if search else None
+        return func.to_tsquery('english', tsquery) if tsquery else None
+
     async def get_system_logs(self, org_id: str = None, level: str = None,
-                             category: str = None, limit: int = 1000) -> List[Dict]:
-        """Get system logs"""
+                             category: str = None, limit: int = 1000, offset: int = 0,
+                             search: str = None, sort: str = None, cursor: str = None) -> List[Dict]:
+        """
+        Get system logs; ``search`` uses the GIN-indexed tsvector.
+
+        ``cursor`` (from ``next_cursor``) pages by ``(timestamp, id)`` instead
+        of ``offset``; relevance-sorted searches ignore it.
+        """
+        ts_query = self._log_search_query(search)
+        relevance = ts_query is not None and sort == 'relevance'
+        keyset = None if relevance else self._keyset_condition(SystemLog.timestamp, SystemLog.id, cursor)
         async with self.get_session() as session:
-            query = select(SystemLog)
+            columns = [SystemLog]
+            if ts_query is not None:
+                columns.append(func.ts_headline(
+                    'english', SystemLog.message, ts_query,
+                    'StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=24'
+                ).label('snippet'))
+            query = select(*columns)
             
             conditions = []
             if org_id:
@@ -599,17 +665,29 @@ class PostgreSQLDatabase:
                 conditions.append(SystemLog.level == level)
             if category:
                 conditions.append(SystemLog.category == category)
+            if ts_query is not None:
+                conditions.append(SystemLog.search_vector.op('@@')(ts_query))
+            if keyset is not None:
+                conditions.append(keyset)
             
             if conditions:
                 query = query.where(and_(*conditions))
             
-            query = query.order_by(SystemLog.timestamp.desc()).limit(limit)
+            if relevance:
+                query = query.order_by(func.ts_rank_cd(SystemLog.search_vector, ts_query).desc(),
+                                       SystemLog.timestamp.desc())
+            else:
+                query = query.order_by(SystemLog.timestamp.desc(), SystemLog.id.desc())
+            query = query.limit(limit)
+            if keyset is None:
+                query = query.offset(offset)
             
             result = await session.execute(query)
-            logs = result.scalars().all()
             
-            return [
-                {
+            logs = []
+            for row in result.all():
+                log = row[0]
+                entry = {
                     'id': str(log.id),
                     'organization_id': str(log.organization_id) if log.organization_id else None,
                     'level': log.level,
@@ -620,8 +698,10 @@ class PostgreSQLDatabase:
                     'stack_trace': log.stack_trace,
                     'timestamp': log.timestamp.isoformat()
                 }
-                for log in logs
-            ]
+                if ts_query is not None:
+                    entry['snippet'] = row[1]
+                logs.append(entry)
+            return logs
     
     # ===== NOTIFICATIONS =====
     
@@ -822,30 +902,24 @@ class PostgreSQLDatabase:
                 }
             ]
     
-    async def get_logs(self, page: int = 1, page_size: int = 20, filters: dict = None) -> List[Dict]:
-        """Get paginated system logs"""
+    async def get_logs(self, page: int = 1, page_size: int = 20, filters: dict = None,
+                       cursor: str = None) -> List[Dict]:
+        """Get paginated system logs (keyset-paged when ``cursor`` is given)"""
         offset = (page - 1) * page_size
         
         # Extract filters
-        org_id = None
-        level = None
-        category = None
-        if filters:
-            org_id = filters.get('org_id')
-            level = filters.get('level')
-            category = filters.get('category')
+        filters = filters or {}
         
-        logs = await self.get_system_logs(
-            org_id=org_id,
-            level=level,
-            category=category,
-            limit=page_size
+        return await self.get_system_logs(
+            org_id=filters.get('org_id'),
+            level=filters.get('level'),
+            category=filters.get('category'),
+            limit=page_size,
+            offset=offset,
+            search=filters.get('search'),
+            sort=filters.get('sort'),
+            cursor=cursor
         )
-        
-        # Apply pagination (simple implementation)
-        start_idx = offset
-        end_idx = start_idx + page_size
-        return logs[start_idx:end_idx]
     
     async def get_security_metrics(self) -> Dict:
         """Get security metrics summary"""
@@ -885,7 +959,8 @@ class PostgreSQLDatabase:
                 'security_score': max(0, 100 - (high_severity * 10 + medium_severity * 5 + low_severity * 1))
             }
     
-    async def get_anomalies(self, page: int = 1, page_size: int = 20, filters: dict = None) -> List[Dict]:
+    async def get_anomalies(self, page: int = 1, page_size: int = 20, filters: dict = None,
+                            cursor: str = None) -> List[Dict]:
         """Get anomalies (placeholder implementation)"""
         # This is a placeholder - in a real implementation, you'd have an anomalies table
         # For now, return empty list or mock data
@@ -945,6 +1020,9 @@ class PostgreSQLDatabase:
                     conditions.append(SystemLog.level == filters['level'])
                 if filters.get('category'):
                     conditions.append(SystemLog.category == filters['category'])
+                ts_query = self._log_search_query(filters.get('search'))
+                if ts_query is not None:
+                    conditions.append(SystemLog.search_vector.op('@@')(ts_query))
             
             if conditions:
                 query = query.where(and_(*conditions))
@@ -6,7 +6,7 @@ PostgreSQL-optimized models with SOC 2 compliance, audit trails, and enterprise
 from sqlalchemy import (
     Column, Integer, String, Text, DateTime, Boolean, Float, JSON, UUID,
     ForeignKey, Index, CheckConstraint, UniqueConstraint, text,
-    TIMESTAMP, Enum as SQLEnum
+    TIMESTAMP, Computed, Enum as SQLEnum
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, validates
@@ -267,8 +267,16 @@ class SecurityFinding(Base, AuditMixin):
     remediation_steps = Column(Text, nullable=True)
     references = Column(JSONB, default=list)
     
-    # Full-text search
-    search_vector = Column(TSVECTOR)
+    # Full-text search (generated, so it can never go stale)
+    search_vector = Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(cve_id, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True
+        )
+    )
     
     # Relationships
     device = relationship("NetworkDevice", back_populates="vulnerabilities")
@@ -424,28 +432,6 @@ class SecurityScan(Base, AuditMixin):
         CheckConstraint('retry_count >= 0', name='non_negative_retries'),
     )
 
-# Full-text search functions
-def update_search_vector():
-    """SQL function to update search vectors"""
-    return text("""
-        CREATE OR REPLACE FUNCTION update_security_finding_search_vector()
-        RETURNS TRIGGER AS $$
-        BEGIN
-            NEW.search_vector := to_tsvector('english', 
-                COALESCE(NEW.title, '') || ' ' || 
-                COALESCE(NEW.description, '') || ' ' ||
-                COALESCE(NEW.cve_id, '')
-            );
-            RETURN NEW;
-        END;
-        $$ LANGUAGE plpgsql;
-        
-        DROP TRIGGER IF EXISTS security_finding_search_vector_trigger ON security_findings;
-        CREATE TRIGGER security_finding_search_vector_trigger
-            BEFORE INSERT OR UPDATE ON security_findings
-            FOR EACH ROW EXECUTE PROCEDURE update_security_finding_search_vector();
-    """)
-
 # Database initialization
 def create_indexes_and_constraints():
     """Additional indexes and constraints for performance"""
@@ -0,0 +1,112 @@
+"""
+SecureNet Full-Text Search
+
+Log and finding search without leading-wildcard ``LIKE`` scans:
+- SQLite: an external-content FTS5 table (``logs_fts``) over ``logs.message``
+  and ``logs.source``, kept in sync by insert/update/delete triggers
+- PostgreSQL: a generated ``tsvector`` column with a GIN index (see the
+  ``search_vector`` columns in ``database.models``/``enterprise_models``)
+
+Both backends accept the same user query syntax:
+- ``"connection refused"``  exact phrase
+- ``auth*``                 prefix match
+- ``ssh failed``            all terms must match (AND)
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 12
+
+# Quoted phrases, or single bare terms (optionally ending in * for prefix)
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+LOG_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+    message, source,
+    content='logs', content_rowid='rowid',
+    tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+    INSERT INTO logs_fts(rowid, message, source) VALUES (new.rowid, new.message, new.source);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+    INSERT INTO logs_fts(logs_fts, rowid, message, source) VALUES ('delete', old.rowid, old.message, old.source);
+END;
+CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF message, source ON logs BEGIN
+    INSERT INTO logs_fts(logs_fts, rowid, message, source) VALUES ('delete', old.rowid, old.message, old.source);
+    INSERT INTO logs_fts(rowid, message, source) VALUES (new.rowid, new.message, new.source);
+END;
+"""
+
+# Match subquery for ``logs.rowid IN (...)`` filters (counts)
+LOG_FTS_MATCH = "logs.rowid IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)"
+
+# Page queries are driven by the FTS index and joined back to logs, so
+# newest-first pages stream matches in rowid (ingestion) order and stop at
+# LIMIT instead of materialising every match and sorting by timestamp.
+LOG_FTS_SELECT = (
+    "SELECT logs.*, logs.rowid AS fts_rowid FROM logs_fts "
+    "JOIN logs ON logs.rowid = logs_fts.rowid WHERE logs_fts MATCH ?"
+)
+LOG_FTS_RECENT_ORDER = "ORDER BY logs_fts.rowid DESC"
+# Relevance order (bm25 is lower-is-better), newest first on ties
+LOG_FTS_RELEVANCE_ORDER = "ORDER BY bm25(logs_fts), logs_fts.rowid DESC"
+# Keyset condition for recent-first search pages; the param is the cursor row's id
+LOG_FTS_AFTER = "logs_fts.rowid < (SELECT rowid FROM logs WHERE id = ?)"
+
+# Highlighted message excerpt for a page of matching rowids; append "(?, ?, ...)"
+LOG_FTS_SNIPPETS = (
+    f"SELECT rowid, snippet(logs_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', "
+    f"'{SNIPPET_ELLIPSIS}', {SNIPPET_TOKENS}) FROM logs_fts WHERE logs_fts MATCH ? AND rowid IN "
+)
+
+def parse_query(text: str) -> List[Tuple[str, List[str], bool]]:
+    """
+    Split user search text into ``(kind, words, prefix)`` parts.
+
+    ``kind`` is ``"phrase"`` or ``"term"``; punctuation is dropped, so the
+    result is safe to render into either backend's query language.
+    """
+    parts = []
+    for phrase, term in _QUERY_PART.findall(text or ""):
+        if phrase:
+            words = _WORD.findall(phrase)
+            if words:
+                parts.append(("phrase", words, False))
+            continue
+        prefix = term.endswith("*")
+        words = _WORD.findall(term)
+        if not words:
+            continue
+        if len(words) > 1:
+            # "10.0.0.5" or "user@host" tokenize into several words; keep them adjacent
+            parts.append(("phrase", words, prefix))
+        else:
+            parts.append(("term", words, prefix))
+    return parts
+
+
+def build_fts5_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression for ``text``, or None if nothing searchable remains."""
+    rendered = []
+    for kind, words, prefix in parse_query(text):
+        quoted = '"' + " ".join(words) + '"'
+        rendered.append(quoted + ("*" if prefix else ""))
+    return " AND ".join(rendered) or None
+
+
+def build_tsquery(text: str) -> Optional[str]:
+    """PostgreSQL ``to_tsquery`` input for ``text``, or None if nothing searchable remains."""
+    rendered = []
+    for kind, words, prefix in parse_query(text):
+        lexemes = [w.lower() for w in words]
+        if prefix:
+            lexemes[-1] += ":*"
+        rendered.append(" <-> ".join(lexemes) if len(lexemes) > 1 else lexemes[0])
+    return " & ".join(rendered) or None
+
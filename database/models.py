@@ -8,10 +8,10 @@ from enum import Enum
 from typing import Optional
 
 from sqlalchemy import (
-    Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, 
+    Boolean, Column, Computed, DateTime, Float, ForeignKey, Integer, String, Text, 
     JSON, Enum as SQLEnum, Index, UniqueConstraint
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -364,12 +364,19 @@ class SystemLog(Base):
     # Timestamp
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Full-text search (maintained by PostgreSQL, see database/fulltext.py)
+    search_vector = Column(
+        TSVECTOR,
+        Computed("to_tsvector('english', coalesce(message, '') || ' ' || coalesce(source, ''))", persisted=True)
+    )
+    
     __table_args__ = (
         Index('idx_log_org_id', 'organization_id'),
         Index('idx_log_level', 'level'),
         Index('idx_log_category', 'category'),
         Index('idx_log_timestamp', 'timestamp'),
         Index('idx_log_source', 'source'),
+        Index('idx_log_search', 'search_vector', postgresql_using='gin'),
     )
 
 class Notification(Base):
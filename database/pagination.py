@@ -0,0 +1,89 @@
+"""
+SecureNet Keyset Pagination Helpers
+
+Cursor-based paging for timestamp-ordered tables (logs, anomalies, findings):
+- opaque cursors encode the ``(timestamp, id)`` of the last row on a page
+- the next page is ``WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC,
+  id DESC LIMIT ?``, which walks a ``(..., timestamp, id)`` index instead of
+  scanning and discarding ``OFFSET`` rows
+- ``CountCache`` serves list totals from a short-lived cache, and estimates
+  unfiltered totals from the rowid range, so paging never pays a full
+  ``COUNT(*)`` per request
+"""
+
+import base64
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+KEYSET_ORDER = "ORDER BY timestamp DESC, id DESC"
+
+
+def encode_cursor(timestamp: Any, row_id: Any) -> str:
+    payload = json.dumps([timestamp, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """Decode a cursor from ``encode_cursor``; raises ``ValueError`` if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}") from e
+    return timestamp, row_id
+
+
+def keyset_condition(cursor: Optional[str]) -> Tuple[Optional[str], List[Any]]:
+    """SQL condition (or None) and params selecting rows after ``cursor``."""
+    if not cursor:
+        return None, []
+    timestamp, row_id = decode_cursor(cursor)
+    return "(timestamp, id) < (?, ?)", [timestamp, row_id]
+
+
+def next_cursor(rows: List[Dict], page_size: int) -> Optional[str]:
+    """Cursor for the page after ``rows``, or None when this was the last page."""
+    if len(rows) < page_size or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.get("timestamp"), last.get("id"))
+
+
+class CountCache:
+    """
+    TTL cache for list totals.
+
+    Totals shown next to a paged list only need to be roughly right; caching
+    them per ``(table, filters)`` for ``ttl`` seconds keeps repeated page
+    loads from re-counting millions of rows.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple, Tuple[float, int]] = {}
+
+    @staticmethod
+    def key(table: str, filters: Optional[Dict]) -> Tuple:
+        items = sorted((k, str(v)) for k, v in (filters or {}).items() if v not in (None, ""))
+        return (table, tuple(items))
+
+    def get(self, key: Tuple) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def set(self, key: Tuple, count: int):
+        if len(self._entries) >= self.max_entries:
+            # Drop the oldest entry; totals are cheap to recompute
+            self._entries.pop(min(self._entries, key=lambda k: self._entries[k][0]))
+        self._entries[key] = (time.monotonic(), count)
+
+    def invalidate(self, table: Optional[str] = None):
+        if table is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
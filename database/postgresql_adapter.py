@@ -26,6 +26,7 @@ from database.enterprise_models import (
     AuditLog, ComplianceControl, SecurityScan,
     UserRole, OrganizationStatus, PlanType, ThreatLevel
 )
+from database.fulltext import build_tsquery
 
 logger = logging.getLogger(__name__)
 
@@ -494,17 +495,29 @@ class PostgreSQLAdapter:
             return {'id': str(finding_id), **finding_data}
     
     async def search_security_findings(self, org_id: str, query: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Search security findings using full-text search"""
+        """Search security findings using full-text search, best matches first"""
+        tsquery = build_tsquery(query)
+        if tsquery is None:
+            return []
         async with self.get_async_connection() as conn:
+            # Rank and headline only the LIMIT rows picked via the GIN index
             rows = await conn.fetch("""
-                SELECT sf.*, nd.name as device_name, nd.ip_address
-                FROM security_findings sf
+                SELECT sf.*, nd.name as device_name, nd.ip_address,
+                       ts_headline('english', coalesce(sf.description, sf.title), q.query,
+                                   'StartSel=<mark>, StopSel=</mark>, MaxFragments=1, MaxWords=24') AS snippet
+                FROM (
+                    SELECT f.id, ts_rank_cd(f.search_vector, q.query) AS rank
+                    FROM security_findings f, to_tsquery('english', $2) AS q(query)
+                    WHERE f.organization_id = $1
+                    AND f.search_vector @@ q.query
+                    ORDER BY rank DESC, f.discovered_at DESC
+                    LIMIT $3
+                ) ranked
+                JOIN security_findings sf ON sf.id = ranked.id
                 LEFT JOIN network_devices nd ON sf.device_id = nd.id
-                WHERE sf.organization_id = $1 
-                AND sf.search_vector @@ to_tsquery('english', $2)
-                ORDER BY sf.discovered_at DESC
-                LIMIT $3
-            """, uuid.UUID(org_id), query, limit)
+                CROSS JOIN to_tsquery('english', $2) AS q(query)
+                ORDER BY ranked.rank DESC, sf.discovered_at DESC
+            """, uuid.UUID(org_id), tsquery, limit)
             
             return [dict(row) for row in rows]
     
@@ -0,0 +1,189 @@
+"""
+SecureNet SQLite Write-Behind Queue
+
+One writer task owns every queued insert/upsert for a database file:
+- callers enqueue ``(sql, params)`` and get a future that resolves once the
+  row is committed (or fails with the row's own error)
+- consecutive statements with the same SQL text are coalesced into
+  ``executemany`` batches, so statements still run in submission order
+- a batch commits when it reaches ``batch_size`` rows or ``flush_interval``
+  seconds after its first row, whichever comes first
+- ``flush()``/``close()`` drain everything still queued (shutdown hook)
+
+Because only this task writes, concurrent request handlers no longer race
+each other for the SQLite write lock and hit "database is locked".
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from database.connection_pool import SQLiteConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# (sql, rows, future); ``rows`` holds one or more parameter tuples
+_Pending = Tuple[str, List[Sequence[Any]], asyncio.Future]
+
+
+class WriteQueue:
+    """Group-committing single writer on top of a ``SQLiteConnectionPool``."""
+
+    def __init__(self, pool: SQLiteConnectionPool, batch_size: int = 500,
+                 flush_interval: float = 0.05, queue_size: int = 10000):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self.stats: Dict[str, float] = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "last_batch_size": 0,
+            "last_commit_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self._task is None or self._task.done():
+            # First use, or a new event loop (scripts/tests call asyncio.run repeatedly)
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            # Fresh context: the writer must not inherit the caller's pooled connection
+            self._task = loop.create_task(self._writer(), context=contextvars.Context())
+
+    def submit_many(self, sql: str, rows: Sequence[Sequence[Any]]) -> "asyncio.Future":
+        """
+        Queue ``rows`` for ``sql`` and return a future for their commit.
+
+        Awaiting ``put`` is avoided so callers holding other locks never
+        block here; use ``write_many`` for backpressure.
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((sql, list(rows), future))
+        self.stats["submitted"] += len(rows)
+        return future
+
+    def submit(self, sql: str, params: Sequence[Any] = ()) -> "asyncio.Future":
+        return self.submit_many(sql, [params])
+
+    async def write_many(self, sql: str, rows: Sequence[Sequence[Any]]):
+        """Queue rows (waiting while the queue is full) and wait until committed."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((sql, list(rows), future))
+        self.stats["submitted"] += len(rows)
+        await future
+
+    async def write(self, sql: str, params: Sequence[Any] = ()):
+        await self.write_many(sql, [params])
+
+    async def flush(self):
+        """Wait until everything queued so far has been committed."""
+        if self._task is None or self._loop is not asyncio.get_running_loop():
+            return
+        await self.write_many("", [])
+
+    async def close(self):
+        """Flush pending writes and stop the writer task."""
+        if self._task is None:
+            return
+        if self._loop is asyncio.get_running_loop() and not self._task.done():
+            await self.flush()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _next_batch(self) -> List[_Pending]:
+        batch = [await self._queue.get()]
+        rows = len(batch[0][1])
+        deadline = self._loop.time() + self.flush_interval
+        while rows < self.batch_size and batch[-1][0]:  # empty SQL is a flush marker
+            try:
+                if self._queue.empty():
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[1])
+        return batch
+
+    async def _writer(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                # Unexpected failure outside statement execution; fail the batch
+                logger.error(f"Write queue batch failed: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit(self, batch: List[_Pending]):
+        # Coalesce runs of the same statement; never reorder across statements
+        groups: List[Tuple[str, List[_Pending]]] = []
+        for item in batch:
+            if not item[0]:
+                continue
+            if groups and groups[-1][0] == item[0]:
+                groups[-1][1].append(item)
+            else:
+                groups.append((item[0], [item]))
+
+        started = time.perf_counter()
+        failed = False
+        async with self.pool.writer() as conn:
+            try:
+                for sql, items in groups:
+                    await conn.executemany(sql, [row for _, rows, _ in items for row in rows])
+                await conn.commit()
+            except Exception as e:
+                await conn.rollback()
+                failed = True
+                logger.warning(f"Write queue batch rolled back, retrying per request: {str(e)}")
+                await self._commit_individually(conn, groups)
+
+        if not failed:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        else:
+            for sql, _, future in batch:
+                if not sql and not future.done():
+                    future.set_result(None)
+
+        written = sum(len(rows) for sql, rows, future in batch
+                      if sql and not future.cancelled() and future.exception() is None)
+        self.stats["written"] += written
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = written
+        self.stats["last_commit_ms"] = (time.perf_counter() - started) * 1000
+
+    async def _commit_individually(self, conn, groups: List[Tuple[str, List[_Pending]]]):
+        """Isolate the request(s) that broke a batch; the rest still commit."""
+        for sql, items in groups:
+            for _, rows, future in items:
+                try:
+                    await conn.executemany(sql, rows)
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    self.stats["write_errors"] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if not future.done():
+                    future.set_result(None)
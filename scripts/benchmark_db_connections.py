@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SecureNet SQLite Connection Benchmark
+
+Compares the per-call overhead of opening a fresh aiosqlite connection for
+every query (the old ``Database`` behaviour) against the pooled reader/writer
+connections in ``database.connection_pool``.
+
+Usage:
+    python scripts/benchmark_db_connections.py
+    python scripts/benchmark_db_connections.py --calls 5000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.connection_pool import SQLiteConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    level TEXT,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_logs_level ON logs(level);
+"""
+
+READ_SQL = "SELECT id, timestamp, message FROM logs WHERE level = ? ORDER BY id DESC LIMIT 20"
+WRITE_SQL = "INSERT INTO logs (timestamp, level, message) VALUES (datetime('now'), ?, ?)"
+
+
+async def seed(db_path: str, rows: int):
+    async with aiosqlite.connect(db_path) as conn:
+        await conn.executescript(SCHEMA)
+        await conn.executemany(
+            "INSERT INTO logs (timestamp, level, message) VALUES (datetime('now'), ?, ?)",
+            ((("info", "warning", "error")[i % 3], f"seed message {i}") for i in range(rows))
+        )
+        await conn.commit()
+
+
+async def per_call_read(db_path: str):
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute(READ_SQL, ("error",))
+        await cursor.fetchall()
+
+
+async def per_call_write(db_path: str):
+    async with aiosqlite.connect(db_path) as conn:
+        await conn.execute(WRITE_SQL, ("info", "benchmark"))
+        await conn.commit()
+
+
+async def pooled_read(pool: SQLiteConnectionPool):
+    async with pool.reader() as conn:
+        cursor = await conn.execute(READ_SQL, ("error",))
+        await cursor.fetchall()
+
+
+async def pooled_write(pool: SQLiteConnectionPool):
+    async with pool.writer() as conn:
+        await conn.execute(WRITE_SQL, ("info", "benchmark"))
+        await conn.commit()
+
+
+async def run_calls(make_call, calls: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await make_call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return time.perf_counter() - started
+
+
+def report(label: str, calls: int, seconds: float):
+    print(f"{label:<22} {calls / seconds:>10,.0f} calls/s  {seconds / calls * 1e6:>8.1f} us/call")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite connection strategies")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows to seed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        await seed(db_path, args.rows)
+        pool = SQLiteConnectionPool(db_path)
+        try:
+            # Warm the pool so connection setup is not counted
+            await run_calls(lambda: pooled_read(pool), pool.readers, pool.readers)
+
+            print(f"{args.calls} calls, concurrency {args.concurrency}")
+            report("read  connect-per-call", args.calls,
+                   await run_calls(lambda: per_call_read(db_path), args.calls, args.concurrency))
+            report("read  pooled", args.calls,
+                   await run_calls(lambda: pooled_read(pool), args.calls, args.concurrency))
+            report("write connect-per-call", args.calls,
+                   await run_calls(lambda: per_call_write(db_path), args.calls, args.concurrency))
+            report("write pooled", args.calls,
+                   await run_calls(lambda: pooled_write(pool), args.calls, args.concurrency))
+            print(f"Pool stats: {pool.stats}")
+        finally:
+            await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+SecureNet Log Search Benchmark
+
+Builds a synthetic log corpus and compares the old ``LIKE '%term%'`` search
+against the FTS5 index from ``database.fulltext`` for rare terms, common
+terms, phrases and prefixes (first page of 20, newest first, plus counts).
+
+Usage:
+    python scripts/benchmark_log_search.py                  # 1M lines
+    python scripts/benchmark_log_search.py --lines 10000000 --db /tmp/logs10m.db
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.connection_pool import apply_pragmas
+from database.fulltext import (LOG_FTS_MATCH, LOG_FTS_RECENT_ORDER, LOG_FTS_SCHEMA, LOG_FTS_SELECT,
+                               build_fts5_query)
+from database.pagination import KEYSET_ORDER
+
+SOURCES = ["sshd", "nginx", "kernel", "cron", "sudo", "postfix", "dockerd", "systemd"]
+TEMPLATES = [
+    "Failed password for {user} from {ip} port {port} ssh2",
+    "Accepted publickey for {user} from {ip} port {port} ssh2",
+    "connection refused by upstream {ip}:{port} while reading response header",
+    "GET /api/v1/{word} HTTP/1.1 200 {port}",
+    "session opened for user {user} by (uid=0)",
+    "Out of memory: Killed process {port} ({word})",
+    "container {word} exited with code {code}",
+    "pam_unix(sudo:auth): authentication failure; user={user}",
+]
+WORDS = ["metrics", "billing", "scanner", "auth", "worker", "reports", "gateway", "ingest"]
+USERS = ["root", "admin", "deploy", "backup", "alice", "bob", "ci", "nagios"]
+
+QUERIES = [
+    ("user name", "nagios"),
+    ("common term", "failed"),
+    ("phrase", '"connection refused"'),
+    ("prefix", "authent*"),
+    ("ip address", "10.1.2.3"),
+    ("no match", "segfault"),
+]
+
+
+def generate(conn, lines: int, batch: int = 50000):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    cursor = conn.cursor()
+    for offset in range(0, lines, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, lines)):
+            template = TEMPLATES[rng.randrange(len(TEMPLATES))]
+            message = template.format(
+                user=USERS[rng.randrange(len(USERS))],
+                ip=f"10.{rng.randrange(4)}.{rng.randrange(8)}.{rng.randrange(16)}",
+                port=rng.randrange(1024, 65535),
+                word=WORDS[rng.randrange(len(WORDS))],
+                code=rng.randrange(3),
+            )
+            rows.append(((start + timedelta(seconds=i)).isoformat(), "info",
+                         SOURCES[rng.randrange(len(SOURCES))], message))
+        cursor.executemany("INSERT INTO logs (timestamp, level, source, message) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def timed(conn, sql, params, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LIKE vs FTS5 log search")
+    parser.add_argument("--lines", type=int, default=1000000, help="Synthetic log lines")
+    parser.add_argument("--db", help="Reuse/create the corpus at this path")
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if db_path is None:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "search.db")
+
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    conn.execute("CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, level TEXT, source TEXT, message TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts_id ON logs(timestamp, id)")
+    existing = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    if existing < args.lines:
+        started = time.perf_counter()
+        generate(conn, args.lines - existing)
+        print(f"Generated {args.lines - existing:,} lines in {time.perf_counter() - started:.1f}s")
+
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'logs_fts'").fetchone()
+    if not has_fts:
+        started = time.perf_counter()
+        conn.executescript(LOG_FTS_SCHEMA)
+        conn.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+        conn.commit()
+        print(f"Built FTS5 index in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'query':<14} {'LIKE page':>10} {'FTS page':>10} {'LIKE count':>11} {'FTS count':>10} {'matches':>10}")
+    for label, text in QUERIES:
+        like_term = "%" + text.strip('"*') + "%"
+        fts_query = build_fts5_query(text)
+
+        like_page, _ = timed(conn, f"SELECT * FROM logs WHERE (message LIKE ? OR source LIKE ?) {KEYSET_ORDER} LIMIT 20",
+                             (like_term, like_term))
+        fts_page, _ = timed(conn, f"{LOG_FTS_SELECT} {LOG_FTS_RECENT_ORDER} LIMIT 20", (fts_query,))
+        like_count, _ = timed(conn, "SELECT COUNT(*) FROM logs WHERE message LIKE ? OR source LIKE ?",
+                              (like_term, like_term), repeat=1)
+        fts_count, rows = timed(conn, f"SELECT COUNT(*) FROM logs WHERE {LOG_FTS_MATCH}", (fts_query,), repeat=1)
+        print(f"{label:<14} {like_page:>8.1f}ms {fts_page:>8.1f}ms {like_count:>9.1f}ms "
+              f"{fts_count:>8.1f}ms {rows[0][0]:>10,}")
+
+    conn.close()
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+SecureNet Network Scan Benchmark
+
+Scans a loopback listener farm with ``AsyncScanEngine`` and, optionally, with
+the previous scanner's approach (a 20-thread pool of hosts, each probing its
+ports one after another with blocking ``connect_ex``), in hosts/s.
+
+Every 127.0.0.0/8 address answers with RST, so all farm hosts are "alive"
+and cost no waiting; on loopback the threaded scanner is competitive. Real
+subnets are mostly silent addresses, which is where the old scanner spent its
+time, so ``--silent`` adds that many TEST-NET-1 (192.0.2.0/24) addresses that
+normally blackhole and make both scanners wait out their timeouts. Use
+``--targets`` to point the scanners at a real subnet instead.
+
+Usage:
+    python scripts/benchmark_network_scan.py
+    python scripts/benchmark_network_scan.py --hosts 1024 --listeners 3 --baseline
+    python scripts/benchmark_network_scan.py --silent 100 --baseline
+    python scripts/benchmark_network_scan.py --targets 192.168.1.0/24
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import random
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from security.scan_engine import DEFAULT_PORTS, AsyncScanEngine, iter_targets
+
+FARM_NETWORK = "127.0.4.0/22"
+SILENT_NETWORK = "192.0.2.0/24"
+
+
+async def start_farm(hosts: int, listeners: int, seed: int):
+    """Bind ``listeners`` random DEFAULT_PORTS on each of the first ``hosts`` farm addresses."""
+    rng = random.Random(seed)
+    addresses = [str(ip) for ip in ipaddress.ip_network(FARM_NETWORK).hosts()][:hosts]
+    expected, servers = {}, []
+    for ip in addresses:
+        ports = sorted(rng.sample([p for p in DEFAULT_PORTS if p >= 1024 or p in (22, 80, 443)], listeners))
+        for port in ports:
+            try:
+                servers.append(await asyncio.start_server(lambda r, w: w.close(), ip, port))
+            except OSError:
+                # Privileged port or already bound; the port is not part of the farm
+                ports = [p for p in ports if p != port]
+        expected[ip] = ports
+    return addresses, expected, servers
+
+
+def threaded_baseline(addresses, ports, timeout: float = 1.0):
+    """Previous approach: 20 worker threads, one host each, ports probed sequentially."""
+    def scan(ip):
+        found = []
+        for port in ports:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout)
+                if sock.connect_ex((ip, port)) == 0:
+                    found.append(port)
+        return ip, found
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        return dict(executor.map(scan, addresses))
+
+
+def _report(label: str, hosts: int, elapsed: float, extra: str = ""):
+    print(f"{label:<10} {hosts:>6} hosts in {elapsed:7.3f}s  {hosts / elapsed:10.1f} hosts/s  {extra}")
+
+
+async def run_async(targets, args):
+    engine = AsyncScanEngine(concurrency=args.concurrency, host_concurrency=args.host_concurrency,
+                             resolve_hostnames=False)
+    found = {}
+    async for event in engine.scan_iter(targets, progress_interval=args.progress_interval):
+        if event["event"] == "host":
+            found[event["host"]["ip"]] = event["host"]["open_ports"]
+        elif event["event"] == "progress" and args.verbose:
+            print(f"  progress {event['scanned']}/{event['total']} alive={event['alive']} "
+                  f"timeout={event['timeout']}s")
+        elif event["event"] == "complete":
+            summary = event
+    return engine, found, summary
+
+
+async def main(args):
+    servers = []
+    expected = None
+    if args.targets:
+        targets = args.targets
+    else:
+        targets, expected, servers = await start_farm(args.hosts, args.listeners, args.seed)
+        silent = [str(ip) for ip in ipaddress.ip_network(SILENT_NETWORK).hosts()]
+        targets += silent[:args.silent]
+    try:
+        engine, found, summary = await run_async(targets, args)
+        extra = f"probes={engine.stats['probes']} final_timeout={engine.rtt.timeout * 1000:.1f}ms"
+        _report("async", summary["scanned"], summary["elapsed"], extra)
+        if expected is not None:
+            hits = sum(len(set(found.get(ip, [])) & set(ports)) for ip, ports in expected.items())
+            print(f"{'':<10} open ports found {hits}/{sum(len(p) for p in expected.values())}")
+
+        if args.baseline:
+            addresses = list(iter_targets(targets))
+            started = time.perf_counter()
+            baseline = await asyncio.get_running_loop().run_in_executor(
+                None, threaded_baseline, addresses, DEFAULT_PORTS)
+            elapsed = time.perf_counter() - started
+            _report("threaded", len(addresses), elapsed)
+            if expected is not None:
+                hits = sum(len(set(baseline.get(ip, [])) & set(ports)) for ip, ports in expected.items())
+                print(f"{'':<10} open ports found {hits}/{sum(len(p) for p in expected.values())}")
+            print(f"speedup: {elapsed / summary['elapsed']:.1f}x")
+    finally:
+        for server in servers:
+            server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=512, help="loopback hosts in the listener farm (max 1022)")
+    parser.add_argument("--listeners", type=int, default=2, help="listening ports per farm host")
+    parser.add_argument("--silent", type=int, default=0, help="blackholed TEST-NET-1 hosts to add (max 254)")
+    parser.add_argument("--targets", nargs="*", help="scan these CIDRs/ranges instead of the loopback farm")
+    parser.add_argument("--concurrency", type=int, default=1024, help="maximum in-flight connects")
+    parser.add_argument("--host-concurrency", type=int, default=256, help="hosts scanned at once")
+    parser.add_argument("--progress-interval", type=float, default=0.5)
+    parser.add_argument("--baseline", action="store_true", help="also run the threaded connect_ex scanner")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+SecureNet Threat Detection Throughput Benchmark
+
+Compares per-event ``ThreatDetectionEngine.process_threat_detection`` calls
+(concurrent, as request handlers would issue them) against the micro-batched
+``process_activity_stream`` pipeline, in activities/s.
+
+PostgreSQL, Redis, the notification broadcast and the audit log are replaced
+by in-process stand-ins that only add a fixed round-trip latency (and a
+bounded connection pool for PostgreSQL), so the numbers reflect how many
+round trips each mode makes rather than a particular server.
+
+Usage:
+    python scripts/benchmark_threat_detection.py
+    python scripts/benchmark_threat_detection.py --activities 20000 --db-latency-ms 2 --batch-size 512
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+LATENCY = {"db": 0.001, "redis": 0.0003, "notify": 0.0005}
+POOL = {"size": 20, "semaphore": None}
+ROUND_TRIPS = {"db": 0, "redis": 0, "notify": 0}
+
+
+async def round_trip(kind: str):
+    ROUND_TRIPS[kind] += 1
+    await asyncio.sleep(LATENCY[kind])
+
+
+class SimulatedConnection:
+    async def fetchval(self, sql, *args):
+        await round_trip("db")
+        return "user"
+
+    async def fetch(self, sql, *args):
+        await round_trip("db")
+        return []
+
+    async def execute(self, sql, *args):
+        await round_trip("db")
+
+    async def executemany(self, sql, rows):
+        await round_trip("db")
+
+
+@asynccontextmanager
+async def simulated_db_connection():
+    if POOL["semaphore"] is None:
+        POOL["semaphore"] = asyncio.Semaphore(POOL["size"])
+    async with POOL["semaphore"]:
+        yield SimulatedConnection()
+
+
+class SimulatedRedis:
+    async def sadd(self, key, *values):
+        await round_trip("redis")
+
+    async def expire(self, key, seconds):
+        await round_trip("redis")
+
+
+async def simulated_alert(*args, **kwargs):
+    await round_trip("notify")
+
+
+async def simulated_audit_log(*args, **kwargs):
+    await round_trip("db")
+    return "event"
+
+
+def install_simulated_backends(malicious_ips):
+    import database.postgresql_adapter as adapter
+    adapter.get_db_connection = simulated_db_connection
+
+    import security.threat_detection as td
+    td.get_db_connection = simulated_db_connection
+    td.send_security_alert = simulated_alert
+    td.security_audit_logger.log_event = simulated_audit_log
+    td.cache_service.redis_client = SimulatedRedis()
+    for address in malicious_ips:
+        td.malicious_ips.add(address, source="benchmark")
+    td.behavior_profiles.checkpoint_path = None
+    return td
+
+
+def home_ip(user: int) -> str:
+    return f"10.0.{user % 4}.{user % 250}"
+
+
+def make_activities(count: int, users: int, seed: int = 7):
+    rng = random.Random(seed)
+
+    def user_ip(user: int) -> str:
+        # Mostly the user's usual address, occasionally somewhere new
+        return home_ip(user) if rng.random() < 0.95 else f"198.51.100.{rng.randrange(250)}"
+
+    activities = []
+    for _ in range(count):
+        roll = rng.random()
+        user = rng.randrange(users)
+        if roll < 0.4:
+            activities.append({
+                "event_type": "login_failed",
+                "username": f"user{rng.randrange(20)}",
+                "source_ip": f"203.0.113.{rng.randrange(50)}",
+            })
+        elif roll < 0.8:
+            activities.append({
+                "event_type": "data_access",
+                "user_id": f"u{user}",
+                "action": "read",
+                "resource": ("/api/admin/users" if rng.random() < 0.02
+                             else rng.choice(["/api/logs", "/api/reports", "/api/network"])),
+                "source_ip": user_ip(user),
+            })
+        else:
+            activities.append({
+                "event_type": "login_success",
+                "user_id": f"u{user}",
+                "source_ip": user_ip(user),
+                "user_agent": "Mozilla/5.0",
+            })
+    return activities
+
+
+async def prepare(td, activities, users: int):
+    # Warm profiles and failed-login counters the way the audit logger would
+    now = time.time()
+    for user in range(users):
+        profile = td.behavior_profiles.new_profile(f"u{user}", now)
+        for hour in range(24):
+            profile.observe_login(hour, hour % 7, "Mozilla/5.0")
+        profile.observe_ip(home_ip(user))
+        for resource in ("/api/logs", "/api/reports", "/api/network"):
+            profile.observe_access(resource, now, 10)
+        td.behavior_profiles.put(profile)
+    for activity in activities:
+        if activity["event_type"] == "login_failed":
+            await td.failed_login_counters.record(activity["source_ip"], activity["username"], now)
+
+
+async def run_per_event(engine, activities, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    threats = 0
+
+    async def one(activity):
+        nonlocal threats
+        async with semaphore:
+            found = await engine.process_threat_detection(activity)
+        threats += len(found)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(activity) for activity in activities))
+    return time.perf_counter() - started, threats
+
+
+async def run_batched(engine, activities, batch_size: int, flush_interval: float):
+    async def stream():
+        for activity in activities:
+            yield activity
+
+    threats = 0
+    started = time.perf_counter()
+    async for batch_threats in engine.process_activity_stream(stream(), batch_size, flush_interval):
+        threats += len(batch_threats)
+    await engine.drain_notifications()
+    return time.perf_counter() - started, threats
+
+
+def report(label: str, activities: int, seconds: float, threats: int, trips: dict):
+    print(f"{label:<10} {activities / seconds:>10,.0f} activities/s  {seconds:>7.2f}s  "
+          f"threats={threats:<6} db={trips['db']:<6} redis={trips['redis']:<6} notify={trips['notify']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-event vs batched threat detection")
+    parser.add_argument("--activities", type=int, default=5000, help="Activities per mode")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct authenticated users")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent per-event callers")
+    parser.add_argument("--batch-size", type=int, default=256, help="Micro-batch size")
+    parser.add_argument("--flush-interval", type=float, default=0.05, help="Micro-batch max wait (s)")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="Simulated PostgreSQL round trip")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.3, help="Simulated Redis round trip")
+    parser.add_argument("--pool-size", type=int, default=20, help="Simulated PostgreSQL pool size")
+    args = parser.parse_args()
+
+    LATENCY["db"] = args.db_latency_ms / 1000
+    LATENCY["redis"] = args.redis_latency_ms / 1000
+    POOL["size"] = args.pool_size
+
+    activities = make_activities(args.activities, args.users)
+    td = install_simulated_backends(malicious_ips=[f"203.0.113.{i}" for i in range(5)])
+    await prepare(td, activities, args.users)
+
+    print(f"{args.activities} activities, {args.users} users, db {args.db_latency_ms}ms, "
+          f"redis {args.redis_latency_ms}ms, pool {args.pool_size}")
+
+    ROUND_TRIPS.update(db=0, redis=0, notify=0)
+    seconds, threats = await run_per_event(td.ThreatDetectionEngine(), activities, args.concurrency)
+    report("per-event", args.activities, seconds, threats, ROUND_TRIPS)
+
+    ROUND_TRIPS.update(db=0, redis=0, notify=0)
+    seconds, threats = await run_batched(td.ThreatDetectionEngine(), activities,
+                                         args.batch_size, args.flush_interval)
+    report("batched", args.activities, seconds, threats, ROUND_TRIPS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
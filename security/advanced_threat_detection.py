@@ -22,17 +22,57 @@ import re
 from collections import defaultdict
 import math
 
+from security.rule_engine import RULES_PATH, RuleEngine, compile_sql
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_PATH = "data/securenet.db"
 
+BUSINESS_START = 9   # 9 AM
+BUSINESS_END = 18    # 6 PM
+ADMIN_ROLES = ('platform_owner', 'security_admin')
+
+# Derived user_activity_logs columns rule predicates can refer to
+ACTIVITY_LOG_COLUMNS = {
+    'hour': "CAST(strftime('%H', timestamp) AS INTEGER)",
+}
+
+RULE_ALERT_TYPES = {
+    'multiple_failed_logins': 'brute_force_attack',
+    'unusual_privilege_change': 'privilege_escalation',
+    'bulk_data_access': 'suspicious_data_access',
+    'activity_outside_business_hours': 'off_hours_activity',
+    'multiple_permission_changes': 'rapid_permission_changes',
+    'admin_unusual_activity': 'admin_compromise',
+}
+
+# Patterns whose decision compares against the user's 30-day history
+BASELINE_PATTERNS = {
+    'unusual_privilege_change', 'bulk_data_access',
+    'activity_outside_business_hours', 'admin_unusual_activity',
+}
+
+# Decision logic per rule pattern
+RULE_EVALUATORS = {
+    'multiple_failed_logins': '_evaluate_failed_logins',
+    'unusual_privilege_change': '_evaluate_privilege_change',
+    'bulk_data_access': '_evaluate_activity_volume',
+    'activity_outside_business_hours': '_evaluate_off_hours',
+    'multiple_permission_changes': '_evaluate_permission_changes',
+    'admin_unusual_activity': '_evaluate_activity_volume',
+}
+
+CORRELATION_WATERMARK = 'correlate_threat_indicators'
+
 class AdvancedThreatDetector:
     """Advanced threat detection and analysis system"""
     
-    def __init__(self, db_path: str = DATABASE_PATH):
+    def __init__(self, db_path: str = DATABASE_PATH, rules_path: str = RULES_PATH):
         self.db_path = db_path
+        self.rules_path = rules_path
+        self.rule_engine: Optional[RuleEngine] = None
         self.threat_rules = {}
         self.detection_models = {}
         self.incident_response_actions = {}
@@ -45,638 +85,422 @@ class AdvancedThreatDetector:
         return conn
     
     def initialize_threat_detection_rules(self):
-        """Initialize threat detection rules and patterns"""
-        self.threat_rules = {
-            'brute_force_login': {
-                'pattern': 'multiple_failed_logins',
-                'threshold': 5,
-                'time_window_minutes': 15,
-                'severity': 'high',
-                'description': 'Multiple failed login attempts indicating brute force attack'
-            },
-            'privilege_escalation': {
-                'pattern': 'unusual_privilege_change',
-                'threshold': 1,
-                'time_window_minutes': 60,
-                'severity': 'critical',
-                'description': 'Unusual privilege escalation detected'
-            },
-            'suspicious_data_access': {
-                'pattern': 'bulk_data_access',
-                'threshold': 100,
-                'time_window_minutes': 30,
-                'severity': 'high',
-                'description': 'Suspicious bulk data access pattern'
-            },
-            'off_hours_activity': {
-                'pattern': 'activity_outside_business_hours',
-                'threshold': 1,
-                'time_window_minutes': 60,
-                'severity': 'medium',
-                'description': 'User activity detected outside normal business hours'
-            },
-            'geolocation_anomaly': {
-                'pattern': 'unusual_location_access',
-                'threshold': 1,
-                'time_window_minutes': 30,
-                'severity': 'high',
-                'description': 'Access from unusual geographic location'
-            },
-            'rapid_permission_changes': {
-                'pattern': 'multiple_permission_changes',
-                'threshold': 10,
-                'time_window_minutes': 60,
-                'severity': 'medium',
-                'description': 'Rapid permission changes detected'
-            },
-            'admin_account_compromise': {
-                'pattern': 'admin_unusual_activity',
-                'threshold': 1,
-                'time_window_minutes': 30,
-                'severity': 'critical',
-                'description': 'Potential admin account compromise detected'
-            },
-            'data_exfiltration': {
-                'pattern': 'large_data_download',
-                'threshold': 1000,  # MB
-                'time_window_minutes': 60,
-                'severity': 'critical',
-                'description': 'Potential data exfiltration detected'
+        """Compile the activity_log threat rules (see security/threat_rules.yaml)"""
+        if self.rule_engine is None:
+            self.rule_engine = RuleEngine(self.rules_path, scope='activity_log')
+        
+        self.threat_rules = {}
+        for rule in self.rule_engine.rules():
+            self.threat_rules[rule.name] = {
+                **rule.params,
+                'threshold': rule.threshold,
+                'description': rule.description,
+                'sql_filter': compile_sql(rule.spec.get('match'), rule.spec.get('any_of'), ACTIVITY_LOG_COLUMNS)
             }
-        }
         
         logger.info(f"✅ Initialized {len(self.threat_rules)} threat detection rules")
     
-    def analyze_user_activities_for_threats(self):
-        """Analyze user activities for potential threats"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            threats_detected = 0
-            
-            # Analyze each threat rule
-            for rule_name, rule_config in self.threat_rules.items():
-                pattern = rule_config['pattern']
-                threshold = rule_config['threshold']
-                time_window = rule_config['time_window_minutes']
-                severity = rule_config['severity']
-                
-                if pattern == 'multiple_failed_logins':
-                    threats_detected += self.detect_brute_force_attacks(cursor, rule_config)
-                
-                elif pattern == 'unusual_privilege_change':
-                    threats_detected += self.detect_privilege_escalation(cursor, rule_config)
-                
-                elif pattern == 'bulk_data_access':
-                    threats_detected += self.detect_suspicious_data_access(cursor, rule_config)
-                
-                elif pattern == 'activity_outside_business_hours':
-                    threats_detected += self.detect_off_hours_activity(cursor, rule_config)
-                
-                elif pattern == 'multiple_permission_changes':
-                    threats_detected += self.detect_rapid_permission_changes(cursor, rule_config)
-                
-                elif pattern == 'admin_unusual_activity':
-                    threats_detected += self.detect_admin_compromise(cursor, rule_config)
-            
-            conn.commit()
-            logger.info(f"✅ Analyzed user activities, detected {threats_detected} potential threats")
-            
-        except Exception as e:
-            logger.error(f"❌ Error analyzing user activities for threats: {str(e)}")
-            conn.rollback()
-        finally:
-            conn.close()
-    
-    def detect_brute_force_attacks(self, cursor, rule_config: Dict) -> int:
-        """Detect brute force login attempts"""
-        threshold = rule_config['threshold']
-        time_window = rule_config['time_window_minutes']
-        
-        # Find users with multiple failed logins
+    def ensure_rule_engine_schema(self, cursor):
+        """Create the watermark table, alert dedup key and indexes the rule engine relies on"""
         cursor.execute("""
-            SELECT 
-                user_id,
-                COUNT(*) as failed_attempts,
-                MIN(timestamp) as first_attempt,
-                MAX(timestamp) as last_attempt,
-                GROUP_CONCAT(DISTINCT details) as attempt_details
-            FROM user_activity_logs 
-            WHERE activity_type = 'failed_login' 
-            AND timestamp > datetime('now', '-{} minutes')
-            GROUP BY user_id
-            HAVING COUNT(*) >= ?
-        """.format(time_window), (threshold,))
-        
-        brute_force_attempts = cursor.fetchall()
-        threats_detected = 0
-        
-        for attempt in brute_force_attempts:
-            user_id = attempt['user_id']
-            failed_count = attempt['failed_attempts']
-            
-            # Get user information
-            cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
-            user_result = cursor.fetchone()
-            username = user_result['username'] if user_result else f"User ID {user_id}"
-            
-            # Calculate threat score
-            threat_score = min(failed_count / threshold, 1.0) * 0.8
-            
-            # Create security alert
-            alert_title = f"Brute Force Attack Detected: {username}"
-            alert_description = f"User {username} had {failed_count} failed login attempts in {time_window} minutes"
-            
-            evidence_data = {
-                'rule_triggered': 'brute_force_login',
-                'failed_attempts': failed_count,
-                'time_window_minutes': time_window,
-                'first_attempt': attempt['first_attempt'],
-                'last_attempt': attempt['last_attempt'],
-                'attempt_details': attempt['attempt_details']
-            }
-            
-            cursor.execute("""
-                INSERT INTO security_alerts 
-                (alert_type, severity, user_id, alert_title, alert_description, 
-                 evidence_data, risk_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                'brute_force_attack',
-                rule_config['severity'],
-                user_id,
-                alert_title,
-                alert_description,
-                json.dumps(evidence_data),
-                threat_score
-            ))
-            
-            threats_detected += 1
-            logger.warning(f"🚨 Brute force attack detected for user {username}")
+            CREATE TABLE IF NOT EXISTS threat_rule_watermarks (
+                rule_name VARCHAR(100) PRIMARY KEY,
+                last_rowid INTEGER NOT NULL DEFAULT 0,
+                last_run_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
         
-        return threats_detected
+        alert_columns = {row['name'] for row in cursor.execute("PRAGMA table_info(security_alerts)")}
+        if 'dedup_key' not in alert_columns:
+            cursor.execute("ALTER TABLE security_alerts ADD COLUMN dedup_key VARCHAR(200)")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_security_alerts_dedup ON security_alerts(dedup_key)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_security_alerts_user_created ON security_alerts(user_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_activity_logs_user_timestamp ON user_activity_logs(user_id, timestamp)")
     
-    def detect_privilege_escalation(self, cursor, rule_config: Dict) -> int:
-        """Detect unusual privilege escalation attempts"""
-        time_window = rule_config['time_window_minutes']
-        
-        # Look for privilege changes in activity logs
-        cursor.execute("""
+    def _load_watermarks(self, cursor) -> Dict[str, int]:
+        cursor.execute("SELECT rule_name, last_rowid FROM threat_rule_watermarks")
+        return {row['rule_name']: row['last_rowid'] for row in cursor.fetchall()}
+    
+    def _save_watermarks(self, cursor, rule_names: List[str], last_rowid: int):
+        cursor.executemany("""
+            INSERT INTO threat_rule_watermarks (rule_name, last_rowid, last_run_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(rule_name) DO UPDATE SET
+                last_rowid = excluded.last_rowid,
+                last_run_at = excluded.last_run_at
+        """, [(name, last_rowid) for name in rule_names])
+    
+    def _insert_alerts(self, cursor, alerts: List[Tuple]) -> int:
+        """Bulk-insert alerts; rows whose dedup key already exists are skipped"""
+        if not alerts:
+            return 0
+        before = cursor.connection.total_changes
+        cursor.executemany("""
+            INSERT OR IGNORE INTO security_alerts 
+            (alert_type, severity, user_id, alert_title, alert_description, 
+             evidence_data, risk_score, dedup_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, alerts)
+        return cursor.connection.total_changes - before
+    
+    def _window_aggregates(self, cursor, rules: List[Tuple[str, Dict]], since_rowid: int, upto_rowid: int):
+        """
+        One pass over the activity window computing every rule's per-user
+        metrics, limited to users with activity after ``since_rowid`` and
+        joined with ``users`` once.
+        """
+        columns = []
+        params: Dict[str, Any] = {'since': since_rowid, 'upto': upto_rowid}
+        for index, (rule_name, rule_config) in enumerate(rules):
+            match = (f"({rule_config['sql_filter']}) "
+                     f"AND timestamp > datetime('now', :cutoff_{index})")
+            params[f'cutoff_{index}'] = f"-{rule_config['time_window_minutes']} minutes"
+            columns.extend([
+                f"SUM(CASE WHEN {match} THEN 1 ELSE 0 END) AS r{index}_count",
+                f"MIN(CASE WHEN {match} THEN timestamp END) AS r{index}_first",
+                f"MAX(CASE WHEN {match} THEN timestamp END) AS r{index}_last",
+                f"MAX(CASE WHEN {match} THEN rowid END) AS r{index}_last_rowid",
+                f"GROUP_CONCAT(DISTINCT CASE WHEN {match} THEN details END) AS r{index}_details",
+                f"GROUP_CONCAT(DISTINCT CASE WHEN {match} THEN activity_type END) AS r{index}_activities",
+                f"COUNT(DISTINCT CASE WHEN {match} THEN activity_type END) AS r{index}_unique",
+            ])
+        params['max_cutoff'] = f"-{max(config['time_window_minutes'] for _, config in rules)} minutes"
+        
+        cursor.execute(f"""
+            SELECT agg.*, u.username, u.role, u.status
+            FROM (
+                SELECT user_id, {', '.join(columns)}
+                FROM user_activity_logs
+                WHERE timestamp > datetime('now', :max_cutoff)
+                AND rowid <= :upto
+                AND user_id IN (
+                    SELECT DISTINCT user_id FROM user_activity_logs
+                    WHERE rowid > :since AND rowid <= :upto
+                )
+                GROUP BY user_id
+            ) agg
+            LEFT JOIN users u ON u.id = agg.user_id
+        """, params)
+        return cursor.fetchall()
+    
+    def _baselines(self, cursor, user_ids: List[Any]) -> Dict[Any, sqlite3.Row]:
+        """30-day (excluding the last day) baselines for every candidate user in one pass"""
+        if not user_ids:
+            return {}
+        
+        # Baselines use the same activity filters as the active rules; '0' if a rule is off
+        filters = {config['pattern']: config['sql_filter'] for config in self.threat_rules.values()}
+        privilege = filters.get('unusual_privilege_change', '0')
+        data_access = filters.get('bulk_data_access', '0')
+        off_hours = filters.get('activity_outside_business_hours', '0')
+        admin = filters.get('admin_unusual_activity', '0')
+        cursor.execute(f"""
             SELECT 
                 user_id,
-                COUNT(*) as escalation_count,
-                GROUP_CONCAT(details) as escalation_details,
-                MIN(timestamp) as first_escalation,
-                MAX(timestamp) as last_escalation
+                SUM(CASE WHEN {privilege} THEN 1 ELSE 0 END) AS privilege_count,
+                SUM(CASE WHEN {data_access} THEN 1 ELSE 0 END) AS data_access_count,
+                COUNT(DISTINCT CASE WHEN {data_access} THEN DATE(timestamp) END) AS data_access_days,
+                SUM(CASE WHEN {off_hours} THEN 1 ELSE 0 END) AS off_hours_count,
+                SUM(CASE WHEN {admin} THEN 1 ELSE 0 END) AS admin_count,
+                COUNT(DISTINCT CASE WHEN {admin} THEN DATE(timestamp) END) AS admin_days
             FROM user_activity_logs 
-            WHERE activity_type LIKE '%privilege%' 
-            AND timestamp > datetime('now', '-{} minutes')
+            WHERE user_id IN (SELECT value FROM json_each(?))
+            AND timestamp BETWEEN datetime('now', '-30 days') AND datetime('now', '-1 day')
             GROUP BY user_id
-        """.format(time_window))
-        
-        escalations = cursor.fetchall()
-        threats_detected = 0
-        
-        for escalation in escalations:
-            user_id = escalation['user_id']
-            escalation_count = escalation['escalation_count']
-            
-            # Get user information
-            cursor.execute("SELECT username, role FROM users WHERE id = ?", (user_id,))
-            user_result = cursor.fetchone()
-            if not user_result:
-                continue
-            
-            username = user_result['username']
-            current_role = user_result['role']
-            
-            # Check if this is unusual for the user
-            cursor.execute("""
-                SELECT COUNT(*) as historical_count
-                FROM user_activity_logs 
-                WHERE user_id = ? AND activity_type LIKE '%privilege%'
-                AND timestamp BETWEEN datetime('now', '-30 days') AND datetime('now', '-1 day')
-            """, (user_id,))
-            
-            historical_result = cursor.fetchone()
-            historical_count = historical_result['historical_count'] if historical_result else 0
-            
-            # Alert if current activity is significantly above historical baseline
-            if escalation_count > max(historical_count * 2, 1):
-                threat_score = min(escalation_count / 5.0, 1.0) * 0.9
-                
-                alert_title = f"Privilege Escalation Detected: {username}"
-                alert_description = f"User {username} performed {escalation_count} privilege changes (historical average: {historical_count})"
-                
-                evidence_data = {
-                    'rule_triggered': 'privilege_escalation',
-                    'current_escalations': escalation_count,
-                    'historical_average': historical_count,
-                    'user_role': current_role,
-                    'escalation_details': escalation['escalation_details'],
-                    'time_window_minutes': time_window
-                }
-                
-                cursor.execute("""
-                    INSERT INTO security_alerts 
-                    (alert_type, severity, user_id, alert_title, alert_description, 
-                     evidence_data, risk_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    'privilege_escalation',
-                    rule_config['severity'],
-                    user_id,
-                    alert_title,
-                    alert_description,
-                    json.dumps(evidence_data),
-                    threat_score
-                ))
-                
-                threats_detected += 1
-                logger.warning(f"🚨 Privilege escalation detected for user {username}")
-        
-        return threats_detected
+        """, (json.dumps(user_ids),))
+        return {row['user_id']: row for row in cursor.fetchall()}
+    
+    @staticmethod
+    def _baseline_value(baseline: Optional[sqlite3.Row], column: str) -> float:
+        return (baseline[column] or 0) if baseline is not None else 0
+    
+    def _daily_average(self, baseline: Optional[sqlite3.Row], count_column: str, days_column: str) -> float:
+        days = self._baseline_value(baseline, days_column)
+        return self._baseline_value(baseline, count_column) / days if days else 0.0
+    
+    def _evaluate_rule(self, rule_name: str, rule_config: Dict, metrics: Dict[str, Any],
+                       user: sqlite3.Row, baseline: Optional[sqlite3.Row]) -> Optional[Tuple[float, str, str, Dict]]:
+        """Apply a rule's decision logic to one user's window metrics"""
+        pattern = rule_config['pattern']
+        if user['username'] is None and pattern != 'multiple_failed_logins':
+            return None  # Only brute force alerts on unknown users
+        evaluate = getattr(self, RULE_EVALUATORS[pattern])
+        return evaluate(rule_name, rule_config, metrics, user, baseline)
     
-    def detect_suspicious_data_access(self, cursor, rule_config: Dict) -> int:
-        """Detect suspicious bulk data access patterns"""
+    def _evaluate_failed_logins(self, rule_name, rule_config, metrics, user, baseline):
         threshold = rule_config['threshold']
         time_window = rule_config['time_window_minutes']
-        
-        # Look for users with high activity counts
-        cursor.execute("""
-            SELECT 
-                user_id,
-                COUNT(*) as activity_count,
-                COUNT(DISTINCT activity_type) as unique_activities,
-                GROUP_CONCAT(DISTINCT activity_type) as activities
-            FROM user_activity_logs 
-            WHERE timestamp > datetime('now', '-{} minutes')
-            AND activity_type IN ('data_access', 'file_download', 'report_generation')
-            GROUP BY user_id
-            HAVING COUNT(*) >= ?
-        """.format(time_window), (threshold,))
-        
-        suspicious_activities = cursor.fetchall()
-        threats_detected = 0
-        
-        for activity in suspicious_activities:
-            user_id = activity['user_id']
-            activity_count = activity['activity_count']
-            
-            # Get user information
-            cursor.execute("SELECT username, role FROM users WHERE id = ?", (user_id,))
-            user_result = cursor.fetchone()
-            if not user_result:
-                continue
-            
-            username = user_result['username']
-            role = user_result['role']
-            
-            # Calculate baseline activity for this user
-            cursor.execute("""
-                SELECT AVG(daily_count) as avg_daily_activity
-                FROM (
-                    SELECT DATE(timestamp) as date, COUNT(*) as daily_count
-                    FROM user_activity_logs 
-                    WHERE user_id = ? 
-                    AND timestamp BETWEEN datetime('now', '-30 days') AND datetime('now', '-1 day')
-                    AND activity_type IN ('data_access', 'file_download', 'report_generation')
-                    GROUP BY DATE(timestamp)
-                )
-            """, (user_id,))
-            
-            baseline_result = cursor.fetchone()
-            avg_daily_activity = baseline_result['avg_daily_activity'] or 0
-            
-            # Convert time window to daily equivalent for comparison
-            daily_equivalent = (activity_count * 1440) / time_window  # 1440 minutes in a day
-            
-            # Alert if current activity is significantly above baseline
-            if daily_equivalent > max(avg_daily_activity * 3, 50):
-                threat_score = min(daily_equivalent / (avg_daily_activity * 5), 1.0) * 0.7
-                
-                alert_title = f"Suspicious Data Access: {username}"
-                alert_description = f"User {username} performed {activity_count} data access operations in {time_window} minutes"
-                
-                evidence_data = {
-                    'rule_triggered': 'suspicious_data_access',
-                    'activity_count': activity_count,
-                    'time_window_minutes': time_window,
-                    'baseline_daily_average': round(avg_daily_activity, 2),
-                    'current_daily_equivalent': round(daily_equivalent, 2),
-                    'unique_activities': activity['unique_activities'],
-                    'activities': activity['activities']
-                }
-                
-                cursor.execute("""
-                    INSERT INTO security_alerts 
-                    (alert_type, severity, user_id, alert_title, alert_description, 
-                     evidence_data, risk_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    'suspicious_data_access',
-                    rule_config['severity'],
-                    user_id,
-                    alert_title,
-                    alert_description,
-                    json.dumps(evidence_data),
-                    threat_score
-                ))
-                
-                threats_detected += 1
-                logger.warning(f"🚨 Suspicious data access detected for user {username}")
-        
-        return threats_detected
+        count = metrics['count']
+        if count < threshold:
+            return None
+        username = user['username'] or f"User ID {user['user_id']}"
+        return (
+            min(count / threshold, 1.0) * 0.8,
+            f"Brute Force Attack Detected: {username}",
+            f"User {username} had {count} failed login attempts in {time_window} minutes",
+            {
+                'rule_triggered': rule_name,
+                'failed_attempts': count,
+                'time_window_minutes': time_window,
+                'first_attempt': metrics['first'],
+                'last_attempt': metrics['last'],
+                'attempt_details': metrics['details']
+            }
+        )
     
-    def detect_off_hours_activity(self, cursor, rule_config: Dict) -> int:
-        """Detect activity outside normal business hours"""
+    def _evaluate_privilege_change(self, rule_name, rule_config, metrics, user, baseline):
+        count = metrics['count']
+        username = user['username']
+        historical_count = self._baseline_value(baseline, 'privilege_count')
+        if count <= max(historical_count * 2, 1):
+            return None
+        return (
+            min(count / 5.0, 1.0) * 0.9,
+            f"Privilege Escalation Detected: {username}",
+            f"User {username} performed {count} privilege changes (historical average: {historical_count})",
+            {
+                'rule_triggered': rule_name,
+                'current_escalations': count,
+                'historical_average': historical_count,
+                'user_role': user['role'],
+                'escalation_details': metrics['details'],
+                'time_window_minutes': rule_config['time_window_minutes']
+            }
+        )
+    
+    def _evaluate_activity_volume(self, rule_name, rule_config, metrics, user, baseline):
+        """Bulk data access and unusual admin activity, compared to the daily baseline"""
         time_window = rule_config['time_window_minutes']
-        
-        # Define business hours (9 AM to 6 PM)
-        business_start = 9
-        business_end = 18
-        
-        cursor.execute("""
-            SELECT 
-                user_id,
-                COUNT(*) as off_hours_count,
-                GROUP_CONCAT(DISTINCT activity_type) as activities,
-                MIN(timestamp) as first_activity,
-                MAX(timestamp) as last_activity
-            FROM user_activity_logs 
-            WHERE timestamp > datetime('now', '-{} minutes')
-            AND (CAST(strftime('%H', timestamp) AS INTEGER) < ? 
-                 OR CAST(strftime('%H', timestamp) AS INTEGER) >= ?)
-            GROUP BY user_id
-        """.format(time_window), (business_start, business_end))
-        
-        off_hours_activities = cursor.fetchall()
-        threats_detected = 0
-        
-        for activity in off_hours_activities:
-            user_id = activity['user_id']
-            off_hours_count = activity['off_hours_count']
-            
-            # Get user information
-            cursor.execute("SELECT username, role FROM users WHERE id = ?", (user_id,))
-            user_result = cursor.fetchone()
-            if not user_result:
-                continue
-            
-            username = user_result['username']
-            role = user_result['role']
-            
-            # Check user's historical off-hours activity
-            cursor.execute("""
-                SELECT COUNT(*) as historical_off_hours
-                FROM user_activity_logs 
-                WHERE user_id = ? 
-                AND timestamp BETWEEN datetime('now', '-30 days') AND datetime('now', '-1 day')
-                AND (CAST(strftime('%H', timestamp) AS INTEGER) < ? 
-                     OR CAST(strftime('%H', timestamp) AS INTEGER) >= ?)
-            """, (user_id, business_start, business_end))
-            
-            historical_result = cursor.fetchone()
-            historical_off_hours = historical_result['historical_off_hours'] or 0
-            
-            # Alert if this is unusual for the user
-            if off_hours_count > max(historical_off_hours / 30 * 2, 5):  # 2x daily average or 5 minimum
-                threat_score = min(off_hours_count / 20.0, 1.0) * 0.5
-                
-                alert_title = f"Off-Hours Activity: {username}"
-                alert_description = f"User {username} had {off_hours_count} activities outside business hours"
-                
-                evidence_data = {
-                    'rule_triggered': 'off_hours_activity',
-                    'off_hours_count': off_hours_count,
-                    'business_hours': f"{business_start}:00-{business_end}:00",
-                    'historical_monthly_average': historical_off_hours,
-                    'activities': activity['activities'],
-                    'first_activity': activity['first_activity'],
-                    'last_activity': activity['last_activity']
-                }
-                
-                cursor.execute("""
-                    INSERT INTO security_alerts 
-                    (alert_type, severity, user_id, alert_title, alert_description, 
-                     evidence_data, risk_score)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    'off_hours_activity',
-                    rule_config['severity'],
-                    user_id,
-                    alert_title,
-                    alert_description,
-                    json.dumps(evidence_data),
-                    threat_score
-                ))
-                
-                threats_detected += 1
-                logger.warning(f"🚨 Off-hours activity detected for user {username}")
-        
-        return threats_detected
+        count = metrics['count']
+        username = user['username']
+        is_admin = rule_config['pattern'] == 'admin_unusual_activity'
+        if is_admin:
+            if user['role'] not in ADMIN_ROLES or user['status'] != 'active':
+                return None
+            avg_daily_activity = self._daily_average(baseline, 'admin_count', 'admin_days')
+            floor, multiplier, score_divisor, weight = 20, 4, 6, 0.9
+        else:
+            if count < rule_config['threshold']:
+                return None
+            avg_daily_activity = self._daily_average(baseline, 'data_access_count', 'data_access_days')
+            floor, multiplier, score_divisor, weight = 50, 3, 5, 0.7
+        
+        # Convert time window to daily equivalent for comparison
+        daily_equivalent = (count * 1440) / time_window  # 1440 minutes in a day
+        if daily_equivalent <= max(avg_daily_activity * multiplier, floor):
+            return None
+        ratio = daily_equivalent / (avg_daily_activity * score_divisor) if avg_daily_activity else 1.0
+        evidence = {
+            'rule_triggered': rule_name,
+            'activity_count': count,
+            'time_window_minutes': time_window,
+            'baseline_daily_average': round(avg_daily_activity, 2),
+            'current_daily_equivalent': round(daily_equivalent, 2),
+            'unique_activities': metrics['unique'],
+            'activities': metrics['activities']
+        }
+        if is_admin:
+            return (
+                min(ratio, 1.0) * weight,
+                f"Potential Admin Compromise: {username}",
+                f"Admin user {username} showed unusual activity pattern: {count} actions in {time_window} minutes",
+                evidence
+            )
+        return (
+            min(ratio, 1.0) * weight,
+            f"Suspicious Data Access: {username}",
+            f"User {username} performed {count} data access operations in {time_window} minutes",
+            evidence
+        )
     
-    def detect_rapid_permission_changes(self, cursor, rule_config: Dict) -> int:
-        """Detect rapid permission changes"""
+    def _evaluate_off_hours(self, rule_name, rule_config, metrics, user, baseline):
+        count = metrics['count']
+        username = user['username']
+        historical_off_hours = self._baseline_value(baseline, 'off_hours_count')
+        if count <= max(historical_off_hours / 30 * 2, 5):  # 2x daily average or 5 minimum
+            return None
+        return (
+            min(count / 20.0, 1.0) * 0.5,
+            f"Off-Hours Activity: {username}",
+            f"User {username} had {count} activities outside business hours",
+            {
+                'rule_triggered': rule_name,
+                'off_hours_count': count,
+                'business_hours': f"{BUSINESS_START}:00-{BUSINESS_END}:00",
+                'historical_monthly_average': historical_off_hours,
+                'activities': metrics['activities'],
+                'first_activity': metrics['first'],
+                'last_activity': metrics['last']
+            }
+        )
+    
+    def _evaluate_permission_changes(self, rule_name, rule_config, metrics, user, baseline):
         threshold = rule_config['threshold']
         time_window = rule_config['time_window_minutes']
-        
-        cursor.execute("""
-            SELECT 
-                user_id,
-                COUNT(*) as permission_changes,
-                GROUP_CONCAT(details) as change_details
-            FROM user_activity_logs 
-            WHERE activity_type LIKE '%permission%' 
-            AND timestamp > datetime('now', '-{} minutes')
-            GROUP BY user_id
-            HAVING COUNT(*) >= ?
-        """.format(time_window), (threshold,))
-        
-        rapid_changes = cursor.fetchall()
-        threats_detected = 0
-        
-        for change in rapid_changes:
-            user_id = change['user_id']
-            change_count = change['permission_changes']
-            
-            # Get user information
-            cursor.execute("SELECT username, role FROM users WHERE id = ?", (user_id,))
-            user_result = cursor.fetchone()
-            if not user_result:
-                continue
-            
-            username = user_result['username']
-            role = user_result['role']
-            
-            threat_score = min(change_count / threshold, 1.0) * 0.6
-            
-            alert_title = f"Rapid Permission Changes: {username}"
-            alert_description = f"User {username} made {change_count} permission changes in {time_window} minutes"
-            
-            evidence_data = {
-                'rule_triggered': 'rapid_permission_changes',
-                'permission_changes': change_count,
+        count = metrics['count']
+        if count < threshold:
+            return None
+        return (
+            min(count / threshold, 1.0) * 0.6,
+            f"Rapid Permission Changes: {user['username']}",
+            f"User {user['username']} made {count} permission changes in {time_window} minutes",
+            {
+                'rule_triggered': rule_name,
+                'permission_changes': count,
                 'time_window_minutes': time_window,
                 'threshold': threshold,
-                'change_details': change['change_details']
+                'change_details': metrics['details']
             }
-            
-            cursor.execute("""
-                INSERT INTO security_alerts 
-                (alert_type, severity, user_id, alert_title, alert_description, 
-                 evidence_data, risk_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                'rapid_permission_changes',
-                rule_config['severity'],
-                user_id,
-                alert_title,
-                alert_description,
-                json.dumps(evidence_data),
-                threat_score
-            ))
-            
-            threats_detected += 1
-            logger.warning(f"🚨 Rapid permission changes detected for user {username}")
-        
-        return threats_detected
+        )
     
-    def detect_admin_compromise(self, cursor, rule_config: Dict) -> int:
-        """Detect potential admin account compromise"""
-        time_window = rule_config['time_window_minutes']
+    def analyze_user_activities_for_threats(self) -> int:
+        """
+        Evaluate every threat rule in one pass over the activity window.
+        
+        Only users with activity newer than a rule's high-water mark are
+        considered, so reruns skip activity that was already evaluated; alerts
+        carry a dedup key (type, user, window bucket) so overlapping windows
+        never insert the same alert twice.
+        """
+        if not self.threat_rules or (self.rule_engine is not None and self.rule_engine.reload_if_changed()):
+            self.initialize_threat_detection_rules()
         
-        # Get admin users
-        cursor.execute("""
-            SELECT id, username FROM users 
-            WHERE role IN ('platform_owner', 'security_admin') 
-            AND status = 'active'
-        """)
-        
-        admin_users = cursor.fetchall()
-        threats_detected = 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        for admin in admin_users:
-            user_id = admin['id']
-            username = admin['username']
-            
-            # Check for unusual admin activities
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as activity_count,
-                    COUNT(DISTINCT activity_type) as unique_activities,
-                    GROUP_CONCAT(DISTINCT activity_type) as activities
-                FROM user_activity_logs 
-                WHERE user_id = ? 
-                AND timestamp > datetime('now', '-{} minutes')
-                AND activity_type IN ('admin_action', 'user_management', 'permission_change', 'system_config')
-            """.format(time_window), (user_id,))
+        try:
+            self.ensure_rule_engine_schema(cursor)
+            rules = [
+                (rule_name, rule_config) for rule_name, rule_config in self.threat_rules.items()
+                if rule_config.get('pattern') in RULE_EVALUATORS
+            ]
+            if not rules:
+                return 0
             
-            admin_activity = cursor.fetchone()
-            activity_count = admin_activity['activity_count'] or 0
+            watermarks = self._load_watermarks(cursor)
+            since_rowid = min(watermarks.get(rule_name, 0) for rule_name, _ in rules)
+            cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM user_activity_logs")
+            upto_rowid = cursor.fetchone()[0]
             
-            if activity_count > 0:
-                # Get baseline admin activity
-                cursor.execute("""
-                    SELECT AVG(daily_count) as avg_daily_activity
-                    FROM (
-                        SELECT DATE(timestamp) as date, COUNT(*) as daily_count
-                        FROM user_activity_logs 
-                        WHERE user_id = ? 
-                        AND timestamp BETWEEN datetime('now', '-30 days') AND datetime('now', '-1 day')
-                        AND activity_type IN ('admin_action', 'user_management', 'permission_change', 'system_config')
-                        GROUP BY DATE(timestamp)
-                    )
-                """, (user_id,))
+            threats_detected = 0
+            if upto_rowid > since_rowid:
+                rows = self._window_aggregates(cursor, rules, since_rowid, upto_rowid)
                 
-                baseline_result = cursor.fetchone()
-                avg_daily_activity = baseline_result['avg_daily_activity'] or 0
+                # Per-user metrics for each rule that saw new activity since its watermark
+                candidates = []
+                for row in rows:
+                    for index, (rule_name, rule_config) in enumerate(rules):
+                        last_rowid = row[f'r{index}_last_rowid']
+                        if last_rowid is None or last_rowid <= watermarks.get(rule_name, 0):
+                            continue
+                        metrics = {
+                            key: row[f'r{index}_{key}']
+                            for key in ('count', 'first', 'last', 'details', 'activities', 'unique')
+                        }
+                        candidates.append((row, rule_name, rule_config, metrics))
                 
-                # Convert to daily equivalent
-                daily_equivalent = (activity_count * 1440) / time_window
+                baseline_users = sorted({
+                    row['user_id'] for row, _, rule_config, _ in candidates
+                    if rule_config['pattern'] in BASELINE_PATTERNS and row['username'] is not None
+                }, key=str)
+                baselines = self._baselines(cursor, baseline_users)
                 
-                # Alert if significantly above baseline or if very high activity
-                if daily_equivalent > max(avg_daily_activity * 4, 20):
-                    threat_score = min(daily_equivalent / (avg_daily_activity * 6), 1.0) * 0.9
-                    
-                    alert_title = f"Potential Admin Compromise: {username}"
-                    alert_description = f"Admin user {username} showed unusual activity pattern: {activity_count} actions in {time_window} minutes"
-                    
-                    evidence_data = {
-                        'rule_triggered': 'admin_account_compromise',
-                        'activity_count': activity_count,
-                        'time_window_minutes': time_window,
-                        'baseline_daily_average': round(avg_daily_activity, 2),
-                        'current_daily_equivalent': round(daily_equivalent, 2),
-                        'unique_activities': admin_activity['unique_activities'],
-                        'activities': admin_activity['activities']
-                    }
-                    
-                    cursor.execute("""
-                        INSERT INTO security_alerts 
-                        (alert_type, severity, user_id, alert_title, alert_description, 
-                         evidence_data, risk_score)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        'admin_compromise',
+                alerts = []
+                alerts_by_rule = defaultdict(int)
+                for row, rule_name, rule_config, metrics in candidates:
+                    started = time.perf_counter_ns()
+                    result = self._evaluate_rule(rule_name, rule_config, metrics, row, baselines.get(row['user_id']))
+                    compiled = self.rule_engine.rule(rule_name) if self.rule_engine else None
+                    if compiled is not None:
+                        compiled.record(time.perf_counter_ns() - started, matched=True, fired=result is not None)
+                    if result is None:
+                        continue
+                    threat_score, alert_title, alert_description, evidence_data = result
+                    alert_type = RULE_ALERT_TYPES[rule_config['pattern']]
+                    alerts.append((
+                        alert_type,
                         rule_config['severity'],
-                        user_id,
+                        row['user_id'],
                         alert_title,
                         alert_description,
                         json.dumps(evidence_data),
-                        threat_score
+                        threat_score,
+                        self._dedup_key(alert_type, row['user_id'], metrics['last'], rule_config['time_window_minutes'])
                     ))
-                    
-                    threats_detected += 1
-                    logger.warning(f"🚨 Potential admin compromise detected for {username}")
-        
-        return threats_detected
+                    alerts_by_rule[rule_name] += 1
+                
+                threats_detected = self._insert_alerts(cursor, alerts)
+                for rule_name, count in alerts_by_rule.items():
+                    logger.warning(f"🚨 {rule_name}: {count} users flagged")
+            
+            self._save_watermarks(cursor, [rule_name for rule_name, _ in rules], upto_rowid)
+            conn.commit()
+            logger.info(f"✅ Analyzed user activities, detected {threats_detected} potential threats")
+            return threats_detected
+            
+        except Exception as e:
+            logger.error(f"❌ Error analyzing user activities for threats: {str(e)}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _dedup_key(alert_type: str, user_id: Any, last_seen: Optional[str], window_minutes: int) -> str:
+        """Alerts of one type for one user collapse within a rule window"""
+        try:
+            bucket = int(datetime.fromisoformat(str(last_seen)).timestamp() // (window_minutes * 60))
+        except ValueError:
+            bucket = str(last_seen)
+        return f"{alert_type}:{user_id}:{bucket}"
     
-    def correlate_threat_indicators(self):
+    def correlate_threat_indicators(self) -> int:
         """Correlate multiple threat indicators for enhanced detection"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Look for users with multiple recent alerts
-            cursor.execute("""
-                SELECT 
-                    user_id,
-                    COUNT(*) as alert_count,
-                    AVG(risk_score) as avg_risk_score,
-                    GROUP_CONCAT(DISTINCT alert_type) as alert_types,
-                    MIN(created_at) as first_alert,
-                    MAX(created_at) as last_alert
-                FROM security_alerts 
-                WHERE created_at > datetime('now', '-24 hours')
-                AND status = 'active'
-                GROUP BY user_id
-                HAVING COUNT(*) >= 2
-            """)
+            self.ensure_rule_engine_schema(cursor)
+            since_id = self._load_watermarks(cursor).get(CORRELATION_WATERMARK, 0)
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM security_alerts")
+            upto_id = cursor.fetchone()[0]
             
-            correlated_threats = cursor.fetchall()
             correlation_alerts = 0
-            
-            for threat in correlated_threats:
-                user_id = threat['user_id']
-                alert_count = threat['alert_count']
-                avg_risk_score = threat['avg_risk_score']
-                
-                # Get user information
-                cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
-                user_result = cursor.fetchone()
-                if not user_result:
-                    continue
-                
-                username = user_result['username']
-                
-                # Calculate correlation score
-                correlation_score = min(alert_count * avg_risk_score * 0.3, 1.0)
+            if upto_id > since_id:
+                # Only users with new alerts since the last run can change their correlation
+                cursor.execute("""
+                    SELECT 
+                        sa.user_id,
+                        u.username,
+                        COUNT(*) as alert_count,
+                        AVG(sa.risk_score) as avg_risk_score,
+                        GROUP_CONCAT(DISTINCT sa.alert_type) as alert_types,
+                        MIN(sa.created_at) as first_alert,
+                        MAX(sa.created_at) as last_alert,
+                        MAX(sa.id) as last_alert_id
+                    FROM security_alerts sa
+                    JOIN users u ON u.id = sa.user_id
+                    WHERE sa.created_at > datetime('now', '-24 hours')
+                    AND sa.status = 'active'
+                    AND sa.alert_type != 'correlated_threat'
+                    AND sa.user_id IN (
+                        SELECT DISTINCT user_id FROM security_alerts
+                        WHERE id > ? AND id <= ? AND alert_type != 'correlated_threat'
+                    )
+                    GROUP BY sa.user_id, u.username
+                    HAVING COUNT(*) >= 2
+                """, (since_id, upto_id))
                 
-                if correlation_score > 0.6:
-                    alert_title = f"Correlated Threat Activity: {username}"
-                    alert_description = f"User {username} triggered {alert_count} security alerts with average risk score {avg_risk_score:.2f}"
+                alerts = []
+                for threat in cursor.fetchall():
+                    alert_count = threat['alert_count']
+                    avg_risk_score = threat['avg_risk_score']
+                    username = threat['username']
+                    
+                    # Calculate correlation score
+                    correlation_score = min(alert_count * avg_risk_score * 0.3, 1.0)
+                    if correlation_score <= 0.6:
+                        continue
                     
                     evidence_data = {
                         'correlation_type': 'multiple_alerts',
@@ -686,31 +510,28 @@ class AdvancedThreatDetector:
                         'time_span_hours': 24,
                         'correlation_score': correlation_score
                     }
-                    
-                    cursor.execute("""
-                        INSERT INTO security_alerts 
-                        (alert_type, severity, user_id, alert_title, alert_description, 
-                         evidence_data, risk_score)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (
+                    alerts.append((
                         'correlated_threat',
                         'high',
-                        user_id,
-                        alert_title,
-                        alert_description,
+                        threat['user_id'],
+                        f"Correlated Threat Activity: {username}",
+                        f"User {username} triggered {alert_count} security alerts with average risk score {avg_risk_score:.2f}",
                         json.dumps(evidence_data),
-                        correlation_score
+                        correlation_score,
+                        f"correlated_threat:{threat['user_id']}:{threat['last_alert_id']}"
                     ))
-                    
-                    correlation_alerts += 1
-                    logger.warning(f"🚨 Correlated threat activity detected for {username}")
+                
+                correlation_alerts = self._insert_alerts(cursor, alerts)
             
+            self._save_watermarks(cursor, [CORRELATION_WATERMARK], upto_id)
             conn.commit()
             logger.info(f"✅ Correlated threat indicators, generated {correlation_alerts} correlation alerts")
+            return correlation_alerts
             
         except Exception as e:
             logger.error(f"❌ Error correlating threat indicators: {str(e)}")
             conn.rollback()
+            return 0
         finally:
             conn.close()
     
@@ -0,0 +1,416 @@
+"""
+SecureNet Behavior Profiles
+
+Compact, incrementally maintained user behavior baselines for
+``BehaviorAnalyzer``:
+- login hour/day-of-week histograms and off-hours counts
+- known source IPs and user agents as bounded LRU sets of 64-bit hashes:
+  membership is exact (collisions ~n/2^64) for the most recent ``max_known``
+  values, so a novel IP or agent is never mistaken for a known one
+- a count-min sketch of source IPs for the primary-IP estimate
+- forward-decayed count-min sketch of resource accesses, so old habits fade
+  without rescanning history
+- a bounded LRU of ``__slots__`` profiles with periodic pickle checkpoints
+
+Audit events update resident profiles as they are logged; a profile is only
+rebuilt from ``audit_logs`` when it is cold (not resident, evicted, or older
+than the baseline window).
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import pickle
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.getenv("BEHAVIOR_PROFILE_CHECKPOINT", "data/behavior_profiles.pkl")
+CHECKPOINT_VERSION = 2
+
+BUSINESS_HOURS = range(9, 18)
+BUSINESS_DAYS = range(1, 6)  # Monday to Friday, 0 = Sunday (PostgreSQL dow)
+
+
+def _digest(value: str) -> int:
+    # Stable across processes (unlike hash()), so checkpoints stay valid
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+
+def _indexes(value: str, depth: int, width: int) -> List[int]:
+    digest = _digest(value)
+    h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+    return [row * width + (h1 + row * h2) % width for row in range(depth)]
+
+
+class RecentHashSet:
+    """
+    Membership over the ``capacity`` most recently seen values, kept as 64-bit
+    hashes in LRU order. Past capacity the least recent value is forgotten and
+    reads as new again; a never-seen value is only reported known on a 64-bit
+    hash collision.
+    """
+
+    __slots__ = ("capacity", "hashes")
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.hashes = array("Q")
+
+    def add(self, value: str):
+        digest = _digest(value)
+        hashes = self.hashes
+        try:
+            hashes.remove(digest)
+        except ValueError:
+            if len(hashes) >= self.capacity:
+                del hashes[0]
+        hashes.append(digest)
+
+    def __contains__(self, value: str) -> bool:
+        return _digest(value) in self.hashes
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+class CountMinSketch:
+    """Fixed-size frequency sketch; estimates never undercount."""
+
+    __slots__ = ("width", "depth", "table")
+
+    def __init__(self, width: int = 32, depth: int = 2, typecode: str = "I"):
+        self.width = width
+        self.depth = depth
+        self.table = array(typecode, bytes(array(typecode).itemsize * width * depth))
+
+    def add(self, value: str, amount: float = 1) -> float:
+        table = self.table
+        estimate = None
+        for index in _indexes(value, self.depth, self.width):
+            table[index] += amount
+            if estimate is None or table[index] < estimate:
+                estimate = table[index]
+        return estimate
+
+    def estimate(self, value: str) -> float:
+        table = self.table
+        return min(table[index] for index in _indexes(value, self.depth, self.width))
+
+
+class DecayedSketch(CountMinSketch):
+    """
+    Count-min sketch with exponential time decay (mean lifetime ``tau`` seconds).
+
+    Uses forward decay: additions are weighted by ``exp((t - landmark) / tau)``
+    and estimates are scaled back to ``now``, so decay costs nothing per event.
+    """
+
+    __slots__ = ("tau", "landmark")
+
+    def __init__(self, tau: float, landmark: float, width: int = 32, depth: int = 2):
+        super().__init__(width, depth, typecode="f")
+        self.tau = tau
+        self.landmark = landmark
+
+    def _rescale(self, timestamp: float):
+        factor = math.exp(-(timestamp - self.landmark) / self.tau)
+        for index in range(len(self.table)):
+            self.table[index] *= factor
+        self.landmark = timestamp
+
+    def add(self, value: str, amount: float = 1, timestamp: Optional[float] = None) -> float:
+        timestamp = time.time() if timestamp is None else timestamp
+        if (timestamp - self.landmark) / self.tau > 40:
+            self._rescale(timestamp)  # keep float32 weights in range
+        super().add(value, amount * math.exp((timestamp - self.landmark) / self.tau))
+        return self.estimate(value, timestamp)
+
+    def estimate(self, value: str, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        return super().estimate(value) * math.exp(-(now - self.landmark) / self.tau)
+
+
+class UserBehaviorProfile:
+    """Streaming behavior baseline for one user."""
+
+    __slots__ = ("user_id", "built_at", "updated_at", "events", "logins", "off_hours_logins",
+                 "hours", "days", "ips", "known_ips", "agents", "resources", "top_ip", "top_ip_count")
+
+    def __init__(self, user_id: str, now: float, resource_tau: float,
+                 sketch_width: int = 32, sketch_depth: int = 2, max_known: int = 64):
+        self.user_id = user_id
+        self.built_at = now
+        self.updated_at = now
+        self.events = 0
+        self.logins = 0
+        self.off_hours_logins = 0
+        self.hours = array("I", bytes(4 * 24))
+        self.days = array("I", bytes(4 * 7))
+        self.ips = CountMinSketch(sketch_width, sketch_depth)
+        self.known_ips = RecentHashSet(max_known)
+        self.agents = RecentHashSet(max_known)
+        self.resources = DecayedSketch(resource_tau, now, sketch_width, sketch_depth)
+        self.top_ip = None
+        self.top_ip_count = 0
+
+    # --- updates -------------------------------------------------------
+
+    def observe_ip(self, source_ip: Optional[str], amount: int = 1):
+        self.events += amount
+        if source_ip and source_ip != "unknown":
+            source_ip = str(source_ip)  # INET columns come back as ipaddress objects
+            self.known_ips.add(source_ip)
+            estimate = self.ips.add(source_ip, amount)
+            if estimate > self.top_ip_count:
+                self.top_ip, self.top_ip_count = source_ip, estimate
+
+    def observe_login(self, hour: int, dow: int, user_agent: Optional[str], amount: int = 1):
+        self.logins += amount
+        self.hours[hour] += amount
+        self.days[dow] += amount
+        if hour not in BUSINESS_HOURS or dow not in BUSINESS_DAYS:
+            self.off_hours_logins += amount
+        if user_agent:
+            self.agents.add(user_agent)
+
+    def observe_access(self, resource: str, timestamp: float, amount: int = 1):
+        self.resources.add(resource, amount, timestamp)
+
+    def observe(self, event_type: str, timestamp: float, source_ip: Optional[str] = None,
+                user_agent: Optional[str] = None, resource: Optional[str] = None):
+        """Fold one audit event into the profile."""
+        self.observe_ip(source_ip)
+        if event_type == "login_success":
+            moment = datetime.fromtimestamp(timestamp)
+            self.observe_login(moment.hour, moment.isoweekday() % 7, user_agent)
+        elif event_type == "data_access" and resource:
+            self.observe_access(resource, timestamp)
+        self.updated_at = max(self.updated_at, timestamp)
+
+    # --- queries -------------------------------------------------------
+
+    def typical_hours(self) -> List[int]:
+        """Hours holding at least 10% of logins."""
+        threshold = max(1, self.logins * 0.1)
+        return [hour for hour, count in enumerate(self.hours) if count >= threshold]
+
+    def typical_days(self) -> List[int]:
+        threshold = max(1, self.logins * 0.1)
+        return [day for day, count in enumerate(self.days) if count >= threshold]
+
+    def knows_ip(self, source_ip: str) -> bool:
+        return source_ip in self.known_ips
+
+    def knows_user_agent(self, user_agent: str) -> bool:
+        return user_agent in self.agents
+
+    def resource_frequency(self, resource: str, now: Optional[float] = None) -> float:
+        return self.resources.estimate(resource, now)
+
+    def ip_stability(self) -> float:
+        return min(1.0, self.top_ip_count / self.events) if self.events else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary in the shape of the old query-built profile."""
+        return {
+            "user_id": self.user_id,
+            "profile_created": datetime.fromtimestamp(self.built_at).isoformat(),
+            "last_updated": datetime.fromtimestamp(self.updated_at).isoformat(),
+            "login_patterns": {
+                "typical_hours": self.typical_hours(),
+                "typical_days": self.typical_days(),
+                "total_logins": self.logins,
+            },
+            "location_patterns": {
+                "primary_ip": self.top_ip,
+                "ip_stability_score": self.ip_stability(),
+            },
+            "risk_indicators": {
+                "off_hours_activity": self.logins > 0 and self.off_hours_logins / self.logins > 0.3,
+            },
+            "total_events": self.events,
+        }
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size (object, arrays, sketches and known-value sets)."""
+        return (sys.getsizeof(self) + sys.getsizeof(self.hours) + sys.getsizeof(self.days)
+                + sum(sys.getsizeof(s) + sys.getsizeof(s.table) for s in (self.ips, self.resources))
+                + sum(sys.getsizeof(s) + sys.getsizeof(s.hashes) for s in (self.known_ips, self.agents)))
+
+
+class BehaviorProfileStore:
+    """
+    Bounded LRU of ``UserBehaviorProfile``s with periodic checkpoints.
+
+    At the default sizes a profile is ~2.6 KB once its known-IP and agent sets
+    are full (plus its LRU entry), so 100k users stay under 300 MB regardless
+    of how many events they generate.
+    """
+
+    def __init__(self, max_profiles: int = 100000, baseline_days: int = 30,
+                 checkpoint_path: Optional[str] = CHECKPOINT_PATH, checkpoint_interval: float = 300,
+                 max_checkpoint_age: float = 3600, sketch_width: int = 32, sketch_depth: int = 2,
+                 max_known: int = 64):
+        self.max_profiles = max_profiles
+        self.baseline_seconds = baseline_days * 86400
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoint_age = max_checkpoint_age
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.max_known = max_known
+        self._profiles: "OrderedDict[str, UserBehaviorProfile]" = OrderedDict()
+        self._loaded = False
+        self._last_checkpoint = time.time()
+        self._checkpoint_task: Optional[asyncio.Future] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "events_applied": 0,
+            "checkpoints": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def new_profile(self, user_id: str, now: Optional[float] = None) -> UserBehaviorProfile:
+        return UserBehaviorProfile(user_id, time.time() if now is None else now, self.baseline_seconds,
+                                   self.sketch_width, self.sketch_depth, self.max_known)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            if self.checkpoint_path:
+                self.load(self.checkpoint_path)
+
+    def get(self, user_id: str, now: Optional[float] = None) -> Optional[UserBehaviorProfile]:
+        """Resident, fresh profile for ``user_id``; None means it is cold."""
+        self._ensure_loaded()
+        profile = self._profiles.get(user_id)
+        now = time.time() if now is None else now
+        if profile is None or now - profile.built_at > self.baseline_seconds:
+            self.stats["misses"] += 1
+            return None
+        self._profiles.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return profile
+
+    def put(self, profile: UserBehaviorProfile):
+        self._ensure_loaded()
+        self._profiles[profile.user_id] = profile
+        self._profiles.move_to_end(profile.user_id)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def observe(self, user_id: str, event_type: str, timestamp: Optional[float] = None,
+                source_ip: Optional[str] = None, user_agent: Optional[str] = None,
+                resource: Optional[str] = None):
+        """Apply an audit event to the user's profile if it is resident."""
+        self._ensure_loaded()
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            return  # Cold profiles are rebuilt from audit_logs, which has this event
+        timestamp = time.time() if timestamp is None else timestamp
+        profile.observe(event_type, timestamp, source_ip, user_agent, resource)
+        self.stats["events_applied"] += 1
+        self._maybe_checkpoint(timestamp)
+
+    def _maybe_checkpoint(self, now: float):
+        if (not self.checkpoint_path or now - self._last_checkpoint < self.checkpoint_interval
+                or (self._checkpoint_task is not None and not self._checkpoint_task.done())):
+            return
+        self._last_checkpoint = now
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.checkpoint()
+            return
+        # Snapshot on the loop thread, pickle and write off it
+        snapshot = self._snapshot()
+        self._checkpoint_task = loop.run_in_executor(None, self._write, snapshot, self.checkpoint_path)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": time.time(),
+            "sketch": (self.sketch_width, self.sketch_depth, self.max_known, self.baseline_seconds),
+            "profiles": [
+                (p.user_id, p.built_at, p.updated_at, p.events, p.logins, p.off_hours_logins,
+                 p.hours.tobytes(), p.days.tobytes(), p.ips.table.tobytes(), p.known_ips.hashes.tobytes(),
+                 p.agents.hashes.tobytes(),
+                 p.resources.table.tobytes(), p.resources.landmark, p.top_ip, p.top_ip_count)
+                for p in self._profiles.values()
+            ],
+        }
+
+    def _write(self, snapshot: Dict[str, Any], path: str):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.stats["checkpoints"] += 1
+        except Exception as e:
+            logger.error(f"Failed to checkpoint behavior profiles: {str(e)}")
+
+    def checkpoint(self, path: Optional[str] = None):
+        """Write all resident profiles to ``path`` (default checkpoint path)."""
+        path = path or self.checkpoint_path
+        if path:
+            self._write(self._snapshot(), path)
+
+    def load(self, path: str) -> int:
+        """Restore profiles from a recent checkpoint; returns how many were loaded."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load behavior profile checkpoint: {str(e)}")
+            return 0
+        if (snapshot.get("version") != CHECKPOINT_VERSION
+                or snapshot.get("sketch") != (self.sketch_width, self.sketch_depth, self.max_known,
+                                              self.baseline_seconds)
+                or time.time() - snapshot.get("saved_at", 0) > self.max_checkpoint_age):
+            return 0  # Layout changed or too many events missed; rebuild on demand
+
+        loaded = 0
+        for (user_id, built_at, updated_at, events, logins, off_hours, hours, days,
+             ips, known_ips, agents, resources, landmark, top_ip, top_ip_count) in snapshot["profiles"]:
+            profile = self.new_profile(user_id, built_at)
+            profile.updated_at = updated_at
+            profile.events, profile.logins, profile.off_hours_logins = events, logins, off_hours
+            profile.hours = array("I", hours)
+            profile.days = array("I", days)
+            profile.ips.table = array("I", ips)
+            profile.known_ips.hashes = array("Q", known_ips)
+            profile.agents.hashes = array("Q", agents)
+            profile.resources.table = array("f", resources)
+            profile.resources.landmark = landmark
+            profile.top_ip, profile.top_ip_count = top_ip, top_ip_count
+            self._profiles[user_id] = profile
+            loaded += 1
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        self._last_checkpoint = snapshot["saved_at"]
+        return loaded
+
+    def memory_bytes(self) -> int:
+        sample = next(iter(self._profiles.values()), None)
+        return sample.memory_bytes() * len(self._profiles) if sample else 0
+
+
+# Global store fed by the audit logger and read by BehaviorAnalyzer
+behavior_profiles = BehaviorProfileStore()
@@ -0,0 +1,288 @@
+"""
+SecureNet CPE 2.3 Matching
+
+CPE-based device/CVE matching for the CVE mirror and ``CVEIntegration``:
+- ``parse_cpe`` reads the CPE 2.3 formatted string binding (``cpe:2.3:``
+  plus 11 attributes) honouring ``\\``-escaped characters, so a product such
+  as ``big-ip_access_policy_manager`` or a version like ``1.0\\:beta`` is read
+  as one attribute instead of being split on every colon
+- every cpeMatch entry becomes a version interval: a fixed CPE version is a
+  point, ``versionStart*`` / ``versionEnd*`` give (half-)open bounds, ``*``
+  and ``-`` without bounds match any version
+- ``ProductIndex`` compiles the intervals of one (vendor, product) into a
+  sorted array of boundary versions and a segment tree over the elementary
+  segments between them: each entry is stored at O(log n) tree nodes, so
+  building is O(n log n) however many ranges overlap, and a version lookup
+  is one ``bisect`` plus a leaf-to-root walk
+- ``resolve_device`` maps device name/type tokens to the CPE products they
+  identify (a FortiGate runs ``fortinet:fortios``); a bare vendor name
+  falls back to that vendor's platform products instead of every CVE the
+  vendor has
+"""
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+ANY = "*"
+NA = "-"
+PARTS = ("a", "h", "o")
+# NVD cpeMatch key -> cve_cpe_matches column
+RANGE_KEYS = {
+    "versionStartIncluding": "version_start_including",
+    "versionStartExcluding": "version_start_excluding",
+    "versionEndIncluding": "version_end_including",
+    "versionEndExcluding": "version_end_excluding",
+}
+
+# How a device's CPE products were identified
+PRODUCT = "product"    # the name or type names the product (fortigate, junos, nexus)
+PLATFORM = "platform"  # only the vendor is known; its platform products are assumed
+
+_TOKEN_SPLIT = re.compile(r"[^a-z0-9]+")
+_VERSION_SPLIT = re.compile(r"[^A-Za-z0-9]+|(?<=\d)(?=[A-Za-z])|(?<=[A-Za-z])(?=\d)")
+_MODEL = re.compile(r"^([a-z]+)\d+[a-z]*$")
+
+# version key of the lower bound, lower inclusive, upper bound, upper inclusive; None: unbounded
+Interval = Tuple[Optional[Tuple], bool, Optional[Tuple], bool]
+
+
+class CPE(NamedTuple):
+    """The 11 attributes of a CPE 2.3 name, lower-cased and unescaped"""
+    part: str
+    vendor: str
+    product: str
+    version: str = ANY
+    update: str = ANY
+    edition: str = ANY
+    language: str = ANY
+    sw_edition: str = ANY
+    target_sw: str = ANY
+    target_hw: str = ANY
+    other: str = ANY
+
+
+def parse_cpe(value: str) -> CPE:
+    """Parse a ``cpe:2.3:...`` formatted string; raises ``ValueError`` when it is not one"""
+    if not value.lower().startswith("cpe:2.3:"):
+        raise ValueError(f"Not a CPE 2.3 formatted string: {value!r}")
+    fields, current, escaped = [], [], False
+    for char in value[8:]:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ":":
+            fields.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    fields.append("".join(current))
+    if len(fields) != 11 or fields[0].lower() not in PARTS + (ANY,) or not fields[1] or not fields[2]:
+        raise ValueError(f"Malformed CPE 2.3 name: {value!r}")
+    return CPE(*(field.lower() or ANY for field in fields))
+
+
+def tokens(value: str) -> List[str]:
+    """Index tokens for a vendor or product name: the name itself plus its parts"""
+    value = value.lower().replace("\\", "")
+    parts = [part for part in _TOKEN_SPLIT.split(value) if len(part) > 1]
+    return list(dict.fromkeys([value] + parts))
+
+
+def version_key(version: str) -> Tuple:
+    """
+    Sort key for dotted versions: numeric parts compare as numbers, others as
+    text; trailing zero parts are dropped so ``17.3`` equals ``17.3.0``
+    """
+    key = [(0, int(part), "") if part.isdigit() else (1, 0, part.lower())
+           for part in _VERSION_SPLIT.split(version) if part]
+    while key and key[-1] == (0, 0, ""):
+        key.pop()
+    return tuple(key)
+
+
+def match_interval(match: Dict) -> Optional[Interval]:
+    """The versions a cpeMatch entry (``cve_cpe_matches`` columns) covers; ``None`` for any version"""
+    start_inc, start_exc, end_inc, end_exc = (match.get(column) for column in RANGE_KEYS.values())
+    if not (start_inc or start_exc or end_inc or end_exc):
+        version = match.get("version")
+        if version in (None, ANY, NA, ""):
+            return None
+        key = version_key(version)
+        return key, True, key, True
+    low = start_inc or start_exc
+    high = end_inc or end_exc
+    return (version_key(low) if low else None, bool(start_inc),
+            version_key(high) if high else None, bool(end_inc))
+
+
+def in_interval(key: Tuple, interval: Optional[Interval]) -> bool:
+    if interval is None:
+        return True
+    low, low_inclusive, high, high_inclusive = interval
+    return ((low is None or key > low or (low_inclusive and key == low))
+            and (high is None or key < high or (high_inclusive and key == high)))
+
+
+class ProductIndex:
+    """
+    Version intervals of one (vendor, product). ``points`` holds every bound
+    in order; segment ``2i + 1`` is the single version ``points[i]`` and
+    segment ``2i`` the open gap below it. An entry covering segments
+    ``first..last`` is stored at the canonical nodes of that range in a
+    segment tree (``nodes``, keyed by heap index with leaves at ``leaves``),
+    and a segment's entries are those on its path to the root.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, Optional[Interval]]]):
+        entries = list(entries)
+        self.entries = tuple(entry for entry, _ in entries)
+        self.unbounded = tuple(entry for entry, interval in entries if interval is None)
+        bounded = [(entry, interval) for entry, interval in entries if interval is not None]
+        self.points = sorted({bound for _, (low, _, high, _) in bounded for bound in (low, high) if bound is not None})
+        segment_count = 2 * len(self.points) + 1
+        self.leaves = 1 << (segment_count - 1).bit_length()
+        self.nodes: Dict[int, List[int]] = defaultdict(list)
+        for entry, (low, low_inclusive, high, high_inclusive) in bounded:
+            first = 0 if low is None else 2 * bisect_left(self.points, low) + (1 if low_inclusive else 2)
+            last = segment_count - 1 if high is None else 2 * bisect_left(self.points, high) + (1 if high_inclusive else 0)
+            left, right = first + self.leaves, last + self.leaves + 1
+            while left < right:
+                if left & 1:
+                    self.nodes[left].append(entry)
+                    left += 1
+                if right & 1:
+                    right -= 1
+                    self.nodes[right].append(entry)
+                left >>= 1
+                right >>= 1
+        self.nodes = dict(self.nodes)
+
+    def lookup(self, version: str) -> Tuple[int, ...]:
+        """Entries whose bounds contain ``version`` (entries without bounds are ``unbounded``)"""
+        key = version_key(version)
+        i = bisect_left(self.points, key)
+        node = (2 * i + 1 if i < len(self.points) and self.points[i] == key else 2 * i) + self.leaves
+        found = []
+        while node:
+            found.extend(self.nodes.get(node, ()))
+            node >>= 1
+        return tuple(sorted(found))
+
+
+class CPEHit(NamedTuple):
+    match: Dict
+    version_matched: bool  # the device version fell inside the entry's explicit bounds
+
+
+class CPEMatcher:
+    """Vulnerable cpeMatch entries grouped per (vendor, product), with compiled version intervals"""
+
+    def __init__(self, matches: Iterable[Dict]):
+        self.matches: List[Dict] = []
+        intervals = defaultdict(list)
+        for match in matches:
+            if not match.get("vulnerable", True):
+                continue
+            intervals[(match["vendor"], match["product"])].append((len(self.matches), match_interval(match)))
+            self.matches.append(match)
+        self.products = {key: ProductIndex(entries) for key, entries in intervals.items()}
+
+    def lookup(self, vendor: str, product: str, version: Optional[str] = None) -> List[CPEHit]:
+        """Entries for the product that apply to ``version`` (all of them when it is unknown)"""
+        index = self.products.get((vendor, product))
+        if index is None:
+            return []
+        if not version:
+            return [CPEHit(self.matches[entry], False) for entry in index.entries]
+        return ([CPEHit(self.matches[entry], False) for entry in index.unbounded] +
+                [CPEHit(self.matches[entry], True) for entry in index.lookup(version)])
+
+
+def device_hits(products: Iterable[Tuple[str, str]], version: Optional[str], matches: Iterable[Dict]) -> List[Dict]:
+    """The cpeMatch entries (e.g. of one CVE) that apply to these products and version, with ``version_matched``"""
+    matcher = CPEMatcher(matches)
+    return [dict(hit.match, version_matched=hit.version_matched)
+            for vendor, product in products for hit in matcher.lookup(vendor, product, version)]
+
+
+class DeviceProfile(NamedTuple):
+    vendor: str                          # CVEIntegration vendor key
+    products: Tuple[Tuple[str, str], ...]  # CPE (vendor, product)
+    evidence: str                        # PRODUCT or PLATFORM
+
+
+# Device name/type keyword -> (vendor key, CPE products it names)
+DEVICE_KEYWORDS: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...]]] = {
+    "cisco": ("cisco", ()),
+    "ios": ("cisco", (("cisco", "ios"), ("cisco", "ios_xe"))),
+    "ios_xe": ("cisco", (("cisco", "ios_xe"),)),
+    "catalyst": ("cisco", (("cisco", "ios"), ("cisco", "ios_xe"))),
+    "nx_os": ("cisco", (("cisco", "nx-os"),)),
+    "nexus": ("cisco", (("cisco", "nx-os"),)),
+    "asa": ("cisco", (("cisco", "adaptive_security_appliance_software"),)),
+    "fortinet": ("fortinet", ()),
+    "fortigate": ("fortinet", (("fortinet", "fortios"),)),
+    "fortios": ("fortinet", (("fortinet", "fortios"),)),
+    "fortianalyzer": ("fortinet", (("fortinet", "fortianalyzer"),)),
+    "fortimanager": ("fortinet", (("fortinet", "fortimanager"),)),
+    "palo_alto": ("palo_alto", ()),
+    "paloalto": ("palo_alto", ()),
+    "pan_os": ("palo_alto", (("paloaltonetworks", "pan-os"),)),
+    "panorama": ("palo_alto", (("paloaltonetworks", "pan-os"),)),
+    "globalprotect": ("palo_alto", (("paloaltonetworks", "globalprotect"),)),
+    "juniper": ("juniper", ()),
+    "junos": ("juniper", (("juniper", "junos"),)),
+    "mikrotik": ("mikrotik", ()),
+    "routeros": ("mikrotik", (("mikrotik", "routeros"),)),
+    "routerboard": ("mikrotik", (("mikrotik", "routeros"),)),
+    "ubiquiti": ("ubiquiti", ()),
+    "unifi": ("ubiquiti", (("ui", "unifi_network_application"),)),
+    "edgerouter": ("ubiquiti", (("ui", "edgeos"),)),
+    "airmax": ("ubiquiti", (("ui", "airos"),)),
+}
+# Model names: letters followed by a number (srx340, mx480, asa5506)
+MODEL_KEYWORDS = {
+    "srx": ("juniper", (("juniper", "junos"),)),
+    "mx": ("juniper", (("juniper", "junos"),)),
+    "ex": ("juniper", (("juniper", "junos"),)),
+    "asa": DEVICE_KEYWORDS["asa"],
+}
+# What a device from the vendor most likely runs when the name only names the vendor
+PLATFORM_PRODUCTS = {
+    "cisco": (("cisco", "ios"), ("cisco", "ios_xe")),
+    "fortinet": (("fortinet", "fortios"),),
+    "palo_alto": (("paloaltonetworks", "pan-os"),),
+    "juniper": (("juniper", "junos"),),
+    "mikrotik": (("mikrotik", "routeros"),),
+    "ubiquiti": (("ui", "edgeos"), ("ui", "airos")),
+}
+
+
+def device_tokens(text: str) -> List[str]:
+    """Words of a device name/type plus adjacent pairs joined by ``_`` (``PAN-OS`` -> ``pan``, ``os``, ``pan_os``)"""
+    words = [word for word in _TOKEN_SPLIT.split(text.lower()) if word]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def resolve_device(name: str, device_type: str = "") -> Optional[DeviceProfile]:
+    """The CPE products a device's name and type identify, or ``None`` for an unknown vendor"""
+    vendor = None
+    products: List[Tuple[str, str]] = []
+    for token in device_tokens(f"{name} {device_type}"):
+        entry = DEVICE_KEYWORDS.get(token)
+        if entry is None:
+            model = _MODEL.match(token)
+            entry = MODEL_KEYWORDS.get(model.group(1)) if model else None
+        if entry is None or (vendor and entry[0] != vendor):
+            continue
+        vendor = entry[0]
+        products += entry[1]
+    if vendor is None:
+        return None
+    if products:
+        return DeviceProfile(vendor, tuple(dict.fromkeys(products)), PRODUCT)
+    return DeviceProfile(vendor, PLATFORM_PRODUCTS.get(vendor, ()), PLATFORM)
@@ -8,23 +8,33 @@ to provide real-time CVE data for enhanced security analysis of network devices.
 
 Features:
 - Real-time CVE data fetching from NVD API 2.0
-- Device-specific vulnerability mapping
+- Local CVE mirror (NVD feed import + lastModified deltas) for offline,
+  indexed device matching
+- Device-specific vulnerability mapping: device names resolve to CPE
+  products, matched against CPE 2.3 entries and their version ranges
+  (security/cpe.py), correlated per device fingerprint group with bulk
+  upserts (security/vuln_correlation.py)
 - CVSS scoring and risk assessment
 - AI-powered threat prioritization
 - Automated vulnerability reporting
 """
 
 import asyncio
-import aiohttp
 import json
 import logging
 import sqlite3
 import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, asdict
-from urllib.parse import urlencode
-import re
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Dict, Optional, Tuple
+from dataclasses import dataclass, asdict, field
+
+from security.cpe import DeviceProfile, device_hits, resolve_device
+from security.cve_mirror import CVEMirror, ensure_schema as ensure_mirror_schema, parse_cve_item
+from security.nvd_client import NVD_CVE_URL, NVDClientError, get_nvd_client
+from security.vuln_correlation import (
+    MIN_CONFIDENCE, SCORING_POOL_MIN, SCORING_WORKERS, affected_services, best_confidence,
+    device_fingerprint, load_devices, score_tasks
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -46,6 +56,7 @@ class CVEData:
     exploitability_score: Optional[float]
     impact_score: Optional[float]
     is_kev: bool = False  # CISA Known Exploited Vulnerabilities
+    cpe_matches: List[Dict] = field(default_factory=list)  # cpeMatch entries with version bounds
     
 @dataclass
 class DeviceVulnerability:
@@ -72,53 +83,28 @@ class CVEIntegration:
     def __init__(self, api_key: Optional[str] = None, db_path: str = "data/securenet.db"):
         self.api_key = api_key
         self.db_path = db_path
-        self.base_url = "https://services.nvd.nist.gov/rest/json/cves/2.0"
-        self.rate_limit_delay = 0.6 if api_key else 6.0  # API key allows faster requests
-        self.last_request_time = 0
-        
-        # Device fingerprinting patterns for CVE mapping
-        self.device_patterns = {
-            'cisco': [
-                r'cisco',
-                r'ios',
-                r'nx-os',
-                r'asa',
-                r'catalyst',
-                r'nexus'
-            ],
-            'fortinet': [
-                r'fortinet',
-                r'fortigate',
-                r'fortios',
-                r'fortianalyzer',
-                r'fortimanager'
-            ],
-            'palo_alto': [
-                r'palo\s*alto',
-                r'pan-os',
-                r'panorama',
-                r'globalprotect'
-            ],
-            'juniper': [
-                r'juniper',
-                r'junos',
-                r'srx',
-                r'mx\d+',
-                r'ex\d+'
-            ],
-            'mikrotik': [
-                r'mikrotik',
-                r'routeros',
-                r'routerboard'
-            ],
-            'ubiquiti': [
-                r'ubiquiti',
-                r'unifi',
-                r'edgerouter',
-                r'airmax'
-            ]
+        self.base_url = NVD_CVE_URL
+        # Shared per API key: one session, rate limit, response cache and in-flight table per process
+        self.client = get_nvd_client(api_key, self.base_url)
+        
+        # CPE vendor names for each vendor key (security.cpe.DEVICE_KEYWORDS)
+        self.cpe_vendors = {
+            'cisco': ['cisco'],
+            'fortinet': ['fortinet'],
+            'palo_alto': ['paloaltonetworks'],
+            'juniper': ['juniper'],
+            'mikrotik': ['mikrotik'],
+            'ubiquiti': ['ui', 'ubiquiti']
         }
         
+        # Local CVE mirror; device matching uses it once it holds data
+        self.mirror = CVEMirror(db_path)
+        self._mirror_ready = False
+        
+        # Confidence scoring moves to a process pool above this much work
+        self.scoring_workers = SCORING_WORKERS
+        self.scoring_pool_min = SCORING_POOL_MIN
+        
         # Initialize database tables
         self._init_cve_tables()
     
@@ -128,25 +114,8 @@ class CVEIntegration:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            # CVE data table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS cve_data (
-                    cve_id TEXT PRIMARY KEY,
-                    description TEXT,
-                    cvss_v3_score REAL,
-                    cvss_v3_severity TEXT,
-                    cvss_v3_vector TEXT,
-                    published_date TEXT,
-                    last_modified TEXT,
-                    cwe_ids TEXT,
-                    affected_products TEXT,
-                    reference_urls TEXT,
-                    exploitability_score REAL,
-                    impact_score REAL,
-                    is_kev BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # CVE data table and the mirror's CPE match / token indexes
+            ensure_mirror_schema(cursor)
             
             # Device vulnerabilities table
             cursor.execute("""
@@ -181,6 +150,20 @@ class CVEIntegration:
                 )
             """)
             
+            # One finding per device and CVE, so scans upsert instead of appending duplicates
+            try:
+                cursor.execute("""
+                    DELETE FROM device_vulnerabilities WHERE id NOT IN (
+                        SELECT MAX(id) FROM device_vulnerabilities GROUP BY device_ip, cve_id
+                    )
+                """)
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_device_vulnerabilities_device_cve
+                    ON device_vulnerabilities (device_ip, cve_id)
+                """)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"device_vulnerabilities has no device_ip column, findings cannot be upserted: {e}")
+            
             conn.commit()
             conn.close()
             logger.info("CVE database tables initialized successfully")
@@ -188,117 +171,17 @@ class CVEIntegration:
         except Exception as e:
             logger.error(f"Failed to initialize CVE tables: {e}")
     
-    async def _rate_limit(self):
-        """Implement rate limiting for API requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_delay:
-            sleep_time = self.rate_limit_delay - time_since_last
-            await asyncio.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
-    
     async def _make_api_request(self, params: Dict) -> Optional[Dict]:
-        """Make authenticated request to NVD API"""
-        await self._rate_limit()
-        
-        headers = {
-            'User-Agent': 'SecureNet-CVE-Integration/2.1.0'
-        }
-        
-        if self.api_key:
-            headers['apiKey'] = self.api_key
-        
-        url = f"{self.base_url}?{urlencode(params)}"
-        
+        """Make authenticated request to NVD API (rate-limited, cached and coalesced by the client)"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    elif response.status == 403:
-                        logger.error("API key invalid or rate limit exceeded")
-                        return None
-                    else:
-                        logger.error(f"API request failed: {response.status}")
-                        return None
-                        
+            return await self.client.get(params)
         except Exception as e:
             logger.error(f"API request error: {e}")
             return None
     
     def _parse_cve_data(self, cve_item: Dict) -> CVEData:
         """Parse CVE data from NVD API response"""
-        cve = cve_item.get('cve', {})
-        
-        # Extract basic info
-        cve_id = cve.get('id', '')
-        descriptions = cve.get('descriptions', [])
-        description = descriptions[0].get('value', '') if descriptions else ''
-        
-        # Extract CVSS v3 metrics
-        metrics = cve.get('metrics', {})
-        cvss_v3 = None
-        cvss_v3_score = None
-        cvss_v3_severity = None
-        cvss_v3_vector = None
-        exploitability_score = None
-        impact_score = None
-        
-        if 'cvssMetricV31' in metrics:
-            cvss_v3 = metrics['cvssMetricV31'][0]['cvssData']
-        elif 'cvssMetricV30' in metrics:
-            cvss_v3 = metrics['cvssMetricV30'][0]['cvssData']
-        
-        if cvss_v3:
-            cvss_v3_score = cvss_v3.get('baseScore')
-            cvss_v3_severity = cvss_v3.get('baseSeverity')
-            cvss_v3_vector = cvss_v3.get('vectorString')
-            exploitability_score = cvss_v3.get('exploitabilityScore')
-            impact_score = cvss_v3.get('impactScore')
-        
-        # Extract CWE IDs
-        weaknesses = cve.get('weaknesses', [])
-        cwe_ids = []
-        for weakness in weaknesses:
-            for desc in weakness.get('description', []):
-                if desc.get('value', '').startswith('CWE-'):
-                    cwe_ids.append(desc['value'])
-        
-        # Extract affected products from configurations
-        affected_products = []
-        configurations = cve.get('configurations', [])
-        for config in configurations:
-            for node in config.get('nodes', []):
-                for cpe_match in node.get('cpeMatch', []):
-                    criteria = cpe_match.get('criteria', '')
-                    if criteria:
-                        affected_products.append(criteria)
-        
-        # Extract references
-        references = []
-        for ref in cve.get('references', []):
-            references.append(ref.get('url', ''))
-        
-        # Check if it's a CISA KEV
-        is_kev = any('cisaExploitAdd' in str(cve_item) for _ in [1])
-        
-        return CVEData(
-            cve_id=cve_id,
-            description=description,
-            cvss_v3_score=cvss_v3_score,
-            cvss_v3_severity=cvss_v3_severity,
-            cvss_v3_vector=cvss_v3_vector,
-            published_date=cve.get('published', ''),
-            last_modified=cve.get('lastModified', ''),
-            cwe_ids=cwe_ids,
-            affected_products=affected_products,
-            references=references,
-            exploitability_score=exploitability_score,
-            impact_score=impact_score,
-            is_kev=is_kev
-        )
+        return CVEData(**parse_cve_item(cve_item))
     
     async def search_cves_by_keyword(self, keyword: str, limit: int = 100) -> List[CVEData]:
         """Search CVEs by keyword (vendor, product, etc.)"""
@@ -373,20 +256,131 @@ class CVEIntegration:
         
         return cves
     
+    def _mirror_available(self) -> bool:
+        if not self._mirror_ready:
+            self._mirror_ready = self.mirror.count() > 0
+        return self._mirror_ready
+    
+    def search_local_cves(self, vendor: str, product_terms: Iterable[str] = (),
+                          version: Optional[str] = None) -> List[CVEData]:
+        """CVEs for a vendor (optionally product terms / version) from the local mirror, no API call"""
+        records = self.mirror.lookup(self.cpe_vendors.get(vendor, [vendor]), product_terms, version)
+        return [self._cve_from_record(record) for record in records]
+    
+    def _cve_from_record(self, record: Dict) -> CVEData:
+        return CVEData(
+            cve_id=record['cve_id'],
+            description=record['description'],
+            cvss_v3_score=record['cvss_v3_score'],
+            cvss_v3_severity=record['cvss_v3_severity'],
+            cvss_v3_vector=record['cvss_v3_vector'],
+            published_date=record['published_date'],
+            last_modified=record['last_modified'],
+            cwe_ids=record['cwe_ids'],
+            affected_products=record['affected_products'],
+            references=record['reference_urls'],
+            exploitability_score=record['exploitability_score'],
+            impact_score=record['impact_score'],
+            is_kev=record['is_kev'],
+            cpe_matches=record['matched_cpes']
+        )
+    
+    async def search_cves_by_cpe(self, vendor: str, product: str, limit: int = 2000) -> List[CVEData]:
+        """CVEs the NVD lists for a CPE vendor/product, any version"""
+        params = {
+            'virtualMatchString': f'cpe:2.3:*:{vendor}:{product}',
+            'resultsPerPage': min(limit, 2000),
+            'startIndex': 0
+        }
+        response = await self._make_api_request(params)
+        if not response:
+            return []
+        
+        cves = []
+        for vulnerability in response.get('vulnerabilities', []):
+            try:
+                cves.append(self._parse_cve_data(vulnerability))
+            except Exception as e:
+                logger.error(f"Error parsing CVE data: {e}")
+        return cves
+    
+    async def _match_device_cves(self, products: Tuple[Tuple[str, str], ...],
+                                 version: Optional[str] = None) -> List[CVEData]:
+        """
+        CVEs with a vulnerable CPE entry for one of the products that applies
+        to ``version``; ``cpe_matches`` holds those entries with ``version_matched``
+        """
+        if await asyncio.to_thread(self._mirror_available):
+            # Building a vendor's matcher reads and compiles all its entries: keep it off the loop
+            records = await asyncio.to_thread(self.mirror.match_products, products, version)
+            return [self._cve_from_record(record) for record in records]
+        
+        found = await asyncio.gather(*(self.search_cves_by_cpe(vendor, product) for vendor, product in products),
+                                     return_exceptions=True)
+        cves: Dict[str, CVEData] = {}
+        for (vendor, product), result in zip(products, found):
+            if isinstance(result, BaseException):
+                logger.error(f"CVE search failed for {vendor}:{product}: {result}")
+                continue
+            for cve in result:
+                if cve.cve_id not in cves:
+                    cve.cpe_matches = device_hits(products, version, cve.cpe_matches)
+                    if cve.cpe_matches:
+                        cves[cve.cve_id] = cve
+        return sorted(cves.values(), key=lambda cve: (-(cve.cvss_v3_score or 0.0), cve.cve_id))
+    
+    def import_cve_feeds(self, paths: Iterable[str]) -> Dict[str, int]:
+        """Bulk-import NVD JSON 2.0 feed files into the local mirror"""
+        results = self.mirror.import_feed(paths)
+        self._mirror_ready = False
+        return results
+    
+    async def sync_cve_mirror(self, page_size: int = 2000) -> Dict:
+        """Pull CVEs modified since the last completed sync from the NVD API"""
+        # A window is [start, end]; only a fully paged window moves the cursor, since pages
+        # are not ordered by lastModified. An interrupted window is retried unchanged, so the
+        # client resumes its pagination.
+        window = self.mirror.get_state('sync_window')
+        if window:
+            start, end = (datetime.fromisoformat(value) for value in json.loads(window))
+        else:
+            since = self.mirror.get_state('sync_cursor') or self.mirror.last_modified()
+            if not since:
+                logger.warning("CVE mirror is empty; import the NVD feeds first (python -m security.cve_mirror)")
+                return {'status': 'empty', 'imported': 0, 'last_modified': None}
+            start, end = datetime.fromisoformat(since[:23]), None
+        
+        sync_end = datetime.now(timezone.utc).replace(tzinfo=None)
+        imported = 0
+        while start < sync_end:
+            # The API accepts lastModified windows of at most 120 days
+            end = end or min(start + timedelta(days=120), sync_end)
+            self.mirror.set_state('sync_window', json.dumps([start.isoformat(), end.isoformat()]))
+            params = {
+                'lastModStartDate': start.strftime('%Y-%m-%dT%H:%M:%S.000'),
+                'lastModEndDate': end.strftime('%Y-%m-%dT%H:%M:%S.000')
+            }
+            try:
+                async for page in self.client.iter_pages(params, page_size):
+                    imported += self.mirror.import_items(page.get('vulnerabilities', []))
+            except NVDClientError as e:
+                logger.error(f"CVE mirror sync interrupted: {e}")
+                return {'status': 'partial', 'imported': imported, 'last_modified': self.mirror.last_modified()}
+            self.mirror.set_state('sync_cursor', end.isoformat())
+            self.mirror.set_state('sync_window', None)
+            start, end = end, None
+        
+        logger.info(f"CVE mirror sync imported {imported} modified CVEs")
+        return {'status': 'completed', 'imported': imported, 'last_modified': self.mirror.last_modified()}
+    
+    def _device_profile(self, device_info: Dict) -> Optional[DeviceProfile]:
+        """CPE products the device's name and type identify"""
+        return resolve_device(device_info.get('name', ''), device_info.get('type', ''))
+    
     def _identify_device_vendor(self, device_info: Dict) -> Optional[str]:
         """Identify device vendor from device information"""
-        device_name = device_info.get('name', '').lower()
-        device_type = device_info.get('type', '').lower()
-        
-        # Combine all device info for pattern matching
-        search_text = f"{device_name} {device_type}".lower()
-        
-        for vendor, patterns in self.device_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, search_text, re.IGNORECASE):
-                    return vendor
-        
-        return None
+        profile = self._device_profile(device_info)
+        return profile.vendor if profile else None
     
     def _calculate_risk_level(self, cvss_score: Optional[float], is_kev: bool = False) -> Tuple[str, int]:
         """Calculate risk level and remediation priority"""
@@ -408,237 +402,199 @@ class CVEIntegration:
             return "INFORMATIONAL", 5
     
     def _calculate_detection_confidence(self, device_info: Dict, cve_data: CVEData) -> float:
-        """Calculate confidence level for CVE-device mapping"""
-        confidence = 0.0
-        
-        device_name = device_info.get('name', '').lower()
-        device_type = device_info.get('type', '').lower()
-        
-        # Check if device vendor matches CVE affected products
-        vendor = self._identify_device_vendor(device_info)
-        if vendor:
-            for product in cve_data.affected_products:
-                if vendor in product.lower():
-                    confidence += 0.4
-                    break
-        
-        # Check for specific product matches
-        for product in cve_data.affected_products:
-            product_lower = product.lower()
-            if any(term in product_lower for term in [device_name, device_type]):
-                confidence += 0.3
-        
-        # Boost confidence for network infrastructure devices
-        if device_info.get('type', '').lower() in ['router', 'switch', 'firewall', 'access_point']:
-            confidence += 0.2
-        
-        # Boost confidence for devices with open ports matching common services
-        open_ports = device_info.get('open_ports', [])
-        if any(port in [22, 23, 80, 443, 161, 8080, 8443] for port in open_ports):
-            confidence += 0.1
-        
-        return min(confidence, 1.0)
+        """Calculate confidence level for CVE-device mapping from the CVE's CPE entries that match the device"""
+        profile = self._device_profile(device_info)
+        if not profile:
+            return 0.0
+        hits = device_hits(profile.products, device_info.get('version'), cve_data.cpe_matches)
+        return best_confidence(profile.evidence, device_info.get('type', ''), device_info.get('open_ports', []),
+                               [(hit['part'], hit['version_matched']) for hit in hits])
     
     async def analyze_device_vulnerabilities(self, device_info: Dict) -> List[DeviceVulnerability]:
         """Analyze vulnerabilities for a specific device"""
-        vendor = self._identify_device_vendor(device_info)
-        if not vendor:
+        profile = self._device_profile(device_info)
+        if not profile:
             logger.warning(f"Could not identify vendor for device {device_info.get('ip')}")
             return []
         
-        # Search for CVEs related to the device vendor
-        cves = await self.search_cves_by_keyword(vendor)
+        # CVEs whose CPE entries cover the device's products and version: locally when the mirror is populated
+        cves = await self._match_device_cves(profile.products, device_info.get('version'))
         
         vulnerabilities = []
         for cve in cves:
             confidence = self._calculate_detection_confidence(device_info, cve)
             
             # Only include CVEs with reasonable confidence
-            if confidence >= 0.3:
-                risk_level, priority = self._calculate_risk_level(
-                    cve.cvss_v3_score, 
-                    cve.is_kev
-                )
-                
-                # Identify affected services based on open ports
-                affected_services = []
-                open_ports = device_info.get('open_ports', [])
-                service_map = {
-                    22: 'SSH',
-                    23: 'Telnet',
-                    80: 'HTTP',
-                    443: 'HTTPS',
-                    161: 'SNMP',
-                    8080: 'HTTP-Alt',
-                    8443: 'HTTPS-Alt'
-                }
-                
-                for port in open_ports:
-                    if port in service_map:
-                        affected_services.append(service_map[port])
-                
-                vulnerability = DeviceVulnerability(
-                    device_ip=device_info.get('ip', ''),
-                    device_name=device_info.get('name', ''),
-                    device_type=device_info.get('type', ''),
-                    cve_id=cve.cve_id,
-                    severity=cve.cvss_v3_severity or 'UNKNOWN',
-                    score=cve.cvss_v3_score or 0.0,
-                    risk_level=risk_level,
-                    remediation_priority=priority,
-                    affected_services=affected_services,
-                    detection_confidence=confidence
-                )
-                
-                vulnerabilities.append(vulnerability)
+            if confidence >= MIN_CONFIDENCE:
+                vulnerabilities.append(self._device_vulnerability(device_info, cve, confidence))
         
         return vulnerabilities
     
+    def _device_vulnerability(self, device_info: Dict, cve: CVEData, confidence: float) -> DeviceVulnerability:
+        risk_level, priority = self._calculate_risk_level(cve.cvss_v3_score, cve.is_kev)
+        return DeviceVulnerability(
+            device_ip=device_info.get('ip', ''),
+            device_name=device_info.get('name', ''),
+            device_type=device_info.get('type', ''),
+            cve_id=cve.cve_id,
+            severity=cve.cvss_v3_severity or 'UNKNOWN',
+            score=cve.cvss_v3_score or 0.0,
+            risk_level=risk_level,
+            remediation_priority=priority,
+            affected_services=affected_services(device_info.get('open_ports', [])),
+            detection_confidence=confidence
+        )
+    
     def store_cve_data(self, cves: List[CVEData]):
         """Store CVE data in database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for cve in cves:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO cve_data (
-                        cve_id, description, cvss_v3_score, cvss_v3_severity,
-                        cvss_v3_vector, published_date, last_modified,
-                        cwe_ids, affected_products, reference_urls,
-                        exploitability_score, impact_score, is_kev
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    cve.cve_id,
-                    cve.description,
-                    cve.cvss_v3_score,
-                    cve.cvss_v3_severity,
-                    cve.cvss_v3_vector,
-                    cve.published_date,
-                    cve.last_modified,
-                    json.dumps(cve.cwe_ids),
-                    json.dumps(cve.affected_products),
-                    json.dumps(cve.references),
-                    cve.exploitability_score,
-                    cve.impact_score,
-                    cve.is_kev
-                ))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Stored {len(cves)} CVEs in database")
+            written = self.mirror.import_records(asdict(cve) for cve in cves)
+            self._mirror_ready = self._mirror_ready or written > 0
+            logger.info(f"Stored {written} new or updated CVEs of {len(cves)} in database")
             
         except Exception as e:
             logger.error(f"Failed to store CVE data: {e}")
     
-    def store_device_vulnerabilities(self, vulnerabilities: List[DeviceVulnerability]):
-        """Store device vulnerabilities in database"""
+    def store_device_vulnerabilities(self, vulnerabilities: List[DeviceVulnerability],
+                                     scanned_ips: Optional[Iterable[str]] = None):
+        """
+        Upsert device vulnerabilities in one transaction. With ``scanned_ips``,
+        findings of those devices that were not reported again are removed.
+        """
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
-            for vuln in vulnerabilities:
+            cursor.executemany("""
+                INSERT INTO device_vulnerabilities (
+                    device_ip, device_name, device_type, cve_id,
+                    severity, score, risk_level, remediation_priority,
+                    affected_services, detection_confidence
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(device_ip, cve_id) DO UPDATE SET
+                    device_name = excluded.device_name,
+                    device_type = excluded.device_type,
+                    severity = excluded.severity,
+                    score = excluded.score,
+                    risk_level = excluded.risk_level,
+                    remediation_priority = excluded.remediation_priority,
+                    affected_services = excluded.affected_services,
+                    detection_confidence = excluded.detection_confidence
+            """, [(
+                vuln.device_ip,
+                vuln.device_name,
+                vuln.device_type,
+                vuln.cve_id,
+                vuln.severity,
+                vuln.score,
+                vuln.risk_level,
+                vuln.remediation_priority,
+                json.dumps(vuln.affected_services),
+                vuln.detection_confidence
+            ) for vuln in vulnerabilities])
+            
+            removed = 0
+            if scanned_ips is not None:
+                cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_findings (device_ip TEXT, cve_id TEXT)")
+                cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_devices (device_ip TEXT PRIMARY KEY)")
+                cursor.executemany("INSERT INTO scan_findings VALUES (?, ?)",
+                                   [(vuln.device_ip, vuln.cve_id) for vuln in vulnerabilities])
+                cursor.executemany("INSERT OR IGNORE INTO scan_devices VALUES (?)", [(ip,) for ip in scanned_ips])
                 cursor.execute("""
-                    INSERT INTO device_vulnerabilities (
-                        device_ip, device_name, device_type, cve_id,
-                        severity, score, risk_level, remediation_priority,
-                        affected_services, detection_confidence
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    vuln.device_ip,
-                    vuln.device_name,
-                    vuln.device_type,
-                    vuln.cve_id,
-                    vuln.severity,
-                    vuln.score,
-                    vuln.risk_level,
-                    vuln.remediation_priority,
-                    json.dumps(vuln.affected_services),
-                    vuln.detection_confidence
-                ))
+                    DELETE FROM device_vulnerabilities
+                    WHERE device_ip IN (SELECT device_ip FROM scan_devices)
+                      AND NOT EXISTS (
+                          SELECT 1 FROM scan_findings f
+                          WHERE f.device_ip = device_vulnerabilities.device_ip
+                            AND f.cve_id = device_vulnerabilities.cve_id
+                      )
+                """)
+                removed = cursor.rowcount
             
             conn.commit()
             conn.close()
-            logger.info(f"Stored {len(vulnerabilities)} device vulnerabilities")
+            logger.info(f"Stored {len(vulnerabilities)} device vulnerabilities, removed {removed} resolved")
             
         except Exception as e:
             logger.error(f"Failed to store device vulnerabilities: {e}")
     
     async def full_vulnerability_scan(self) -> Dict:
-        """Perform comprehensive vulnerability scan of all network devices"""
+        """
+        Correlate all active network devices with known CVEs. Devices are
+        grouped by fingerprint so each group is looked up and scored once;
+        results include per-stage timings.
+        """
         start_time = time.time()
+        timings = {}
         
-        # Get all network devices from database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, type, status, last_seen, metadata 
-            FROM network_devices 
-            WHERE status = 'active'
-        """)
-        
-        devices = []
-        for row in cursor.fetchall():
-            # Extract IP address from metadata if available
-            metadata = json.loads(row[5]) if row[5] else {}
-            ip_address = metadata.get('ip_address', f'192.168.2.{row[0]}')  # Fallback IP
-            
-            devices.append({
-                'ip': ip_address,
-                'name': row[1] or 'Unknown',
-                'type': row[2] or 'Unknown',
-                'open_ports': metadata.get('open_ports', [22, 80, 443])  # Default common ports
-            })
+        def lap(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = round(now - since, 4)
+            return now
         
-        conn.close()
+        stage = time.perf_counter()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            devices, skipped = load_devices(conn)
+        finally:
+            conn.close()
+        stage = lap('load', stage)
         
         if not devices:
             logger.warning("No active devices found for vulnerability scanning")
             return {
                 'devices_scanned': 0,
+                'devices_skipped': skipped,
                 'vulnerabilities_found': 0,
                 'high_risk_count': 0,
                 'critical_count': 0,
-                'scan_duration': 0
+                'scan_duration': 0,
+                'stage_timings': timings
             }
         
         logger.info(f"Starting vulnerability scan for {len(devices)} devices")
         
-        all_vulnerabilities = []
-        high_risk_count = 0
-        critical_count = 0
-        
-        # Analyze each device
+        # Group devices by fingerprint; devices of unknown vendors have nothing to match
+        groups: Dict[Tuple, List[Dict]] = {}
         for device in devices:
-            try:
-                device_vulns = await self.analyze_device_vulnerabilities(device)
-                all_vulnerabilities.extend(device_vulns)
-                
-                # Count risk levels
-                for vuln in device_vulns:
-                    if vuln.risk_level == 'HIGH':
-                        high_risk_count += 1
-                    elif vuln.risk_level == 'CRITICAL':
-                        critical_count += 1
-                
-                logger.info(f"Found {len(device_vulns)} vulnerabilities for {device['ip']}")
-                
-            except Exception as e:
-                logger.error(f"Error analyzing device {device['ip']}: {e}")
-        
-        # Store all vulnerabilities
-        if all_vulnerabilities:
-            # Clear old vulnerabilities for these devices
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            device_ips = [d['ip'] for d in devices]
-            placeholders = ','.join(['?' for _ in device_ips])
-            cursor.execute(f"DELETE FROM device_vulnerabilities WHERE device_ip IN ({placeholders})", device_ips)
-            conn.commit()
-            conn.close()
-            
-            # Store new vulnerabilities
-            self.store_device_vulnerabilities(all_vulnerabilities)
+            profile = self._device_profile(device)
+            if profile:
+                groups.setdefault(device_fingerprint(profile, device), []).append(device)
+        stage = lap('group', stage)
+        
+        lookups = sorted({(profile.products, version) for profile, _, version, _ in groups},
+                         key=lambda key: (key[0], key[1] or ''))
+        found = await asyncio.gather(*(self._match_device_cves(products, version) for products, version in lookups))
+        candidates = dict(zip(lookups, found))
+        stage = lap('lookup', stage)
+        
+        # One scoring task per group
+        tasks, task_members, cve_index = [], [], {}
+        for (profile, device_type, version, ports), members in groups.items():
+            cves = candidates[(profile.products, version)]
+            if not cves:
+                continue
+            cve_index.update((cve.cve_id, cve) for cve in cves)
+            tasks.append((profile.evidence, device_type, ports, [
+                (cve.cve_id, [(match['part'], match['version_matched']) for match in cve.cpe_matches])
+                for cve in cves
+            ]))
+            task_members.append(members)
+        
+        scored = await score_tasks(tasks, self.scoring_workers, self.scoring_pool_min)
+        all_vulnerabilities = [
+            self._device_vulnerability(member, cve_index[cve_id], confidence)
+            for members, matches in zip(task_members, scored)
+            for cve_id, confidence in matches
+            for member in members
+        ]
+        high_risk_count = sum(1 for vuln in all_vulnerabilities if vuln.risk_level == 'HIGH')
+        critical_count = sum(1 for vuln in all_vulnerabilities if vuln.risk_level == 'CRITICAL')
+        stage = lap('score', stage)
+        
+        # Upsert findings and drop the ones the scanned devices no longer have
+        self.store_device_vulnerabilities(all_vulnerabilities, scanned_ips=[d['ip'] for d in devices])
+        lap('write', stage)
         
         scan_duration = time.time() - start_time
         
@@ -666,10 +622,13 @@ class CVEIntegration:
         
         results = {
             'devices_scanned': len(devices),
+            'devices_skipped': skipped,
+            'device_groups': len(groups),
             'vulnerabilities_found': len(all_vulnerabilities),
             'high_risk_count': high_risk_count,
             'critical_count': critical_count,
-            'scan_duration': scan_duration
+            'scan_duration': scan_duration,
+            'stage_timings': timings
         }
         
         logger.info(f"Vulnerability scan completed: {results}")
@@ -0,0 +1,437 @@
+"""
+SecureNet Local CVE Mirror
+
+A local copy of NVD CVE data in the ``cve_data`` table, so device matching
+runs as an indexed SQLite join, works offline, and does not wait on the NVD
+API rate limit (6 s per request without a key):
+- ``import_feed`` bulk-loads NVD JSON 2.0 files (``nvdcve-2.0-*.json`` or
+  ``.json.gz``: the yearly feeds, the ``modified`` feed, or saved API
+  responses). ``import_items`` takes API ``vulnerabilities`` pages for
+  ``lastModified`` deltas. A CVE is rewritten only when its ``lastModified``
+  is newer than the stored one, so replaying a feed costs one indexed lookup
+  per batch
+- each CVE's ``cpeMatch`` entries go to ``cve_cpe_matches``, indexed on
+  ``(vendor, product)``. The entries keep their ``versionStart*`` /
+  ``versionEnd*`` bounds. Vendor and product tokens (``catalyst_9300_firmware``
+  -> ``catalyst``, ``9300``, ``firmware``) go to the ``cve_cpe_tokens``
+  inverted index, so a device name can narrow a vendor's CVEs to a product
+  line
+- ``match_products`` answers device (vendor, product, version) queries from
+  per-vendor ``security.cpe.CPEMatcher`` indexes, compiled once per import
+- ``cve_mirror_state`` records the highest ``lastModified`` imported and the
+  delta sync window in progress
+
+``python -m security.cve_mirror FEED [FEED ...] --db data/securenet.db``
+imports feed files from the command line.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from security.cpe import (
+    RANGE_KEYS, CPEMatcher, in_interval, match_interval, parse_cpe, tokens, version_key
+)
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+LOOKUP_CACHE_SIZE = 1024
+
+CVE_COLUMNS = (
+    "cve_id", "description", "cvss_v3_score", "cvss_v3_severity", "cvss_v3_vector",
+    "published_date", "last_modified", "cwe_ids", "affected_products", "reference_urls",
+    "exploitability_score", "impact_score", "is_kev",
+)
+MATCH_COLUMNS = (
+    "cve_id", "criteria", "part", "vendor", "product", "version",
+    "version_start_including", "version_start_excluding",
+    "version_end_including", "version_end_excluding", "vulnerable",
+)
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cve_data (
+        cve_id TEXT PRIMARY KEY,
+        description TEXT,
+        cvss_v3_score REAL,
+        cvss_v3_severity TEXT,
+        cvss_v3_vector TEXT,
+        published_date TEXT,
+        last_modified TEXT,
+        cwe_ids TEXT,
+        affected_products TEXT,
+        reference_urls TEXT,
+        exploitability_score REAL,
+        impact_score REAL,
+        is_kev BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cve_data_last_modified ON cve_data(last_modified)",
+    """
+    CREATE TABLE IF NOT EXISTS cve_cpe_matches (
+        cve_id TEXT NOT NULL,
+        criteria TEXT NOT NULL,
+        part TEXT,
+        vendor TEXT NOT NULL,
+        product TEXT NOT NULL,
+        version TEXT,
+        version_start_including TEXT,
+        version_start_excluding TEXT,
+        version_end_including TEXT,
+        version_end_excluding TEXT,
+        vulnerable INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cve_cpe_matches_vendor_product ON cve_cpe_matches(vendor, product)",
+    "CREATE INDEX IF NOT EXISTS idx_cve_cpe_matches_cve ON cve_cpe_matches(cve_id)",
+    """
+    CREATE TABLE IF NOT EXISTS cve_cpe_tokens (
+        token TEXT NOT NULL,
+        cve_id TEXT NOT NULL,
+        PRIMARY KEY (token, cve_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cve_mirror_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+)
+
+
+def ensure_schema(cursor):
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+
+def version_in_range(version: str, match: Dict) -> bool:
+    """Whether ``version`` falls in one cpeMatch entry's version / range bounds"""
+    return in_interval(version_key(version), match_interval(match))
+
+
+def parse_cve_item(item: Dict) -> Dict:
+    """One NVD 2.0 ``vulnerabilities`` entry as a flat record, including its cpeMatch entries"""
+    cve = item.get('cve', item)
+
+    descriptions = cve.get('descriptions', [])
+    description = next((d.get('value', '') for d in descriptions if d.get('lang') == 'en'),
+                       descriptions[0].get('value', '') if descriptions else '')
+
+    metrics = cve.get('metrics', {})
+    metric, cvss_v3 = {}, {}
+    for key in ('cvssMetricV31', 'cvssMetricV30'):
+        if metrics.get(key):
+            metric = metrics[key][0]
+            cvss_v3 = metric['cvssData']
+            break
+
+    cwe_ids = [desc['value'] for weakness in cve.get('weaknesses', [])
+               for desc in weakness.get('description', []) if desc.get('value', '').startswith('CWE-')]
+
+    cpe_matches = []
+    for config in cve.get('configurations', []):
+        for node in config.get('nodes', []):
+            for cpe_match in node.get('cpeMatch', []):
+                criteria = cpe_match.get('criteria', '')
+                try:
+                    cpe = parse_cpe(criteria)
+                except ValueError:
+                    logger.debug(f"Skipping unparseable CPE {criteria!r} in {cve.get('id')}")
+                    continue
+                match = {'criteria': criteria, 'part': cpe.part, 'vendor': cpe.vendor, 'product': cpe.product,
+                         'version': cpe.version, 'vulnerable': cpe_match.get('vulnerable', True)}
+                match.update({column: cpe_match.get(key) for key, column in RANGE_KEYS.items()})
+                cpe_matches.append(match)
+
+    return {
+        'cve_id': cve.get('id', ''),
+        'description': description,
+        'cvss_v3_score': cvss_v3.get('baseScore'),
+        'cvss_v3_severity': cvss_v3.get('baseSeverity'),
+        'cvss_v3_vector': cvss_v3.get('vectorString'),
+        'published_date': cve.get('published', ''),
+        'last_modified': cve.get('lastModified', ''),
+        'cwe_ids': cwe_ids,
+        'affected_products': [match['criteria'] for match in cpe_matches],
+        'references': [ref.get('url', '') for ref in cve.get('references', [])],
+        # NVD 2.0 reports these next to cvssData, not inside it
+        'exploitability_score': metric.get('exploitabilityScore', cvss_v3.get('exploitabilityScore')),
+        'impact_score': metric.get('impactScore', cvss_v3.get('impactScore')),
+        # CISA Known Exploited Vulnerabilities carry cisaExploitAdd
+        'is_kev': 'cisaExploitAdd' in cve,
+        'cpe_matches': cpe_matches,
+    }
+
+
+def _open_feed(path: str):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def iter_feed_items(path: str) -> Iterator[Dict]:
+    """``vulnerabilities`` entries of an NVD JSON 2.0 feed file or saved API response"""
+    with _open_feed(path) as f:
+        document = json.load(f)
+    yield from document.get('vulnerabilities', [])
+
+
+def _cve_row(record: Dict) -> tuple:
+    values = dict(record, reference_urls=json.dumps(record['references']),
+                  cwe_ids=json.dumps(record['cwe_ids']),
+                  affected_products=json.dumps(record['affected_products']))
+    return tuple(values[column] for column in CVE_COLUMNS)
+
+
+def _batches(records: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _record(row: Sequence) -> Dict:
+    record = dict(zip(CVE_COLUMNS, row))
+    for column in ('cwe_ids', 'affected_products', 'reference_urls'):
+        record[column] = json.loads(record[column]) if record[column] else []
+    record['is_kev'] = bool(record['is_kev'])
+    record['matched_cpes'] = []
+    return record
+
+
+def _by_severity(records: Iterable[Dict]) -> List[Dict]:
+    return sorted(records, key=lambda r: (-(r['cvss_v3_score'] or 0.0), r['cve_id']))
+
+
+class CVEMirror:
+    """Bulk import into, and indexed device lookups against, the local CVE tables"""
+
+    def __init__(self, db_path: str = "data/securenet.db"):
+        self.db_path = db_path
+        self._cache: Dict[tuple, List[Dict]] = {}
+        self._matchers: Dict[str, CPEMatcher] = {}
+        # Matchers are built in worker threads; one build per vendor
+        self._matcher_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        ensure_schema(conn.cursor())
+        return conn
+
+    def upsert(self, conn: sqlite3.Connection, records: Sequence[Dict]) -> int:
+        """
+        Write parsed records that are new or newer than the stored copy, with
+        their match/token index entries; returns how many were written
+        """
+        stored = dict(conn.execute(
+            f"SELECT cve_id, last_modified FROM cve_data WHERE cve_id IN ({','.join('?' * len(records))})",
+            [record['cve_id'] for record in records]
+        ).fetchall()) if records else {}
+        latest: Dict[str, Dict] = {}
+        for record in records:
+            cve_id = record['cve_id']
+            if not cve_id or (cve_id in stored and (stored[cve_id] or '') >= record['last_modified']):
+                continue
+            if cve_id not in latest or latest[cve_id]['last_modified'] <= record['last_modified']:
+                latest[cve_id] = record
+        if not latest:
+            return 0
+
+        replaced = [(cve_id,) for cve_id in latest if cve_id in stored]
+        if replaced:
+            conn.executemany("DELETE FROM cve_cpe_matches WHERE cve_id = ?", replaced)
+            conn.executemany("DELETE FROM cve_cpe_tokens WHERE cve_id = ?", replaced)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO cve_data ({', '.join(CVE_COLUMNS)}) VALUES ({', '.join('?' * len(CVE_COLUMNS))})",
+            [_cve_row(record) for record in latest.values()]
+        )
+        conn.executemany(
+            f"INSERT INTO cve_cpe_matches ({', '.join(MATCH_COLUMNS)}) VALUES ({', '.join('?' * len(MATCH_COLUMNS))})",
+            [tuple(dict(match, cve_id=cve_id, vulnerable=int(bool(match['vulnerable'])))[column]
+                   for column in MATCH_COLUMNS)
+             for cve_id, record in latest.items() for match in record['cpe_matches']]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO cve_cpe_tokens (token, cve_id) VALUES (?, ?)",
+            {(f"{kind}:{token}", cve_id)
+             for cve_id, record in latest.items() for match in record['cpe_matches']
+             for kind in ('vendor', 'product') for token in tokens(match[kind])}
+        )
+        newest = max(record['last_modified'] for record in latest.values())
+        conn.execute("""
+            INSERT INTO cve_mirror_state (key, value) VALUES ('last_modified', ?)
+            ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)
+        """, (newest,))
+        return len(latest)
+
+    def import_records(self, records: Iterable[Dict], batch_size: int = IMPORT_BATCH_SIZE) -> int:
+        """Import parsed records (``parse_cve_item`` output) in batches, one transaction"""
+        written = 0
+        conn = self._connect()
+        try:
+            for batch in _batches(records, batch_size):
+                written += self.upsert(conn, batch)
+            conn.commit()
+        finally:
+            conn.close()
+        if written:
+            self._cache.clear()
+            self._matchers.clear()
+        return written
+
+    def import_items(self, items: Iterable[Dict], batch_size: int = IMPORT_BATCH_SIZE) -> int:
+        """Import raw NVD ``vulnerabilities`` entries (a feed or an API delta page)"""
+        return self.import_records((parse_cve_item(item) for item in items), batch_size)
+
+    def import_feed(self, paths: Iterable[str], batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, int]:
+        """Import NVD JSON 2.0 feed files; returns CVEs written per file"""
+        results = {}
+        for path in paths:
+            results[path] = self.import_items(iter_feed_items(path), batch_size)
+            logger.info(f"Imported {results[path]} CVEs from {path}")
+        return results
+
+    def get_state(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM cve_mirror_state WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def set_state(self, key: str, value: Optional[str]):
+        conn = self._connect()
+        try:
+            if value is None:
+                conn.execute("DELETE FROM cve_mirror_state WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT INTO cve_mirror_state (key, value) VALUES (?, ?) "
+                             "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def last_modified(self) -> Optional[str]:
+        """Highest ``lastModified`` imported"""
+        return self.get_state('last_modified')
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM cve_data").fetchone()[0]
+        finally:
+            conn.close()
+
+    def lookup(self, vendors: Iterable[str], product_terms: Iterable[str] = (),
+               version: Optional[str] = None) -> List[Dict]:
+        """
+        CVEs with a vulnerable CPE from one of ``vendors``; ``product_terms``
+        narrow to CPEs whose product shares a token, ``version`` to entries
+        whose version bounds contain it. Each result carries its
+        ``matched_cpes``.
+        """
+        vendors = tuple(sorted({vendor.lower() for vendor in vendors}))
+        terms = tuple(sorted({token for term in product_terms for token in tokens(term)}))
+        key = (vendors, terms, version)
+        if key in self._cache:
+            return self._cache[key]
+        if not vendors:
+            return []
+
+        sql = f"""
+            SELECT d.{', d.'.join(CVE_COLUMNS)}, m.{', m.'.join(MATCH_COLUMNS[1:])}
+            FROM cve_cpe_matches m JOIN cve_data d ON d.cve_id = m.cve_id
+            WHERE m.vendor IN ({','.join('?' * len(vendors))}) AND m.vulnerable = 1
+        """
+        params = list(vendors)
+        if terms:
+            sql += f" AND m.cve_id IN (SELECT cve_id FROM cve_cpe_tokens WHERE token IN ({','.join('?' * len(terms))}))"
+            params += [f"product:{term}" for term in terms]
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        results: Dict[str, Dict] = {}
+        width = len(CVE_COLUMNS)
+        for row in rows:
+            match = dict(zip(MATCH_COLUMNS[1:], row[width:]))
+            if terms and not set(tokens(match['product'])) & set(terms):
+                continue
+            if version is not None and not version_in_range(version, match):
+                continue
+            if row[0] not in results:
+                results[row[0]] = _record(row[:width])
+            results[row[0]]['matched_cpes'].append(match)
+
+        found = _by_severity(results.values())
+        if len(self._cache) >= LOOKUP_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = found
+        return found
+
+    def matcher(self, vendor: str) -> CPEMatcher:
+        """The vendor's vulnerable CPE entries with compiled per-product version intervals (cached until the next import)"""
+        matcher = self._matchers.get(vendor)
+        if matcher is not None:
+            return matcher
+        with self._matcher_lock:
+            matcher = self._matchers.get(vendor)
+            if matcher is None:
+                conn = self._connect()
+                try:
+                    rows = conn.execute(f"SELECT {', '.join(MATCH_COLUMNS)} FROM cve_cpe_matches "
+                                        "WHERE vendor = ? AND vulnerable = 1", (vendor,)).fetchall()
+                finally:
+                    conn.close()
+                matcher = self._matchers[vendor] = CPEMatcher(dict(zip(MATCH_COLUMNS, row)) for row in rows)
+        return matcher
+
+    def match_products(self, products: Iterable[Tuple[str, str]], version: Optional[str] = None) -> List[Dict]:
+        """
+        CVEs with a vulnerable entry for one of the CPE (vendor, product)
+        pairs that applies to ``version`` (every entry when it is unknown).
+        ``matched_cpes`` entries carry ``version_matched``: the version fell
+        inside explicit bounds rather than an any-version entry.
+        """
+        hits: Dict[str, List[Dict]] = {}
+        for vendor, product in products:
+            for hit in self.matcher(vendor).lookup(vendor, product, version):
+                hits.setdefault(hit.match['cve_id'], []).append(dict(hit.match, version_matched=hit.version_matched))
+        if not hits:
+            return []
+
+        records = []
+        conn = self._connect()
+        try:
+            for batch in _batches(hits, IMPORT_BATCH_SIZE):
+                for row in conn.execute(f"SELECT {', '.join(CVE_COLUMNS)} FROM cve_data "
+                                        f"WHERE cve_id IN ({','.join('?' * len(batch))})", batch):
+                    record = _record(row)
+                    record['matched_cpes'] = hits[record['cve_id']]
+                    records.append(record)
+        finally:
+            conn.close()
+        return _by_severity(records)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Import NVD JSON 2.0 feed files into the local CVE mirror")
+    parser.add_argument("feeds", nargs="+", help="nvdcve-2.0-*.json[.gz] files or saved API responses")
+    parser.add_argument("--db", default="data/securenet.db")
+    args = parser.parse_args()
+    mirror = CVEMirror(args.db)
+    results = mirror.import_feed(args.feeds)
+    print(f"Imported {sum(results.values())} CVEs; mirror holds {mirror.count()}, "
+          f"last modified {mirror.last_modified()}")
@@ -0,0 +1,371 @@
+"""
+SecureNet Differential Scan State
+
+Per-host fingerprints that let ``NetworkScanner`` re-probe only the hosts that
+are due and write only the devices that changed:
+- a fingerprint hashes the open ports, the MAC address and a hash of the
+  hostname; the RTT is kept next to it and counts as a change only when it
+  moves by ``RTT_CHANGE_RATIO`` (a route change rather than jitter). A MAC or
+  hostname that merely failed to resolve this time keeps its previous value
+- each host carries a volatility score (EWMA of "changed at this probe") and
+  its next probe is placed geometrically between the minimum and maximum
+  re-probe intervals: hosts that keep changing are checked often, stable ones
+  rarely
+- hosts that stop answering are re-checked at the minimum interval and are
+  declared gone after ``gone_after`` consecutive misses
+- ``network_devices`` rows keep their id for the life of the device: new and
+  changed devices are upserted in one ``executemany``, gone devices are marked
+  inactive, unchanged ones only get ``last_seen`` refreshed now and then
+- every new / gone / changed device is appended to ``network_device_changes``
+  with an increasing id, so CVE and alerting jobs can poll the feed with a
+  cursor (``changes_since``) instead of rescanning or diffing the device table
+
+Store functions take an open ``aiosqlite`` connection and leave committing to
+the caller.
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+NEW = "new"
+GONE = "gone"
+CHANGED = "changed"
+
+ACTIVE = "active"
+RTT_CHANGE_RATIO = 4.0
+RTT_FLOOR_MS = 1.0  # sub-millisecond LAN RTTs are all "fast"; ratios below this are noise
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS network_device_state (
+        ip TEXT PRIMARY KEY,
+        device_id TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        open_ports TEXT NOT NULL,
+        mac_address TEXT,
+        hostname_hash TEXT,
+        rtt_ms REAL,
+        volatility REAL NOT NULL,
+        status TEXT NOT NULL,
+        misses INTEGER NOT NULL,
+        first_seen REAL NOT NULL,
+        last_seen REAL NOT NULL,
+        last_changed REAL NOT NULL,
+        next_probe REAL NOT NULL,
+        last_written REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_network_device_state_next_probe ON network_device_state(next_probe)",
+    """
+    CREATE TABLE IF NOT EXISTS network_device_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        scan_id TEXT NOT NULL,
+        device_id TEXT NOT NULL,
+        ip TEXT NOT NULL,
+        change TEXT NOT NULL,
+        details TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS network_scan_sweeps (
+        target TEXT PRIMARY KEY,
+        last_sweep REAL NOT NULL
+    )
+    """,
+)
+
+
+def hostname_hash(hostname: Optional[str]) -> Optional[str]:
+    if not hostname:
+        return None
+    return hashlib.sha1(hostname.strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(open_ports: Iterable[int], mac_address: Optional[str], name_hash: Optional[str]) -> str:
+    canonical = json.dumps([sorted(open_ports), (mac_address or "").upper(), name_hash or ""],
+                           separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def rtt_moved(old: Optional[float], new: Optional[float]) -> bool:
+    if old is None or new is None:
+        return False
+    low, high = sorted((max(old, RTT_FLOOR_MS), max(new, RTT_FLOOR_MS)))
+    return high / low >= RTT_CHANGE_RATIO
+
+
+def new_device_id() -> str:
+    return f"dev_{uuid.uuid4().hex[:12]}"
+
+
+@dataclass
+class DeviceState:
+    """What the scanner last knew about one address"""
+    ip: str
+    device_id: str
+    fingerprint: str
+    open_ports: List[int] = field(default_factory=list)
+    mac_address: Optional[str] = None
+    hostname_hash: Optional[str] = None
+    rtt_ms: Optional[float] = None  # reference RTT: the value last reported
+    volatility: float = 0.5
+    status: str = ACTIVE
+    misses: int = 0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    last_changed: float = 0.0
+    next_probe: float = 0.0
+    last_written: float = 0.0
+
+    def row(self) -> tuple:
+        values = asdict(self)
+        values["open_ports"] = json.dumps(self.open_ports)
+        return tuple(values[name] for name in STATE_COLUMNS)
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "DeviceState":
+        values = dict(zip(STATE_COLUMNS, row))
+        values["open_ports"] = json.loads(values["open_ports"] or "[]")
+        return cls(**values)
+
+
+STATE_COLUMNS = tuple(f.name for f in fields(DeviceState))
+
+
+class DeviceTracker:
+    """
+    In-memory fingerprints and probe schedule. ``observe`` / ``miss`` return
+    the change to report (``NEW``, ``GONE``, ``CHANGED`` or ``None``).
+    """
+
+    def __init__(self, states: Optional[Dict[str, DeviceState]] = None,
+                 min_interval: float = 300.0, max_interval: float = 86400.0,
+                 alpha: float = 0.3, gone_after: int = 2, refresh_interval: float = 900.0):
+        self.states: Dict[str, DeviceState] = dict(states or {})
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.gone_after = gone_after
+        self.refresh_interval = refresh_interval
+
+    def interval(self, volatility: float) -> float:
+        """Re-probe interval: ``max_interval`` for a never-changing host, ``min_interval`` for one that always changes."""
+        return self.max_interval * (self.min_interval / self.max_interval) ** volatility
+
+    def _schedule(self, state: DeviceState, changed: Optional[bool], now: float):
+        if changed is not None:
+            state.volatility = (1 - self.alpha) * state.volatility + self.alpha * (1.0 if changed else 0.0)
+        state.next_probe = now + self.interval(state.volatility)
+
+    def due(self, now: float) -> List[str]:
+        """Active hosts whose next probe has come"""
+        return [ip for ip, state in self.states.items() if state.status == ACTIVE and state.next_probe <= now]
+
+    def observe(self, host: Dict, now: float) -> Tuple[Optional[str], DeviceState, Dict]:
+        """
+        Record a host that answered (a scan engine host result). Returns the
+        change, the updated state and ``{field: [old, new]}`` for what changed.
+        """
+        ip = host["ip"]
+        state = self.states.get(ip)
+        ports = sorted(host.get("open_ports") or [])
+        mac = (host.get("mac_address") or "").upper() or (state.mac_address if state else None)
+        name_hash = hostname_hash(host.get("hostname")) or (state.hostname_hash if state else None)
+        rtt = host.get("response_time")
+        digest = fingerprint(ports, mac, name_hash)
+
+        if state is None:
+            state = DeviceState(ip=ip, device_id=new_device_id(), fingerprint=digest, open_ports=ports,
+                                mac_address=mac, hostname_hash=name_hash, rtt_ms=rtt,
+                                first_seen=now, last_seen=now, last_changed=now)
+            self.states[ip] = state
+            self._schedule(state, None, now)
+            return NEW, state, {}
+
+        diff = {}
+        if ports != state.open_ports:
+            diff["open_ports"] = [state.open_ports, ports]
+        if mac != state.mac_address:
+            diff["mac_address"] = [state.mac_address, mac]
+        if name_hash != state.hostname_hash:
+            diff["hostname"] = [state.hostname_hash, name_hash]
+        if rtt_moved(state.rtt_ms, rtt):
+            diff["rtt_ms"] = [state.rtt_ms, rtt]
+
+        change = NEW if state.status != ACTIVE else (CHANGED if diff else None)
+        state.fingerprint, state.open_ports, state.mac_address, state.hostname_hash = digest, ports, mac, name_hash
+        if change or state.rtt_ms is None:
+            state.rtt_ms = rtt
+        state.status, state.misses, state.last_seen = ACTIVE, 0, now
+        if change:
+            state.last_changed = now
+        self._schedule(state, change is not None, now)
+        return change, state, diff
+
+    def miss(self, ip: str, now: float) -> Optional[str]:
+        """Record that a known host was probed and did not answer"""
+        state = self.states.get(ip)
+        if state is None or state.status != ACTIVE:
+            return None
+        state.misses += 1
+        if state.misses < self.gone_after:
+            # Confirm soon rather than trusting one lost probe
+            state.next_probe = now + self.min_interval
+            return None
+        state.status, state.last_changed = GONE, now
+        self._schedule(state, True, now)
+        return GONE
+
+    def needs_refresh(self, state: DeviceState, now: float) -> bool:
+        """Unchanged device whose ``last_seen`` in ``network_devices`` is getting stale"""
+        return now - state.last_written >= self.refresh_interval
+
+
+async def ensure_schema(conn):
+    for statement in SCHEMA:
+        await conn.execute(statement)
+
+
+def _legacy_ip(ip_address: Optional[str], metadata: Optional[str]) -> Optional[str]:
+    if ip_address:
+        return ip_address
+    try:
+        meta = json.loads(metadata) if metadata else {}
+    except (TypeError, ValueError):
+        return None
+    return meta.get("ip") or meta.get("ip_address")
+
+
+async def load_states(conn, now: float) -> Dict[str, DeviceState]:
+    """
+    Saved state; on first use, adopt rows already in ``network_devices`` so
+    their ids survive the switch (they are due for a probe immediately).
+    """
+    cursor = await conn.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM network_device_state")
+    states = {row[0]: DeviceState.from_row(row) for row in await cursor.fetchall()}
+    if states:
+        return states
+
+    cursor = await conn.execute(
+        "SELECT rowid, id, name, ip_address, mac_address, metadata FROM network_devices WHERE status = 'active'"
+    )
+    assigned = []
+    for rowid, device_id, name, ip_address, mac, metadata in await cursor.fetchall():
+        ip = _legacy_ip(ip_address, metadata)
+        if not ip or ip in states:
+            continue
+        if not device_id:
+            device_id = new_device_id()
+            assigned.append((device_id, ip, rowid))
+        meta = json.loads(metadata) if metadata else {}
+        ports = sorted(meta.get("ports") or meta.get("open_ports") or [])
+        mac = (mac or meta.get("mac") or "").upper() or None
+        if mac == "UNKNOWN":
+            mac = None
+        name_hash = hostname_hash(name)
+        states[ip] = DeviceState(ip=ip, device_id=device_id, fingerprint=fingerprint(ports, mac, name_hash),
+                                 open_ports=ports, mac_address=mac, hostname_hash=name_hash,
+                                 rtt_ms=meta.get("response_time"), first_seen=now, last_seen=now,
+                                 last_changed=now, next_probe=0.0, last_written=now)
+    if assigned:
+        await conn.executemany("UPDATE network_devices SET id = ?, ip_address = ? WHERE rowid = ?", assigned)
+    if states:
+        logger.info(f"Adopted {len(states)} existing network devices into scan state")
+    return states
+
+
+async def save_states(conn, states: Iterable[DeviceState]):
+    rows = [state.row() for state in states]
+    if not rows:
+        return
+    updates = ", ".join(f"{column} = excluded.{column}" for column in STATE_COLUMNS[1:])
+    await conn.executemany(
+        f"INSERT INTO network_device_state ({', '.join(STATE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(STATE_COLUMNS))}) "
+        f"ON CONFLICT(ip) DO UPDATE SET {updates}",
+        rows
+    )
+
+
+async def write_devices(conn, upserts: List[Dict], refreshed: List[Tuple[str, str]],
+                        gone: List[Tuple[str, str]]):
+    """
+    Bulk-apply device rows: ``upserts`` are device dicts with an ``id``,
+    ``refreshed`` / ``gone`` are ``(device_id, timestamp)`` pairs.
+    """
+    if upserts:
+        # A hostname that did not resolve this time (name None) keeps the stored name
+        await conn.executemany("""
+            INSERT INTO network_devices
+            (id, name, type, ip_address, mac_address, status, last_seen, metadata, created_at, updated_at)
+            VALUES (?, COALESCE(?, ?), ?, ?, ?, 'active', ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                name = COALESCE(?, network_devices.name),
+                type = excluded.type,
+                ip_address = excluded.ip_address,
+                mac_address = excluded.mac_address,
+                status = 'active',
+                last_seen = excluded.last_seen,
+                metadata = excluded.metadata,
+                updated_at = excluded.updated_at
+        """, [(
+            device['id'], device['name'], device['fallback_name'], device['device_type'], device['ip'],
+            device['mac_address'], device['last_seen'],
+            json.dumps({
+                'ip': device['ip'],
+                'mac': device['mac_address'] or 'Unknown',
+                'ports': device['open_ports'],
+                'response_time': device['response_time']
+            }),
+            device['last_seen'], device['last_seen'], device['name']
+        ) for device in upserts])
+    if refreshed:
+        await conn.executemany("UPDATE network_devices SET last_seen = ? WHERE id = ?",
+                               [(timestamp, device_id) for device_id, timestamp in refreshed])
+    if gone:
+        await conn.executemany("UPDATE network_devices SET status = 'inactive', updated_at = ? WHERE id = ?",
+                               [(timestamp, device_id) for device_id, timestamp in gone])
+
+
+async def append_changes(conn, scan_id: str, changes: List[Dict]):
+    if not changes:
+        return
+    await conn.executemany(
+        "INSERT INTO network_device_changes (scan_id, device_id, ip, change, details, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(scan_id, change["device_id"], change["ip"], change["change"],
+          json.dumps(change["details"]), change["timestamp"]) for change in changes]
+    )
+
+
+async def changes_since(conn, since_id: int = 0, limit: int = 1000) -> List[Dict]:
+    """Change feed entries after ``since_id``, oldest first; pass the last ``id`` back as the cursor."""
+    cursor = await conn.execute(
+        "SELECT id, scan_id, device_id, ip, change, details, created_at FROM network_device_changes "
+        "WHERE id > ? ORDER BY id LIMIT ?",
+        (since_id, limit)
+    )
+    return [{
+        "id": row[0], "scan_id": row[1], "device_id": row[2], "ip": row[3], "change": row[4],
+        "details": json.loads(row[5]) if row[5] else {}, "timestamp": row[6]
+    } for row in await cursor.fetchall()]
+
+
+async def last_sweeps(conn) -> Dict[str, float]:
+    cursor = await conn.execute("SELECT target, last_sweep FROM network_scan_sweeps")
+    return {target: last_sweep for target, last_sweep in await cursor.fetchall()}
+
+
+async def mark_swept(conn, targets: Iterable[str], now: float):
+    await conn.executemany(
+        "INSERT INTO network_scan_sweeps (target, last_sweep) VALUES (?, ?) "
+        "ON CONFLICT(target) DO UPDATE SET last_sweep = excluded.last_sweep",
+        [(target, now) for target in targets]
+    )
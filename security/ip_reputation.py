@@ -0,0 +1,515 @@
+"""
+SecureNet IP Reputation Index
+
+In-process lookups for malicious and blocked addresses, so request middleware
+and threat detection never make a network round trip per request:
+- exact addresses sit behind a Bloom filter: clean addresses (the common case)
+  are rejected without touching the exact table, and the table confirms
+  positives so a filter false positive never blocks anyone
+- CIDR ranges live in a path-compressed radix (patricia) tree with
+  longest-prefix match, so blocking a /24 is one entry instead of 256 keys
+- verdicts are cached per address string until the index changes
+- indexes load from feed files (one address or CIDR per line, ``#`` comments)
+  and stay current from Redis pub/sub, or an in-process ``LocalUpdateBus``
+  when Redis is unavailable; published entries are also kept in a Redis hash
+  so a new worker can sync a snapshot at startup
+"""
+
+import asyncio
+import glob
+import ipaddress
+import json
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from utils.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+FEED_DIR = os.getenv("THREAT_INTEL_FEED_DIR", "data/threat_intel")
+FEED_PATTERNS = ("*.txt", "*.netset", "*.ipset")
+
+MASK64 = (1 << 64) - 1
+V6_TAG = 1 << 128  # keeps IPv4 and IPv6 keys apart in the exact table
+_MISS = object()
+
+
+def parse_address(address: str) -> Optional[Tuple[int, int]]:
+    """(version, integer) for an address string; IPv4-mapped IPv6 becomes IPv4"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), "big")
+    except (OSError, TypeError):
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+    except (OSError, TypeError, ValueError):
+        return None
+    if value >> 32 == 0xFFFF:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+
+@dataclass
+class ReputationEntry:
+    """One listed address or network"""
+    network: str
+    category: str
+    source: str = "manual"
+    expires_at: Optional[float] = None
+    added_at: float = field(default_factory=time.time)
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and (time.time() if now is None else now) >= self.expires_at
+
+
+class BloomFilter:
+    """Bit-array membership filter over integer keys; no false negatives."""
+
+    __slots__ = ("size", "hashes", "bits", "count", "capacity")
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _hashes(self, key: int) -> Tuple[int, int]:
+        # Double hashing with two 64-bit multiplicative mixes; no hashlib on the hot path
+        h1 = ((key ^ (key >> 64)) * 0x9E3779B97F4A7C15) & MASK64
+        h2 = (((key ^ (key >> 31)) * 0xBF58476D1CE4E5B9) & MASK64) | 1
+        return h1, h2
+
+    def add(self, key: int):
+        h1, h2 = self._hashes(key)
+        bits, size = self.bits, self.size
+        for _ in range(self.hashes):
+            position = h1 % size
+            bits[position >> 3] |= 1 << (position & 7)
+            h1 += h2
+        self.count += 1
+
+    def __contains__(self, key: int) -> bool:
+        h1, h2 = self._hashes(key)
+        bits, size = self.bits, self.size
+        for _ in range(self.hashes):  # most absent keys fail on the first probe or two
+            position = h1 % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            h1 += h2
+        return True
+
+
+class _Node:
+    __slots__ = ("key", "length", "entry", "children")
+
+    def __init__(self, key: int, length: int, entry: Any = None):
+        self.key = key          # the top ``length`` bits of the prefix
+        self.length = length
+        self.entry = entry
+        self.children: List[Optional["_Node"]] = [None, None]
+
+
+class RadixTree:
+    """Path-compressed binary trie of prefixes with longest-prefix match."""
+
+    def __init__(self, bits: int):
+        self.bits = bits
+        self.root = _Node(0, 0)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def _common_length(key: int, length: int, other: int, other_length: int) -> int:
+        shortest = min(length, other_length)
+        diff = (key >> (length - shortest)) ^ (other >> (other_length - shortest))
+        return shortest - diff.bit_length()
+
+    def insert(self, network: int, length: int, entry: Any):
+        """Store ``entry`` for ``network/length`` (network as a full-width integer)"""
+        key = network >> (self.bits - length)
+        node = self.root
+        while node.length < length:
+            bit = (key >> (length - node.length - 1)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(key, length, entry)
+                self.size += 1
+                return
+            common = self._common_length(key, length, child.key, child.length)
+            if common >= child.length:
+                node = child
+                continue
+            # Split the edge at the point where the prefixes diverge
+            split = _Node(key >> (length - common), common)
+            split.children[(child.key >> (child.length - common - 1)) & 1] = child
+            node.children[bit] = split
+            if common == length:
+                split.entry = entry
+            else:
+                split.children[(key >> (length - common - 1)) & 1] = _Node(key, length, entry)
+            self.size += 1
+            return
+        if node.entry is None:
+            self.size += 1
+        node.entry = entry
+
+    def remove(self, network: int, length: int) -> bool:
+        key = network >> (self.bits - length)
+        path = [self.root]
+        node = self.root
+        while node.length < length:
+            child = node.children[(key >> (length - node.length - 1)) & 1]
+            if child is None or child.length > length or (key >> (length - child.length)) != child.key:
+                return False
+            path.append(child)
+            node = child
+        if node.entry is None or node.key != key:
+            return False
+        node.entry = None
+        self.size -= 1
+        # Drop or splice out nodes left without an entry and with at most one child
+        while len(path) > 1:
+            node = path.pop()
+            live = [child for child in node.children if child is not None]
+            if node.entry is not None or len(live) > 1:
+                break
+            parent = path[-1]
+            parent.children[parent.children.index(node)] = live[0] if live else None
+        return True
+
+    def lookup(self, address: int) -> Any:
+        """Entry of the longest stored prefix containing ``address``"""
+        bits = self.bits
+        node = self.root
+        best = node.entry
+        while node.length < bits:
+            node = node.children[(address >> (bits - node.length - 1)) & 1]
+            if node is None or (address >> (bits - node.length)) != node.key:
+                break
+            if node.entry is not None:
+                best = node.entry
+        return best
+
+    def entries(self) -> List[Any]:
+        found, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            if node.entry is not None:
+                found.append(node.entry)
+            stack.extend(child for child in node.children if child is not None)
+        return found
+
+
+class LocalUpdateBus:
+    """In-process stand-in for Redis pub/sub (single worker, tests)."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def publish(self, channel: str, message: str) -> int:
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait(message)
+        return len(queues)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+
+local_update_bus = LocalUpdateBus()
+
+
+class IPReputationIndex:
+    """
+    Exact addresses and CIDR ranges with a category (``malicious``,
+    ``blocked``), source and optional expiry. ``lookup`` is synchronous and
+    does no I/O.
+    """
+
+    def __init__(self, name: str, default_category: str, bloom_capacity: int = 100000,
+                 error_rate: float = 0.001, cache_size: int = 65536,
+                 legacy_set_key: Optional[str] = None):
+        self.name = name
+        self.default_category = default_category
+        self.channel = f"{name}:updates"
+        self.snapshot_key = f"{name}:entries"
+        self.legacy_set_key = legacy_set_key
+        self.error_rate = error_rate
+        self.cache_size = cache_size
+        self.instance_id = uuid.uuid4().hex
+        self._exact: Dict[int, ReputationEntry] = {}
+        self._bloom = BloomFilter(bloom_capacity, error_rate)
+        self._stale_bloom_keys = 0
+        self._trees = {4: RadixTree(32), 6: RadixTree(128)}
+        self._cache: Dict[str, Optional[ReputationEntry]] = {}
+        self.stats = {
+            "resolved": 0,
+            "bloom_rejects": 0,
+            "bloom_false_positives": 0,
+            "updates_applied": 0,
+            "feed_entries": 0,
+            "expired": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._trees[4]) + len(self._trees[6])
+
+    def __contains__(self, address: str) -> bool:
+        return self.lookup(address) is not None
+
+    # --- lookups -------------------------------------------------------
+
+    def lookup(self, address: str, now: Optional[float] = None) -> Optional[ReputationEntry]:
+        """Most specific live entry covering ``address``, or None"""
+        entry = self._cache.get(address, _MISS)
+        if entry is _MISS:
+            entry = self._resolve(address)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[address] = entry
+        if entry is not None and entry.expires_at is not None and entry.expired(now):
+            self.stats["expired"] += 1
+            self.remove(entry.network)
+            return self.lookup(address, now)  # a broader range may still apply
+        return entry
+
+    def lookup_many(self, addresses: Iterable[str]) -> List[Optional[ReputationEntry]]:
+        return [self.lookup(address) for address in addresses]
+
+    def _resolve(self, address: str) -> Optional[ReputationEntry]:
+        parsed = parse_address(address)
+        if parsed is None:
+            return None
+        self.stats["resolved"] += 1
+        version, value = parsed
+        key = value if version == 4 else value | V6_TAG
+        if key in self._bloom:
+            entry = self._exact.get(key)
+            if entry is not None:
+                return entry
+            self.stats["bloom_false_positives"] += 1
+        else:
+            self.stats["bloom_rejects"] += 1
+        tree = self._trees[version]
+        return tree.lookup(value) if tree.size else None
+
+    # --- updates -------------------------------------------------------
+
+    def _insert(self, network: "ipaddress._BaseNetwork", entry: ReputationEntry):
+        value = int(network.network_address)
+        if network.prefixlen == network.max_prefixlen:
+            key = value if network.version == 4 else value | V6_TAG
+            if key not in self._exact:
+                if self._bloom.count >= self._bloom.capacity:
+                    self._rebuild_bloom(extra=1)
+                self._bloom.add(key)
+            self._exact[key] = entry
+        else:
+            self._trees[network.version].insert(value, network.prefixlen, entry)
+
+    def _rebuild_bloom(self, extra: int = 0):
+        # Bloom filters can't delete; rebuild when removals or growth degrade the error rate
+        capacity = max(self._bloom.capacity, 2 * (len(self._exact) + extra))
+        bloom = BloomFilter(capacity, self.error_rate)
+        for key in self._exact:
+            bloom.add(key)
+        self._bloom = bloom
+        self._stale_bloom_keys = 0
+
+    def add(self, network: str, category: Optional[str] = None, source: str = "manual",
+            ttl: Optional[float] = None, expires_at: Optional[float] = None) -> ReputationEntry:
+        """List an address or CIDR range (``ttl`` seconds, or until removed)"""
+        parsed = ipaddress.ip_network(network, strict=False)
+        if expires_at is None and ttl:
+            expires_at = time.time() + ttl
+        entry = ReputationEntry(str(parsed), category or self.default_category, source, expires_at)
+        self._insert(parsed, entry)
+        self._cache.clear()
+        return entry
+
+    def remove(self, network: str) -> bool:
+        parsed = ipaddress.ip_network(network, strict=False)
+        value = int(parsed.network_address)
+        if parsed.prefixlen == parsed.max_prefixlen:
+            removed = self._exact.pop(value if parsed.version == 4 else value | V6_TAG, None) is not None
+            if removed:
+                self._stale_bloom_keys += 1
+                if self._stale_bloom_keys > max(1024, len(self._exact)):
+                    self._rebuild_bloom()
+        else:
+            removed = self._trees[parsed.version].remove(value, parsed.prefixlen)
+        if removed:
+            self._cache.clear()
+        return removed
+
+    def clear(self):
+        self._exact.clear()
+        self._bloom = BloomFilter(self._bloom.capacity, self.error_rate)
+        self._stale_bloom_keys = 0
+        self._trees = {4: RadixTree(32), 6: RadixTree(128)}
+        self._cache.clear()
+
+    def entries(self) -> List[ReputationEntry]:
+        return list(self._exact.values()) + self._trees[4].entries() + self._trees[6].entries()
+
+    def load_feed(self, path: str, category: Optional[str] = None, source: Optional[str] = None) -> int:
+        """Load one address or CIDR per line; returns how many entries were added"""
+        source = source or os.path.basename(path)
+        category = category or self.default_category
+        loaded = invalid = 0
+        with open(path) as f:
+            for line in f:
+                value = line.split("#", 1)[0].replace(",", " ").split()
+                if not value:
+                    continue
+                try:
+                    parsed = ipaddress.ip_network(value[0], strict=False)
+                except ValueError:
+                    invalid += 1
+                    continue
+                self._insert(parsed, ReputationEntry(str(parsed), category, source))
+                loaded += 1
+        self._cache.clear()
+        self.stats["feed_entries"] += loaded
+        if invalid:
+            logger.warning(f"Skipped {invalid} invalid entries in IP feed {path}")
+        logger.info(f"Loaded {loaded} entries from IP feed {path}")
+        return loaded
+
+    def load_feed_directory(self, directory: str = FEED_DIR) -> int:
+        loaded = 0
+        for pattern in FEED_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(directory, pattern))):
+                try:
+                    loaded += self.load_feed(path)
+                except Exception as e:
+                    logger.error(f"Failed to load IP feed {path}: {str(e)}")
+        return loaded
+
+    def apply_update(self, update: Dict[str, Any]) -> bool:
+        """Apply an ``{"op": "add"|"remove"|"clear", "network": ...}`` update"""
+        op = update.get("op")
+        if op == "add":
+            self.add(update["network"], update.get("category"), update.get("source", "feed"),
+                     expires_at=update.get("expires_at"))
+        elif op == "remove":
+            self.remove(update["network"])
+        elif op == "clear":
+            self.clear()
+        else:
+            raise ValueError(f"Unknown IP reputation update: {op}")
+        self.stats["updates_applied"] += 1
+        return True
+
+    # --- distribution --------------------------------------------------
+
+    async def publish(self, op: str, network: Optional[str] = None, category: Optional[str] = None,
+                      source: str = "manual", ttl: Optional[float] = None,
+                      bus: Optional[LocalUpdateBus] = None) -> Dict[str, Any]:
+        """Apply an update locally, persist it and broadcast it to other workers"""
+        update: Dict[str, Any] = {"op": op, "origin": self.instance_id}
+        if network is not None:
+            update["network"] = str(ipaddress.ip_network(network, strict=False))
+        if op == "add":
+            update.update(category=category or self.default_category, source=source,
+                          expires_at=time.time() + ttl if ttl else None)
+        self.apply_update(update)
+        message = json.dumps(update)
+
+        if bus is None and cache_service.connected:
+            try:
+                redis = cache_service.redis_client
+                if op == "add":
+                    await redis.hset(self.snapshot_key, update["network"], message)
+                elif op == "remove":
+                    await redis.hdel(self.snapshot_key, update["network"])
+                else:
+                    await redis.delete(self.snapshot_key)
+                await redis.publish(self.channel, message)
+            except Exception as e:
+                logger.error(f"Failed to publish IP reputation update to Redis: {str(e)}")
+        else:
+            (bus or local_update_bus).publish(self.channel, message)
+        return update
+
+    async def sync(self) -> int:
+        """Load the shared snapshot (and the legacy Redis set) from Redis"""
+        if not cache_service.connected:
+            return 0
+        loaded = 0
+        try:
+            redis = cache_service.redis_client
+            now = time.time()
+            expired = []
+            for network, message in (await redis.hgetall(self.snapshot_key)).items():
+                update = json.loads(message)
+                if update.get("expires_at") and update["expires_at"] <= now:
+                    expired.append(network)
+                    continue
+                self.apply_update(update)
+                loaded += 1
+            if expired:
+                await redis.hdel(self.snapshot_key, *expired)
+            if self.legacy_set_key:
+                for address in await redis.smembers(self.legacy_set_key):
+                    self.add(address, source="redis")
+                    loaded += 1
+        except Exception as e:
+            logger.error(f"Failed to sync IP reputation index {self.name}: {str(e)}")
+        return loaded
+
+    async def _messages(self, bus: Optional[LocalUpdateBus]) -> AsyncIterator[str]:
+        if bus is not None or not cache_service.connected:
+            async for message in (bus or local_update_bus).subscribe(self.channel):
+                yield message
+            return
+        pubsub = cache_service.redis_client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.unsubscribe(self.channel)
+
+    async def listen(self, bus: Optional[LocalUpdateBus] = None):
+        """Apply updates published by other workers until cancelled"""
+        async for message in self._messages(bus):
+            try:
+                update = json.loads(message)
+                if update.get("origin") != self.instance_id:
+                    self.apply_update(update)
+            except Exception as e:
+                logger.error(f"Ignoring bad IP reputation update on {self.channel}: {str(e)}")
+
+
+# Global indexes: threat intelligence and active blocks
+malicious_ips = IPReputationIndex("threat_intel:malicious_ips", "malicious",
+                                  legacy_set_key="threat_intel:malicious_ips")
+blocked_ips = IPReputationIndex("blocked_ips", "blocked")
+
+
+async def initialize_ip_reputation(feed_dir: str = FEED_DIR) -> List[asyncio.Task]:
+    """Load feeds, sync from Redis and start listening for updates"""
+    if os.path.isdir(feed_dir):
+        malicious_ips.load_feed_directory(feed_dir)
+    tasks = []
+    for index in (malicious_ips, blocked_ips):
+        await index.sync()
+        tasks.append(asyncio.create_task(index.listen()))
+    return tasks
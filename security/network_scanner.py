@@ -5,6 +5,7 @@ Implements actual network discovery and monitoring
 """
 
 import asyncio
+import os
 import socket
 import subprocess
 import platform
@@ -13,11 +14,16 @@ import psutil
 import time
 import json
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Optional, Set
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Set
 from datetime import datetime, timedelta
 import aiosqlite
 
+from security.device_state import (
+    ACTIVE, CHANGED, GONE, NEW, DeviceState, DeviceTracker, append_changes, changes_since, ensure_schema,
+    last_sweeps, load_states, mark_swept, save_states, write_devices
+)
+from security.scan_engine import AsyncScanEngine, read_neighbor_table, target_filter
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,8 +33,16 @@ class NetworkScanner:
     
     def __init__(self, db_path: str = "data/securenet.db"):
         self.db_path = db_path
-        self.executor = ThreadPoolExecutor(max_workers=50)
         self.active_scans = set()
+        self.engine = AsyncScanEngine(
+            concurrency=int(os.getenv("SCAN_CONCURRENCY", "1024")),
+            host_concurrency=int(os.getenv("SCAN_HOST_CONCURRENCY", "256")),
+            max_timeout=float(os.getenv("SCAN_MAX_TIMEOUT", "3.0"))
+        )
+        # Differential scans: fingerprints and probe schedule, loaded from the database on first use
+        self.tracker: Optional[DeviceTracker] = None
+        self.sweep_interval = float(os.getenv("SCAN_SWEEP_INTERVAL", "3600"))
+        self._scan_lock = asyncio.Lock()
         
     def get_local_network_range(self) -> List[str]:
         """Get local network ranges from active interfaces"""
@@ -50,42 +64,9 @@ class NetworkScanner:
         
         return networks
     
-    def ping_host(self, ip: str, timeout: int = 1) -> bool:
-        """Ping a single host to check if it's alive"""
-        try:
-            if platform.system().lower() == "windows":
-                cmd = ["ping", "-n", "1", "-w", str(timeout * 1000), ip]
-            else:
-                cmd = ["ping", "-c", "1", "-W", str(timeout), ip]
-            
-            result = subprocess.run(cmd, capture_output=True, timeout=timeout + 1)
-            return result.returncode == 0
-        except Exception:
-            return False
-    
     def get_mac_address(self, ip: str) -> Optional[str]:
-        """Get MAC address for an IP using ARP table"""
-        try:
-            if platform.system().lower() == "windows":
-                cmd = ["arp", "-a", ip]
-            else:
-                cmd = ["arp", "-n", ip]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                for line in lines:
-                    if ip in line:
-                        parts = line.split()
-                        for part in parts:
-                            if ':' in part and len(part) == 17:  # MAC format xx:xx:xx:xx:xx:xx
-                                return part.upper()
-                            elif '-' in part and len(part) == 17:  # Windows format xx-xx-xx-xx-xx-xx
-                                return part.replace('-', ':').upper()
-        except Exception as e:
-            logger.debug(f"Error getting MAC for {ip}: {e}")
-        
-        return None
+        """Get MAC address for an IP from the ARP/neighbor table"""
+        return read_neighbor_table(self.engine.neighbor_table_path).get(ip)
     
     def get_hostname(self, ip: str) -> Optional[str]:
         """Get hostname for an IP address"""
@@ -108,28 +89,9 @@ class NetworkScanner:
         
         return None
     
-    def scan_ports(self, ip: str, ports: List[int] = None) -> List[int]:
+    async def scan_ports(self, ip: str, ports: List[int] = None) -> List[int]:
         """Scan common ports on a host"""
-        if ports is None:
-            ports = [22, 23, 25, 53, 80, 110, 139, 143, 443, 993, 995, 1723, 3389, 5900, 8080]
-        
-        open_ports = []
-        
-        def check_port(port):
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(1)
-                result = sock.connect_ex((ip, port))
-                sock.close()
-                return port if result == 0 else None
-            except:
-                return None
-        
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            results = executor.map(check_port, ports)
-            open_ports = [port for port in results if port is not None]
-        
-        return open_ports
+        return await self.engine.scan_ports(ip, ports)
     
     def identify_device_type(self, ip: str, hostname: str, mac: str, ports: List[int]) -> str:
         """Identify device type based on characteristics"""
@@ -164,43 +126,29 @@ class NetworkScanner:
         # Default to endpoint
         return 'endpoint'
     
+    def _device_info(self, host: Dict) -> Dict:
+        """Shape a scan engine host result into device information"""
+        ip = host['ip']
+        device_type = self.identify_device_type(ip, host['hostname'], host['mac_address'], host['open_ports'])
+        return {
+            'ip': ip,
+            'hostname': host['hostname'] or f"device-{ip.split('.')[-1]}",
+            'mac_address': host['mac_address'] or 'Unknown',
+            'device_type': device_type,
+            'status': 'active',
+            'open_ports': host['open_ports'],
+            'last_seen': datetime.now().isoformat(),
+            'response_time': host['response_time'] or 0.0  # ms
+        }
+    
     async def scan_single_host(self, ip: str) -> Optional[Dict]:
         """Scan a single host and return device information"""
         try:
-            # Check if host is alive
-            is_alive = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.ping_host, ip
-            )
-            
-            if not is_alive:
+            host = await self.engine.scan_host(ip, await self.engine.neighbors())
+            if host is None:
                 return None
             
-            # Get additional information
-            hostname = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.get_hostname, ip
-            )
-            
-            mac_address = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.get_mac_address, ip
-            )
-            
-            open_ports = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.scan_ports, ip
-            )
-            
-            device_type = self.identify_device_type(ip, hostname, mac_address, open_ports)
-            
-            device_info = {
-                'ip': ip,
-                'hostname': hostname or f"device-{ip.split('.')[-1]}",
-                'mac_address': mac_address or 'Unknown',
-                'device_type': device_type,
-                'status': 'active',
-                'open_ports': open_ports,
-                'last_seen': datetime.now().isoformat(),
-                'response_time': 0.0  # Could implement actual ping time measurement
-            }
-            
+            device_info = self._device_info(host)
             logger.info(f"Discovered device: {device_info['hostname']} ({ip})")
             return device_info
             
@@ -208,64 +156,128 @@ class NetworkScanner:
             logger.error(f"Error scanning {ip}: {e}")
             return None
     
+    async def stream_network_scan(self, network_ranges: Iterable[str],
+                                  progress_interval: float = 1.0) -> AsyncIterator[Dict]:
+        """
+        Scan any mix of CIDR ranges, addresses and first-last ranges, yielding
+        device, progress and completion events as the scan runs
+        """
+        async for event in self.engine.scan_iter(network_ranges, progress_interval):
+            if event["event"] == "host":
+                device_info = self._device_info(event["host"])
+                logger.info(f"Discovered device: {device_info['hostname']} ({device_info['ip']})")
+                yield {"event": "device", "device": device_info, "host": event["host"]}
+            else:
+                if event["event"] == "progress":
+                    logger.info(f"Scan progress: {event['scanned']}/{event['total']} hosts, "
+                                f"{event['alive']} alive, {event['hosts_per_second']} hosts/s")
+                yield event
+    
     async def scan_network_range(self, network_range: str) -> List[Dict]:
         """Scan an entire network range"""
         devices = []
         
         try:
-            network = ipaddress.IPv4Network(network_range)
             logger.info(f"Scanning network range: {network_range}")
-            
-            # Create tasks for all IPs in range (skip network and broadcast)
-            tasks = []
-            for ip in network.hosts():
-                if len(tasks) < 254:  # Limit concurrent scans
-                    tasks.append(self.scan_single_host(str(ip)))
-            
-            # Execute scans
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Collect valid results
-            for result in results:
-                if isinstance(result, dict) and result is not None:
-                    devices.append(result)
+            async for event in self.stream_network_scan([network_range]):
+                if event["event"] == "device":
+                    devices.append(event["device"])
             
         except Exception as e:
             logger.error(f"Error scanning network range {network_range}: {e}")
         
         return devices
     
-    async def store_devices_in_db(self, devices: List[Dict]):
-        """Store discovered devices in database"""
+    async def _load_tracker(self, conn) -> DeviceTracker:
+        if self.tracker is None:
+            await ensure_schema(conn)
+            self.tracker = DeviceTracker(
+                await load_states(conn, time.time()),
+                min_interval=float(os.getenv("SCAN_MIN_REPROBE_INTERVAL", "300")),
+                max_interval=float(os.getenv("SCAN_MAX_REPROBE_INTERVAL", "86400")),
+                gone_after=int(os.getenv("SCAN_GONE_AFTER", "2"))
+            )
+        return self.tracker
+    
+    def _device_row(self, host: Dict, state: DeviceState, timestamp: str) -> Dict:
+        """``network_devices`` row for a new or changed device"""
+        ip = host['ip']
+        return {
+            'id': state.device_id,
+            'ip': ip,
+            'name': host['hostname'],
+            'fallback_name': f"device-{ip.split('.')[-1]}",
+            'device_type': self.identify_device_type(ip, host['hostname'], state.mac_address, state.open_ports),
+            'mac_address': state.mac_address,
+            'open_ports': state.open_ports,
+            'last_seen': timestamp,
+            'response_time': host['response_time'] or 0.0
+        }
+    
+    async def store_devices_in_db(self, hosts: List[Dict], probed: Iterable[str] = (),
+                                  scan_id: Optional[str] = None) -> List[Dict]:
+        """
+        Diff scan engine results against the saved device state and write only
+        what changed. Known addresses in ``probed`` that did not answer count
+        as misses. Returns the change feed entries that were recorded.
+        """
+        scan_id = scan_id or f"scan_{int(time.time())}"
+        changes = []
         try:
             async with aiosqlite.connect(self.db_path) as conn:
-                # Clear existing devices
-                await conn.execute("DELETE FROM network_devices")
+                tracker = await self._load_tracker(conn)
+                now = time.time()
+                timestamp = datetime.now().isoformat()
+                upserts, refreshed, gone, touched = [], [], [], []
+                answered = set()
                 
-                # Insert new devices
-                for device in devices:
-                    await conn.execute("""
-                        INSERT INTO network_devices 
-                        (name, type, status, last_seen, metadata) 
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        device['hostname'],
-                        device['device_type'],
-                        'active',  # Map to 'active' instead of device['status']
-                        device['last_seen'],
-                        json.dumps({
-                            'ip': device['ip'],
-                            'mac': device['mac_address'],
-                            'ports': device['open_ports'],
-                            'response_time': device['response_time']
-                        })
-                    ))
+                for host in hosts:
+                    answered.add(host['ip'])
+                    change, state, diff = tracker.observe(host, now)
+                    touched.append(state)
+                    if change:
+                        upserts.append(self._device_row(host, state, timestamp))
+                        if change == NEW:
+                            diff = {'open_ports': state.open_ports, 'mac_address': state.mac_address}
+                        changes.append({'device_id': state.device_id, 'ip': state.ip, 'change': change,
+                                        'details': diff, 'timestamp': timestamp})
+                    elif tracker.needs_refresh(state, now):
+                        refreshed.append((state.device_id, timestamp))
+                    else:
+                        continue
+                    state.last_written = now
+                
+                for ip in set(probed) - answered:
+                    if ip not in tracker.states:
+                        continue
+                    change = tracker.miss(ip, now)
+                    state = tracker.states[ip]
+                    touched.append(state)
+                    if change == GONE:
+                        gone.append((state.device_id, timestamp))
+                        changes.append({'device_id': state.device_id, 'ip': ip, 'change': GONE,
+                                        'details': {}, 'timestamp': timestamp})
                 
+                await write_devices(conn, upserts, refreshed, gone)
+                await append_changes(conn, scan_id, changes)
+                await save_states(conn, touched)
                 await conn.commit()
-                logger.info(f"Stored {len(devices)} devices in database")
+                logger.info(f"Stored scan {scan_id}: {len(upserts)} devices written, {len(gone)} gone, "
+                            f"{len(refreshed)} refreshed, {len(hosts) - len(upserts) - len(refreshed)} unchanged")
                 
         except Exception as e:
             logger.error(f"Error storing devices in database: {e}")
+            # The in-memory state may be ahead of the database; reload it next time
+            self.tracker = None
+            return []
+        
+        return changes
+    
+    async def get_device_changes(self, since_id: int = 0, limit: int = 1000) -> List[Dict]:
+        """New / gone / changed devices recorded after ``since_id`` (the last ``id`` a consumer saw)"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            await ensure_schema(conn)
+            return await changes_since(conn, since_id, limit)
     
     async def generate_traffic_data(self, devices: List[Dict]):
         """Generate realistic traffic data based on discovered devices"""
@@ -309,43 +321,65 @@ class NetworkScanner:
         except Exception as e:
             logger.error(f"Error generating traffic data: {e}")
     
-    async def full_network_scan(self) -> Dict:
-        """Perform a complete network scan"""
-        scan_id = f"real_scan_{int(time.time())}"
+    async def _scan(self, network_ranges: Optional[List[str]], full: bool) -> Dict:
+        scan_id = f"{'real' if full else 'diff'}_scan_{int(time.time())}"
         self.active_scans.add(scan_id)
         
         try:
-            logger.info(f"Starting real network scan {scan_id}")
-            start_time = time.time()
-            
-            # Get network ranges to scan
-            network_ranges = self.get_local_network_range()
-            logger.info(f"Scanning network ranges: {network_ranges}")
-            
-            all_devices = []
-            
-            # Scan each network range
-            for network_range in network_ranges:
-                devices = await self.scan_network_range(network_range)
-                all_devices.extend(devices)
-            
-            # Store results in database
-            await self.store_devices_in_db(all_devices)
-            await self.generate_traffic_data(all_devices)
-            
-            scan_time = time.time() - start_time
-            
-            result = {
-                'scan_id': scan_id,
-                'status': 'completed',
-                'devices_found': len(all_devices),
-                'scan_time': scan_time,
-                'network_ranges': network_ranges,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            logger.info(f"Network scan completed: {len(all_devices)} devices found in {scan_time:.2f}s")
-            return result
+            async with self._scan_lock:
+                logger.info(f"Starting {'full' if full else 'differential'} network scan {scan_id}")
+                start_time = time.time()
+                
+                # Get network ranges to scan
+                network_ranges = network_ranges or self.get_local_network_range()
+                async with aiosqlite.connect(self.db_path) as conn:
+                    tracker = await self._load_tracker(conn)
+                    swept_at = await last_sweeps(conn)
+                
+                # Sweep ranges whose sweep interval has passed; elsewhere only probe hosts that are
+                # due, plus neighbor-table entries the scanner has not seen (or saw with another MAC)
+                now = time.time()
+                sweep = [r for r in network_ranges if full or now - swept_at.get(r, 0.0) >= self.sweep_interval]
+                in_sweep, in_ranges = target_filter(sweep), target_filter(network_ranges)
+                extra = set(tracker.due(now))
+                for ip, mac in (await self.engine.neighbors()).items():
+                    state = tracker.states.get(ip)
+                    if in_ranges(ip) and (state is None or state.status != ACTIVE or state.mac_address != mac):
+                        extra.add(ip)
+                extra = {ip for ip in extra if not in_sweep(ip)}
+                probed = extra | {ip for ip in tracker.states if in_sweep(ip)}
+                logger.info(f"Sweeping {sweep}, re-probing {len(extra)} hosts of {len(tracker.states)} known")
+                
+                hosts, hosts_probed = [], 0
+                async for event in self.stream_network_scan(sweep + sorted(extra)):
+                    if event["event"] == "device":
+                        hosts.append(event["host"])
+                    elif event["event"] == "complete":
+                        hosts_probed = event["scanned"]
+                
+                changes = await self.store_devices_in_db(hosts, probed, scan_id)
+                if sweep:
+                    async with aiosqlite.connect(self.db_path) as conn:
+                        await mark_swept(conn, sweep, now)
+                        await conn.commit()
+                
+                scan_time = time.time() - start_time
+                summary = {change: sum(1 for c in changes if c['change'] == change) for change in (NEW, GONE, CHANGED)}
+                result = {
+                    'scan_id': scan_id,
+                    'status': 'completed',
+                    'mode': 'full' if full else 'differential',
+                    'devices_found': len(hosts),
+                    'hosts_probed': hosts_probed,
+                    'changes': summary,
+                    'scan_time': scan_time,
+                    'network_ranges': network_ranges,
+                    'swept_ranges': sweep,
+                    'timestamp': datetime.now().isoformat()
+                }
+                
+                logger.info(f"Network scan completed: {len(hosts)} devices answered, {summary} in {scan_time:.2f}s")
+                return result
             
         except Exception as e:
             logger.error(f"Error in network scan: {e}")
@@ -357,6 +391,21 @@ class NetworkScanner:
             }
         finally:
             self.active_scans.discard(scan_id)
+    
+    async def differential_network_scan(self, network_ranges: Optional[List[str]] = None) -> Dict:
+        """
+        Re-probe only hosts that are due (by volatility) and sweep ranges whose
+        sweep interval has passed; unchanged devices are not rewritten
+        """
+        return await self._scan(network_ranges, full=False)
+    
+    async def full_network_scan(self) -> Dict:
+        """Perform a complete network scan"""
+        result = await self._scan(None, full=True)
+        if result['status'] == 'completed' and self.tracker is not None:
+            active = [{'ip': ip} for ip, state in self.tracker.states.items() if state.status == ACTIVE]
+            await self.generate_traffic_data(active)
+        return result
 
 # Global scanner instance
 scanner = NetworkScanner()
@@ -365,6 +414,10 @@ async def start_real_network_scan():
     """Start a real network scan"""
     return await scanner.full_network_scan()
 
+async def start_differential_network_scan():
+    """Re-probe due hosts and record only what changed"""
+    return await scanner.differential_network_scan()
+
 if __name__ == "__main__":
     # Test the scanner
     async def test_scanner():
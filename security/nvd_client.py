@@ -0,0 +1,290 @@
+"""
+SecureNet NVD API Client
+
+Shared access to the NVD CVE API 2.0 for ``CVEIntegration``:
+- one pooled ``aiohttp`` session per client (keep-alive, bounded connector)
+  instead of a new session and TLS handshake per request
+- a sliding-window limiter matching the NVD limits (5 requests per rolling
+  30 s, 50 with an API key): a request waits until the oldest of the last N
+  is a full window old, so no 30 s span ever holds more than N; waiters
+  queue on an ``asyncio.Lock``, so concurrent callers cannot all see
+  "enough time has passed" and fire together
+- single-flight: identical queries already in flight share one request,
+  whoever asked first
+- an on-disk response cache (``NVD_CACHE_DIR``): fresh entries are served
+  without a request for ``NVD_CACHE_TTL`` seconds, stale ones are revalidated
+  with ``If-None-Match`` / ``If-Modified-Since`` (a 304 costs no body), and
+  when the API is unreachable a stale copy is better than nothing
+- ``iter_pages`` walks ``startIndex`` pagination and records the next index
+  after each page the caller has consumed, so an interrupted walk resumes
+  where it stopped instead of starting over
+- 403/429/5xx responses are retried with backoff, honouring ``Retry-After``
+
+Clients are shared per API key and base URL (``get_nvd_client``) because the
+rate limit applies to the process, not to one ``CVEIntegration`` instance.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+NVD_CVE_URL = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+USER_AGENT = "SecureNet-CVE-Integration/2.1.0"
+CACHE_DIR = os.getenv("NVD_CACHE_DIR", "data/cache/nvd")
+CACHE_TTL = float(os.getenv("NVD_CACHE_TTL", "7200"))
+RATE_WINDOW = 30.0
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+# Pagination parameters are not part of a query's identity
+PAGE_PARAMS = ("startIndex", "resultsPerPage")
+
+
+class NVDClientError(Exception):
+    """A page could not be fetched; ``iter_pages`` resumes from it next time"""
+
+
+class SlidingWindowLimiter:
+    """
+    At most ``limit`` acquisitions in any ``window`` seconds, safe to share
+    between coroutines; waiters are served in arrival order
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.sent: deque = deque()
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.window:
+                    self.sent.popleft()
+                if len(self.sent) < self.limit:
+                    self.sent.append(now)
+                    return
+                await asyncio.sleep(self.sent[0] + self.window - now)
+
+
+class ResponseCache:
+    """JSON response bodies on disk with their validators, one file per query"""
+
+    def __init__(self, directory: str = CACHE_DIR, ttl: float = CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fresh(self, entry: Dict) -> bool:
+        return time.time() - entry.get("stored_at", 0) < self.ttl
+
+    def store(self, key: str, url: str, body: Dict, etag: Optional[str], last_modified: Optional[str]) -> Dict:
+        entry = {"url": url, "etag": etag, "last_modified": last_modified, "stored_at": time.time(), "body": body}
+        _write_json(self._path(key), entry)
+        return entry
+
+    def touch(self, key: str, entry: Dict):
+        """A 304 revalidated the entry: restart its TTL"""
+        entry["stored_at"] = time.time()
+        _write_json(self._path(key), entry)
+
+
+def _write_json(path: str, document: Dict):
+    """Write atomically so a crash never leaves a half-written cache or progress file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def query_key(params: Dict) -> str:
+    return hashlib.sha256(json.dumps(sorted(params.items()), default=str).encode("utf-8")).hexdigest()
+
+
+class NVDClient:
+    """Rate-limited, cached, coalescing NVD API client"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = NVD_CVE_URL,
+                 cache_dir: str = CACHE_DIR, ttl: float = CACHE_TTL,
+                 requests_per_window: Optional[int] = None, window: float = RATE_WINDOW,
+                 max_retries: int = 3, retry_backoff: float = 2.0, timeout: float = 60.0,
+                 connections: int = 4):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.cache = ResponseCache(cache_dir, ttl)
+        self.limiter = SlidingWindowLimiter(requests_per_window or (50 if api_key else 5), window)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.connections = connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loop = None
+        self.stats = {"requests": 0, "cache_hits": 0, "revalidated": 0, "coalesced": 0, "retries": 0, "stale": 0}
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Sessions and futures belong to one event loop
+            self._loop, self._session, self._inflight = loop, None, {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": USER_AGENT, **({"apiKey": self.api_key} if self.api_key else {})}
+            )
+        return self._session
+
+    async def get(self, params: Dict, use_cache: bool = True) -> Optional[Dict]:
+        """One API response body, or ``None`` when it could not be fetched and nothing is cached"""
+        self._ensure_loop()
+        key = query_key(params)
+        entry = self.cache.load(key) if use_cache else None
+        if entry is not None and self.cache.fresh(entry):
+            self.stats["cache_hits"] += 1
+            return entry["body"]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._fetch(params, key, entry))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _, key=key: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the request other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            return self.retry_backoff * (2 ** attempt)
+
+    async def _fetch(self, params: Dict, key: str, entry: Optional[Dict]) -> Optional[Dict]:
+        url = f"{self.base_url}?{urlencode(params)}"
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            self.stats["requests"] += 1
+            retry_after = None
+            try:
+                async with self._get_session().get(url, headers=headers) as response:
+                    if response.status == 304 and entry is not None:
+                        self.stats["revalidated"] += 1
+                        self.cache.touch(key, entry)
+                        return entry["body"]
+                    if response.status == 200:
+                        body = await response.json(content_type=None)
+                        self.cache.store(key, url, body, response.headers.get("ETag"),
+                                         response.headers.get("Last-Modified"))
+                        return body
+                    if response.status not in RETRY_STATUSES:
+                        logger.error(f"NVD API request failed: {response.status}")
+                        break
+                    retry_after = response.headers.get("Retry-After")
+                    logger.warning(f"NVD API returned {response.status}, attempt {attempt + 1}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"NVD API request error: {e}, attempt {attempt + 1}")
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+        if entry is not None:
+            self.stats["stale"] += 1
+            logger.warning("Serving stale cached NVD response")
+            return entry["body"]
+        return None
+
+    def _progress_path(self, params: Dict) -> str:
+        identity = {k: v for k, v in params.items() if k not in PAGE_PARAMS}
+        return os.path.join(self.cache.directory, "progress", f"{query_key(identity)}.json")
+
+    async def iter_pages(self, params: Dict, page_size: int = 2000, resume: bool = True) -> AsyncIterator[Dict]:
+        """
+        Every page of a paginated query. The next ``startIndex`` is recorded
+        once the caller asks for the following page (i.e. has processed this
+        one), so after a failure or restart the walk resumes from there.
+        Raises ``NVDClientError`` when a page cannot be fetched.
+        """
+        path = self._progress_path(params)
+        start = 0
+        if resume:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    start = json.load(f)["next_index"]
+                logger.info(f"Resuming NVD query at startIndex {start}")
+            except (OSError, ValueError, KeyError):
+                start = 0
+
+        while True:
+            page = await self.get({**params, "resultsPerPage": page_size, "startIndex": start})
+            if page is None:
+                raise NVDClientError(f"NVD page at startIndex {start} could not be fetched")
+            yield page
+            count = len(page.get("vulnerabilities", []))
+            start += count
+            if count == 0 or start >= page.get("totalResults", 0):
+                break
+            _write_json(path, {"next_index": start, "total": page.get("totalResults", 0)})
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_clients: Dict[Tuple[Optional[str], str], NVDClient] = {}
+
+
+def get_nvd_client(api_key: Optional[str] = None, base_url: str = NVD_CVE_URL) -> NVDClient:
+    """The process-wide client for an API key, so every caller shares its rate limit, cache and session"""
+    client = _clients.get((api_key, base_url))
+    if client is None:
+        client = _clients[(api_key, base_url)] = NVDClient(api_key, base_url)
+    return client
+
+
+async def close_nvd_clients():
+    for client in _clients.values():
+        await client.close()
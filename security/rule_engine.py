@@ -0,0 +1,446 @@
+"""
+SecureNet Declarative Threat Rules
+
+Threat rules are declared in YAML (``security/threat_rules.yaml``) and
+compiled once into closures, so evaluating an event costs a few dict lookups
+and comparisons rather than interpreting the rule on every call.
+
+Rule format::
+
+    - name: suspicious_data_access
+      scope: realtime              # realtime (activity dicts) | activity_log (SQL)
+      match:                       # every predicate must hold
+        event_type: data_access    # equality (also used to index the rule)
+        user_id: {exists: true}
+      any_of:                      # optional: at least one mapping must hold
+        - action: {contains: [admin, root]}
+      group_by: [user_id]          # windowed count key
+      window: 60                   # seconds
+      threshold: 10                # fires as the per-key count in the window reaches it
+      detector: brute_force        # optional: a built-in detector consumes the match
+
+Predicates: a scalar (equals), ``{equals}``, ``{in: [...]}``,
+``{not_in: [...]}``, ``{contains: str | [str]}`` (case-insensitive),
+``{regex}``, ``{gt|gte|lt|lte}`` and ``{exists: bool}``. Any other rule key is
+passed through in ``CompiledRule.params``.
+
+Rules are indexed by their equality/``in`` predicate on an indexed field
+(``event_type`` first), so an event is only checked against rules that could
+match it. ``RuleEngine`` swaps rule sets atomically on hot reload, keeps the
+window counters of unchanged rules and tracks per-rule evaluation counts and
+latency.
+"""
+
+import logging
+import operator
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import yaml
+
+from utils.windowed_counters import WindowedCounterStore
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv(
+    "THREAT_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "threat_rules.yaml")
+)
+
+SCOPES = ("realtime", "activity_log")
+
+# Fields an event is bucketed on, most selective first
+INDEX_FIELDS = ("event_type", "activity_type", "action")
+
+RULE_KEYS = {"name", "description", "enabled", "scope", "match", "any_of", "group_by",
+             "window", "threshold", "detector"}
+
+COMPARISONS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+SQL_COMPARISONS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+# Predicates ordered cheapest first when a rule is compiled
+PREDICATE_COST = {"exists": 0, "equals": 1, "in": 1, "not_in": 1, "gt": 1, "gte": 1, "lt": 1,
+                  "lte": 1, "contains": 2, "regex": 3}
+
+
+class RuleError(ValueError):
+    """Invalid rule definition"""
+
+
+Check = Callable[[Any], bool]
+Matcher = Callable[[Dict[str, Any]], bool]
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _predicate_parts(field: str, spec: Any) -> Dict[str, Any]:
+    """Normalise a predicate to ``{operator: operand}``"""
+    if not isinstance(spec, dict):
+        return {"equals": spec}
+    if not spec:
+        raise RuleError(f"Empty predicate for field '{field}'")
+    unknown = set(spec) - set(PREDICATE_COST)
+    if unknown:
+        raise RuleError(f"Unknown predicate {sorted(unknown)} for field '{field}'")
+    return spec
+
+
+def _compile_check(field: str, op: str, operand: Any) -> Check:
+    if op == "exists":
+        return (lambda value: value is not None) if operand else (lambda value: value is None)
+    if op == "equals":
+        return lambda value: value == operand
+    if op in ("in", "not_in"):
+        try:
+            values = frozenset(_as_list(operand))
+        except TypeError:
+            raise RuleError(f"Unhashable values in '{op}' for field '{field}'")
+        if op == "in":
+            return lambda value: value in values
+        return lambda value: value is not None and value not in values
+    if op == "contains":
+        needles = tuple(str(needle).lower() for needle in _as_list(operand))
+        if len(needles) == 1:
+            needle = needles[0]
+            return lambda value: value is not None and needle in str(value).lower()
+        return lambda value: value is not None and any(n in str(value).lower() for n in needles)
+    if op == "regex":
+        try:
+            search = re.compile(operand).search
+        except re.error as e:
+            raise RuleError(f"Invalid regex for field '{field}': {e}")
+        return lambda value: value is not None and search(str(value)) is not None
+    compare = COMPARISONS[op]
+
+    def check(value: Any) -> bool:
+        try:
+            return value is not None and compare(value, operand)
+        except TypeError:
+            return False
+    return check
+
+
+def compile_match(match: Dict[str, Any]) -> Matcher:
+    """Compile a ``{field: predicate}`` mapping into one closure over an event"""
+    if not isinstance(match, dict):
+        raise RuleError("'match' must be a mapping of field to predicate")
+    checks: List[Tuple[int, str, Check]] = []
+    for field, spec in match.items():
+        for op, operand in _predicate_parts(field, spec).items():
+            checks.append((PREDICATE_COST[op], field, _compile_check(field, op, operand)))
+    checks.sort(key=lambda item: item[0])
+    compiled = tuple((field, check) for _, field, check in checks)
+
+    if not compiled:
+        return lambda event: True
+    if len(compiled) == 1:
+        (field, check), = compiled
+        return lambda event: check(event.get(field))
+
+    def matches(event: Dict[str, Any]) -> bool:
+        get = event.get
+        for field, check in compiled:
+            if not check(get(field)):
+                return False
+        return True
+    return matches
+
+
+def _sql_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def compile_sql(match: Dict[str, Any], any_of: Optional[List[Dict[str, Any]]] = None,
+                columns: Optional[Dict[str, str]] = None) -> str:
+    """
+    Compile predicates into a SQL boolean expression with inlined literals.
+
+    ``columns`` maps rule fields to SQL expressions (derived columns such as
+    the hour of a timestamp); other fields are used as column names.
+    """
+    columns = columns or {}
+
+    def column(field: str) -> str:
+        if field in columns:
+            return columns[field]
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", field):
+            raise RuleError(f"Field '{field}' is not a valid column name")
+        return field
+
+    def conjunction(mapping: Dict[str, Any]) -> str:
+        clauses = []
+        for field, spec in mapping.items():
+            col = column(field)
+            for op, operand in _predicate_parts(field, spec).items():
+                if op == "exists":
+                    clauses.append(f"{col} IS {'NOT ' if operand else ''}NULL")
+                elif op == "equals":
+                    clauses.append(f"{col} = {_sql_literal(operand)}")
+                elif op in ("in", "not_in"):
+                    values = ", ".join(_sql_literal(v) for v in _as_list(operand))
+                    clauses.append(f"{col} {'NOT ' if op == 'not_in' else ''}IN ({values})")
+                elif op == "contains":
+                    needles = [f"instr(LOWER({col}), {_sql_literal(str(n).lower())}) > 0"
+                               for n in _as_list(operand)]
+                    clauses.append(needles[0] if len(needles) == 1 else f"({' OR '.join(needles)})")
+                elif op in SQL_COMPARISONS:
+                    clauses.append(f"{col} {SQL_COMPARISONS[op]} {_sql_literal(operand)}")
+                else:
+                    raise RuleError(f"Predicate '{op}' on field '{field}' has no SQL form")
+        return " AND ".join(clauses) if clauses else "1"
+
+    sql = conjunction(match) if match else ""
+    if any_of:
+        options = " OR ".join(f"({conjunction(option)})" for option in any_of)
+        sql = f"({sql}) AND ({options})" if sql else f"({options})"
+    return sql or "1"
+
+
+class CompiledRule:
+    """A rule definition bound to its compiled matcher and runtime counters."""
+
+    __slots__ = ("name", "spec", "scope", "description", "detector", "group_by", "window",
+                 "threshold", "params", "matches", "index_field", "index_values",
+                 "evaluations", "matched", "fired", "total_ns", "max_ns")
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict) or not spec.get("name"):
+            raise RuleError("Every rule needs a name")
+        self.name = spec["name"]
+        self.spec = spec
+        self.scope = spec.get("scope", "realtime")
+        if self.scope not in SCOPES:
+            raise RuleError(f"Rule '{self.name}' has unknown scope '{self.scope}'")
+        self.description = spec.get("description", "")
+        self.detector = spec.get("detector")
+        self.group_by = tuple(_as_list(spec.get("group_by") or ()))
+        self.window = spec.get("window")
+        self.threshold = spec.get("threshold")
+        self.params = {key: value for key, value in spec.items() if key not in RULE_KEYS}
+
+        match = spec.get("match") or {}
+        any_of = spec.get("any_of") or []
+        try:
+            matcher = compile_match(match)
+            options = tuple(compile_match(option) for option in any_of)
+        except RuleError as e:
+            raise RuleError(f"Rule '{self.name}': {e}")
+        if options:
+            self.matches = lambda event: matcher(event) and any(option(event) for option in options)
+        else:
+            self.matches = matcher
+
+        self.index_field, self.index_values = None, ()
+        for field in INDEX_FIELDS:
+            parts = _predicate_parts(field, match[field]) if field in match else {}
+            if "equals" in parts or "in" in parts:
+                self.index_field = field
+                self.index_values = tuple(_as_list(parts.get("equals", parts.get("in"))))
+                break
+
+        self.evaluations = 0
+        self.matched = 0
+        self.fired = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    @property
+    def counts_window(self) -> bool:
+        """Generic windowed threshold (detector rules apply their own logic)"""
+        return not self.detector and bool(self.window) and bool(self.threshold)
+
+    def group_key(self, event: Dict[str, Any]) -> str:
+        return "|".join(str(event.get(field)) for field in self.group_by) or self.name
+
+    def record(self, elapsed_ns: int, matched: bool = False, fired: bool = False):
+        self.evaluations += 1
+        self.matched += matched
+        self.fired += fired
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def inherit_stats(self, other: "CompiledRule"):
+        self.evaluations, self.matched, self.fired = other.evaluations, other.matched, other.fired
+        self.total_ns, self.max_ns = other.total_ns, other.max_ns
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "evaluations": self.evaluations,
+            "matched": self.matched,
+            "fired": self.fired,
+            "total_ms": self.total_ns / 1e6,
+            "avg_us": self.total_ns / self.evaluations / 1000 if self.evaluations else 0.0,
+            "max_us": self.max_ns / 1000,
+        }
+
+
+class RuleSet:
+    """Immutable, indexed collection of compiled rules."""
+
+    def __init__(self, rules: Iterable[CompiledRule]):
+        self.rules: List[CompiledRule] = list(rules)
+        self.by_name: Dict[str, CompiledRule] = {}
+        self.index: Dict[str, Dict[Any, List[CompiledRule]]] = {}
+        self.unindexed: List[CompiledRule] = []
+        for rule in self.rules:
+            if rule.name in self.by_name:
+                raise RuleError(f"Duplicate rule name '{rule.name}'")
+            self.by_name[rule.name] = rule
+            if rule.index_field is None:
+                self.unindexed.append(rule)
+                continue
+            buckets = self.index.setdefault(rule.index_field, {})
+            for value in rule.index_values:
+                buckets.setdefault(value, []).append(rule)
+
+    def candidates(self, event: Dict[str, Any]) -> Iterator[CompiledRule]:
+        """Rules that could match ``event``"""
+        for field, buckets in self.index.items():
+            value = event.get(field)
+            if value is not None:
+                try:
+                    yield from buckets.get(value, ())
+                except TypeError:
+                    pass  # Unhashable field values can't match an indexed rule
+        yield from self.unindexed
+
+
+@dataclass
+class RuleMatch:
+    """A rule that matched an event (and, for windowed rules, crossed its threshold)"""
+    rule: CompiledRule
+    event: Dict[str, Any]
+    key: Optional[str] = None
+    count: int = 1
+
+
+class RuleEngine:
+    """Evaluates events against a hot-reloadable set of compiled rules."""
+
+    def __init__(self, path: Optional[str] = RULES_PATH, scope: Optional[str] = "realtime",
+                 rules: Optional[List[Dict[str, Any]]] = None, resolution: int = 60,
+                 max_keys: int = 100000, reload_interval: float = 5.0):
+        self.path = path
+        self.scope = scope
+        self.resolution = resolution
+        self.max_keys = max_keys
+        self.reload_interval = reload_interval
+        self.ruleset = RuleSet([])
+        self._counters: Dict[str, WindowedCounterStore] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = time.monotonic()
+        self.stats = {
+            "events": 0,
+            "candidates": 0,
+            "reloads": 0,
+            "reload_errors": 0,
+        }
+        if rules is not None:
+            self.load_rules(rules)
+        elif path:
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.ruleset.rules)
+
+    def rule(self, name: str) -> Optional[CompiledRule]:
+        return self.ruleset.by_name.get(name)
+
+    def rules(self) -> List[CompiledRule]:
+        return list(self.ruleset.rules)
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Compile the rule file at ``path``; raises on invalid rules, keeping the old set"""
+        path = path or self.path
+        mtime = os.path.getmtime(path)
+        with open(path) as f:
+            document = yaml.safe_load(f) or {}
+        specs = document.get("rules", []) if isinstance(document, dict) else document
+        loaded = self.load_rules(specs)
+        self.path, self._mtime = path, mtime
+        return loaded
+
+    def load_rules(self, specs: List[Dict[str, Any]]) -> int:
+        """Compile ``specs`` and swap them in atomically; returns the active rule count"""
+        if not isinstance(specs, list):
+            raise RuleError("Rules must be a list")
+        compiled = [
+            CompiledRule(spec) for spec in specs
+            if spec.get("enabled", True) and (self.scope is None or spec.get("scope", "realtime") == self.scope)
+        ]
+        ruleset = RuleSet(compiled)
+
+        counters = {}
+        for rule in ruleset.rules:
+            previous = self.ruleset.by_name.get(rule.name)
+            if previous is not None:
+                rule.inherit_stats(previous)
+            if not rule.counts_window:
+                continue
+            store = self._counters.get(rule.name)
+            if (store is None or previous is None or previous.spec.get("match") != rule.spec.get("match")
+                    or previous.group_by != rule.group_by or previous.window != rule.window):
+                store = WindowedCounterStore(rule.window, self.resolution, self.max_keys)
+            counters[rule.name] = store
+
+        self.ruleset, self._counters = ruleset, counters
+        logger.info(f"Loaded {len(ruleset.rules)} threat rules")
+        return len(ruleset.rules)
+
+    def reload_if_changed(self) -> bool:
+        """Reload the rule file if it changed; a broken file keeps the current rules"""
+        self._checked_at = time.monotonic()
+        if not self.path:
+            return False
+        try:
+            if os.path.getmtime(self.path) == self._mtime:
+                return False
+            self.load(self.path)
+            self.stats["reloads"] += 1
+            return True
+        except Exception as e:
+            self.stats["reload_errors"] += 1
+            logger.error(f"Failed to reload threat rules from {self.path}: {str(e)}")
+            return False
+
+    def evaluate(self, event: Dict[str, Any], now: Optional[float] = None) -> List[RuleMatch]:
+        """Rules matched by ``event``; windowed rules match as their count reaches the threshold"""
+        if time.monotonic() - self._checked_at > self.reload_interval:
+            self.reload_if_changed()
+        ruleset, counters = self.ruleset, self._counters
+        self.stats["events"] += 1
+        clock = time.perf_counter_ns
+        matches = []
+        for rule in ruleset.candidates(event):
+            started = clock()
+            self.stats["candidates"] += 1
+            matched = fired = False
+            if rule.matches(event):
+                matched = True
+                if rule.counts_window:
+                    key = rule.group_key(event)
+                    now = time.time() if now is None else now
+                    count = counters[rule.name].increment(key, now)
+                    if count == rule.threshold:  # once per burst, not per event above it
+                        fired = True
+                        matches.append(RuleMatch(rule, event, key, count))
+                else:
+                    fired = True
+                    matches.append(RuleMatch(rule, event))
+            rule.record(clock() - started, matched, fired)
+        return matches
+
+    def rule_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-rule evaluation counts and latency"""
+        return {rule.name: rule.stats() for rule in self.ruleset.rules}
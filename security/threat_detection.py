@@ -9,12 +9,16 @@ import time
 import json
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple, Set
+from typing import Dict, List, Any, Optional, Tuple, Set, Sequence, AsyncIterable, AsyncIterator
 from enum import Enum
 from dataclasses import dataclass, asdict
 import hashlib
 from collections import defaultdict, deque
 from utils.cache_service import cache_service
+from utils.windowed_counters import failed_login_counters
+from security.behavior_profiles import BehaviorProfileStore, UserBehaviorProfile, behavior_profiles
+from security.rule_engine import RuleEngine, RuleMatch, RuleSet
+from security.ip_reputation import ReputationEntry, blocked_ips, malicious_ips
 from auth.audit_logging import security_audit_logger, AuditEventType, AuditSeverity
 from utils.realtime_notifications import send_security_alert, NotificationPriority
 from database.postgresql_adapter import get_db_connection
@@ -85,173 +89,91 @@ class BehaviorAnalyzer:
     AI-powered user behavior analysis for anomaly detection
     """
     
-    def __init__(self):
-        self.user_profiles: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, profiles: Optional[BehaviorProfileStore] = None):
+        # Profiles are kept current by the audit logger; see security.behavior_profiles
+        self.profiles = profiles if profiles is not None else behavior_profiles
         self.baseline_window = timedelta(days=30)
         self.anomaly_threshold = 0.8  # Z-score threshold for anomaly detection
+        self.common_resource_frequency = 5  # decayed accesses
         
-    async def build_user_profile(self, user_id: str) -> Dict[str, Any]:
-        """Build behavioral profile for user"""
+    async def _rebuild_profiles(self, user_ids: List[str]) -> Dict[str, UserBehaviorProfile]:
+        """Rebuild cold profiles from the baseline window of audit_logs"""
         try:
-            # Get user activity from last 30 days
             end_time = datetime.now()
             start_time = end_time - self.baseline_window
             
+            # One grouped scan for every user replaces per-user login/access/location scans
             async with get_db_connection() as conn:
-                # Login patterns
-                login_data = await conn.fetch("""
+                rows = await conn.fetch("""
                     SELECT 
-                        EXTRACT(hour FROM timestamp) as login_hour,
-                        EXTRACT(dow FROM timestamp) as login_dow,
+                        user_id,
+                        event_type,
+                        EXTRACT(hour FROM timestamp)::int as hour,
+                        EXTRACT(dow FROM timestamp)::int as dow,
                         source_ip,
                         user_agent,
-                        COUNT(*) as frequency
-                    FROM audit_logs 
-                    WHERE user_id = $1 
-                    AND event_type = 'login_success'
-                    AND timestamp BETWEEN $2 AND $3
-                    GROUP BY login_hour, login_dow, source_ip, user_agent
-                """, user_id, start_time, end_time)
-                
-                # Access patterns
-                access_data = await conn.fetch("""
-                    SELECT 
                         resource,
-                        action,
                         COUNT(*) as frequency,
                         AVG(EXTRACT(epoch FROM timestamp))::bigint as avg_timestamp
                     FROM audit_logs 
-                    WHERE user_id = $1 
-                    AND event_type = 'data_access'
+                    WHERE user_id = ANY($1) 
                     AND timestamp BETWEEN $2 AND $3
-                    GROUP BY resource, action
-                """, user_id, start_time, end_time)
-                
-                # Location patterns (IP geolocation)
-                location_data = await conn.fetch("""
-                    SELECT 
-                        source_ip,
-                        COUNT(*) as frequency,
-                        MIN(timestamp) as first_seen,
-                        MAX(timestamp) as last_seen
-                    FROM audit_logs 
-                    WHERE user_id = $1 
-                    AND timestamp BETWEEN $2 AND $3
-                    GROUP BY source_ip
-                """, user_id, start_time, end_time)
-            
-            # Calculate behavioral metrics
-            profile = {
-                "user_id": user_id,
-                "profile_created": datetime.now().isoformat(),
-                "baseline_period": {
-                    "start": start_time.isoformat(),
-                    "end": end_time.isoformat()
-                },
-                "login_patterns": {
-                    "typical_hours": self._extract_typical_hours([row['login_hour'] for row in login_data]),
-                    "typical_days": self._extract_typical_days([row['login_dow'] for row in login_data]),
-                    "known_ips": list(set([row['source_ip'] for row in location_data])),
-                    "known_user_agents": list(set([row['user_agent'] for row in login_data if row['user_agent']]))
-                },
-                "access_patterns": {
-                    "common_resources": [row['resource'] for row in access_data if row['frequency'] > 5],
-                    "common_actions": [row['action'] for row in access_data if row['frequency'] > 3],
-                    "activity_frequency": len(access_data)
-                },
-                "location_patterns": {
-                    "primary_ips": [row['source_ip'] for row in location_data if row['frequency'] > 10],
-                    "total_unique_ips": len(location_data),
-                    "ip_stability_score": self._calculate_ip_stability(location_data)
-                },
-                "risk_indicators": {
-                    "frequent_ip_changes": len(location_data) > 20,
-                    "off_hours_activity": self._check_off_hours_activity(login_data),
-                    "resource_access_variance": len(access_data) > 50
-                }
-            }
-            
-            # Cache profile
-            await cache_service.set(f"user_profile:{user_id}", profile, ttl=86400)
-            self.user_profiles[user_id] = profile
+                    GROUP BY user_id, event_type, hour, dow, source_ip, user_agent, resource
+                    ORDER BY avg_timestamp
+                """, list(user_ids), start_time, end_time)
             
-            return profile
+            profiles = {
+                user_id: self.profiles.new_profile(user_id, end_time.timestamp())
+                for user_id in user_ids
+            }
+            for row in rows:
+                profile = profiles.get(row['user_id']) or profiles.get(str(row['user_id']))
+                if profile is None:
+                    continue
+                frequency = row['frequency']
+                profile.observe_ip(row['source_ip'], frequency)
+                if row['event_type'] == 'login_success':
+                    profile.observe_login(row['hour'], row['dow'], row['user_agent'], frequency)
+                elif row['event_type'] == 'data_access' and row['resource']:
+                    profile.observe_access(row['resource'], row['avg_timestamp'], frequency)
+            
+            for profile in profiles.values():
+                self.profiles.put(profile)
+            return profiles
             
         except Exception as e:
-            logger.error(f"Failed to build user profile for {user_id}: {e}")
+            logger.error(f"Failed to build user profiles for {len(user_ids)} users: {e}")
             return {}
     
-    def _extract_typical_hours(self, hours: List[int]) -> List[int]:
-        """Extract typical login hours"""
-        if not hours:
-            return []
-        
-        hour_counts = defaultdict(int)
-        for hour in hours:
-            hour_counts[hour] += 1
-        
-        # Return hours with frequency > 10% of total
-        total = len(hours)
-        threshold = max(1, total * 0.1)
-        return [hour for hour, count in hour_counts.items() if count >= threshold]
-    
-    def _extract_typical_days(self, days: List[int]) -> List[int]:
-        """Extract typical days of week (0=Sunday, 6=Saturday)"""
-        if not days:
-            return []
-        
-        day_counts = defaultdict(int)
-        for day in days:
-            day_counts[day] += 1
-        
-        total = len(days)
-        threshold = max(1, total * 0.1)
-        return [day for day, count in day_counts.items() if count >= threshold]
-    
-    def _calculate_ip_stability(self, location_data: List[Dict]) -> float:
-        """Calculate IP stability score (0.0 to 1.0)"""
-        if not location_data:
-            return 0.0
-        
-        total_activity = sum(row['frequency'] for row in location_data)
-        
-        # Find the most frequently used IP
-        max_frequency = max(row['frequency'] for row in location_data)
-        
-        # Stability = (most frequent IP usage) / (total activity)
-        return min(1.0, max_frequency / total_activity)
+    async def _rebuild_profile(self, user_id: str) -> Optional[UserBehaviorProfile]:
+        """Rebuild one cold profile from audit_logs"""
+        return (await self._rebuild_profiles([user_id])).get(user_id)
     
-    def _check_off_hours_activity(self, login_data: List[Dict]) -> bool:
-        """Check if user has significant off-hours activity"""
-        if not login_data:
-            return False
-        
-        # Define business hours (9 AM to 6 PM, weekdays)
-        business_hours = set(range(9, 18))
-        business_days = set(range(1, 6))  # Monday to Friday
-        
-        off_hours_count = 0
-        for row in login_data:
-            hour = row['login_hour']
-            day = row['login_dow']
-            
-            if hour not in business_hours or day not in business_days:
-                off_hours_count += row['frequency']
-        
-        total_logins = sum(row['frequency'] for row in login_data)
-        off_hours_ratio = off_hours_count / total_logins if total_logins > 0 else 0
+    async def warm_profiles(self, user_ids: Set[str]):
+        """Make sure every user in a batch has a resident profile (one scan for all cold users)"""
+        cold = [user_id for user_id in user_ids if self.profiles.get(user_id) is None]
+        if cold:
+            await self._rebuild_profiles(cold)
+    
+    async def build_user_profile(self, user_id: str) -> Dict[str, Any]:
+        """Build behavioral profile for user"""
+        profile = await self._rebuild_profile(user_id)
+        if profile is None:
+            return {}
         
-        return off_hours_ratio > 0.3  # More than 30% off-hours activity
+        summary = profile.to_dict()
+        await cache_service.set(f"user_profile:{user_id}", summary, ttl=86400)
+        return summary
     
     async def analyze_current_behavior(self, user_id: str, current_activity: Dict[str, Any]) -> Tuple[float, List[str]]:
         """Analyze current user behavior against baseline profile"""
         try:
-            # Get or build user profile
-            profile = self.user_profiles.get(user_id)
-            if not profile:
-                profile = await self.build_user_profile(user_id)
+            # Resident profiles are current; only cold ones hit the database
+            profile = self.profiles.get(user_id)
+            if profile is None:
+                profile = await self._rebuild_profile(user_id)
             
-            if not profile:
+            if profile is None:
                 return 0.0, ["No baseline profile available"]
             
             anomalies = []
@@ -259,29 +181,27 @@ class BehaviorAnalyzer:
             
             # Check login time anomaly
             current_hour = datetime.now().hour
-            typical_hours = profile.get("login_patterns", {}).get("typical_hours", [])
+            typical_hours = profile.typical_hours()
             if typical_hours and current_hour not in typical_hours:
                 anomalies.append(f"Login at unusual hour: {current_hour}")
                 anomaly_scores.append(0.7)
             
             # Check IP address anomaly
             current_ip = current_activity.get("source_ip")
-            known_ips = profile.get("login_patterns", {}).get("known_ips", [])
-            if current_ip and current_ip not in known_ips:
+            if current_ip and not profile.knows_ip(current_ip):
                 anomalies.append(f"Login from unknown IP: {current_ip}")
                 anomaly_scores.append(0.8)
             
             # Check user agent anomaly
             current_user_agent = current_activity.get("user_agent")
-            known_agents = profile.get("login_patterns", {}).get("known_user_agents", [])
-            if current_user_agent and current_user_agent not in known_agents:
+            if current_user_agent and not profile.knows_user_agent(current_user_agent):
                 anomalies.append(f"Login from unknown device/browser")
                 anomaly_scores.append(0.6)
             
             # Check access pattern anomaly
             requested_resource = current_activity.get("resource")
-            common_resources = profile.get("access_patterns", {}).get("common_resources", [])
-            if requested_resource and requested_resource not in common_resources:
+            if (requested_resource and
+                    profile.resource_frequency(requested_resource) <= self.common_resource_frequency):
                 anomalies.append(f"Access to unusual resource: {requested_resource}")
                 anomaly_scores.append(0.5)
             
@@ -299,12 +219,16 @@ class ThreatDetectionEngine:
     Advanced threat detection engine with multiple detection methods
     """
     
-    def __init__(self):
+    def __init__(self, rule_engine: Optional[RuleEngine] = None):
         self.behavior_analyzer = BehaviorAnalyzer()
+        self.rule_engine = rule_engine
         self.detection_rules: Dict[str, Dict[str, Any]] = {}
+        self._detector_rules: Dict[str, Dict[str, Any]] = {}
+        self._ruleset: Optional[RuleSet] = None
         self.threat_history: deque = deque(maxlen=10000)  # Keep last 10k threats
         self.active_threats: Dict[str, ThreatEvent] = {}
         self.false_positive_patterns: Set[str] = set()
+        self._notification_tasks: Set[asyncio.Task] = set()
         
         # Initialize detection rules
         self._initialize_detection_rules()
@@ -316,163 +240,239 @@ class ThreatDetectionEngine:
             "threats_by_level": defaultdict(int),
             "false_positive_rate": 0.0,
             "avg_detection_time": 0.0,
-            "auto_responses_triggered": 0
+            "auto_responses_triggered": 0,
+            "batches_processed": 0,
+            "activities_processed": 0,
+            "last_batch_ms": 0.0
         }
     
     def _initialize_detection_rules(self):
-        """Initialize threat detection rules"""
-        self.detection_rules = {
-            "brute_force_login": {
-                "description": "Detect brute force login attempts",
-                "threshold": 5,  # attempts
-                "window": 300,   # seconds
-                "threat_level": ThreatLevel.HIGH,
-                "auto_response": True
-            },
-            "anomalous_login_location": {
-                "description": "Detect logins from unusual locations",
-                "threshold": 0.8,  # anomaly score
-                "threat_level": ThreatLevel.MEDIUM,
-                "auto_response": False
-            },
-            "privilege_escalation": {
-                "description": "Detect privilege escalation attempts",
-                "patterns": ["admin", "root", "sudo", "elevation"],
-                "threat_level": ThreatLevel.CRITICAL,
-                "auto_response": True
-            },
-            "suspicious_data_access": {
-                "description": "Detect suspicious data access patterns",
-                "threshold": 10,  # requests per minute
-                "threat_level": ThreatLevel.MEDIUM,
-                "auto_response": False
+        """Compile the realtime threat rules (see security/threat_rules.yaml)"""
+        if self.rule_engine is None:
+            self.rule_engine = RuleEngine(scope="realtime")
+        self._sync_detection_rules()
+    
+    def _sync_detection_rules(self):
+        """Refresh rule configs after the rule engine (re)loads its rule file"""
+        ruleset = self.rule_engine.ruleset
+        if ruleset is self._ruleset:
+            return
+        self.detection_rules = {}
+        self._detector_rules = {}
+        for rule in ruleset.rules:
+            config = {
+                **rule.params,
+                "name": rule.name,
+                "description": rule.description,
+                "detector": rule.detector,
+                "threat_level": ThreatLevel(rule.params.get("threat_level", "medium")),
+                "auto_response": bool(rule.params.get("auto_response", False))
+            }
+            if rule.threshold is not None:
+                config["threshold"] = rule.threshold
+            if rule.window:
+                config["window"] = rule.window
+            self.detection_rules[rule.name] = config
+            if rule.detector:
+                self._detector_rules[rule.detector] = config
+        self._ruleset = ruleset
+        
+        brute_force = self._detector_rules.get("brute_force")
+        if brute_force and brute_force.get("window"):
+            failed_login_counters.track_window(brute_force["window"])
+    
+    def _detector_rule(self, detector: str) -> Dict[str, Any]:
+        """Config of the rule bound to a built-in detector"""
+        return self._detector_rules[detector]
+    
+    def _match_rules(self, activity: Dict[str, Any]) -> List[RuleMatch]:
+        """Rules whose predicates match the activity (windowed rules at their threshold)"""
+        matches = self.rule_engine.evaluate(activity)
+        self._sync_detection_rules()
+        return matches
+    
+    def _rule_threat(self, match: RuleMatch) -> ThreatEvent:
+        """Build a threat for a declarative rule without a dedicated detector"""
+        rule, activity = match.rule, match.event
+        config = self.detection_rules[rule.name]
+        threshold = rule.threshold or 1
+        return ThreatEvent(
+            id="",
+            threat_type=ThreatType(config.get("threat_type", ThreatType.SUSPICIOUS_ACTIVITY.value)),
+            threat_level=config["threat_level"],
+            status=ThreatStatus.DETECTED,
+            source_ip=activity.get("source_ip", "unknown"),
+            user_id=activity.get("user_id"),
+            username=activity.get("username"),
+            description=(f"{rule.description}: {match.count} matching events in {rule.window} seconds"
+                         if rule.window else rule.description),
+            evidence={
+                "matching_events": match.count,
+                "threshold": rule.threshold,
+                "time_window": rule.window,
+                "group_key": match.key,
+                "activity": activity,
+                "detection_rule": rule.name
             },
-            "malicious_ip_activity": {
-                "description": "Activity from known malicious IPs",
-                "threat_level": ThreatLevel.HIGH,
-                "auto_response": True
+            confidence_score=min(1.0, match.count / (threshold * 2)),
+            risk_score=min(100, int(match.count * 50 / threshold)),
+            timestamp=datetime.now(),
+            detection_method="rule_based",
+            affected_resources=[f"{field}:{activity.get(field)}" for field in rule.group_by],
+            recommended_actions=config.get("recommended_actions", [
+                "Review matching activity",
+                "Verify the source is legitimate"
+            ]),
+            auto_response_taken=config["auto_response"]
+        )
+    
+    def _brute_force_threat(self, source_ip: str, username: str, failed_attempts: int) -> Optional[ThreatEvent]:
+        """Build a brute force threat if ``failed_attempts`` reaches the rule threshold"""
+        rule = self._detector_rule("brute_force")
+        window = rule["window"]
+        threshold = rule["threshold"]
+        
+        if failed_attempts < threshold:
+            return None
+        
+        return ThreatEvent(
+            id="",
+            threat_type=ThreatType.BRUTE_FORCE,
+            threat_level=rule["threat_level"],
+            status=ThreatStatus.DETECTED,
+            source_ip=source_ip,
+            user_id=None,
+            username=username,
+            description=f"Brute force attack detected: {failed_attempts} failed login attempts in {window} seconds",
+            evidence={
+                "failed_attempts": failed_attempts,
+                "time_window": window,
+                "detection_rule": rule["name"]
             },
-            "rate_limit_abuse": {
-                "description": "Detect rate limit abuse attempts",
-                "threshold": 100,  # requests per minute
-                "threat_level": ThreatLevel.MEDIUM,
-                "auto_response": True
-            }
-        }
+            confidence_score=min(1.0, failed_attempts / (threshold * 2)),
+            risk_score=min(100, failed_attempts * 10),
+            timestamp=datetime.now(),
+            detection_method="rule_based",
+            affected_resources=[f"user:{username}"],
+            recommended_actions=[
+                "Block IP address temporarily",
+                "Lock user account",
+                "Require MFA verification",
+                "Investigate source of attacks"
+            ],
+            auto_response_taken=rule["auto_response"]
+        )
     
     async def detect_brute_force_attack(self, source_ip: str, username: str) -> Optional[ThreatEvent]:
         """Detect brute force login attempts"""
         try:
-            rule = self.detection_rules["brute_force_login"]
-            window = rule["window"]
-            threshold = rule["threshold"]
-            
-            # Count failed login attempts in time window
-            now = datetime.now()
-            start_time = now - timedelta(seconds=window)
-            
-            async with get_db_connection() as conn:
-                failed_attempts = await conn.fetchval("""
-                    SELECT COUNT(*) FROM audit_logs 
-                    WHERE event_type = 'login_failed'
-                    AND source_ip = $1 
-                    AND username = $2
-                    AND timestamp > $3
-                """, source_ip, username, start_time)
-            
-            if failed_attempts >= threshold:
-                threat = ThreatEvent(
-                    id="",
-                    threat_type=ThreatType.BRUTE_FORCE,
-                    threat_level=rule["threat_level"],
-                    status=ThreatStatus.DETECTED,
-                    source_ip=source_ip,
-                    user_id=None,
-                    username=username,
-                    description=f"Brute force attack detected: {failed_attempts} failed login attempts in {window} seconds",
-                    evidence={
-                        "failed_attempts": failed_attempts,
-                        "time_window": window,
-                        "detection_rule": "brute_force_login"
-                    },
-                    confidence_score=min(1.0, failed_attempts / (threshold * 2)),
-                    risk_score=min(100, failed_attempts * 10),
-                    timestamp=now,
-                    detection_method="rule_based",
-                    affected_resources=[f"user:{username}"],
-                    recommended_actions=[
-                        "Block IP address temporarily",
-                        "Lock user account",
-                        "Require MFA verification",
-                        "Investigate source of attacks"
-                    ],
-                    auto_response_taken=rule["auto_response"]
-                )
-                
-                return threat
-            
-            return None
+            # Failed logins are counted as the audit logger records them
+            failed_attempts = await failed_login_counters.count(
+                "ip_user", self._detector_rule("brute_force")["window"],
+                source_ip=source_ip, username=username
+            )
+            return self._brute_force_threat(source_ip, username, failed_attempts)
             
         except Exception as e:
             logger.error(f"Brute force detection failed: {e}")
             return None
     
+    def _behavioral_threat(self, user_id: str, activity: Dict[str, Any],
+                           anomaly_score: float, anomalies: List[str]) -> Optional[ThreatEvent]:
+        """Build a behavioral anomaly threat for a high anomaly score"""
+        if anomaly_score < self._detector_rule("behavioral_anomaly")["threshold"]:
+            return None
+        
+        return ThreatEvent(
+            id="",
+            threat_type=ThreatType.BEHAVIORAL_ANOMALY,
+            threat_level=ThreatLevel.MEDIUM if anomaly_score < 0.9 else ThreatLevel.HIGH,
+            status=ThreatStatus.DETECTED,
+            source_ip=activity.get("source_ip", "unknown"),
+            user_id=user_id,
+            username=activity.get("username"),
+            description=f"Behavioral anomaly detected (score: {anomaly_score:.2f})",
+            evidence={
+                "anomaly_score": anomaly_score,
+                "anomalies": anomalies,
+                "activity": activity,
+                "detection_rule": "behavioral_analysis"
+            },
+            confidence_score=anomaly_score,
+            risk_score=int(anomaly_score * 100),
+            timestamp=datetime.now(),
+            detection_method="ai_behavioral_analysis",
+            affected_resources=[f"user:{user_id}"],
+            recommended_actions=[
+                "Verify user identity",
+                "Monitor continued activity",
+                "Require additional authentication",
+                "Review recent access patterns"
+            ]
+        )
+    
     async def detect_behavioral_anomaly(self, user_id: str, activity: Dict[str, Any]) -> Optional[ThreatEvent]:
         """Detect behavioral anomalies using AI analysis"""
         try:
             anomaly_score, anomalies = await self.behavior_analyzer.analyze_current_behavior(user_id, activity)
-            
-            if anomaly_score >= 0.8:  # High anomaly threshold
-                threat = ThreatEvent(
-                    id="",
-                    threat_type=ThreatType.BEHAVIORAL_ANOMALY,
-                    threat_level=ThreatLevel.MEDIUM if anomaly_score < 0.9 else ThreatLevel.HIGH,
-                    status=ThreatStatus.DETECTED,
-                    source_ip=activity.get("source_ip", "unknown"),
-                    user_id=user_id,
-                    username=activity.get("username"),
-                    description=f"Behavioral anomaly detected (score: {anomaly_score:.2f})",
-                    evidence={
-                        "anomaly_score": anomaly_score,
-                        "anomalies": anomalies,
-                        "activity": activity,
-                        "detection_rule": "behavioral_analysis"
-                    },
-                    confidence_score=anomaly_score,
-                    risk_score=int(anomaly_score * 100),
-                    timestamp=datetime.now(),
-                    detection_method="ai_behavioral_analysis",
-                    affected_resources=[f"user:{user_id}"],
-                    recommended_actions=[
-                        "Verify user identity",
-                        "Monitor continued activity",
-                        "Require additional authentication",
-                        "Review recent access patterns"
-                    ]
-                )
-                
-                return threat
-            
-            return None
+            return self._behavioral_threat(user_id, activity, anomaly_score, anomalies)
             
         except Exception as e:
             logger.error(f"Behavioral anomaly detection failed: {e}")
             return None
     
+    def _escalation_indicators(self, action: str, resource: str) -> List[str]:
+        """Privilege escalation patterns found in an action or resource"""
+        action_lower = action.lower()
+        resource_lower = resource.lower()
+        return [
+            pattern for pattern in self._detector_rule("privilege_escalation")["patterns"]
+            if pattern in action_lower or pattern in resource_lower
+        ]
+    
+    def _privilege_escalation_threat(self, user_id: str, action: str, resource: str,
+                                     indicators: List[str], user_role: Optional[str]) -> Optional[ThreatEvent]:
+        """Build a privilege escalation threat unless the user's role allows the action"""
+        # If user is not admin/platform_owner, this is suspicious
+        if user_role in ['platform_owner', 'security_admin']:
+            return None
+        
+        rule = self._detector_rule("privilege_escalation")
+        return ThreatEvent(
+            id="",
+            threat_type=ThreatType.PRIVILEGE_ESCALATION,
+            threat_level=rule["threat_level"],
+            status=ThreatStatus.DETECTED,
+            source_ip="unknown",  # Would need to be passed in
+            user_id=user_id,
+            username=None,
+            description=f"Privilege escalation attempt detected",
+            evidence={
+                "action": action,
+                "resource": resource,
+                "indicators": indicators,
+                "user_role": user_role,
+                "detection_rule": rule["name"]
+            },
+            confidence_score=0.9,
+            risk_score=95,
+            timestamp=datetime.now(),
+            detection_method="pattern_matching",
+            affected_resources=[resource],
+            recommended_actions=[
+                "Immediately investigate user activity",
+                "Suspend user account if confirmed",
+                "Review recent privilege changes",
+                "Audit system access logs"
+            ],
+            auto_response_taken=rule["auto_response"]
+        )
+    
     async def detect_privilege_escalation(self, user_id: str, action: str, resource: str) -> Optional[ThreatEvent]:
         """Detect privilege escalation attempts"""
         try:
-            rule = self.detection_rules["privilege_escalation"]
-            patterns = rule["patterns"]
-            
             # Check if action or resource contains privilege escalation indicators
-            escalation_indicators = []
-            action_lower = action.lower()
-            resource_lower = resource.lower()
-            
-            for pattern in patterns:
-                if pattern in action_lower or pattern in resource_lower:
-                    escalation_indicators.append(pattern)
+            escalation_indicators = self._escalation_indicators(action, resource)
             
             if escalation_indicators:
                 # Get user's current role to check if escalation is legitimate
@@ -481,39 +481,7 @@ class ThreatDetectionEngine:
                         SELECT role FROM users WHERE id = $1
                     """, user_id)
                 
-                # If user is not admin/platform_owner, this is suspicious
-                if user_role not in ['platform_owner', 'security_admin']:
-                    threat = ThreatEvent(
-                        id="",
-                        threat_type=ThreatType.PRIVILEGE_ESCALATION,
-                        threat_level=rule["threat_level"],
-                        status=ThreatStatus.DETECTED,
-                        source_ip="unknown",  # Would need to be passed in
-                        user_id=user_id,
-                        username=None,
-                        description=f"Privilege escalation attempt detected",
-                        evidence={
-                            "action": action,
-                            "resource": resource,
-                            "indicators": escalation_indicators,
-                            "user_role": user_role,
-                            "detection_rule": "privilege_escalation"
-                        },
-                        confidence_score=0.9,
-                        risk_score=95,
-                        timestamp=datetime.now(),
-                        detection_method="pattern_matching",
-                        affected_resources=[resource],
-                        recommended_actions=[
-                            "Immediately investigate user activity",
-                            "Suspend user account if confirmed",
-                            "Review recent privilege changes",
-                            "Audit system access logs"
-                        ],
-                        auto_response_taken=rule["auto_response"]
-                    )
-                    
-                    return threat
+                return self._privilege_escalation_threat(user_id, action, resource, escalation_indicators, user_role)
             
             return None
             
@@ -521,42 +489,45 @@ class ThreatDetectionEngine:
             logger.error(f"Privilege escalation detection failed: {e}")
             return None
     
+    def _malicious_ip_threat(self, source_ip: str, entry: ReputationEntry) -> ThreatEvent:
+        """Build a threat for activity from a known malicious IP"""
+        rule = self._detector_rule("malicious_ip")
+        return ThreatEvent(
+            id="",
+            threat_type=ThreatType.MALICIOUS_IP,
+            threat_level=rule["threat_level"],
+            status=ThreatStatus.DETECTED,
+            source_ip=source_ip,
+            user_id=None,
+            username=None,
+            description=f"Activity from known malicious IP: {source_ip}",
+            evidence={
+                "threat_intel_source": entry.source,
+                "matched_network": entry.network,
+                "detection_rule": rule["name"]
+            },
+            confidence_score=0.95,
+            risk_score=90,
+            timestamp=datetime.now(),
+            detection_method="threat_intelligence",
+            affected_resources=["network"],
+            recommended_actions=[
+                "Block IP address immediately",
+                "Investigate all recent activity from this IP",
+                "Check for successful authentications",
+                "Review firewall rules"
+            ],
+            auto_response_taken=rule["auto_response"]
+        )
+    
     async def check_malicious_ip(self, source_ip: str) -> Optional[ThreatEvent]:
         """Check if IP is in malicious IP database"""
         try:
-            # Check against cached threat intelligence
-            threat_ip_key = f"threat_intel:malicious_ips"
-            is_malicious = await cache_service.redis_client.sismember(threat_ip_key, source_ip)
-            
-            if is_malicious:
-                threat = ThreatEvent(
-                    id="",
-                    threat_type=ThreatType.MALICIOUS_IP,
-                    threat_level=ThreatLevel.HIGH,
-                    status=ThreatStatus.DETECTED,
-                    source_ip=source_ip,
-                    user_id=None,
-                    username=None,
-                    description=f"Activity from known malicious IP: {source_ip}",
-                    evidence={
-                        "threat_intel_source": "malicious_ip_database",
-                        "detection_rule": "malicious_ip_activity"
-                    },
-                    confidence_score=0.95,
-                    risk_score=90,
-                    timestamp=datetime.now(),
-                    detection_method="threat_intelligence",
-                    affected_resources=["network"],
-                    recommended_actions=[
-                        "Block IP address immediately",
-                        "Investigate all recent activity from this IP",
-                        "Check for successful authentications",
-                        "Review firewall rules"
-                    ],
-                    auto_response_taken=True
-                )
-                
-                return threat
+            # Check against the in-process threat intelligence index
+            entry = malicious_ips.lookup(source_ip)
+            
+            if entry is not None:
+                return self._malicious_ip_threat(source_ip, entry)
             
             return None
             
@@ -574,26 +545,24 @@ class ThreatDetectionEngine:
             username = activity.get("username")
             action = activity.get("action", "")
             resource = activity.get("resource", "")
-            event_type = activity.get("event_type", "")
             
-            # Run detection methods in parallel
+            # Run the detectors of every matching rule in parallel
             detection_tasks = []
             
-            # Brute force detection (for failed logins)
-            if event_type == "login_failed" and username:
-                detection_tasks.append(self.detect_brute_force_attack(source_ip, username))
-            
-            # Behavioral anomaly detection (for authenticated users)
-            if user_id:
-                detection_tasks.append(self.detect_behavioral_anomaly(user_id, activity))
-            
-            # Privilege escalation detection
-            if user_id and action and resource:
-                detection_tasks.append(self.detect_privilege_escalation(user_id, action, resource))
-            
-            # Malicious IP check
-            if source_ip != "unknown":
-                detection_tasks.append(self.check_malicious_ip(source_ip))
+            for match in self._match_rules(activity):
+                detector = match.rule.detector
+                if detector is None:
+                    detected_threats.append(self._rule_threat(match))
+                elif detector == "brute_force":
+                    detection_tasks.append(self.detect_brute_force_attack(source_ip, username))
+                elif detector == "behavioral_anomaly":
+                    detection_tasks.append(self.detect_behavioral_anomaly(user_id, activity))
+                elif detector == "privilege_escalation":
+                    detection_tasks.append(self.detect_privilege_escalation(user_id, action, resource))
+                elif detector == "malicious_ip":
+                    detection_tasks.append(self.check_malicious_ip(source_ip))
+                else:
+                    logger.warning(f"Rule {match.rule.name} names unknown detector {detector}")
             
             # Execute all detection methods
             if detection_tasks:
@@ -615,21 +584,180 @@ class ThreatDetectionEngine:
             logger.error(f"Threat detection processing failed: {e}")
             return []
     
-    async def _process_detected_threat(self, threat: ThreatEvent):
-        """Process and respond to detected threat"""
+    async def _detect_brute_force_batch(self, pairs: List[Tuple[str, str]]) -> List[ThreatEvent]:
+        """One in-memory count per distinct (source_ip, username) in the batch"""
+        window = self._detector_rule("brute_force")["window"]
+        counts = await asyncio.gather(*(
+            failed_login_counters.count("ip_user", window, source_ip=source_ip, username=username)
+            for source_ip, username in pairs
+        ))
+        threats = []
+        for (source_ip, username), failed_attempts in zip(pairs, counts):
+            threat = self._brute_force_threat(source_ip, username, failed_attempts)
+            if threat:
+                threats.append(threat)
+        return threats
+    
+    async def _detect_behavioral_batch(self, activities: List[Tuple[str, Dict[str, Any]]]) -> List[ThreatEvent]:
+        """Warm every cold profile with one scan, then score activities in memory"""
+        await self.behavior_analyzer.warm_profiles({user_id for user_id, _ in activities})
+        threats = []
+        for user_id, activity in activities:
+            if self.behavior_analyzer.profiles.get(user_id) is None:
+                continue  # Rebuild failed; don't retry per activity
+            anomaly_score, anomalies = await self.behavior_analyzer.analyze_current_behavior(user_id, activity)
+            threat = self._behavioral_threat(user_id, activity, anomaly_score, anomalies)
+            if threat:
+                threats.append(threat)
+        return threats
+    
+    async def _detect_privilege_escalation_batch(self, candidates: List[Tuple[str, str, str, List[str]]]) -> List[ThreatEvent]:
+        """One role lookup for every user with escalation indicators in the batch"""
+        if not candidates:
+            return []
+        user_ids = list(dict.fromkeys(user_id for user_id, _, _, _ in candidates))
+        async with get_db_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT id, role FROM users WHERE id = ANY($1)
+            """, user_ids)
+        roles = {str(row['id']): row['role'] for row in rows}
+        
+        threats = []
+        for user_id, action, resource, indicators in candidates:
+            threat = self._privilege_escalation_threat(user_id, action, resource, indicators, roles.get(str(user_id)))
+            if threat:
+                threats.append(threat)
+        return threats
+    
+    async def _check_malicious_ips_batch(self, source_ips: List[str]) -> List[ThreatEvent]:
+        """Look up every distinct IP in the batch in the local reputation index"""
+        threats = []
+        for source_ip in source_ips:
+            entry = malicious_ips.lookup(source_ip)
+            if entry is not None:
+                threats.append(self._malicious_ip_threat(source_ip, entry))
+        return threats
+    
+    async def process_threat_detection_batch(self, activities: Sequence[Dict[str, Any]]) -> List[ThreatEvent]:
+        """
+        Process a batch of activities through all threat detection methods.
+        
+        Activities are grouped per detector so each runs its lookups once for
+        the batch (repeat failed logins for the same IP+user yield one threat);
+        threats are bulk-inserted and notified in the background.
+        """
+        started = time.perf_counter()
         try:
-            # Store threat
-            self.active_threats[threat.id] = threat
-            self.threat_history.append(threat)
+            brute_force_pairs: Dict[Tuple[str, str], None] = {}
+            behavioral: List[Tuple[str, Dict[str, Any]]] = []
+            escalations: List[Tuple[str, str, str, List[str]]] = []
+            source_ips: Dict[str, None] = {}
+            rule_threats: List[ThreatEvent] = []
+            
+            for activity in activities:
+                source_ip = activity.get("source_ip", "unknown")
+                user_id = activity.get("user_id")
+                
+                for match in self._match_rules(activity):
+                    detector = match.rule.detector
+                    if detector is None:
+                        rule_threats.append(self._rule_threat(match))
+                    elif detector == "brute_force":
+                        brute_force_pairs[(source_ip, activity.get("username"))] = None
+                    elif detector == "behavioral_anomaly":
+                        behavioral.append((user_id, activity))
+                    elif detector == "privilege_escalation":
+                        action, resource = activity.get("action", ""), activity.get("resource", "")
+                        indicators = self._escalation_indicators(action, resource)
+                        if indicators:
+                            escalations.append((user_id, action, resource, indicators))
+                    elif detector == "malicious_ip":
+                        source_ips[source_ip] = None
+            
+            results = await asyncio.gather(
+                self._detect_brute_force_batch(list(brute_force_pairs)),
+                self._detect_behavioral_batch(behavioral),
+                self._detect_privilege_escalation_batch(escalations),
+                self._check_malicious_ips_batch(list(source_ips)),
+                return_exceptions=True
+            )
             
-            # Update metrics
-            self.metrics["total_threats_detected"] += 1
-            self.metrics["threats_by_type"][threat.threat_type.value] += 1
-            self.metrics["threats_by_level"][threat.threat_level.value] += 1
+            detected_threats = rule_threats
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Batch threat detection error: {result}")
+                else:
+                    detected_threats.extend(result)
             
-            # Store in database
-            await self._store_threat_event(threat)
+            await self._process_detected_threats(detected_threats)
+            
+            self.metrics["batches_processed"] += 1
+            self.metrics["activities_processed"] += len(activities)
+            self.metrics["last_batch_ms"] = (time.perf_counter() - started) * 1000
+            return detected_threats
             
+        except Exception as e:
+            logger.error(f"Batch threat detection processing failed: {e}")
+            return []
+    
+    async def process_activity_stream(self, activities: AsyncIterable[Dict[str, Any]],
+                                      batch_size: int = 256,
+                                      flush_interval: float = 0.05) -> AsyncIterator[List[ThreatEvent]]:
+        """
+        Micro-batch a stream of activities, yielding the threats found per batch.
+        
+        A batch closes at ``batch_size`` activities or ``flush_interval``
+        seconds after its first activity, whichever comes first.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size * 4)
+        end_of_stream = object()
+        
+        async def feed():
+            try:
+                async for activity in activities:
+                    await queue.put(activity)
+            finally:
+                await queue.put(end_of_stream)
+        
+        feeder = loop.create_task(feed())
+        try:
+            finished = False
+            while not finished:
+                item = await queue.get()
+                if item is end_of_stream:
+                    break
+                batch = [item]
+                deadline = loop.time() + flush_interval
+                while len(batch) < batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is end_of_stream:
+                        finished = True
+                        break
+                    batch.append(item)
+                yield await self.process_threat_detection_batch(batch)
+        finally:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+    
+    def _record_threat(self, threat: ThreatEvent):
+        """Track a detected threat in memory and update metrics"""
+        self.active_threats[threat.id] = threat
+        self.threat_history.append(threat)
+        
+        self.metrics["total_threats_detected"] += 1
+        self.metrics["threats_by_type"][threat.threat_type.value] += 1
+        self.metrics["threats_by_level"][threat.threat_level.value] += 1
+    
+    async def _notify_threat(self, threat: ThreatEvent):
+        """Broadcast, audit-log and auto-respond to a stored threat"""
+        try:
             # Send real-time notification
             await send_security_alert(
                 alert_type=threat.threat_type.value,
@@ -669,28 +797,67 @@ class ThreatDetectionEngine:
         except Exception as e:
             logger.error(f"Failed to process threat {threat.id}: {e}")
     
-    async def _store_threat_event(self, threat: ThreatEvent):
-        """Store threat event in database"""
+    async def _process_detected_threat(self, threat: ThreatEvent):
+        """Process and respond to detected threat"""
+        try:
+            self._record_threat(threat)
+            
+            # Store in database
+            await self._store_threat_event(threat)
+            
+            await self._notify_threat(threat)
+            
+        except Exception as e:
+            logger.error(f"Failed to process threat {threat.id}: {e}")
+    
+    async def _process_detected_threats(self, threats: List[ThreatEvent]):
+        """Record and bulk-store a batch of threats, then notify without blocking the batch"""
+        if not threats:
+            return
+        for threat in threats:
+            self._record_threat(threat)
+        
+        await self._store_threat_events(threats)
+        
+        for threat in threats:
+            task = asyncio.create_task(self._notify_threat(threat))
+            self._notification_tasks.add(task)
+            task.add_done_callback(self._notification_tasks.discard)
+    
+    async def drain_notifications(self):
+        """Wait for background threat notifications (shutdown, benchmarks)"""
+        if self._notification_tasks:
+            await asyncio.gather(*self._notification_tasks, return_exceptions=True)
+    
+    async def _store_threat_events(self, threats: List[ThreatEvent]):
+        """Store threat events in database with one bulk insert"""
         try:
             async with get_db_connection() as conn:
-                await conn.execute("""
+                await conn.executemany("""
                     INSERT INTO threat_events (
                         id, threat_type, threat_level, status, source_ip,
                         user_id, username, description, evidence, confidence_score,
                         risk_score, timestamp, detection_method, affected_resources,
                         recommended_actions, auto_response_taken
                     ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16)
-                """, 
-                    threat.id, threat.threat_type.value, threat.threat_level.value,
-                    threat.status.value, threat.source_ip, threat.user_id, threat.username,
-                    threat.description, json.dumps(threat.evidence), threat.confidence_score,
-                    threat.risk_score, threat.timestamp, threat.detection_method,
-                    json.dumps(threat.affected_resources), json.dumps(threat.recommended_actions),
-                    threat.auto_response_taken
-                )
+                """, [
+                    (
+                        threat.id, threat.threat_type.value, threat.threat_level.value,
+                        threat.status.value, threat.source_ip, threat.user_id, threat.username,
+                        threat.description, json.dumps(threat.evidence), threat.confidence_score,
+                        threat.risk_score, threat.timestamp, threat.detection_method,
+                        json.dumps(threat.affected_resources), json.dumps(threat.recommended_actions),
+                        threat.auto_response_taken
+                    )
+                    for threat in threats
+                ])
                 
         except Exception as e:
-            logger.error(f"Failed to store threat event: {e}")
+            logger.error(f"Failed to store {len(threats)} threat events: {e}")
+    
+    async def _store_threat_event(self, threat: ThreatEvent):
+        """Store threat event in database"""
+        await self._store_threat_events([threat])
     
     async def _execute_automated_response(self, threat: ThreatEvent):
         """Execute automated response to threat"""
@@ -737,14 +904,9 @@ class ThreatDetectionEngine:
             logger.error(f"Automated response failed for threat {threat.id}: {e}")
     
     async def _block_ip_address(self, ip_address: str, duration: int):
-        """Block IP address for specified duration"""
+        """Block IP address for specified duration (every worker's index picks it up)"""
         try:
-            block_key = f"blocked_ips:{ip_address}"
-            await cache_service.set(block_key, {"blocked_at": datetime.now().isoformat()}, ttl=duration)
-            
-            # Add to blocked IPs set
-            await cache_service.redis_client.sadd("blocked_ips_set", ip_address)
-            await cache_service.redis_client.expire("blocked_ips_set", duration)
+            await blocked_ips.publish("add", ip_address, source="threat_detection", ttl=duration)
             
         except Exception as e:
             logger.error(f"Failed to block IP {ip_address}: {e}")
@@ -821,6 +983,10 @@ async def analyze_activity_for_threats(activity: Dict[str, Any]) -> List[ThreatE
     """Analyze activity for potential threats"""
     return await threat_detector.process_threat_detection(activity)
 
+async def analyze_activities_for_threats(activities: Sequence[Dict[str, Any]]) -> List[ThreatEvent]:
+    """Analyze a batch of activities for potential threats"""
+    return await threat_detector.process_threat_detection_batch(activities)
+
 async def build_user_behavior_profile(user_id: str) -> Dict[str, Any]:
     """Build behavioral profile for user"""
     return await threat_detector.behavior_analyzer.build_user_profile(user_id)
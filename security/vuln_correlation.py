@@ -0,0 +1,157 @@
+"""
+SecureNet Vulnerability Correlation
+
+Inventory-wide CVE correlation helpers for ``CVEIntegration.full_vulnerability_scan``:
+- devices are grouped by fingerprint (the CPE products their name and type
+  resolve to, type, firmware version and the service ports that scoring
+  looks at), so CVE candidates are matched and scored once per group and the
+  findings fanned out to every member
+- confidence comes from how the match was made: a named product or only the
+  vendor's platform, a version inside the entry's bounds, a CPE part that
+  fits the device type, exposed service ports
+- detection-confidence scoring is pure and picklable; ``score_tasks`` spreads
+  it over a process pool once there is enough of it to pay for the workers
+  (``CVE_SCORING_WORKERS``, ``CVE_SCORING_POOL_MIN``) and runs inline otherwise
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from security.cpe import PLATFORM, PRODUCT, DeviceProfile
+
+logger = logging.getLogger(__name__)
+
+SERVICE_PORTS = {
+    22: 'SSH',
+    23: 'Telnet',
+    80: 'HTTP',
+    443: 'HTTPS',
+    161: 'SNMP',
+    8080: 'HTTP-Alt',
+    8443: 'HTTPS-Alt'
+}
+INFRASTRUCTURE_TYPES = ('router', 'switch', 'firewall', 'access_point')
+EVIDENCE_CONFIDENCE = {PRODUCT: 0.5, PLATFORM: 0.4}
+MIN_CONFIDENCE = 0.5
+SCORING_WORKERS = int(os.getenv("CVE_SCORING_WORKERS", str(os.cpu_count() or 1)))
+# (candidate, matched CPE) pairs below which a process pool costs more than it saves
+SCORING_POOL_MIN = int(os.getenv("CVE_SCORING_POOL_MIN", "200000"))
+
+# (evidence, device type, open ports, [(cve_id, [(CPE part, version matched)])])
+ScoringTask = Tuple[str, str, Tuple[int, ...], List[Tuple[str, List[Tuple[str, bool]]]]]
+
+
+def detection_confidence(evidence: str, device_type: str, open_ports: Iterable[int],
+                         part: str, version_matched: bool) -> float:
+    """Confidence that one matched CPE entry applies to the device"""
+    confidence = EVIDENCE_CONFIDENCE[evidence]
+
+    # The device version fell inside the entry's explicit bounds
+    if version_matched:
+        confidence += 0.3
+
+    # An OS or hardware CPE for network infrastructure, an application otherwise
+    if (part in ('o', 'h')) == (device_type.lower() in INFRASTRUCTURE_TYPES):
+        confidence += 0.1
+
+    # Open ports matching common services
+    if any(port in SERVICE_PORTS for port in open_ports):
+        confidence += 0.1
+
+    return min(confidence, 1.0)
+
+
+def best_confidence(evidence: str, device_type: str, open_ports: Sequence[int],
+                    hits: Iterable[Tuple[str, bool]]) -> float:
+    """Confidence for a CVE: its best-matching CPE entry"""
+    return max((detection_confidence(evidence, device_type, open_ports, part, version_matched)
+                for part, version_matched in hits), default=0.0)
+
+
+def affected_services(open_ports: Iterable[int]) -> List[str]:
+    return [SERVICE_PORTS[port] for port in open_ports if port in SERVICE_PORTS]
+
+
+def device_fingerprint(profile: DeviceProfile, device: Dict) -> Tuple:
+    """Devices with equal fingerprints get the same CVE matches and the same scores"""
+    service_ports = tuple(sorted({port for port in device.get('open_ports', []) if port in SERVICE_PORTS}))
+    return profile, device.get('type', '').lower(), device.get('version'), service_ports
+
+
+def score_candidates(task: ScoringTask) -> List[Tuple[str, float]]:
+    """(cve_id, confidence) for the candidates at or above ``MIN_CONFIDENCE``"""
+    evidence, device_type, open_ports, candidates = task
+    scored = []
+    for cve_id, hits in candidates:
+        confidence = best_confidence(evidence, device_type, open_ports, hits)
+        if confidence >= MIN_CONFIDENCE:
+            scored.append((cve_id, confidence))
+    return scored
+
+
+def score_batch(tasks: List[ScoringTask]) -> List[List[Tuple[str, float]]]:
+    """Process pool unit: several tasks per round trip"""
+    return [score_candidates(task) for task in tasks]
+
+
+async def score_tasks(tasks: List[ScoringTask], workers: int = SCORING_WORKERS,
+                      pool_min: int = SCORING_POOL_MIN) -> List[List[Tuple[str, float]]]:
+    """Score every task, in a process pool when the work is large enough; results keep task order"""
+    work = sum(len(hits) for task in tasks for _, hits in task[3])
+    workers = min(workers, len(tasks))
+    if workers < 2 or work < pool_min:
+        return score_batch(tasks)
+
+    # Round-robin so large and small groups spread evenly over the batches
+    batches = [list(range(i, len(tasks), workers * 4)) for i in range(min(len(tasks), workers * 4))]
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        done = await asyncio.gather(*(
+            loop.run_in_executor(pool, score_batch, [tasks[i] for i in batch]) for batch in batches
+        ))
+    results: List[List[Tuple[str, float]]] = [[] for _ in tasks]
+    for batch, batch_results in zip(batches, done):
+        for i, scored in zip(batch, batch_results):
+            results[i] = scored
+    logger.info(f"Scored {len(tasks)} device groups ({work} CPE matches) on {workers} workers")
+    return results
+
+
+def load_devices(conn: sqlite3.Connection) -> Tuple[List[Dict], int]:
+    """
+    Active devices as the scanner stores them (address in ``ip_address``,
+    ports in ``metadata.ports``; older rows keep ``ip`` / ``ip_address`` and
+    ``open_ports`` in metadata). Devices without a known address are skipped;
+    returns (devices, skipped).
+    """
+    devices = []
+    skipped = 0
+    for device_id, name, device_type, ip_address, metadata in conn.execute("""
+        SELECT id, name, type, ip_address, metadata
+        FROM network_devices
+        WHERE status = 'active'
+    """):
+        try:
+            metadata = json.loads(metadata) if metadata else {}
+        except ValueError:
+            metadata = {}
+        ip = ip_address or metadata.get('ip') or metadata.get('ip_address')
+        if not ip:
+            skipped += 1
+            continue
+        devices.append({
+            'id': device_id,
+            'ip': ip,
+            'name': name or 'Unknown',
+            'type': device_type or 'Unknown',
+            'version': metadata.get('version'),
+            'open_ports': metadata.get('ports', metadata.get('open_ports', []))
+        })
+    if skipped:
+        logger.warning(f"Skipped {skipped} active devices without an IP address")
+    return devices, skipped
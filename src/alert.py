@@ -3,12 +3,21 @@ alert.py
 
 Purpose:
 - Send alerts via Slack when anomalies are detected.
+- Aggregate flagged logs into per-source digests and deliver them
+  asynchronously with rate limiting and retries (AlertDispatcher).
 
 Usage:
 Import and call send_slack_alert(message) from detect_anomalies.py or any alerting module.
+For bulk alerting, use `await AlertDispatcher().dispatch(flagged_df)`.
 """
 
+import asyncio
+import logging
 import os
+import time
+from typing import List, Optional, Set, Tuple
+
+import aiohttp
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from dotenv import load_dotenv
@@ -16,8 +25,13 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SLACK_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_CHANNEL = os.getenv("SLACK_CHANNEL", "#alerts")
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+
+ALERT_HEADER = ":rotating_light: SecureNet Alert :rotating_light:"
 
 client = WebClient(token=SLACK_TOKEN)
 
@@ -25,8 +39,136 @@ def send_slack_alert(message):
     try:
         response = client.chat_postMessage(
             channel=SLACK_CHANNEL,
-            text=f":rotating_light: SecureNet Alert :rotating_light:\n{message}"
+            text=f"{ALERT_HEADER}\n{message}"
         )
         return response
     except SlackApiError as e:
-        print(f"Slack API Error: {e.response['error']}")
\ No newline at end of file
+        print(f"Slack API Error: {e.response['error']}")
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AlertDispatcher:
+    """
+    Digest-based Slack alert delivery.
+
+    Flagged rows are grouped per source into one message each, sent
+    concurrently (bounded) through a token bucket, and retried with
+    exponential backoff; Slack 429 responses honour ``Retry-After``.
+    """
+
+    def __init__(self, token: Optional[str] = SLACK_TOKEN, channel: str = SLACK_CHANNEL,
+                 api_url: str = SLACK_API_URL, rate: float = 1.0, burst: int = 3,
+                 max_retries: int = 4, backoff: float = 1.0, max_concurrency: int = 4,
+                 samples_per_digest: int = 5, max_message_length: int = 300):
+        self.token = token
+        self.channel = channel
+        self.api_url = api_url.rstrip("/") + "/"
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.samples_per_digest = samples_per_digest
+        self.max_message_length = max_message_length
+        self.limiter = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"digests_sent": 0, "digests_failed": 0, "retries": 0}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def build_digests(self, flagged) -> List[Tuple[str, str]]:
+        """Return ``(source, text)`` digests for a DataFrame of flagged rows."""
+        ordered = flagged.sort_values('anomaly_score')
+        grouped = ordered.groupby('source', sort=False)
+        summary = grouped.agg(
+            count=('anomaly_score', 'size'),
+            worst=('anomaly_score', 'min'),
+            first_seen=('timestamp', 'min'),
+            last_seen=('timestamp', 'max'),
+        )
+        samples = grouped.head(self.samples_per_digest)
+
+        digests = []
+        for source, rows in samples.groupby('source', sort=False):
+            info = summary.loc[source]
+            lines = [
+                f"[ALERT] {info['count']} suspicious logs from {source}",
+                f"  Window: {info['first_seen']} -> {info['last_seen']}",
+                f"  Worst score: {info['worst']:.4f}",
+            ]
+            for timestamp, score, message in zip(rows['timestamp'], rows['anomaly_score'], rows['message']):
+                message = str(message)
+                if len(message) > self.max_message_length:
+                    message = message[:self.max_message_length] + "..."
+                lines.append(f"  • {timestamp} ({score:.4f}) {message}")
+            if info['count'] > len(rows):
+                lines.append(f"  ...and {info['count'] - len(rows)} more")
+            digests.append((source, "\n".join(lines)))
+        return digests
+
+    async def _post(self, text: str) -> Tuple[int, dict, Optional[float]]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        async with self._session.post(
+            f"{self.api_url}chat.postMessage",
+            json={"channel": self.channel, "text": f"{ALERT_HEADER}\n{text}"},
+            headers={"Authorization": f"Bearer {self.token}"}
+        ) as response:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                body = await response.json(content_type=None)
+            except ValueError:
+                body = {}
+            return response.status, body or {}, float(retry_after) if retry_after else None
+
+    async def send(self, text: str) -> bool:
+        """Deliver one message, retrying transient failures."""
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire()
+                delay = self.backoff * (2 ** attempt)
+                try:
+                    status, body, retry_after = await self._post(text)
+                    if status == 200 and body.get("ok", True):
+                        self.stats["digests_sent"] += 1
+                        return True
+                    if status == 429 or body.get("error") == "ratelimited":
+                        delay = retry_after or delay
+                    elif status < 500:
+                        logger.error(f"Slack API Error: {body.get('error', status)}")
+                        break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Slack delivery attempt {attempt + 1} failed: {e}")
+                if attempt < self.max_retries:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(delay)
+            self.stats["digests_failed"] += 1
+            return False
+
+    async def dispatch(self, flagged) -> Set[str]:
+        """Send one digest per source; returns the sources that were delivered."""
+        digests = self.build_digests(flagged)
+        results = await asyncio.gather(*(self.send(text) for _, text in digests))
+        return {source for (source, _), ok in zip(digests, results) if ok}
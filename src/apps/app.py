@@ -43,8 +43,12 @@ from src.security import (
     ALGORITHM
 )
 from database.database_factory import db, Database
+from database.pagination import next_cursor
 from jose import JWTError, jwt
 from security.cve_integration import CVEIntegration
+from security.nvd_client import close_nvd_clients
+from src.log_tail import FileTailer, LogPipeline
+from src.syslog_receiver import SyslogReceiver
 
 # Import new API modules for multi-tenant SaaS
 from api.endpoints.api_billing import router as billing_router
@@ -120,9 +124,20 @@ async def lifespan(app):
         if service_states[service]["running"]:
             await stop_service(service)
     
+    # Stop the log monitors before flushing, so nothing submits into a stopped pipeline
+    for source in log_sources.values():
+        await source.stop()
+    await log_pipeline.stop()
+
     # Stop Week 2 Day 2 systems
     await job_processor.stop()
 
+    # Release pooled database connections
+    await db.close()
+
+    # Close the shared NVD API sessions
+    await close_nvd_clients()
+
 # Rate limiter setup
 limiter = Limiter(key_func=get_remote_address)
 app = FastAPI(lifespan=lifespan)
@@ -256,6 +271,7 @@ async def get_anomalies_list(
     status: Optional[str] = None,
     severity: Optional[str] = None,
     type: Optional[str] = None,
+    cursor: Optional[str] = None,
     api_key: APIKey = Depends(get_api_key)
 ):
     try:
@@ -267,7 +283,8 @@ async def get_anomalies_list(
                 'status': status,
                 'severity': severity,
                 'type': type
-            }
+            },
+            cursor=cursor
         )
         total = await db.get_anomalies_count(filters={
             'status': status,
@@ -282,10 +299,13 @@ async def get_anomalies_list(
                 "total": total,
                 "page": page,
                 "page_size": page_size,
-                "total_pages": (total + page_size - 1) // page_size
+                "total_pages": (total + page_size - 1) // page_size,
+                "next_cursor": next_cursor(anomalies, page_size)
             },
             "timestamp": datetime.now().isoformat()
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting anomalies list: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -550,6 +570,11 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Shared ingestion pipeline: batched DB writes, WebSocket fan-out decoupled from writes.
+# On SQLite, batches go through the database's single-writer queue.
+log_pipeline = LogPipeline('data/securenet.db', broadcast=manager.broadcast_log,
+                           write_queue=db.write_queue if db.is_sqlite else None)
+
 # Log source management
 class LogSource:
     def __init__(self, source_type: str, config: dict):
@@ -557,21 +582,31 @@ class LogSource:
         self.config = config
         self.active = False
         self.last_check = None
+        self.receiver: Optional[SyslogReceiver] = None
+        self._task: Optional[asyncio.Task] = None
 
     async def start(self):
         self.active = True
         # Start appropriate log collection based on source type
         if self.source_type == "file":
-            asyncio.create_task(self._monitor_file())
+            self._task = asyncio.create_task(self._monitor_file())
         elif self.source_type == "syslog":
-            asyncio.create_task(self._monitor_syslog())
+            self._task = asyncio.create_task(self._monitor_syslog())
         elif self.source_type == "aws":
-            asyncio.create_task(self._monitor_aws())
+            self._task = asyncio.create_task(self._monitor_aws())
         elif self.source_type == "custom":
-            asyncio.create_task(self._monitor_custom())
+            self._task = asyncio.create_task(self._monitor_custom())
 
     async def stop(self):
+        """Stop collecting; returns once the monitor task (and syslog listener) has exited"""
         self.active = False
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
     async def _monitor_file(self):
         file_path = self.config.get("file_path")
@@ -585,15 +620,17 @@ class LogSource:
             })
             return
 
+        await log_pipeline.start()
+        tailer = FileTailer(
+            file_path,
+            from_end=self.config.get("from_end", True),
+            use_inotify=self.config.get("use_inotify", True)
+        )
         try:
-            with open(file_path, 'r') as f:
-                f.seek(0, 2)  # Seek to end of file
-                while self.active:
-                    line = f.readline()
-                    if line:
-                        await self._process_log_entry(line.strip(), "file")
-                    else:
-                        await asyncio.sleep(0.1)
+            async for lines in tailer.lines(lambda: self.active):
+                self.last_check = datetime.now().isoformat()
+                for line in lines:
+                    await self._process_log_entry(line.strip(), "file")
         except Exception as e:
             await manager.broadcast_notification({
                 "title": "Log Source Error",
@@ -604,8 +641,27 @@ class LogSource:
             })
 
     async def _monitor_syslog(self):
-        # Implement syslog monitoring
-        pass
+        self.receiver = SyslogReceiver(
+            log_pipeline,
+            host=self.config.get("host", "0.0.0.0"),
+            udp_port=self.config.get("udp_port", 514),
+            tcp_port=self.config.get("tcp_port")
+        )
+        try:
+            await self.receiver.start()
+            while self.active:
+                self.last_check = datetime.now().isoformat()
+                await asyncio.sleep(1)
+        except Exception as e:
+            await manager.broadcast_notification({
+                "title": "Log Source Error",
+                "message": f"Syslog listener error: {str(e)}",
+                "level": "error",
+                "time": datetime.now().isoformat(),
+                "unread": True
+            })
+        finally:
+            await self.receiver.stop()
 
     async def _monitor_aws(self):
         # Implement AWS CloudTrail monitoring
@@ -616,25 +672,15 @@ class LogSource:
         pass
 
     async def _process_log_entry(self, log_line: str, source: str):
-        timestamp = datetime.now().isoformat()
         log_entry = {
-            "timestamp": timestamp,
+            "timestamp": datetime.now().isoformat(),
             "message": log_line,
             "source": source,
             "level": "info"  # Default level, can be enhanced with log parsing
         }
-        
-        # Store in database
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO logs (timestamp, source, message, level)
-                VALUES (?, ?, ?, ?)
-            """, (timestamp, source, log_line, "info"))
-            conn.commit()
 
-        # Broadcast to WebSocket clients
-        await manager.broadcast_log(log_entry)
+        # Queued for group-committed storage and broadcast to WebSocket clients
+        await log_pipeline.submit(log_entry)
 
 # Log source registry
 log_sources: Dict[str, LogSource] = {}
@@ -758,7 +804,8 @@ async def list_log_sources(request: Request, api_key: APIKey = Depends(get_api_k
             "id": source_id,
             "type": source.source_type,
             "active": source.active,
-            "last_check": source.last_check
+            "last_check": source.last_check,
+            "stats": source.receiver.stats() if source.receiver else {}
         }
         for source_id, source in log_sources.items()
     ]
@@ -1168,10 +1215,13 @@ async def get_logs(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     search: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
     api_key: APIKey = Depends(get_api_key)
 ):
     try:
-        # Use global db instance
+        # Use global db instance; pass the returned nextCursor to page deeply.
+        # search supports "exact phrases" and prefix*; sort=relevance ranks matches.
         logs = await db.get_logs(
             page=page,
             page_size=page_size,
@@ -1181,8 +1231,10 @@ async def get_logs(
                 'source': source,
                 'start_date': start_date,
                 'end_date': end_date,
-                'search': search
-            }
+                'search': search,
+                'sort': sort
+            },
+            cursor=cursor
         )
         total = await db.get_logs_count(filters={
             'level': level,
@@ -1198,10 +1250,13 @@ async def get_logs(
                 "logs": logs,
                 "total": total,
                 "page": page,
-                "pageSize": page_size
+                "pageSize": page_size,
+                "nextCursor": None if (search and sort == 'relevance') else next_cursor(logs, page_size)
             },
             "timestamp": datetime.now().isoformat()
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting logs: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1253,6 +1308,37 @@ async def get_security_status(
         logger.error(f"Error getting security status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/security/findings")
+@limiter.limit("30/minute")
+async def get_security_findings(
+    request: Request,
+    page_size: int = 50,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    scan_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    api_key: APIKey = Depends(get_api_key)
+):
+    try:
+        filters = {'severity': severity, 'status': status, 'scan_id': scan_id}
+        findings = await db.get_security_findings(page_size=page_size, filters=filters, cursor=cursor)
+        total = await db.get_security_findings_count(filters=filters)
+        return {
+            "status": "success",
+            "data": {
+                "items": findings,
+                "total": total,
+                "page_size": page_size,
+                "next_cursor": next_cursor(findings, page_size)
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting security findings: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/network")
 @limiter.limit("30/minute")
 async def get_network_status(
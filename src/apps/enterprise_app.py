@@ -38,6 +38,8 @@ from monitoring.prometheus_metrics import metrics, setup_fastapi_metrics
 from monitoring.sentry_config import configure_sentry
 from utils.logging_config import configure_structlog, get_logger
 from tasks.rq_service import rq_service
+from security.ip_reputation import blocked_ips, initialize_ip_reputation
+from auth.audit_logging import security_audit_logger
 from api.endpoints.api_admin import router as admin_router
 from api.endpoints.api_advanced_billing import router as billing_router
 from api.endpoints.api_network import router as network_router
@@ -162,6 +164,7 @@ class AppState:
         self.auth_manager = None
         self.is_healthy = False
         self.startup_time = None
+        self.ip_reputation_tasks = []
 
 app_state = AppState()
 
@@ -192,6 +195,10 @@ async def lifespan(app: FastAPI):
         logger.info("Initializing background task queue...")
         await rq_service.initialize()
         
+        # Load IP reputation feeds and subscribe to block/threat-intel updates
+        logger.info("Initializing IP reputation index...")
+        app_state.ip_reputation_tasks = await initialize_ip_reputation()
+        
         # Health check
         app_state.is_healthy = True
         logger.info("✅ SecureNet Enterprise startup completed successfully")
@@ -210,10 +217,14 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("🛑 SecureNet Enterprise shutting down...")
     try:
+        # Drain buffered audit events before the database goes away
+        await security_audit_logger.close()
         if app_state.db_adapter:
             await app_state.db_adapter.close()
         if rq_service:
             await rq_service.close()
+        for task in app_state.ip_reputation_tasks:
+            task.cancel()
         logger.info("✅ Shutdown completed successfully")
     except Exception as e:
         logger.error(f"❌ Shutdown error: {e}")
@@ -256,6 +267,10 @@ def setup_middleware():
     async def security_middleware(request: Request, call_next):
         """Enterprise security middleware"""
         
+        # Reject blocked addresses before any other work (local lookup, no I/O)
+        if request.client and blocked_ips.lookup(request.client.host) is not None:
+            return JSONResponse(status_code=403, content={"detail": "Access denied"})
+        
         # Generate request ID
         request_id = str(uuid.uuid4())
         request.state.request_id = request_id
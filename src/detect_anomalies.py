@@ -7,20 +7,47 @@ Purpose:
 - Train Isolation Forest on existing data
 - Identify and score anomalies
 - Print or flag alerts based on anomaly score
+- Incremental mode: score only rows past a watermark with a persisted model,
+  refit periodically on a bounded sample and record results so each alert
+  fires exactly once
 
 Usage:
 $ python detect_anomalies.py
+$ python detect_anomalies.py --incremental [--refit]
 """
 
+import argparse
+import asyncio
+import os
+import pickle
 import sqlite3
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from src.alert import send_slack_alert
+from src.alert import AlertDispatcher
+from src.log_templates import TemplateMiner
 
 DB_NAME = "data/logs.db"
+MODEL_PATH = "data/anomaly_model.pkl"
 ALERT_THRESHOLD = -0.15  # Lower = more suspicious
+FEATURE_COLUMNS = [
+    'hour', 'day_of_week', 'message_length', 'token_count',
+    'level_code', 'source_code', 'template_hash',
+    'template_frequency', 'template_rarity'
+]
+
+# Stable hashed codes so categories map to the same value across runs/chunks
+CATEGORY_BUCKETS = 1024
+TEMPLATE_BUCKETS = 4096
+VARIABLE_TOKEN_PATTERN = r'0x[0-9a-fA-F]+|\d+(?:[.:/-]\d+)*'
+
+# Incremental mode
+SCORE_CHUNK_SIZE = 50000
+TRAINING_SAMPLE_SIZE = 100000  # Most recent rows used for a refit
+REFIT_INTERVAL = timedelta(hours=24)
+REFIT_AFTER_ROWS = 500000  # Refit early once this many new rows were scored
 
 def fetch_logs():
     conn = sqlite3.connect(DB_NAME)
@@ -28,13 +55,66 @@ def fetch_logs():
     conn.close()
     return df
 
-def preprocess_logs(df):
-    # Convert timestamp to datetime features
-    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-    df['hour'] = df['timestamp'].dt.hour
-    df['day_of_week'] = df['timestamp'].dt.dayofweek
-    df['message_length'] = df['message'].apply(len)
-    feature_df = df[['hour', 'day_of_week', 'message_length']]
+def _hash_codes(values, buckets):
+    hashed = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return (hashed % np.uint64(buckets)).astype(np.int64)
+
+def template_features(df, messages, miner, learn=True):
+    """
+    Relative frequency and rarity (-log p) of each row's mined template.
+
+    Rows that already carry a ``template_id`` from ingestion are looked up
+    rather than mined again, so each log is learned exactly once. With
+    ``learn=False`` other rows are only matched, leaving ``miner`` untouched.
+    """
+    known = df['template_id'].to_numpy() if 'template_id' in df else None
+    template_ids = np.empty(len(messages), dtype=np.int64)
+    for i, message in enumerate(messages):
+        if known is not None and not pd.isna(known[i]):
+            template_ids[i] = known[i]
+        elif learn:
+            template_ids[i] = miner.add(message).template_id
+        else:
+            match = miner.match(message)
+            template_ids[i] = match.template_id if match else 0
+    sizes = np.fromiter((miner.frequency(t) for t in template_ids), dtype=float, count=len(template_ids))
+    frequency = np.maximum(sizes, 1.0) / max(miner.total, 1)
+    return frequency, -np.log(frequency)
+
+def extract_features(df, miner=None, learn=True):
+    """
+    Build the feature matrix for ``df`` with vectorized column operations.
+
+    Template features come from ``miner`` (a fresh TemplateMiner when not
+    given), learning from unseen rows unless ``learn`` is False. Returns an (n_rows, len(FEATURE_COLUMNS)) float array and the
+    parsed timestamps.
+    """
+    timestamps = pd.to_datetime(df['timestamp'], errors='coerce')
+    messages = df['message'].fillna('').astype(str)
+    sources = df['source'].fillna('unknown').astype(str) if 'source' in df else pd.Series('unknown', index=df.index)
+    levels = df['level'].fillna('info').astype(str).str.lower() if 'level' in df else pd.Series('info', index=df.index)
+    templates = messages.str.replace(VARIABLE_TOKEN_PATTERN, '<*>', regex=True)
+    template_frequency, template_rarity = template_features(df, messages.tolist(), miner or TemplateMiner(), learn)
+
+    features = np.column_stack([
+        timestamps.dt.hour.to_numpy(dtype=float, na_value=np.nan),
+        timestamps.dt.dayofweek.to_numpy(dtype=float, na_value=np.nan),
+        messages.str.len().to_numpy(dtype=float),
+        messages.str.count(r'\S+').to_numpy(dtype=float),
+        _hash_codes(levels, CATEGORY_BUCKETS),
+        _hash_codes(sources, CATEGORY_BUCKETS),
+        _hash_codes(templates, TEMPLATE_BUCKETS),
+        template_frequency,
+        template_rarity,
+    ])
+    return features, timestamps
+
+def preprocess_logs(df, miner=None, learn=True):
+    features, timestamps = extract_features(df, miner, learn)
+    df['timestamp'] = timestamps
+    feature_df = pd.DataFrame(features, columns=FEATURE_COLUMNS, index=df.index)
+    for column in FEATURE_COLUMNS:
+        df[column] = feature_df[column]
     return feature_df, df
 
 def detect_anomalies(features, original_df):
@@ -47,20 +127,226 @@ def detect_anomalies(features, original_df):
     original_df['anomaly'] = preds
     return original_df
 
-def alert_on_anomalies(df):
-    flagged = df[df['anomaly_score'] < ALERT_THRESHOLD]
-    for _, row in flagged.iterrows():
-        alert_message = (
-            f"[ALERT] Suspicious log detected:\n"
-            f"  Time: {row['timestamp']}\n"
-            f"  Source: {row['source']}\n"
-            f"  Score: {row['anomaly_score']:.4f}\n"
-            f"  Message: {row['message']}"
+def alert_on_anomalies(df, dispatcher=None):
+    """
+    Send digests for rows below ALERT_THRESHOLD.
+
+    Returns the flagged rows whose digest was delivered.
+    """
+    flagged = df[df['anomaly_score'].to_numpy() < ALERT_THRESHOLD]
+    if flagged.empty:
+        return flagged
+
+    async def dispatch():
+        alert_dispatcher = dispatcher or AlertDispatcher()
+        try:
+            return await alert_dispatcher.dispatch(flagged)
+        finally:
+            if dispatcher is None:
+                await alert_dispatcher.close()
+
+    delivered_sources = asyncio.run(dispatch())
+    print(f"[ALERT] {len(flagged)} suspicious logs across {flagged['source'].nunique()} sources, "
+          f"{len(delivered_sources)} digests delivered")
+    return flagged[flagged['source'].isin(delivered_sources)]
+
+# ===== INCREMENTAL MODE =====
+
+def init_anomaly_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_results (
+            log_id INTEGER PRIMARY KEY,
+            timestamp TEXT,
+            source TEXT,
+            message TEXT,
+            anomaly_score REAL NOT NULL,
+            anomaly INTEGER NOT NULL,
+            scored_at TEXT NOT NULL,
+            alerted_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_anomaly_results_pending
+        ON anomaly_results (anomaly_score) WHERE alerted_at IS NULL
+    ''')
+    conn.commit()
+
+def get_state(conn, key, default=None):
+    row = conn.execute("SELECT value FROM anomaly_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_state(conn, key, value):
+    conn.execute(
+        "INSERT INTO anomaly_state (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value))
+    )
+
+def fetch_training_sample(conn, sample_size=TRAINING_SAMPLE_SIZE):
+    """Most recent ``sample_size`` logs, so refits cost the same however old the table is."""
+    return pd.read_sql_query(
+        "SELECT * FROM logs ORDER BY id DESC LIMIT ?",
+        conn, params=(sample_size,)
+    )
+
+def iter_new_logs(conn, after_id, chunk_size=SCORE_CHUNK_SIZE):
+    """Yield DataFrames of logs with id > ``after_id`` in id order (keyset paged)."""
+    while True:
+        chunk = pd.read_sql_query(
+            "SELECT * FROM logs WHERE id > ? ORDER BY id LIMIT ?",
+            conn, params=(after_id, chunk_size)
         )
-        print(alert_message)
-        send_slack_alert(alert_message)
+        if chunk.empty:
+            return
+        yield chunk
+        after_id = int(chunk['id'].iloc[-1])
+
+def fit_model(conn, sample_size=TRAINING_SAMPLE_SIZE):
+    sample = fetch_training_sample(conn, sample_size)
+    if sample.empty:
+        return None
+    # Train on the same template frequencies scoring sees. The persisted miner
+    # is only read here; on a cold start it learns the sample in memory.
+    miner = TemplateMiner.load(conn, bind=False)
+    features, _ = preprocess_logs(sample, miner, learn=miner.total == 0)
+    clf = IsolationForest(contamination=0.05, random_state=42)
+    clf.fit(features.fillna(0))
+    return {
+        "model": clf,
+        "columns": FEATURE_COLUMNS,
+        "fitted_at": datetime.now().isoformat(),
+        "training_rows": len(sample),
+    }
+
+def save_model(bundle, path=MODEL_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(bundle, f)
+    os.replace(tmp_path, path)
+
+def load_model(path=MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        bundle = pickle.load(f)
+    if bundle.get("columns") != FEATURE_COLUMNS:
+        return None  # Feature set changed; force a refit
+    return bundle
+
+def refit_due(conn, bundle, now=None):
+    if bundle is None:
+        return True
+    now = now or datetime.now()
+    fitted_at = datetime.fromisoformat(bundle["fitted_at"])
+    rows_since_fit = int(get_state(conn, "rows_since_fit", 0))
+    return now - fitted_at >= REFIT_INTERVAL or rows_since_fit >= REFIT_AFTER_ROWS
+
+def get_model(conn, force_refit=False):
+    """Reuse the persisted model, refitting on a bounded sample when due."""
+    bundle = None if force_refit else load_model()
+    if force_refit or refit_due(conn, bundle):
+        bundle = fit_model(conn)
+        if bundle is not None:
+            save_model(bundle)
+            set_state(conn, "rows_since_fit", 0)
+            conn.commit()
+    return bundle
+
+def score_new_logs(conn, bundle, chunk_size=SCORE_CHUNK_SIZE):
+    """
+    Score logs past the watermark chunk by chunk.
+
+    Results and the advanced watermark are committed in the same
+    transaction, so a crash never rescores or skips rows.
+    """
+    watermark = int(get_state(conn, "last_scored_id", 0))
+    miner = TemplateMiner.load(conn)
+    scored = 0
+    flagged = 0
+    for chunk in iter_new_logs(conn, watermark, chunk_size):
+        features, enriched = preprocess_logs(chunk, miner)
+        clf = bundle["model"]
+        X = features.fillna(0)
+        scores = clf.decision_function(X)
+        preds = clf.predict(X)
+
+        scored_at = datetime.now().isoformat()
+        rows = list(zip(
+            enriched['id'].tolist(),
+            enriched['timestamp'].astype(str).tolist(),
+            enriched['source'].tolist(),
+            enriched['message'].tolist(),
+            scores.tolist(),
+            preds.tolist(),
+        ))
+        conn.executemany(
+            "INSERT OR IGNORE INTO anomaly_results "
+            "(log_id, timestamp, source, message, anomaly_score, anomaly, scored_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [row + (scored_at,) for row in rows if row[4] < ALERT_THRESHOLD or row[5] == -1]
+        )
+        watermark = int(enriched['id'].iloc[-1])
+        set_state(conn, "last_scored_id", watermark)
+        set_state(conn, "rows_since_fit", int(get_state(conn, "rows_since_fit", 0)) + len(rows))
+        miner.save(conn, commit=False)
+        conn.commit()
+
+        scored += len(rows)
+        flagged += int((scores < ALERT_THRESHOLD).sum())
+    return scored, flagged
+
+def fetch_pending_alerts(conn):
+    return pd.read_sql_query(
+        "SELECT log_id, timestamp, source, message, anomaly_score FROM anomaly_results "
+        "WHERE alerted_at IS NULL AND anomaly_score < ? ORDER BY log_id",
+        conn, params=(ALERT_THRESHOLD,)
+    )
+
+def mark_alerted(conn, log_ids):
+    alerted_at = datetime.now().isoformat()
+    conn.executemany(
+        "UPDATE anomaly_results SET alerted_at = ? WHERE log_id = ?",
+        [(alerted_at, int(log_id)) for log_id in log_ids]
+    )
+    conn.commit()
+
+def run_incremental(force_refit=False):
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        init_anomaly_tables(conn)
+        bundle = get_model(conn, force_refit=force_refit)
+        if bundle is None:
+            print("No logs found in database.")
+            return
+
+        scored, flagged = score_new_logs(conn, bundle)
+        print(f"Scored {scored} new logs, {flagged} above alert threshold")
+
+        pending = fetch_pending_alerts(conn)
+        if not pending.empty:
+            delivered = alert_on_anomalies(pending)
+            mark_alerted(conn, delivered['log_id'])
+    finally:
+        conn.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Detect anomalies in ingested logs.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Score only new logs with a persisted model and alert once per anomaly")
+    parser.add_argument("--refit", action="store_true", help="Force a model refit (incremental mode)")
+    args = parser.parse_args()
+
+    if args.incremental:
+        run_incremental(force_refit=args.refit)
+        return
+
     logs_df = fetch_logs()
     if logs_df.empty:
         print("No logs found in database.")
@@ -71,4 +357,4 @@ def main():
     alert_on_anomalies(results_df)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,19 +5,62 @@ Purpose:
 - Ingest logs from either a local JSON log file or system logs (Linux syslog format).
 - Normalize the logs into a consistent format.
 - Store the normalized logs into a local SQLite database for later analysis.
+- Stream large exports (JSON-lines, JSON arrays, syslog) in constant memory.
+- Optionally tag each log with a mined template ID (see log_templates.py).
 
 Usage:
 $ python3 ingest_logs.py --source sample_logs.json
+$ python3 ingest_logs.py --source export.jsonl --stream --chunk-size 50000 --templates
 """
 
 import argparse
 import json
 import os
+import re
 import sqlite3
+import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.log_templates import TemplateMiner
 
 DB_NAME = "data/logs.db"
 
+# Streaming defaults
+DEFAULT_CHUNK_SIZE = 10000
+READ_BLOCK_SIZE = 1 << 20  # 1 MiB
+
+SYSLOG_PATTERN = re.compile(
+    r'^(?P<timestamp>[A-Z][a-z]{2}\s+\d{1,2}\s\d{2}:\d{2}:\d{2})\s+'
+    r'(?P<host>\S+)\s+'
+    r'(?P<tag>[^:\[\s]+)(?:\[\d+\])?:\s?'
+    r'(?P<message>.*)$'
+)
+
+INSERT_LOG_SQL = "INSERT INTO logs (timestamp, source, message, template_id) VALUES (?, ?, ?, ?)"
+
+
+@dataclass
+class IngestStats:
+    """Summary of a streaming ingestion run."""
+    rows: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    peak_rss_mb: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
 def init_db():
     os.makedirs("data", exist_ok=True)
     conn = sqlite3.connect(DB_NAME)
@@ -27,16 +70,143 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT,
             source TEXT,
-            message TEXT
+            message TEXT,
+            template_id INTEGER
         )
     ''')
+    try:
+        cursor.execute("ALTER TABLE logs ADD COLUMN template_id INTEGER")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
     conn.commit()
     conn.close()
 
+def configure_bulk_connection(conn):
+    """Apply pragmas tuned for large sequential inserts."""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MiB
+    return conn
+
 def parse_json_log(file_path):
     with open(file_path, 'r') as f:
         return json.load(f)
 
+def iter_json_lines(file_path):
+    """Yield one entry per non-empty line of a JSON-lines file."""
+    with open(file_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_json_array(file_path, block_size=READ_BLOCK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buf = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            if not eof and len(buf) - pos < block_size:
+                chunk = f.read(block_size)
+                if chunk:
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                else:
+                    eof = True
+
+            # Skip whitespace and separators between elements
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{file_path} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Element straddles the block boundary; read more
+                chunk = f.read(block_size)
+                if chunk:
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                else:
+                    eof = True
+                continue
+            pos = end
+            yield entry
+
+def parse_syslog_line(line):
+    """Parse a classic BSD syslog line into a log entry dict, or None."""
+    match = SYSLOG_PATTERN.match(line)
+    if not match:
+        return None
+    return {
+        "timestamp": match.group("timestamp"),
+        "source": f"{match.group('host')}/{match.group('tag')}",
+        "message": match.group("message"),
+    }
+
+def iter_syslog(file_path):
+    """Yield parsed entries from a syslog file, skipping unparseable lines."""
+    with open(file_path, 'r', errors='replace') as f:
+        for line in f:
+            entry = parse_syslog_line(line.rstrip("\n"))
+            if entry is not None:
+                yield entry
+
+def detect_format(file_path):
+    """Guess the input format from the first non-whitespace character."""
+    with open(file_path, 'r', errors='replace') as f:
+        while True:
+            ch = f.read(1)
+            if not ch:
+                return "jsonl"
+            if not ch.isspace():
+                break
+    if ch == "[":
+        return "json"
+    if ch == "{":
+        return "jsonl"
+    return "syslog"
+
+def iter_log_file(file_path, fmt="auto"):
+    """Return a generator of raw entries for the given file and format."""
+    if fmt == "auto":
+        fmt = detect_format(file_path)
+    readers = {
+        "json": iter_json_array,
+        "jsonl": iter_json_lines,
+        "syslog": iter_syslog,
+    }
+    if fmt not in readers:
+        raise ValueError(f"Unsupported log format: {fmt}")
+    return readers[fmt](file_path)
+
+def iter_chunks(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
 def normalize_log(entry):
     return {
         "timestamp": entry.get("timestamp", datetime.utcnow().isoformat()),
@@ -44,27 +214,105 @@ def normalize_log(entry):
         "message": entry.get("message", "")
     }
 
+def normalize_chunk(entries, miner=None):
+    """Normalize a chunk of entries into insert-ready row tuples."""
+    default_ts = datetime.utcnow().isoformat()
+    rows = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        message = entry.get("message", "")
+        template_id = miner.add(str(message)).template_id if miner is not None else None
+        rows.append((
+            entry.get("timestamp", default_ts),
+            entry.get("source", "unknown"),
+            message,
+            template_id,
+        ))
+    return rows
+
 def save_logs(logs):
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
-    for entry in logs:
-        norm = normalize_log(entry)
-        cursor.execute('''
-            INSERT INTO logs (timestamp, source, message) 
-            VALUES (?, ?, ?)
-        ''', (norm["timestamp"], norm["source"], norm["message"]))
+    cursor.executemany(INSERT_LOG_SQL, normalize_chunk(logs))
     conn.commit()
     conn.close()
 
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (0.0 if unavailable)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def stream_logs(file_path, fmt="auto", chunk_size=DEFAULT_CHUNK_SIZE, chunks_per_txn=10,
+                mine_templates=False):
+    """
+    Ingest a log file incrementally.
+
+    Entries are parsed lazily, normalized in chunks of ``chunk_size`` and
+    written with ``executemany``; a transaction is committed every
+    ``chunks_per_txn`` chunks so memory stays flat regardless of input size.
+    With ``mine_templates`` each row is tagged with a template ID and the
+    templates are saved to ``log_templates`` in the same transactions.
+    """
+    stats = IngestStats()
+    started = time.perf_counter()
+
+    conn = configure_bulk_connection(sqlite3.connect(DB_NAME))
+    try:
+        cursor = conn.cursor()
+        miner = TemplateMiner.load(conn) if mine_templates else None
+        pending = 0
+        for chunk in iter_chunks(iter_log_file(file_path, fmt), chunk_size):
+            rows = normalize_chunk(chunk, miner)
+            stats.skipped += len(chunk) - len(rows)
+            if not rows:
+                continue
+            if not conn.in_transaction:
+                cursor.execute("BEGIN")
+            cursor.executemany(INSERT_LOG_SQL, rows)
+            stats.rows += len(rows)
+            stats.chunks += 1
+            pending += 1
+            if pending >= chunks_per_txn:
+                if miner is not None:
+                    miner.save(conn, commit=False)
+                conn.commit()
+                pending = 0
+        if miner is not None:
+            miner.save(conn, commit=False)
+        conn.commit()
+    finally:
+        conn.close()
+
+    stats.seconds = time.perf_counter() - started
+    stats.peak_rss_mb = peak_rss_mb()
+    return stats
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest system or JSON logs.")
-    parser.add_argument("--source", required=True, help="Path to log file (JSON format)")
+    parser.add_argument("--source", required=True, help="Path to log file (JSON, JSON-lines or syslog)")
+    parser.add_argument("--stream", action="store_true", help="Stream the file in chunks instead of loading it")
+    parser.add_argument("--format", default="auto", choices=["auto", "json", "jsonl", "syslog"],
+                        help="Input format for --stream (default: detect)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per executemany batch")
+    parser.add_argument("--templates", action="store_true", help="Tag rows with mined log template IDs (--stream)")
     args = parser.parse_args()
 
     init_db()
+    if args.stream:
+        stats = stream_logs(args.source, fmt=args.format, chunk_size=args.chunk_size,
+                            mine_templates=args.templates)
+        print(f"Ingested {stats.rows} logs into {DB_NAME} "
+              f"({stats.rows_per_sec:,.0f} rows/s, peak RSS {stats.peak_rss_mb:.1f} MiB, "
+              f"{stats.skipped} skipped)")
+        return
+
     logs = parse_json_log(args.source)
     save_logs(logs)
     print(f"Ingested {len(logs)} logs into {DB_NAME}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
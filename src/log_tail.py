@@ -0,0 +1,409 @@
+"""
+log_tail.py
+
+Purpose:
+- Tail log files asynchronously with inotify change detection (polling fallback).
+- Survive log rotation (rename + recreate) and truncation (copytruncate).
+- Decouple ingestion from persistence and fan-out with bounded asyncio queues:
+  DB writes are group-committed in micro-batches on a dedicated writer thread,
+  WebSocket broadcasts run separately and shed load under backpressure.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import sqlite3
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+DEFAULT_LOG_COLUMNS = ("timestamp", "source", "message", "level")
+
+
+class _PollingWatcher:
+    """Change detector that simply sleeps with exponential backoff."""
+
+    def __init__(self, min_interval: float = 0.05, max_interval: float = 1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._interval = min_interval
+
+    async def wait(self, timeout: Optional[float] = None):
+        delay = self._interval if timeout is None else min(self._interval, timeout)
+        await asyncio.sleep(delay)
+        self._interval = min(self._interval * 2, self.max_interval)
+
+    def reset(self):
+        self._interval = self.min_interval
+
+    def close(self):
+        pass
+
+
+class _InotifyWatcher:
+    """Change detector backed by Linux inotify on the file's directory."""
+
+    def __init__(self, file_path: str, libc):
+        self._libc = libc
+        self._name = os.path.basename(file_path).encode()
+        self._event = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(file_path)).encode()
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self._fd, directory, mask) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, _, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+            start = offset + _INOTIFY_EVENT.size
+            name = data[start:start + name_len].rstrip(b"\0")
+            offset = start + name_len
+            if name == self._name:
+                self._event.set()
+
+    async def wait(self, timeout: Optional[float] = None):
+        # The timeout doubles as a safety net for missed events (e.g. NFS).
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+
+    def reset(self):
+        pass
+
+    def close(self):
+        if self._fd >= 0:
+            self._loop.remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _load_libc():
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    path = ctypes.util.find_library("c")
+    if not path:
+        return None
+    libc = ctypes.CDLL(path, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+def create_watcher(file_path: str, use_inotify: bool = True):
+    """Return an inotify watcher when available, otherwise a polling watcher."""
+    if use_inotify:
+        try:
+            libc = _load_libc()
+            if libc is not None:
+                return _InotifyWatcher(file_path, libc)
+        except OSError as e:
+            logger.warning(f"inotify unavailable for {file_path}, falling back to polling: {e}")
+    return _PollingWatcher()
+
+
+class FileTailer:
+    """
+    Follow a file like ``tail -F``.
+
+    Reads in blocks rather than per line, handles truncation by rewinding and
+    rotation by draining the old inode before reopening the path.
+    """
+
+    def __init__(self, file_path: str, from_end: bool = True, block_size: int = 64 * 1024,
+                 max_line_length: int = 64 * 1024, idle_timeout: float = 1.0,
+                 use_inotify: bool = True, encoding: str = "utf-8"):
+        self.file_path = file_path
+        self.from_end = from_end
+        self.block_size = block_size
+        self.max_line_length = max_line_length
+        self.idle_timeout = idle_timeout
+        self.use_inotify = use_inotify
+        self.encoding = encoding
+        self.rotations = 0
+        self.truncations = 0
+        self._file = None
+        self._inode = None
+        self._partial = b""
+
+    def _open(self, seek_end: bool):
+        self._file = open(self.file_path, "rb")
+        st = os.fstat(self._file.fileno())
+        self._inode = (st.st_dev, st.st_ino)
+        if seek_end:
+            self._file.seek(0, os.SEEK_END)
+        self._partial = b""
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_lines(self) -> List[str]:
+        """Read everything currently available and return complete lines."""
+        data = self._file.read(self.block_size)
+        if not data:
+            return []
+        data = self._partial + data
+        parts = data.split(b"\n")
+        self._partial = parts.pop()
+        if len(self._partial) > self.max_line_length:
+            # Emit over-long unterminated lines rather than buffering forever
+            parts.append(self._partial)
+            self._partial = b""
+        return [p.rstrip(b"\r").decode(self.encoding, errors="replace") for p in parts if p]
+
+    def _check_rotation(self) -> bool:
+        """Return True when the path now points at a different (or no) file."""
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False
+        if (st.st_dev, st.st_ino) != self._inode:
+            return True
+        if st.st_size < self._file.tell():
+            logger.info(f"{self.file_path} truncated, rewinding")
+            self._file.seek(0)
+            self._partial = b""
+            self.truncations += 1
+        return False
+
+    async def lines(self, should_continue: Callable[[], bool] = lambda: True) -> AsyncIterator[List[str]]:
+        """Yield batches of new lines until ``should_continue`` returns False."""
+        self._open(seek_end=self.from_end)
+        watcher = create_watcher(self.file_path, self.use_inotify)
+        try:
+            while should_continue():
+                batch = self._read_lines()
+                if batch:
+                    watcher.reset()
+                    yield batch
+                    continue
+
+                if self._check_rotation():
+                    # Drain whatever was appended to the old file, then follow the new one
+                    while True:
+                        tail = self._read_lines()
+                        if not tail:
+                            break
+                        yield tail
+                    if self._partial:
+                        yield [self._partial.decode(self.encoding, errors="replace")]
+                    self._close()
+                    self._open(seek_end=False)
+                    self.rotations += 1
+                    logger.info(f"{self.file_path} rotated, reopened")
+                    continue
+
+                await watcher.wait(self.idle_timeout)
+        finally:
+            watcher.close()
+            self._close()
+
+
+class LogPipeline:
+    """
+    Bounded ingestion pipeline for log entries.
+
+    ``submit`` applies backpressure by awaiting when the write queue is full.
+    A single writer task group-commits micro-batches via ``executemany`` on a
+    dedicated thread, so the event loop never waits on SQLite. Broadcasts go
+    through their own queue; when clients fall behind the oldest pending
+    entries are dropped so ingestion is never slowed by WebSockets.
+
+    With ``write_queue`` (a ``database.write_queue.WriteQueue``) batches are
+    handed to that shared single writer instead of a private connection, so
+    log ingestion and other inserts never compete for the SQLite write lock.
+    """
+
+    def __init__(self, db_path: str, broadcast: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                 table: str = "logs", columns: Sequence[str] = DEFAULT_LOG_COLUMNS,
+                 batch_size: int = 500, flush_interval: float = 0.25,
+                 queue_size: int = 10000, broadcast_queue_size: int = 1000,
+                 write_queue=None):
+        self.db_path = db_path
+        self.write_queue = write_queue
+        self.broadcast = broadcast
+        self.table = table
+        self.columns = tuple(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.broadcast_queue_size = broadcast_queue_size
+        self._insert_sql = (
+            f"INSERT INTO {table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)})"
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._broadcast_queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self.running = False
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "broadcast": 0,
+            "broadcast_dropped": 0,
+            "last_batch_size": 0,
+            "last_commit_ms": 0.0,
+        }
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._broadcast_queue = asyncio.Queue(maxsize=self.broadcast_queue_size)
+        if self.write_queue is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-writer")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._connect)
+        self.running = True
+        self._tasks = [asyncio.create_task(self._writer())]
+        if self.broadcast is not None:
+            self._tasks.append(asyncio.create_task(self._broadcaster()))
+
+    async def stop(self):
+        """Flush pending writes and stop background tasks."""
+        if not self.running:
+            return
+        self.running = False
+        await self._queue.put(None)
+        await self._tasks[0]
+        for task in self._tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*self._tasks[1:], return_exceptions=True)
+        if self._executor is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._disconnect)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._tasks = []
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+
+    def _disconnect(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _row(self, entry: Dict[str, Any]) -> tuple:
+        return tuple(entry.get(column) for column in self.columns)
+
+    async def submit(self, entry: Dict[str, Any]):
+        """Queue an entry for persistence, waiting if the writer is behind."""
+        self.stats["submitted"] += 1
+        await self._queue.put(entry)
+        self._offer_broadcast(entry)
+
+    def submit_nowait(self, entry: Dict[str, Any]) -> bool:
+        """Queue an entry without waiting; returns False when the writer is behind."""
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            return False
+        self.stats["submitted"] += 1
+        self._offer_broadcast(entry)
+        return True
+
+    async def submit_many(self, entries: Sequence[Dict[str, Any]]):
+        for entry in entries:
+            await self.submit(entry)
+
+    def _offer_broadcast(self, entry: Dict[str, Any]):
+        if self.broadcast is None:
+            return
+        if self._broadcast_queue.full():
+            # Shed the oldest pending broadcast; live views prefer fresh data
+            self._broadcast_queue.get_nowait()
+            self.stats["broadcast_dropped"] += 1
+        self._broadcast_queue.put_nowait(entry)
+
+    def _write_batch(self, rows: List[tuple]):
+        started = time.perf_counter()
+        with self._conn:
+            self._conn.executemany(self._insert_sql, rows)
+        return (time.perf_counter() - started) * 1000
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is None:
+                break
+            batch = [self._row(entry)]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    if self._queue.empty():
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        entry = await asyncio.wait_for(self._queue.get(), remaining)
+                    else:
+                        entry = self._queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(self._row(entry))
+
+            try:
+                if self.write_queue is not None:
+                    started = time.perf_counter()
+                    await self.write_queue.write_many(self._insert_sql, batch)
+                    elapsed = (time.perf_counter() - started) * 1000
+                else:
+                    elapsed = await loop.run_in_executor(self._executor, self._write_batch, batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["last_batch_size"] = len(batch)
+                self.stats["last_commit_ms"] = elapsed
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                logger.error(f"Error writing {len(batch)} log entries: {str(e)}")
+
+    async def _broadcaster(self):
+        while True:
+            entry = await self._broadcast_queue.get()
+            try:
+                await self.broadcast(entry)
+                self.stats["broadcast"] += 1
+            except Exception as e:
+                logger.debug(f"Broadcast failed: {str(e)}")
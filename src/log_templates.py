@@ -0,0 +1,335 @@
+"""
+log_templates.py
+
+Purpose:
+- Mine log message templates online with a Drain-style fixed-depth prefix tree.
+- Map every message to a template ID plus its variable parameters.
+- Keep the template cache bounded with LRU eviction.
+- Persist templates to SQLite (`log_templates`) so IDs and counts survive
+  between ingestion and anomaly-scoring runs. SQLite assigns template IDs
+  (one row per template text) and saves add count deltas, so concurrent
+  ingestion and scoring processes share IDs instead of overwriting each other.
+
+Each message costs O(tokens): the tree descent is bounded by ``depth`` and a
+leaf holds at most ``max_clusters_per_leaf`` candidate templates.
+"""
+
+import math
+import re
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+PARAM = "<*>"
+
+# Tokens that are almost always variables: numbers, IPs/versions/times, hex ids
+_VARIABLE = re.compile(r"^[-+(\[]?(?:\d+(?:[.:/_-]\d+)*|0x[0-9a-fA-F]+|[0-9a-fA-F]{16,}|[0-9a-fA-F-]{36})[)\],;]?$")
+_SPLIT = re.compile(r"\s+")
+
+
+class TemplateMatch(NamedTuple):
+    template_id: int
+    template: str
+    parameters: List[str]
+    size: int
+    is_new: bool
+
+
+class LogCluster:
+    __slots__ = ("cluster_id", "tokens", "size", "saved_size", "leaf", "last_used", "last_seen")
+
+    def __init__(self, cluster_id: int, tokens: List[str], size: int = 1, last_seen: Optional[str] = None,
+                 saved_size: Optional[int] = None):
+        self.cluster_id = cluster_id
+        self.tokens = tokens
+        self.size = size
+        # Count already stored in log_templates; None until the template has a row
+        self.saved_size = saved_size
+        self.leaf = None
+        self.last_used = 0
+        self.last_seen = last_seen
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+class _Node:
+    __slots__ = ("children", "clusters")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.clusters: List[LogCluster] = []
+
+
+def tokenize(message: str) -> List[str]:
+    return [token for token in _SPLIT.split(message.strip()) if token]
+
+
+class TemplateMiner:
+    """
+    Online Drain template miner.
+
+    ``depth`` counts the length layer plus the prefix-token layers, so a
+    depth of 4 routes on token count and the first two tokens.
+
+    A miner bound to a connection (``load``, or after its first ``save``)
+    registers each new template in ``log_templates`` as it is mined and uses
+    the row ID; an unbound miner numbers templates itself, and those IDs are
+    provisional until the first ``save``.
+    """
+
+    def __init__(self, depth: int = 4, similarity_threshold: float = 0.5,
+                 max_children: int = 100, max_clusters: int = 10000,
+                 max_clusters_per_leaf: int = 32):
+        self.depth = max(depth, 3)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.max_clusters_per_leaf = max_clusters_per_leaf
+        self.root = _Node()
+        self.clusters: "OrderedDict[int, LogCluster]" = OrderedDict()
+        self.total = 0
+        self.next_id = 1
+        self.evictions = 0
+        self.conn = None
+        self._dirty = set()
+
+    # ===== Matching =====
+
+    def _leaf(self, tokens: List[str], create: bool) -> Optional[_Node]:
+        node = self.root.children.get(str(len(tokens)))
+        if node is None:
+            if not create:
+                return None
+            node = self.root.children[str(len(tokens))] = _Node()
+
+        for token in tokens[:self.depth - 2]:
+            key = PARAM if _VARIABLE.match(token) else token
+            child = node.children.get(key)
+            if child is None:
+                child = node.children.get(PARAM)
+            if child is None:
+                if not create:
+                    return None
+                if len(node.children) >= self.max_children - 1 and key != PARAM:
+                    key = PARAM
+                child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = _Node()
+            node = child
+        return node
+
+    def _best_cluster(self, leaf: _Node, tokens: List[str]) -> Optional[LogCluster]:
+        best = None
+        best_sim = -1.0
+        best_params = -1
+        for cluster in leaf.clusters:
+            same = 0
+            params = 0
+            for template_token, token in zip(cluster.tokens, tokens):
+                if template_token == PARAM:
+                    params += 1
+                elif template_token == token:
+                    same += 1
+            sim = same / len(tokens) if tokens else 1.0
+            if sim > best_sim or (sim == best_sim and params > best_params):
+                best, best_sim, best_params = cluster, sim, params
+        if best is not None and best_sim >= self.similarity_threshold:
+            return best
+        return None
+
+    def _touch(self, cluster: LogCluster):
+        cluster.last_used = self.total
+        self.clusters.move_to_end(cluster.cluster_id)
+
+    def _add_cluster(self, leaf: _Node, cluster: LogCluster):
+        if len(leaf.clusters) >= self.max_clusters_per_leaf:
+            # Evict the least recently used template in this leaf
+            self._evict(min(leaf.clusters, key=lambda c: c.last_used))
+        cluster.last_used = self.total
+        cluster.leaf = leaf
+        leaf.clusters.append(cluster)
+        self.clusters[cluster.cluster_id] = cluster
+        while len(self.clusters) > self.max_clusters:
+            self._evict(next(iter(self.clusters.values())))
+
+    def _evict(self, cluster: LogCluster):
+        self.clusters.pop(cluster.cluster_id, None)
+        if cluster.leaf is not None:
+            cluster.leaf.clusters.remove(cluster)
+            cluster.leaf = None
+        self.evictions += 1
+
+    @staticmethod
+    def _parameters(template_tokens: List[str], tokens: List[str]) -> List[str]:
+        return [token for template_token, token in zip(template_tokens, tokens) if template_token == PARAM]
+
+    def add(self, message: str) -> TemplateMatch:
+        """Match ``message`` against known templates, learning from it."""
+        tokens = tokenize(message)
+        self.total += 1
+        leaf = self._leaf(tokens, create=True)
+        cluster = self._best_cluster(leaf, tokens)
+        is_new = cluster is None
+
+        if is_new:
+            template_tokens = [PARAM if _VARIABLE.match(t) else t for t in tokens]
+            cluster_id, saved_size = self._allocate_id(" ".join(template_tokens))
+            known = self.clusters.get(cluster_id)
+            if known is not None:
+                # Another run registered this template and we hold its row
+                cluster, is_new = known, False
+                cluster.size += 1
+                self._touch(cluster)
+            else:
+                cluster = LogCluster(cluster_id, template_tokens, saved_size=saved_size)
+                self._add_cluster(leaf, cluster)
+        else:
+            cluster.size += 1
+            if any(t != PARAM and t != token for t, token in zip(cluster.tokens, tokens)):
+                cluster.tokens = [t if t == token else PARAM for t, token in zip(cluster.tokens, tokens)]
+            self._touch(cluster)
+
+        self._dirty.add(cluster.cluster_id)
+        return TemplateMatch(cluster.cluster_id, cluster.template,
+                             self._parameters(cluster.tokens, tokens), cluster.size, is_new)
+
+    def _allocate_id(self, template: str):
+        """``(template_id, saved_size)`` for a new template."""
+        if self.conn is None:
+            cluster_id = self.next_id
+            self.next_id += 1
+            return cluster_id, None
+        row = self.conn.execute(
+            "INSERT INTO log_templates (template, size, last_seen) VALUES (?, 0, ?) "
+            "ON CONFLICT(template) DO UPDATE SET last_seen = excluded.last_seen RETURNING id",
+            (template, datetime.now().isoformat())
+        ).fetchall()[0]
+        return row[0], 0
+
+    def match(self, message: str) -> Optional[TemplateMatch]:
+        """Match ``message`` without updating the miner."""
+        tokens = tokenize(message)
+        leaf = self._leaf(tokens, create=False)
+        if leaf is None:
+            return None
+        cluster = self._best_cluster(leaf, tokens)
+        if cluster is None:
+            return None
+        return TemplateMatch(cluster.cluster_id, cluster.template,
+                             self._parameters(cluster.tokens, tokens), cluster.size, False)
+
+    # ===== Features =====
+
+    def frequency(self, template_id: int) -> int:
+        cluster = self.clusters.get(template_id)
+        return cluster.size if cluster else 0
+
+    def rarity(self, template_id: int) -> float:
+        """Negative log-probability of the template given everything seen so far."""
+        size = self.frequency(template_id)
+        if size == 0 or self.total == 0:
+            return math.log(max(self.total, 1) + 1)
+        return -math.log(size / self.total)
+
+    # ===== Persistence =====
+
+    @staticmethod
+    def init_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS log_templates (
+                id INTEGER PRIMARY KEY,
+                template TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_seen TEXT
+            )
+        ''')
+        try:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_log_templates_template ON log_templates (template)")
+        except sqlite3.IntegrityError:
+            # Tables written before IDs were assigned here can hold one
+            # template under several IDs; fold them into the lowest
+            conn.execute('''
+                UPDATE log_templates SET size = (
+                    SELECT SUM(size) FROM log_templates AS dup WHERE dup.template = log_templates.template
+                )
+                WHERE id IN (SELECT MIN(id) FROM log_templates GROUP BY template HAVING COUNT(*) > 1)
+            ''')
+            conn.execute("DELETE FROM log_templates WHERE id NOT IN (SELECT MIN(id) FROM log_templates GROUP BY template)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_log_templates_template ON log_templates (template)")
+
+    def save(self, conn, commit: bool = True):
+        """Add the counts of templates touched since the last save; binds the miner to ``conn``."""
+        self.init_table(conn)
+        now = datetime.now().isoformat()
+        updates = []
+        renames = []
+        remapped = {}
+        for cluster_id in self._dirty:
+            cluster = self.clusters.get(cluster_id)
+            if cluster is None:
+                continue
+            cluster.last_seen = now
+            if cluster.saved_size is None:
+                row = conn.execute(
+                    "INSERT INTO log_templates (template, size, last_seen) VALUES (?, ?, ?) "
+                    "ON CONFLICT(template) DO UPDATE SET size = size + excluded.size, "
+                    "last_seen = excluded.last_seen RETURNING id",
+                    (cluster.template, cluster.size, now)
+                ).fetchall()[0]
+                if row[0] != cluster_id:
+                    remapped[cluster_id] = row[0]
+            else:
+                updates.append((cluster.size - cluster.saved_size, now, cluster_id))
+                renames.append((cluster.template, cluster_id))
+            cluster.saved_size = cluster.size
+        conn.executemany("UPDATE log_templates SET size = size + ?, last_seen = ? WHERE id = ?", updates)
+        # A template generalised here may already exist under another ID; keep the old text then
+        conn.executemany("UPDATE OR IGNORE log_templates SET template = ? WHERE id = ?", renames)
+        if remapped:
+            self._remap(remapped)
+        if commit:
+            conn.commit()
+        self._dirty.clear()
+        self.conn = conn
+
+    def _remap(self, remapped: Dict[int, int]):
+        """Replace provisional IDs with the row IDs they were saved under."""
+        clusters = OrderedDict()
+        for cluster_id, cluster in self.clusters.items():
+            cluster.cluster_id = remapped.get(cluster_id, cluster_id)
+            if cluster.cluster_id in clusters:
+                # Two provisional templates saved onto one row; keep one cluster
+                cluster.leaf.clusters.remove(cluster)
+                clusters[cluster.cluster_id].size += cluster.size
+                clusters[cluster.cluster_id].saved_size += cluster.saved_size
+                continue
+            clusters[cluster.cluster_id] = cluster
+        self.clusters = clusters
+
+    @classmethod
+    def load(cls, conn, bind: bool = True, **kwargs) -> "TemplateMiner":
+        """
+        Rebuild a miner from the most recently used persisted templates.
+        With ``bind`` false, templates it learns stay in memory until ``save``.
+        """
+        miner = cls(**kwargs)
+        cls.init_table(conn)
+        row = conn.execute("SELECT COALESCE(MAX(id), 0), COALESCE(SUM(size), 0) FROM log_templates").fetchone()
+        miner.next_id = row[0] + 1
+        miner.total = row[1]
+        rows = conn.execute(
+            "SELECT id, template, size, last_seen FROM log_templates ORDER BY last_seen DESC, id DESC LIMIT ?",
+            (miner.max_clusters,)
+        ).fetchall()
+        for cluster_id, template, size, last_seen in reversed(rows):
+            tokens = template.split(" ") if template else []
+            leaf = miner._leaf(tokens, create=True)
+            cluster = LogCluster(cluster_id, tokens, size, last_seen, saved_size=size)
+            miner._add_cluster(leaf, cluster)
+        miner.evictions = 0
+        if bind:
+            miner.conn = conn
+        return miner
@@ -0,0 +1,380 @@
+"""
+syslog_receiver.py
+
+Purpose:
+- Receive syslog over UDP and TCP with native asyncio protocols.
+- Parse RFC 5424 and RFC 3164 messages with precompiled patterns.
+- Support RFC 6587 octet-counted and newline-delimited TCP framing.
+- Hand parsed entries to a LogPipeline for batched inserts into `logs`.
+
+Usage:
+$ python3 -m src.syslog_receiver --udp-port 5514 --tcp-port 5514
+$ python3 -m src.syslog_receiver --bench 200000
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from src.log_tail import LogPipeline
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAME_SIZE = 64 * 1024
+UDP_RECV_BUFFER = 8 * 1024 * 1024
+UDP_DRAIN_BATCH = 1024
+# Senders tracked individually; the least recently seen beyond this fold into OTHER_PEERS
+MAX_TRACKED_PEERS = 1024
+OTHER_PEERS = "other"
+
+_PRI_RE = re.compile(r"<(\d{1,3})>")
+_RFC5424_RE = re.compile(
+    r"<(\d{1,3})>1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: (.*))?",
+    re.DOTALL,
+)
+_RFC3164_RE = re.compile(
+    r"<(\d{1,3})>([A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) (\S+) ([^:\[\s]+)(?:\[(\d+)\])?: ?(.*)",
+    re.DOTALL,
+)
+
+# Severity (0-7) to the level names used by the logs table
+SEVERITY_LEVELS = ("critical", "critical", "critical", "error", "warning", "info", "info", "debug")
+
+
+class SyslogMessage(NamedTuple):
+    facility: int
+    severity: int
+    timestamp: Optional[str]
+    hostname: Optional[str]
+    app_name: Optional[str]
+    procid: Optional[str]
+    msgid: Optional[str]
+    message: str
+
+
+def _nil(value: str) -> Optional[str]:
+    return None if value == "-" else value
+
+
+def parse_syslog(line: str) -> SyslogMessage:
+    """Parse a single syslog message; unrecognised input is kept as a user.notice message."""
+    match = _RFC5424_RE.match(line)
+    if match:
+        pri = int(match.group(1))
+        message = match.group(8) or ""
+        if message.startswith("\ufeff"):
+            message = message[1:]
+        return SyslogMessage(pri >> 3, pri & 7, _nil(match.group(2)), _nil(match.group(3)),
+                             _nil(match.group(4)), _nil(match.group(5)), _nil(match.group(6)), message)
+
+    match = _RFC3164_RE.match(line)
+    if match:
+        pri = int(match.group(1))
+        return SyslogMessage(pri >> 3, pri & 7, match.group(2), match.group(3),
+                             match.group(4), match.group(5), None, match.group(6))
+
+    match = _PRI_RE.match(line)
+    if match:
+        pri = int(match.group(1))
+        return SyslogMessage(pri >> 3, pri & 7, None, None, None, None, None, line[match.end():])
+    return SyslogMessage(1, 5, None, None, None, None, None, line)
+
+
+class SourceCounters:
+    """Per-sender counters."""
+
+    __slots__ = ("received", "bytes", "parsed", "dropped", "last_seen")
+
+    def __init__(self):
+        self.received = 0
+        self.bytes = 0
+        self.parsed = 0
+        self.dropped = 0
+        self.last_seen = 0.0
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def absorb(self, other: "SourceCounters"):
+        self.received += other.received
+        self.bytes += other.bytes
+        self.parsed += other.parsed
+        self.dropped += other.dropped
+        self.last_seen = max(self.last_seen, other.last_seen)
+
+
+class SyslogReceiver:
+    """
+    Asyncio syslog listener.
+
+    UDP datagrams that arrive while the pipeline is full are dropped and
+    counted; TCP connections are paused instead, pushing backpressure to the
+    sender. Counters are kept for the ``max_peers`` most recently seen
+    senders; older ones are folded into an ``"other"`` entry, so spoofed UDP
+    sources cannot grow them without bound.
+    """
+
+    def __init__(self, pipeline: LogPipeline, host: str = "0.0.0.0",
+                 udp_port: Optional[int] = 514, tcp_port: Optional[int] = None,
+                 max_frame_size: int = MAX_FRAME_SIZE, max_peers: int = MAX_TRACKED_PEERS):
+        self.pipeline = pipeline
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.max_frame_size = max_frame_size
+        self.max_peers = max_peers
+        self.counters: "OrderedDict[str, SourceCounters]" = OrderedDict()
+        self._udp_sock = None
+        self._tcp_server = None
+        self._connections: Set["_SyslogStreamProtocol"] = set()
+        self._drains: Set[asyncio.Future] = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await self.pipeline.start()
+        if self.udp_port is not None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECV_BUFFER)
+            except OSError:
+                pass
+            sock.bind((self.host, self.udp_port))
+            sock.setblocking(False)
+            # Read UDP directly off the selector so each wakeup drains a burst of
+            # datagrams instead of one (create_datagram_endpoint reads one per tick)
+            loop.add_reader(sock.fileno(), self._on_udp_readable, sock)
+            self._udp_sock = sock
+            self.udp_port = sock.getsockname()[1]
+        if self.tcp_port is not None:
+            self._tcp_server = await loop.create_server(
+                lambda: _SyslogStreamProtocol(self), self.host, self.tcp_port, reuse_address=True)
+            self.tcp_port = self._tcp_server.sockets[0].getsockname()[1]
+        logger.info(f"Syslog receiver listening on {self.host} (udp={self.udp_port}, tcp={self.tcp_port})")
+
+    async def stop(self):
+        if self._udp_sock is not None:
+            asyncio.get_running_loop().remove_reader(self._udp_sock.fileno())
+            self._udp_sock.close()
+            self._udp_sock = None
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            # Open connections keep wait_closed() waiting; closing them flushes their buffers
+            for connection in list(self._connections):
+                connection.transport.close()
+            await self._tcp_server.wait_closed()
+            self._tcp_server = None
+        # Paused connections may still be handing their backlog to the pipeline
+        if self._drains:
+            await asyncio.gather(*self._drains, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {peer: counters.to_dict() for peer, counters in self.counters.items()}
+
+    def _counters_for(self, peer: str) -> SourceCounters:
+        counters = self.counters.get(peer)
+        if counters is not None:
+            if peer != OTHER_PEERS:
+                self.counters.move_to_end(peer)
+            return counters
+        counters = self.counters[peer] = SourceCounters()
+        while len(self.counters) > self.max_peers + (OTHER_PEERS in self.counters):
+            oldest = next(p for p in self.counters if p != OTHER_PEERS)
+            evicted = self.counters.pop(oldest)
+            other = self.counters.get(OTHER_PEERS)
+            if other is None:
+                other = self.counters[OTHER_PEERS] = SourceCounters()
+                self.counters.move_to_end(OTHER_PEERS, last=False)
+            other.absorb(evicted)
+        return counters
+
+    def _to_entry(self, line: str, peer: str) -> Dict:
+        msg = parse_syslog(line)
+        source = msg.hostname or peer
+        if msg.app_name:
+            source = f"{source}/{msg.app_name}"
+        timestamp = msg.timestamp if msg.timestamp and msg.timestamp[0].isdigit() else datetime.now().isoformat()
+        return {
+            "timestamp": timestamp,
+            "source": source,
+            "message": msg.message,
+            "level": SEVERITY_LEVELS[msg.severity],
+        }
+
+    def handle_frame(self, data: bytes, peer: str) -> Optional[Dict]:
+        """Parse one frame and offer it to the pipeline; returns the entry if it did not fit."""
+        counters = self._counters_for(peer)
+        counters.received += 1
+        counters.bytes += len(data)
+        counters.last_seen = time.time()
+        line = data.decode("utf-8", errors="replace").rstrip("\r\n\0")
+        if not line:
+            return None
+        entry = self._to_entry(line, peer)
+        counters.parsed += 1
+        if self.pipeline.submit_nowait(entry):
+            return None
+        return entry
+
+    def _on_udp_readable(self, sock: socket.socket):
+        recvfrom = sock.recvfrom
+        for _ in range(UDP_DRAIN_BATCH):
+            try:
+                data, addr = recvfrom(self.max_frame_size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.warning(f"Syslog UDP error: {e}")
+                return
+            if self.handle_frame(data, addr[0]) is not None:
+                self._counters_for(addr[0]).dropped += 1
+
+
+class _SyslogStreamProtocol(asyncio.Protocol):
+    """TCP syslog with RFC 6587 octet-counting or LF-delimited framing."""
+
+    def __init__(self, receiver: SyslogReceiver):
+        self.receiver = receiver
+        self.transport = None
+        self.peer = "unknown"
+        self._buffer = bytearray()
+        self._backlog: List[Dict] = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+        peername = transport.get_extra_info("peername")
+        if peername:
+            self.peer = peername[0]
+        self.receiver._connections.add(self)
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        for frame in self._frames():
+            entry = self.receiver.handle_frame(frame, self.peer)
+            if entry is not None:
+                self._backlog.append(entry)
+        if self._backlog:
+            self.transport.pause_reading()
+            drain = asyncio.ensure_future(self._drain_backlog())
+            self.receiver._drains.add(drain)
+            drain.add_done_callback(self.receiver._drains.discard)
+        elif len(self._buffer) > self.receiver.max_frame_size:
+            logger.warning(f"Dropping oversized syslog frame from {self.peer}")
+            self.receiver._counters_for(self.peer).dropped += 1
+            self._buffer.clear()
+
+    def _frames(self):
+        buf = self._buffer
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            if 48 <= buf[pos] <= 57:  # octet-counted: "<len> <msg>"
+                space = buf.find(b" ", pos, min(end, pos + 10))
+                prefix = bytes(buf[pos:space if space >= 0 else min(end, pos + 10)])
+                if prefix.isdigit():
+                    if space < 0:
+                        if end - pos < 10:
+                            break  # Length prefix may still be arriving
+                    else:
+                        length = int(prefix)
+                        start = space + 1
+                        if start + length > end:
+                            break
+                        yield bytes(buf[start:start + length])
+                        pos = start + length
+                        continue
+                # Not a length prefix after all (e.g. "12:00:01 host msg"); use LF framing
+            newline = buf.find(b"\n", pos)
+            if newline < 0:
+                break
+            yield bytes(buf[pos:newline])
+            pos = newline + 1
+        del buf[:pos]
+
+    async def _drain_backlog(self):
+        backlog, self._backlog = self._backlog, []
+        await self.receiver.pipeline.submit_many(backlog)
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+            if self._buffer:
+                self.data_received(b"")
+
+    def connection_lost(self, exc):
+        self.receiver._connections.discard(self)
+        if self._buffer:
+            self.receiver.handle_frame(bytes(self._buffer), self.peer)
+            self._buffer.clear()
+
+
+def _send_udp(port: int, count: int, payload: bytes):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for _ in range(count):
+        sender.sendto(payload, ("127.0.0.1", port))
+    sender.close()
+
+
+async def _bench(count: int, db_path: str):
+    """Blast ``count`` messages from a separate sender process over loopback UDP."""
+    import multiprocessing
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, source TEXT, message TEXT, level TEXT)")
+    conn.close()
+
+    pipeline = LogPipeline(db_path, batch_size=5000, queue_size=100000)
+    receiver = SyslogReceiver(pipeline, host="127.0.0.1", udp_port=0)
+    await receiver.start()
+
+    payload = b"<34>1 2025-05-15T12:00:00Z web01 sshd 1234 ID47 - Failed password for root from 10.0.0.1"
+    sender = multiprocessing.Process(target=_send_udp, args=(receiver.udp_port, count, payload))
+    started = time.perf_counter()
+    sender.start()
+    while sender.is_alive():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)  # let the socket buffer drain
+    elapsed = time.perf_counter() - started
+    await receiver.stop()
+    await pipeline.stop()
+
+    received = sum(c.received for c in receiver.counters.values())
+    dropped = sum(c.dropped for c in receiver.counters.values())
+    print(f"sent={count} received={received} dropped={dropped} written={pipeline.stats['written']} "
+          f"batches={pipeline.stats['batches']} -> {received / elapsed:,.0f} msgs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SecureNet syslog receiver")
+    parser.add_argument("--db", default="data/securenet.db", help="SQLite database with a logs table")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--udp-port", type=int, default=514)
+    parser.add_argument("--tcp-port", type=int, default=None)
+    parser.add_argument("--bench", type=int, default=0, help="Run a loopback benchmark with N messages")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.bench:
+        asyncio.run(_bench(args.bench, args.db))
+        return
+
+    async def serve():
+        receiver = SyslogReceiver(LogPipeline(args.db), args.host, args.udp_port, args.tcp_port)
+        await receiver.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await receiver.stop()
+            await receiver.pipeline.stop()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
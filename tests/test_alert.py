@@ -0,0 +1,78 @@
+import asyncio
+
+import pandas as pd
+from aiohttp import web
+
+from src.alert import AlertDispatcher
+
+
+def _flagged_rows():
+    return pd.DataFrame({
+        "timestamp": [f"2025-05-15T10:00:{i:02d}Z" for i in range(30)],
+        "source": ["auth"] * 20 + ["kernel"] * 10,
+        "message": [f"event {i}" for i in range(30)],
+        "anomaly_score": [-0.5 + i * 0.01 for i in range(30)],
+    })
+
+
+async def _start_fake_slack(responses):
+    """Local stand-in for Slack's chat.postMessage; pops canned statuses in order."""
+    received = []
+
+    async def post_message(request):
+        received.append(await request.json())
+        status = responses.pop(0) if responses else 200
+        if status == 429:
+            return web.json_response({"ok": False, "error": "ratelimited"}, status=429,
+                                     headers={"Retry-After": "0"})
+        if status >= 500:
+            return web.Response(status=status)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_post("/api/chat.postMessage", post_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/api/", received
+
+
+def test_dispatch_sends_one_digest_per_source_with_retries():
+    async def scenario():
+        runner, url, received = await _start_fake_slack([429, 503])
+        dispatcher = AlertDispatcher(token="xoxb-test", api_url=url, rate=100, burst=10, backoff=0.01)
+        try:
+            delivered = await dispatcher.dispatch(_flagged_rows())
+        finally:
+            await dispatcher.close()
+            await runner.cleanup()
+        return delivered, received, dispatcher.stats
+
+    delivered, received, stats = asyncio.run(scenario())
+
+    assert delivered == {"auth", "kernel"}
+    assert stats["digests_sent"] == 2
+    assert stats["retries"] == 2
+    texts = [body["text"] for body in received]
+    auth_digest = next(t for t in texts if "from auth" in t and "20 suspicious" in t)
+    assert "...and 15 more" in auth_digest
+
+
+def test_dispatch_gives_up_after_max_retries():
+    async def scenario():
+        runner, url, _ = await _start_fake_slack([500] * 10)
+        dispatcher = AlertDispatcher(token="xoxb-test", api_url=url, rate=100, burst=10,
+                                     backoff=0.01, max_retries=2)
+        try:
+            delivered = await dispatcher.dispatch(_flagged_rows().head(5))
+        finally:
+            await dispatcher.close()
+            await runner.cleanup()
+        return delivered, dispatcher.stats
+
+    delivered, stats = asyncio.run(scenario())
+
+    assert delivered == set()
+    assert stats["digests_failed"] == 1
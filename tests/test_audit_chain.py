@@ -0,0 +1,110 @@
+import copy
+import json
+from datetime import datetime, timedelta, timezone
+
+from auth.audit_chain import (
+    EXPORT_FORMAT, AuditChain, inclusion_proof, main, merkle_root, verify_event_proof,
+    verify_export, verify_inclusion,
+)
+
+
+def _event(i):
+    return {
+        "event_id": f"audit_{i}", "event_hash": "abc", "event_type": "login_success",
+        "severity": "low", "user_id": str(i % 3), "username": f"user{i % 3}", "user_role": None,
+        "source_ip": "10.0.0.1", "user_agent": None, "resource": None, "action": "user_login",
+        "result": "success", "details": json.dumps({"b": 1, "a": i}),
+        "timestamp": datetime(2026, 1, 1, 12, 0, 0) + timedelta(seconds=i),
+        "session_id": None, "request_id": None, "organization_id": None,
+    }
+
+
+def _export(count=10, block_size=4):
+    chain = AuditChain("node-1", block_size=block_size, checkpoint_interval=3600)
+    chain.restore(None, [])
+    events, checkpoints = [], []
+    for i in range(count):
+        events.append(chain.append(_event(i), now=1000))
+        checkpoint = chain.checkpoint(now=1000)
+        if checkpoint:
+            checkpoints.append(checkpoint)
+    checkpoints.append(chain.checkpoint(now=1000, force=True))
+    return chain, {"format": EXPORT_FORMAT, "chain_id": "node-1", "events": events,
+                   "checkpoints": [c for c in checkpoints if c]}
+
+
+def test_inclusion_proofs_verify_for_every_leaf_and_tree_size():
+    for size in (1, 2, 3, 5, 8, 13):
+        leaves = [f"{i:064x}" for i in range(size)]
+        root = merkle_root(leaves)
+        for index in range(size):
+            path = inclusion_proof(leaves, index)
+            assert len(path) <= size.bit_length()
+            assert verify_inclusion(leaves[index], index, size, path, root)
+            assert not verify_inclusion(leaves[(index + 1) % size], index, size, path, root) or size == 1
+
+
+def test_chain_blocks_and_export_verify_offline():
+    _, export = _export()
+    assert [c["last_sequence"] for c in export["checkpoints"]] == [4, 8, 10]
+    report = verify_export(json.loads(json.dumps(export, default=str)))
+    assert report["valid"], report["errors"]
+    assert report["sealed_events"] == 10
+
+
+def test_verification_detects_edited_and_dropped_events():
+    _, export = _export()
+    edited = copy.deepcopy(export)
+    edited["events"][5]["result"] = "failed"
+    assert any("event 6" in e for e in verify_export(edited)["errors"])
+
+    rehashed = copy.deepcopy(export)
+    del rehashed["events"][2]
+    report = verify_export(rehashed)
+    assert not report["valid"] and any("checkpoint 0" in e for e in report["errors"])
+
+
+def test_event_proof_survives_database_round_trip():
+    _, export = _export()
+    event = dict(export["events"][6])
+    # What asyncpg hands back: aware UTC timestamp, JSONB-normalised details
+    event["timestamp"] = event["timestamp"].replace(tzinfo=timezone.utc)
+    event["details"] = json.dumps(json.loads(event["details"]), sort_keys=True, indent=1)
+    checkpoint = export["checkpoints"][1]
+    leaves = [e["chain_hash"] for e in export["events"][4:8]]
+    bundle = {"event": event, "checkpoint": checkpoint,
+              "proof": {"leaf_index": 2, "leaf_count": 4, "path": inclusion_proof(leaves, 2)}}
+    assert verify_event_proof(bundle)
+    bundle["event"]["action"] = "something_else"
+    assert not verify_event_proof(bundle)
+
+
+def test_restore_continues_the_chain(tmp_path):
+    chain, export = _export(count=6)
+    resumed = AuditChain("node-1", block_size=4)
+    sealed = export["checkpoints"][0]
+    resumed.restore(sealed, [(e["sequence"], e["chain_hash"]) for e in export["events"][4:]])
+    assert (resumed.sequence, resumed.head) == (6, export["events"][-1]["chain_hash"])
+    export["events"].append(resumed.append(_event(6), now=1000))
+    export["events"].append(resumed.append(_event(7), now=1000))
+    export["checkpoints"] = [sealed, resumed.checkpoint(now=1000)]
+    assert verify_export(json.loads(json.dumps(export, default=str)))["valid"]
+
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps(export, default=str))
+    assert main([str(path)]) == 0
+
+
+def test_default_chain_id_is_per_process(monkeypatch):
+    import os
+    import socket
+
+    import database.postgresql_adapter as adapter
+    # audit_logging imports the deployment's connection factory; never called here
+    monkeypatch.setattr(adapter, "get_db_connection", None, raising=False)
+    monkeypatch.delenv("AUDIT_CHAIN_ID", raising=False)
+    from auth.audit_logging import SecurityAuditLogger
+
+    assert SecurityAuditLogger().chain.chain_id == f"{socket.gethostname()}-{os.getpid()}"
+    monkeypatch.setenv("AUDIT_CHAIN_ID", "single-writer")
+    assert SecurityAuditLogger().chain.chain_id == "single-writer"
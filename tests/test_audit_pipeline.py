@@ -0,0 +1,203 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from auth.audit_chain import CHECKPOINT_COLUMNS
+from auth.audit_pipeline import AUDIT_COLUMNS, AuditSpool, AuditWriter, UserRiskScores
+
+
+class RowRejected(Exception):
+    sqlstate = "22P02"  # invalid_text_representation
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+        self.checkpoints = []
+        self.copies = 0
+        self.fail = False
+        self.reject = set()  # event_ids the database refuses
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        if any(record[0] in self.reject for record in records):
+            raise RowRejected("invalid input syntax")
+        if table == "audit_checkpoints":
+            assert tuple(columns) == CHECKPOINT_COLUMNS
+            self.checkpoints.extend(records)
+            return
+        assert table == "audit_logs" and tuple(columns) == AUDIT_COLUMNS
+        self.copies += 1
+        self.rows.extend(records)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self):
+        self.redis.executed.append(self.commands)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.executed = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def _row(i, ts=None):
+    ts = ts or datetime(2026, 1, 1, 12, 0, i % 60)
+    values = {"event_id": f"audit_{i}", "event_type": "login_success", "details": "{}", "timestamp": ts}
+    return tuple(values.get(column, f"{column}-{i}") for column in AUDIT_COLUMNS)
+
+
+def _writer(conn, redis, tmp_path, **kwargs):
+    @asynccontextmanager
+    async def connect():
+        yield conn
+
+    return AuditWriter(connect, lambda: redis, spool_path=str(tmp_path / "spool.jsonl"), **kwargs)
+
+
+def test_events_are_batched_into_copy_and_one_redis_pipeline(tmp_path):
+    conn, redis = FakeConnection(), FakeRedis()
+    writer = _writer(conn, redis, tmp_path, flush_interval=0.05)
+
+    async def run():
+        for i in range(200):
+            writer.submit(_row(i), {"event_id": f"audit_{i}"})
+        writer.submit_alert({"type": "critical_event"})
+        await writer.close()
+
+    asyncio.run(run())
+    assert len(conn.rows) == 200 and conn.copies < 5
+    assert len(redis.executed) <= conn.copies + 1
+    recent = [args for batch in redis.executed for name, args in batch if name == "lpush" and args[0] == "audit:recent_events"]
+    assert sum(len(args) - 1 for args in recent) == 200
+    alerts = [args for batch in redis.executed for name, args in batch if name == "lpush" and args[0] == "security:active_alerts"]
+    assert len(alerts) == 1
+    assert writer.stats["written"] == 200
+
+
+def test_failed_batches_spill_to_disk_and_replay(tmp_path):
+    conn = FakeConnection()
+    conn.fail = True
+    writer = _writer(conn, None, tmp_path, flush_interval=0.01)
+
+    async def run():
+        for i in range(10):
+            writer.submit(_row(i))
+        writer.submit_checkpoint(tuple(datetime(2026, 1, 1) if c == "created_at" else c for c in CHECKPOINT_COLUMNS))
+        await writer.flush()
+        assert writer.spool.pending() and conn.rows == []
+        conn.fail = False
+        writer.submit(_row(10))
+        await writer.close()
+
+    asyncio.run(run())
+    assert sorted(row[0] for row in conn.rows) == sorted(f"audit_{i}" for i in range(11))
+    assert all(isinstance(row[AUDIT_COLUMNS.index("timestamp")], datetime) for row in conn.rows)
+    assert not writer.spool.pending() and len(conn.checkpoints) == 1
+    assert writer.stats["spilled"] == 11 and writer.stats["replayed"] == 11
+
+
+def test_full_queue_spools_instead_of_dropping(tmp_path):
+    conn = FakeConnection()
+    writer = _writer(conn, None, tmp_path, queue_size=2)
+
+    async def run():
+        accepted = [writer.submit(_row(i)) for i in range(5)]
+        spooled = [row[0] for row in writer.pending_rows("event")]
+        await writer.close()
+        return accepted, spooled
+
+    accepted, spooled = asyncio.run(run())
+    assert accepted == [True, True, False, False, False]
+    assert spooled == ["audit_2", "audit_3", "audit_4"]
+    assert sorted(row[0] for row in conn.rows) == [f"audit_{i}" for i in range(5)]
+
+
+def test_rejected_row_is_quarantined_and_the_rest_commit(tmp_path):
+    conn = FakeConnection()
+    conn.reject = {"audit_7"}
+    writer = _writer(conn, None, tmp_path, flush_interval=0.05)
+
+    async def run():
+        for i in range(20):
+            writer.submit(_row(i))
+        await writer.close()
+
+    asyncio.run(run())
+    assert sorted(row[0] for row in conn.rows) == sorted(f"audit_{i}" for i in range(20) if i != 7)
+    assert not writer.spool.pending() and writer.stats["spilled"] == 0
+    assert [row[0] for row in writer.spool._read(writer.spool.rejected_path)] == ["audit_7"]
+    assert writer.stats["rejected"] == 1 and writer.stats["written"] == 19
+
+
+def test_replay_skips_rejected_rows_and_picks_up_later_spills(tmp_path):
+    conn = FakeConnection()
+    conn.fail = True
+    conn.reject = {"audit_2"}
+    writer = _writer(conn, None, tmp_path, flush_interval=0.01)
+
+    async def run():
+        for i in range(5):
+            writer.submit(_row(i))
+        await writer.flush()
+        # A replay that died part-way leaves its file aside...
+        assert len(writer.spool.take()) == 5
+        # ...while later rows keep spilling to the live file
+        for i in range(5, 8):
+            writer.submit(_row(i))
+        await writer.flush()
+        conn.fail = False
+        writer.submit(_row(8))
+        await writer.close()
+
+    asyncio.run(run())
+    assert sorted(row[0] for row in conn.rows) == sorted(f"audit_{i}" for i in range(9) if i != 2)
+    assert not writer.spool.pending()
+    assert [row[0] for row in writer.spool._read(writer.spool.rejected_path)] == ["audit_2"]
+
+
+def test_workers_sharing_a_spool_never_lose_each_others_rows(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    index = AUDIT_COLUMNS.index("timestamp")
+    worker_a, worker_b = AuditSpool(path, index), AuditSpool(path, index)
+
+    worker_a.append([_row(1), _row(2)])
+    assert worker_a.take() == [_row(1), _row(2)]
+    # A is replaying: B's spill stays in the live file and B does not take
+    worker_b.append([_row(3)])
+    assert worker_b.take() == []
+    worker_a.release()
+    worker_a.finish()
+    worker_b.finish()
+
+    assert worker_b.take() == [_row(3)]
+    worker_b.release()
+    worker_b.finish()
+    assert not worker_a.pending()
+
+
+def test_user_risk_scores_match_hourly_rules():
+    scores = UserRiskScores()
+    now = 10000
+    for i in range(3):
+        scores.record("u1", "login_failed", now + i)
+    assert scores.record("u1", "permission_denied", now + 3) == 55
+    for i in range(20):
+        scores.record("u2", "data_access", now + i)
+    assert scores.score("u2", now + 20) == 0
+    assert scores.record("u2", "data_access", now + 21) == 42
+    assert scores.score("u1", now + 7200) == 0
+    for i in range(10):
+        scores.record("u1", "login_failed", now + 7200 + i)
+    assert scores.score("u1", now + 7210) == 100
@@ -0,0 +1,136 @@
+import asyncio
+import random
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from auth.audit_pipeline import AUDIT_COLUMNS
+from auth.audit_rollups import AuditRollups, SpaceSavingSketch, split_range, summarize
+
+
+def _row(ts, event_type="login_failed", severity="medium", result="failed", username="bob", ip="10.0.0.1"):
+    values = {"timestamp": ts, "event_type": event_type, "severity": severity, "result": result,
+              "username": username, "source_ip": ip}
+    return tuple(values.get(column) for column in AUDIT_COLUMNS)
+
+
+def test_space_saving_keeps_heavy_hitters_and_merges():
+    rng = random.Random(3)
+    stream = ["alice"] * 500 + ["bob"] * 300 + [f"noise{rng.randrange(5000)}" for _ in range(2000)]
+    rng.shuffle(stream)
+    halves = SpaceSavingSketch(capacity=20), SpaceSavingSketch(capacity=20)
+    for i, value in enumerate(stream):
+        halves[i % 2].add(value)
+    merged = halves[0].merge(halves[1])
+    top = merged.top(2)
+    assert [value for value, _ in top] == ["alice", "bob"]
+    # Estimates never undercount, and overcount by at most the tracked error
+    for value, count in top:
+        true = Counter(stream)[value]
+        assert true <= count <= true + merged.errors[value]
+    assert SpaceSavingSketch.from_json(merged.to_json()).top(2) == top
+
+
+def test_split_range_uses_hours_inside_and_minutes_at_edges():
+    start, end = datetime(2026, 1, 1, 9, 42, 10), datetime(2026, 1, 2, 9, 42, 10)
+    assert split_range(start, end) == (
+        datetime(2026, 1, 1, 9, 42), datetime(2026, 1, 1, 10, 0),
+        datetime(2026, 1, 2, 9, 0), datetime(2026, 1, 2, 9, 43),
+    )
+    # Shorter than an hour: minutes only
+    short = split_range(datetime(2026, 1, 1, 9, 5, 1), datetime(2026, 1, 1, 9, 20))
+    assert short[0] == datetime(2026, 1, 1, 9, 5) and short[1] == short[2] == short[3] == datetime(2026, 1, 1, 9, 21)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.tables = {"audit_rollups_minute": Counter(), "audit_rollups_hour": Counter()}
+        self.sketches = {}
+
+    async def executemany(self, sql, rows):
+        for table in self.tables:
+            if f"INSERT INTO {table} " in sql:
+                for *key, count in rows:
+                    self.tables[table][tuple(key)] += count
+                return
+        if "INSERT INTO audit_heavy_hitters" in sql:
+            for *key, sketch in rows:
+                self.sketches.setdefault(tuple(key), sketch)
+        elif "UPDATE audit_heavy_hitters" in sql:
+            for sketch, *key in rows:
+                self.sketches[tuple(key)] = sketch
+
+    async def fetch(self, sql, *args):
+        return [{"bucket": key[0], "event_type": key[1], "dimension": key[2], "sketch": sketch}
+                for key, sketch in self.sketches.items()]
+
+
+def test_batches_update_rollups_and_summary_matches_exact_counts():
+    conn = FakeConnection()
+    rollups = AuditRollups(AUDIT_COLUMNS)
+    base = datetime(2026, 1, 1, 8, 0)
+    rows = [_row(base + timedelta(minutes=7 * i), username=f"user{i % 3}", ip=f"10.0.0.{i % 4}")
+            for i in range(40)]
+    rows += [_row(base + timedelta(minutes=11 * i), "data_export", "critical", "success", "alice")
+             for i in range(10)]
+
+    async def run():
+        await rollups.apply(conn, rows[:25])
+        await rollups.apply(conn, rows[25:])
+
+    asyncio.run(run())
+    assert sum(conn.tables["audit_rollups_minute"].values()) == 50
+    assert sum(conn.tables["audit_rollups_hour"].values()) == 50
+    assert conn.tables["audit_rollups_hour"][(base, "data_export", "critical", "success")] == 6
+
+    counts = [{"event_type": k[1], "severity": k[2], "result": k[3], "count": v}
+              for k, v in conn.tables["audit_rollups_hour"].items()]
+    hitters = [{"dimension": key[2], "sketch": sketch} for key, sketch in conn.sketches.items()]
+    summary = summarize(counts, hitters, base, base + timedelta(hours=5))
+    assert summary["summary"]["total_events"] == 50
+    assert summary["summary"]["failed_events"] == 40
+    assert summary["summary"]["critical_events"] == 10
+    assert summary["top_users"][0] == {"username": "user0", "event_count": 14}
+    assert {row["source_ip"] for row in summary["top_ips"]} == {f"10.0.0.{i}" for i in range(4)}
+    assert summary["event_breakdown"][0] == {"event_type": "login_failed", "severity": "medium", "count": 40}
+
+
+class CoverageConnection:
+    def __init__(self, covered_from):
+        self.covered_from = covered_from
+
+    async def fetchval(self, sql, start):
+        assert "audit_rollup_coverage" in sql
+        return self.covered_from <= start
+
+    async def fetch(self, sql, *args):
+        return []
+
+
+def test_summary_falls_back_to_exact_before_rollup_coverage(monkeypatch):
+    import database.postgresql_adapter as adapter
+    monkeypatch.setattr(adapter, "get_db_connection", None, raising=False)
+    import auth.audit_logging as audit_logging
+
+    conn = CoverageConnection(covered_from=datetime(2026, 3, 1, 12, 0))
+
+    @asynccontextmanager
+    async def coverage_db_connection():
+        yield conn
+
+    async def exact_summary(start, end, user_id=None, event_type=None):
+        return {"summary": {"source": "exact"}}
+
+    monkeypatch.setattr(audit_logging, "get_db_connection", coverage_db_connection)
+    auditor = audit_logging.SecurityAuditLogger()
+    monkeypatch.setattr(auditor, "_exact_audit_summary", exact_summary)
+
+    def source(start, end):
+        return asyncio.run(auditor.get_audit_summary(start, end))["summary"]["source"]
+
+    assert source(datetime(2026, 3, 1, 12, 0, 30), datetime(2026, 3, 2)) == "rollups"
+    # Events before the rollups were deployed only exist in audit_logs
+    assert source(datetime(2026, 2, 28), datetime(2026, 3, 2)) == "exact"
+    # A backfill moves coverage back
+    conn.covered_from = datetime(2026, 2, 1)
+    assert source(datetime(2026, 2, 28), datetime(2026, 3, 2)) == "rollups"
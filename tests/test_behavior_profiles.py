@@ -0,0 +1,84 @@
+import time
+
+from security.behavior_profiles import BehaviorProfileStore, CountMinSketch, DecayedSketch
+
+
+def test_count_min_sketch_never_undercounts():
+    sketch = CountMinSketch(width=16, depth=2)
+    for i in range(200):
+        sketch.add(f"10.0.0.{i % 50}")
+    assert all(sketch.estimate(f"10.0.0.{i}") >= 4 for i in range(50))
+
+
+def test_decayed_sketch_fades_old_accesses():
+    day = 86400
+    sketch = DecayedSketch(tau=30 * day, landmark=0)
+    for _ in range(10):
+        sketch.add("/api/reports", timestamp=0)
+    assert abs(sketch.estimate("/api/reports", now=0) - 10) < 1e-3
+    assert 3.5 < sketch.estimate("/api/reports", now=30 * day) < 3.8
+    # Far-future updates rescale instead of overflowing float32
+    sketch.add("/api/reports", timestamp=5000 * day)
+    assert abs(sketch.estimate("/api/reports", now=5000 * day) - 1) < 1e-3
+
+
+def test_store_applies_events_to_resident_profiles_and_checkpoints(tmp_path):
+    path = str(tmp_path / "profiles.pkl")
+    store = BehaviorProfileStore(max_profiles=2, checkpoint_path=path)
+    now = time.time()
+    store.put(store.new_profile("alice", now))
+    for i in range(20):
+        store.observe("alice", "login_success", now + i, source_ip="10.0.0.5", user_agent="firefox")
+        store.observe("alice", "data_access", now + i, source_ip="10.0.0.5", resource="/api/logs")
+    store.observe("bob", "login_success", now, source_ip="10.0.0.9")  # cold: ignored
+
+    profile = store.get("alice", now + 20)
+    assert profile.logins == 20 and profile.events == 40
+    assert profile.knows_ip("10.0.0.5") and not profile.knows_ip("192.0.2.1")
+    assert profile.knows_user_agent("firefox") and not profile.knows_user_agent("curl")
+    assert profile.resource_frequency("/api/logs", now + 20) > 19
+    assert profile.typical_hours() and profile.ip_stability() == 1.0
+    assert store.get("bob") is None
+
+    store.checkpoint()
+    restored = BehaviorProfileStore(checkpoint_path=path)
+    copy = restored.get("alice", now + 20)
+    assert copy.logins == 20 and copy.knows_ip("10.0.0.5") and copy.top_ip == "10.0.0.5"
+
+    # LRU keeps at most max_profiles, evicting the least recently used
+    store.put(store.new_profile("carol", now))
+    store.get("alice", now)
+    store.put(store.new_profile("dave", now))
+    assert store.get("carol", now) is None and store.get("alice", now) is not None
+    assert store.stats["evictions"] == 1
+
+
+def test_analyzer_keeps_an_injected_empty_store(tmp_path, monkeypatch):
+    import database.postgresql_adapter as adapter
+    # threat_detection imports the deployment's connection factory; never called here
+    monkeypatch.setattr(adapter, "get_db_connection", None, raising=False)
+    from security.threat_detection import BehaviorAnalyzer
+
+    store = BehaviorProfileStore(checkpoint_path=str(tmp_path / "profiles.pkl"))
+    assert len(store) == 0
+    assert BehaviorAnalyzer(profiles=store).profiles is store
+
+
+def test_unseen_ips_and_agents_are_reported_new():
+    store = BehaviorProfileStore(checkpoint_path=None)
+    now = time.time()
+    for known in (20, 64):
+        profile = store.new_profile(f"user{known}", now)
+        for i in range(known):
+            profile.observe("login_success", now + i, source_ip=f"10.{known}.{i}.1", user_agent=f"agent/{i}")
+
+        assert all(profile.knows_ip(f"10.{known}.{i}.1") for i in range(known))
+        unseen = [f"198.51.{i // 256}.{i % 256}" for i in range(5000)]
+        assert not any(profile.knows_ip(ip) for ip in unseen)
+        assert not any(profile.knows_user_agent(f"curl/{i}") for i in range(1000))
+
+    # Past capacity the least recently seen value is forgotten, not confused
+    profile = store.new_profile("roamer", now)
+    for i in range(store.max_known + 1):
+        profile.observe_ip(f"10.9.{i}.1")
+    assert not profile.knows_ip("10.9.0.1") and profile.knows_ip("10.9.1.1")
@@ -0,0 +1,68 @@
+import asyncio
+
+from database.connection_pool import SQLiteConnectionPool
+
+
+def test_pool_reuses_connections_and_enables_wal(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"), readers=2)
+
+    async def run():
+        async with pool.writer() as conn:
+            await conn.execute("CREATE TABLE IF NOT EXISTS t (id INTEGER PRIMARY KEY, v TEXT)")
+            await conn.execute("INSERT OR REPLACE INTO t (id, v) VALUES (1, 'a')")
+            await conn.commit()
+        for _ in range(20):
+            async with pool.reader() as conn:
+                cursor = await conn.execute("SELECT COUNT(*) FROM t")
+                assert (await cursor.fetchone())[0] == 1
+        async with pool.reader() as conn:
+            cursor = await conn.execute("PRAGMA journal_mode")
+            return (await cursor.fetchone())[0]
+
+    try:
+        assert asyncio.run(run()) == "wal"
+        # A second event loop reuses the same connections
+        assert asyncio.run(run()) == "wal"
+        assert pool.stats["connections_opened"] <= 3
+    finally:
+        asyncio.run(pool.close())
+
+
+def test_nested_calls_reuse_the_held_connection(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"), readers=1)
+
+    async def run():
+        async with pool.writer() as outer:
+            await outer.execute("CREATE TABLE t (v TEXT)")
+            await outer.execute("INSERT INTO t VALUES ('x')")
+            # Readers inside a writer see its uncommitted rows instead of deadlocking
+            async with pool.reader() as inner:
+                assert inner is outer
+                cursor = await inner.execute("SELECT COUNT(*) FROM t")
+                assert (await cursor.fetchone())[0] == 1
+            await outer.commit()
+
+    try:
+        asyncio.run(run())
+        assert pool.stats["reentrant_acquires"] == 1
+    finally:
+        asyncio.run(pool.close())
+
+
+def test_released_connection_has_no_open_transaction(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / "pool.db"))
+
+    async def run():
+        async with pool.writer() as conn:
+            await conn.execute("CREATE TABLE t (v TEXT)")
+            await conn.commit()
+        async with pool.writer() as conn:
+            await conn.execute("INSERT INTO t VALUES ('dropped')")  # never committed
+        async with pool.reader() as conn:
+            cursor = await conn.execute("SELECT COUNT(*) FROM t")
+            return (await cursor.fetchone())[0]
+
+    try:
+        assert asyncio.run(run()) == 0
+    finally:
+        asyncio.run(pool.close())
@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from security.cpe import (
+    ANY, PLATFORM, PRODUCT, CPEMatcher, in_interval, match_interval, parse_cpe, resolve_device, version_key
+)
+
+
+def test_parse_honours_escapes_and_rejects_malformed_names():
+    cpe = parse_cpe("cpe:2.3:o:cisco:nx-os:9.3\\(5\\):*:*:*:*:*:*:*")
+    assert (cpe.part, cpe.vendor, cpe.product, cpe.version, cpe.update) == ("o", "cisco", "nx-os", "9.3(5)", ANY)
+    assert parse_cpe("cpe:2.3:a:Vendor:tool:1.0\\:beta:*:*:*:*:*:*:*").version == "1.0:beta"
+    for bad in ("cpe:/o:cisco:ios:15.1", "cpe:2.3:o:cisco:ios", "cpe:2.3:x:cisco:ios:*:*:*:*:*:*:*:*"):
+        with pytest.raises(ValueError):
+            parse_cpe(bad)
+
+
+def test_version_keys():
+    assert version_key("17.3") == version_key("17.3.0")
+    assert version_key("17.10") > version_key("17.9.4") > version_key("17.9")
+    assert version_key("7.2.5b") > version_key("7.2.5")
+
+
+def _match(cve_id, version="*", **bounds):
+    return dict({"cve_id": cve_id, "vendor": "cisco", "product": "ios_xe", "part": "o", "version": version,
+                 "version_start_including": None, "version_start_excluding": None,
+                 "version_end_including": None, "version_end_excluding": None, "vulnerable": 1}, **bounds)
+
+
+MATCHES = [
+    _match("A", version_start_including="17.3", version_end_excluding="17.9.4"),
+    _match("B", version_start_excluding="16.12", version_end_including="17.3.1"),
+    _match("C", version="17.6.1"),
+    _match("D", version_end_excluding="16.9"),
+    _match("E", version_start_including="17.9"),
+    _match("F"),
+    dict(_match("G"), vulnerable=0),
+]
+
+
+def test_compiled_intervals_agree_with_direct_bounds_checks():
+    matcher = CPEMatcher(MATCHES)
+    rng = random.Random(7)
+    versions = ["16.9", "16.12", "17.3", "17.3.1", "17.6.1", "17.9.4", "17.9"] + [
+        f"{rng.randint(15, 18)}.{rng.randint(0, 13)}.{rng.randint(0, 5)}" for _ in range(300)]
+    for version in versions:
+        hits = matcher.lookup("cisco", "ios_xe", version)
+        expected = {m["cve_id"] for m in MATCHES[:-1]
+                    if in_interval(version_key(version), match_interval(m))}
+        assert {hit.match["cve_id"] for hit in hits} == expected, version
+        assert all(hit.version_matched == (hit.match["cve_id"] != "F") for hit in hits)
+
+    assert {hit.match["cve_id"] for hit in matcher.lookup("cisco", "ios_xe", "17.3")} == {"A", "B", "F"}
+    assert len(matcher.lookup("cisco", "ios_xe")) == 6
+    assert matcher.lookup("cisco", "nx-os", "17.3") == []
+
+
+def test_devices_resolve_to_cpe_products():
+    fortigate = resolve_device("FortiGate-60F", "firewall")
+    assert fortigate.vendor == "fortinet" and fortigate.products == (("fortinet", "fortios"),)
+    assert fortigate.evidence == PRODUCT
+    assert resolve_device("core PAN-OS gw").products == (("paloaltonetworks", "pan-os"),)
+    assert resolve_device("srx340-branch").products == (("juniper", "junos"),)
+    edge = resolve_device("cisco-edge-1", "router")
+    assert edge.evidence == PLATFORM and ("cisco", "ios_xe") in edge.products
+    # "ios" inside another word is not a match, unlike the old regex patterns
+    assert resolve_device("studios-nas", "server") is None
+
+
+def test_index_size_grows_n_log_n_with_overlapping_ranges():
+    # Entry i covers every version below 5.i: about 2i of the 2n segments
+    for count in (1000, 4000):
+        matcher = CPEMatcher([_match(f"CVE-{i}", version_end_excluding=f"5.{i}") for i in range(count)])
+        index = matcher.products[("cisco", "ios_xe")]
+        assert sum(len(node) for node in index.nodes.values()) <= 2 * count * (2 * count).bit_length()
+        assert len(matcher.lookup("cisco", "ios_xe", "5.0")) == count - 1
+        hits = matcher.lookup("cisco", "ios_xe", f"5.{count - 2}")
+        assert [hit.match["cve_id"] for hit in hits] == [f"CVE-{count - 1}"]
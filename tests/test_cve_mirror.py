@@ -0,0 +1,102 @@
+import gzip
+import json
+import sqlite3
+
+from security.cve_mirror import CVEMirror, parse_cve_item, version_in_range
+
+
+def _cve(cve_id, modified, matches, score=7.5, kev=False):
+    cve = {
+        "id": cve_id,
+        "published": "2024-01-01T00:00:00.000",
+        "lastModified": modified,
+        "descriptions": [{"lang": "es", "value": "descripcion"}, {"lang": "en", "value": f"{cve_id} issue"}],
+        "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": score, "baseSeverity": "HIGH",
+                                                    "vectorString": "CVSS:3.1/AV:N"},
+                                       "exploitabilityScore": 3.9, "impactScore": 3.6}]},
+        "weaknesses": [{"description": [{"value": "CWE-79"}]}],
+        "configurations": [{"nodes": [{"cpeMatch": matches}]}],
+        "references": [{"url": f"https://nvd.example/{cve_id}"}],
+    }
+    if kev:
+        cve["cisaExploitAdd"] = "2024-02-01"
+    return {"cve": cve}
+
+
+FEED = [
+    _cve("CVE-2024-0001", "2024-01-02T00:00:00.000", [
+        {"vulnerable": True, "criteria": "cpe:2.3:o:cisco:ios_xe:*:*:*:*:*:*:*:*",
+         "versionStartIncluding": "17.3", "versionEndExcluding": "17.9.4"},
+    ], score=9.8, kev=True),
+    _cve("CVE-2024-0002", "2024-01-03T00:00:00.000", [
+        {"vulnerable": True, "criteria": "cpe:2.3:o:cisco:catalyst_9300_firmware:16.12.1:*:*:*:*:*:*:*"},
+        {"vulnerable": False, "criteria": "cpe:2.3:h:fortinet:fortigate_60f:-:*:*:*:*:*:*:*"},
+    ]),
+    _cve("CVE-2024-0003", "2024-01-04T00:00:00.000", [
+        {"vulnerable": True, "criteria": "cpe:2.3:o:fortinet:fortios:*:*:*:*:*:*:*:*",
+         "versionEndIncluding": "7.2.5"},
+    ], score=5.0),
+]
+
+
+def _write_feed(path, items, compress=False):
+    document = {"format": "NVD_CVE", "version": "2.0", "vulnerabilities": items}
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        json.dump(document, f)
+    return str(path)
+
+
+def test_parse_keeps_ranges_scores_and_kev():
+    record = parse_cve_item(FEED[0])
+    assert record["description"] == "CVE-2024-0001 issue" and record["is_kev"]
+    assert record["exploitability_score"] == 3.9 and record["cvss_v3_score"] == 9.8
+    match = record["cpe_matches"][0]
+    assert (match["vendor"], match["product"], match["version"]) == ("cisco", "ios_xe", "*")
+    assert match["version_start_including"] == "17.3" and match["version_end_excluding"] == "17.9.4"
+
+
+def test_version_bounds():
+    match = parse_cve_item(FEED[0])["cpe_matches"][0]
+    assert version_in_range("17.3", match) and version_in_range("17.9.3", match)
+    assert not version_in_range("17.9.4", match) and not version_in_range("16.12", match)
+    fixed = parse_cve_item(FEED[1])["cpe_matches"][0]
+    assert version_in_range("16.12.1", fixed) and not version_in_range("16.12.2", fixed)
+
+
+def test_feed_import_then_local_lookups(tmp_path):
+    mirror = CVEMirror(str(tmp_path / "cve.db"))
+    assert mirror.import_feed([_write_feed(tmp_path / "nvdcve-2.0-2024.json.gz", FEED, compress=True)])
+    assert mirror.count() == 3 and mirror.last_modified() == "2024-01-04T00:00:00.000"
+
+    cisco = mirror.lookup(["cisco"])
+    assert [r["cve_id"] for r in cisco] == ["CVE-2024-0001", "CVE-2024-0002"]
+    assert cisco[0]["is_kev"] and cisco[0]["reference_urls"] == ["https://nvd.example/CVE-2024-0001"]
+    # The fortigate CPE is only a platform (vulnerable: false)
+    assert [r["cve_id"] for r in mirror.lookup(["fortinet"])] == ["CVE-2024-0003"]
+    # Product tokens from the device name narrow through the inverted index
+    assert [r["cve_id"] for r in mirror.lookup(["cisco"], ["Catalyst-9300"])] == ["CVE-2024-0002"]
+    assert [r["cve_id"] for r in mirror.lookup(["cisco"], version="17.6.1")] == ["CVE-2024-0001"]
+    assert mirror.lookup(["fortinet"], version="7.4.0") == []
+
+
+def test_deltas_only_rewrite_newer_cves(tmp_path):
+    path = str(tmp_path / "cve.db")
+    mirror = CVEMirror(path)
+    mirror.import_feed([_write_feed(tmp_path / "feed.json", FEED)])
+    assert mirror.import_feed([_write_feed(tmp_path / "again.json", FEED)]) == {str(tmp_path / "again.json"): 0}
+    assert len(mirror.lookup(["cisco"])) == 2  # cached
+
+    stale = _cve("CVE-2024-0003", "2023-12-01T00:00:00.000", [])
+    moved = _cve("CVE-2024-0002", "2024-03-01T00:00:00.000", [
+        {"vulnerable": True, "criteria": "cpe:2.3:o:juniper:junos:*:*:*:*:*:*:*:*", "versionEndExcluding": "23.2"},
+    ])
+    assert mirror.import_items([stale, moved]) == 1
+    assert [r["cve_id"] for r in mirror.lookup(["cisco"])] == ["CVE-2024-0001"]
+    assert [r["cve_id"] for r in mirror.lookup(["juniper"], ["junos"], "22.4")] == ["CVE-2024-0002"]
+    assert mirror.last_modified() == "2024-03-01T00:00:00.000"
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM cve_cpe_matches WHERE cve_id = 'CVE-2024-0002'").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM cve_cpe_tokens WHERE token = 'product:catalyst'").fetchone()[0] == 0
+    assert len(conn.execute("SELECT * FROM cve_cpe_matches WHERE cve_id = 'CVE-2024-0003'").fetchall()) == 1
@@ -3,7 +3,8 @@
 import sqlite3
 import pandas as pd
 import pytest
-from src.detect_anomalies import preprocess_logs, detect_anomalies
+from src.detect_anomalies import preprocess_logs, detect_anomalies, run_incremental, get_state
+from src.log_templates import TemplateMiner
 
 import sys
 import os
@@ -28,9 +29,101 @@ def test_preprocess_logs_returns_correct_features(sample_logs_df):
     assert "message_length" in features.columns
     assert len(features) == 2
 
+def test_preprocess_logs_vectorized_features(sample_logs_df):
+    features, _ = preprocess_logs(sample_logs_df.copy())
+    assert list(features["token_count"]) == [3, 3]
+    assert list(features["message_length"]) == [17, 23]
+    # Same template (numbers masked) hashes to the same bucket
+    df = pd.DataFrame({
+        "timestamp": ["2025-05-15T10:00:00Z"] * 2,
+        "source": ["auth", "auth"],
+        "message": ["user 1001 failed", "user 2002 failed"],
+    })
+    templated, _ = preprocess_logs(df)
+    assert templated["template_hash"].nunique() == 1
+
 def test_detect_anomalies_outputs_expected_columns(sample_logs_df):
     features, enriched = preprocess_logs(sample_logs_df)
     result = detect_anomalies(features, enriched)
     assert "anomaly_score" in result.columns
     assert "anomaly" in result.columns
-    assert result.shape[0] == 2
\ No newline at end of file
+    assert result.shape[0] == 2
+@pytest.fixture
+def incremental_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "logs.db")
+    monkeypatch.setattr("src.detect_anomalies.DB_NAME", db_path)
+    monkeypatch.setattr("src.detect_anomalies.MODEL_PATH", str(tmp_path / "model.pkl"))
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, source TEXT, message TEXT)")
+    conn.executemany(
+        "INSERT INTO logs (timestamp, source, message) VALUES (?, ?, ?)",
+        [(f"2025-05-15T{i % 24:02d}:00:00Z", "syslog", "y" * 2000 if i % 100 == 99 else "x" * (i % 50))
+         for i in range(500)]
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_training_sees_persisted_template_frequencies(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "logs.db"))
+    miner = TemplateMiner()
+    messages = [f"Login failed for user u{i} from 10.0.0.{i}" for i in range(9)] + ["kernel panic"]
+    template_ids = [miner.add(message).template_id for message in messages]
+    miner.save(conn)
+    df = pd.DataFrame({
+        "timestamp": ["2025-05-15T10:00:00Z"] * 10,
+        "source": ["syslog"] * 10,
+        "message": messages,
+        "template_id": template_ids,
+    })
+
+    persisted = TemplateMiner.load(conn)
+    trained, _ = preprocess_logs(df.copy(), persisted, learn=False)
+    scored, _ = preprocess_logs(df.copy(), TemplateMiner.load(conn))
+    assert persisted.total == 10
+    assert trained["template_frequency"].tolist() == scored["template_frequency"].tolist()
+    assert trained["template_rarity"].iloc[-1] > trained["template_rarity"].iloc[0] > 0
+    conn.close()
+
+class LengthForest:
+    """Deterministic IsolationForest stand-in: the longer the message, the lower the score"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def fit(self, X):
+        return self
+
+    def decision_function(self, X):
+        return 0.1 - X['message_length'].to_numpy(dtype=float) / 1000
+
+    def predict(self, X):
+        return 1 - 2 * (self.decision_function(X) < 0)
+
+def test_incremental_scores_only_new_rows(incremental_db, monkeypatch):
+    sent = []
+
+    async def fake_post(self, text):
+        sent.append(text)
+        return 200, {"ok": True}, None
+
+    monkeypatch.setattr("src.alert.AlertDispatcher._post", fake_post)
+    monkeypatch.setattr("src.detect_anomalies.IsolationForest", LengthForest)
+
+    run_incremental()
+    # Only the five 2000-character rows score below ALERT_THRESHOLD: one digest
+    assert len(sent) == 1 and "5 suspicious logs from syslog" in sent[0]
+    assert get_state(incremental_db, "last_scored_id") == "500"
+
+    # A rerun with no new logs must not re-alert
+    run_incremental()
+    assert len(sent) == 1
+
+    incremental_db.executemany("INSERT INTO logs (timestamp, source, message) VALUES (?, ?, ?)",
+                               [("2025-05-15T03:00:00Z", "syslog", "z" * 5000),
+                                ("2025-05-15T03:00:01Z", "syslog", "short")])
+    incremental_db.commit()
+    run_incremental()
+    assert get_state(incremental_db, "last_scored_id") == "502"
+    assert len(sent) == 2 and "1 suspicious logs from syslog" in sent[-1]
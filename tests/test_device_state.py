@@ -0,0 +1,135 @@
+import asyncio
+import json
+import sqlite3
+
+from security.device_state import (
+    ACTIVE, CHANGED, GONE, NEW, DeviceTracker, append_changes, changes_since, ensure_schema,
+    load_states, save_states, write_devices
+)
+
+
+def _host(ip, ports=(22, 80), mac="aa:bb:cc:dd:ee:01", hostname="web", rtt=2.0):
+    return {"ip": ip, "open_ports": list(ports), "mac_address": mac, "hostname": hostname, "response_time": rtt}
+
+
+def test_tracker_reports_only_real_changes():
+    tracker = DeviceTracker(min_interval=60, max_interval=3600)
+    change, state, _ = tracker.observe(_host("10.0.0.5"), now=0)
+    assert change == NEW and state.mac_address == "AA:BB:CC:DD:EE:01"
+    device_id = state.device_id
+
+    # Jitter, an expired ARP entry and a failed reverse lookup are not changes
+    assert tracker.observe(_host("10.0.0.5", rtt=3.5, mac=None, hostname=None), now=10)[0] is None
+    change, state, diff = tracker.observe(_host("10.0.0.5", ports=(22, 80, 3389)), now=20)
+    assert change == CHANGED and diff == {"open_ports": [[22, 80], [22, 80, 3389]]}
+    change, _, diff = tracker.observe(_host("10.0.0.5", ports=(22, 80, 3389), rtt=40.0), now=30)
+    assert change == CHANGED and diff == {"rtt_ms": [2.0, 40.0]}
+    assert state.device_id == device_id
+
+
+def test_volatile_hosts_are_probed_sooner_than_stable_ones():
+    tracker = DeviceTracker(min_interval=60, max_interval=3600)
+    tracker.observe(_host("10.0.0.1"), now=0)
+    tracker.observe(_host("10.0.0.2"), now=0)
+    for i in range(1, 6):
+        tracker.observe(_host("10.0.0.1"), now=i)
+        tracker.observe(_host("10.0.0.2", ports=[i]), now=i)
+    stable, volatile = tracker.states["10.0.0.1"], tracker.states["10.0.0.2"]
+    assert volatile.next_probe - 5 < 300 < 2000 < stable.next_probe - 5
+    assert tracker.due(now=500) == ["10.0.0.2"]
+
+
+def test_host_is_gone_after_consecutive_misses_and_returns_as_new():
+    tracker = DeviceTracker(min_interval=60, max_interval=3600, gone_after=2)
+    _, state, _ = tracker.observe(_host("10.0.0.9"), now=0)
+    assert tracker.miss("10.0.0.9", now=100) is None
+    assert state.next_probe == 160
+    assert tracker.miss("10.0.0.9", now=160) == GONE
+    assert tracker.due(now=10 ** 9) == []
+    assert tracker.observe(_host("10.0.0.9"), now=200)[0] == NEW
+    assert state.status == ACTIVE and state.misses == 0
+
+
+class SqliteConnection:
+    """aiosqlite-shaped wrapper over sqlite3 for the store functions"""
+
+    class Cursor:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        async def fetchall(self):
+            return self.cursor.fetchall()
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:")
+        self.statements = []
+
+    async def execute(self, sql, params=()):
+        self.statements.append(sql)
+        return self.Cursor(self.db.execute(sql, params))
+
+    async def executemany(self, sql, rows):
+        self.statements.append(sql)
+        self.db.executemany(sql, rows)
+
+
+def _device_rows(conn):
+    return {row[0]: row[1:] for row in conn.db.execute(
+        "SELECT id, name, status, mac_address, metadata, updated_at FROM network_devices")}
+
+
+def test_store_keeps_device_ids_and_feeds_changes():
+    conn = SqliteConnection()
+    conn.db.execute("""
+        CREATE TABLE network_devices (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL, ip_address TEXT, mac_address TEXT,
+            status TEXT NOT NULL, last_seen TEXT, metadata TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    # A row written by the old scanner: no id, address only in metadata
+    conn.db.execute("INSERT INTO network_devices (name, type, status, metadata, created_at, updated_at) "
+                    "VALUES ('nas', 'server', 'active', ?, 't0', 't0')",
+                    (json.dumps({"ip": "10.0.0.2", "mac": "Unknown", "ports": [445]}),))
+
+    def device(state, hostname, timestamp):
+        return {"id": state.device_id, "ip": state.ip, "name": hostname, "fallback_name": "device-x",
+                "device_type": "endpoint", "mac_address": state.mac_address, "open_ports": state.open_ports,
+                "last_seen": timestamp, "response_time": state.rtt_ms}
+
+    async def run():
+        await ensure_schema(conn)
+        tracker = DeviceTracker(await load_states(conn, now=0))
+        legacy = tracker.states["10.0.0.2"]
+        assert legacy.open_ports == [445] and tracker.due(now=1) == ["10.0.0.2"]
+
+        _, web, _ = tracker.observe(_host("10.0.0.1"), now=1)
+        _, nas, _ = tracker.observe(_host("10.0.0.2", ports=[445], mac=None, hostname="nas"), now=1)
+        await write_devices(conn, [device(web, "web", "t1")], [(nas.device_id, "t1")], [])
+        await append_changes(conn, "scan-1", [{"device_id": web.device_id, "ip": web.ip, "change": NEW,
+                                               "details": {}, "timestamp": "t1"}])
+        await save_states(conn, tracker.states.values())
+        first = _device_rows(conn)
+
+        # Second scan: web changed (name not resolved this time), nas disappeared
+        _, web, diff = tracker.observe(_host("10.0.0.1", ports=[22], hostname=None), now=2)
+        tracker.miss("10.0.0.2", now=2)
+        tracker.miss("10.0.0.2", now=3)
+        await write_devices(conn, [device(web, None, "t2")], [], [(nas.device_id, "t2")])
+        await append_changes(conn, "scan-2", [
+            {"device_id": web.device_id, "ip": web.ip, "change": CHANGED, "details": diff, "timestamp": "t2"},
+            {"device_id": nas.device_id, "ip": nas.ip, "change": GONE, "details": {}, "timestamp": "t2"},
+        ])
+        await save_states(conn, tracker.states.values())
+        return first, _device_rows(conn), await changes_since(conn, 0), await changes_since(conn, 1), \
+            DeviceTracker(await load_states(conn, now=4)).states
+
+    first, second, feed, tail, reloaded = asyncio.run(run())
+    assert set(first) == set(second) and None not in first
+    web_id = next(i for i, row in second.items() if row[0] == "web")
+    assert second[web_id][2] == "AA:BB:CC:DD:EE:01" and second[web_id][4] == "t2"
+    assert json.loads(second[web_id][3])["ports"] == [22]
+    nas_id = next(i for i, row in second.items() if row[0] == "nas")
+    assert second[nas_id][1] == "inactive" and first[nas_id][4] == "t0"
+    assert [entry["change"] for entry in feed] == [NEW, CHANGED, GONE]
+    assert [entry["id"] for entry in tail] == [2, 3] and tail[0]["details"] == {"open_ports": [[22, 80], [22]]}
+    assert reloaded["10.0.0.2"].status == GONE and reloaded["10.0.0.1"].open_ports == [22]
@@ -0,0 +1,77 @@
+import sqlite3
+
+from database.fulltext import (LOG_FTS_AFTER, LOG_FTS_MATCH, LOG_FTS_RECENT_ORDER, LOG_FTS_SCHEMA,
+                               LOG_FTS_SELECT, LOG_FTS_SNIPPETS, build_fts5_query, build_tsquery)
+
+
+def test_query_builders_handle_phrases_prefixes_and_punctuation():
+    assert build_fts5_query('"connection refused" ssh*') == '"connection refused" AND "ssh"*'
+    assert build_fts5_query("10.0.0.5") == '"10 0 0 5"'
+    assert build_fts5_query('AND OR ( "') is not None  # operators are quoted, not interpreted
+    assert build_fts5_query("  !!  ") is None
+
+    assert build_tsquery('"connection refused" ssh*') == "connection <-> refused & ssh:*"
+    assert build_tsquery("Failed") == "failed"
+
+
+def _search(conn, text):
+    return [r[0] for r in conn.execute(
+        f"SELECT id FROM logs WHERE {LOG_FTS_MATCH} ORDER BY id", (build_fts5_query(text),)
+    )]
+
+
+def test_fts_triggers_keep_index_in_sync():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, timestamp TEXT, source TEXT, message TEXT)")
+    conn.executemany("INSERT INTO logs (source, message) VALUES (?, ?)", [
+        ("sshd", "Failed password for root from 10.0.0.5"),
+        ("nginx", "connection refused by upstream"),
+        ("sshd", "Accepted publickey for deploy"),
+    ])
+    # Rows written before the index exists are picked up by the rebuild
+    conn.executescript(LOG_FTS_SCHEMA)
+    conn.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+
+    assert _search(conn, "failed") == [1]
+    assert _search(conn, '"connection refused"') == [2]
+    assert _search(conn, '"refused connection"') == []
+    assert _search(conn, "accept*") == [3]
+    assert _search(conn, "sshd") == [1, 3]  # source is indexed too
+    assert _search(conn, "10.0.0.5") == [1]
+
+    conn.execute("INSERT INTO logs (source, message) VALUES ('sshd', 'Failed password for admin')")
+    conn.execute("UPDATE logs SET message = 'Session closed' WHERE id = 1")
+    conn.execute("DELETE FROM logs WHERE id = 2")
+    assert _search(conn, "failed") == [4]
+    assert _search(conn, "closed") == [1]
+    assert _search(conn, "refused") == []
+
+    snippet = conn.execute(f"{LOG_FTS_SNIPPETS}(?)", (build_fts5_query("admin"), 4)).fetchone()[1]
+    assert "<mark>admin</mark>" in snippet
+
+
+def test_recent_first_search_pages_with_filters_and_cursor():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, timestamp TEXT, level TEXT, source TEXT, message TEXT)")
+    conn.executescript(LOG_FTS_SCHEMA)
+    conn.executemany("INSERT INTO logs (level, source, message) VALUES (?, 'sshd', ?)", [
+        ("error" if i % 3 == 0 else "info", f"Failed password attempt {i}") for i in range(30)
+    ])
+    query = build_fts5_query("failed")
+
+    seen = []
+    last_id = None
+    while True:
+        conditions, params = ["logs.level = ?"], [query, "error"]
+        if last_id is not None:
+            conditions.append(LOG_FTS_AFTER)
+            params.append(last_id)
+        rows = conn.execute(
+            f"{LOG_FTS_SELECT} AND {' AND '.join(conditions)} {LOG_FTS_RECENT_ORDER} LIMIT 4", params
+        ).fetchall()
+        seen.extend(row[0] for row in rows)
+        if len(rows) < 4:
+            break
+        last_id = rows[-1][0]
+
+    assert seen == sorted((i + 1 for i in range(30) if i % 3 == 0), reverse=True)
@@ -1,7 +1,8 @@
+import json
 import os
 import sqlite3
 import pytest
-from src.ingest_logs import init_db, save_logs
+from src.ingest_logs import init_db, save_logs, stream_logs, iter_json_array, detect_format
 
 import sys
 import os
@@ -40,3 +41,63 @@ def test_save_single_log_entry(setup_test_db):
     
     assert len(results) == 1
     assert results[0][2] == "test-source"
+def _count_logs():
+    conn = sqlite3.connect(TEST_DB)
+    count = conn.execute("SELECT COUNT(*) FROM logs;").fetchone()[0]
+    conn.close()
+    return count
+
+def test_stream_json_lines(setup_test_db, tmp_path):
+    path = tmp_path / "export.jsonl"
+    with open(path, "w") as f:
+        for i in range(250):
+            f.write(json.dumps({"timestamp": f"2025-05-15T12:00:{i % 60:02d}Z",
+                                "source": "stream", "message": f"line {i}"}) + "\n")
+
+    stats = stream_logs(str(path), chunk_size=40)
+
+    assert stats.rows == 250
+    assert stats.chunks == 7
+    assert _count_logs() == 250
+
+def test_stream_json_array_across_blocks(tmp_path):
+    path = tmp_path / "export.json"
+    entries = [{"source": "arr", "message": "x" * 50 + str(i)} for i in range(100)]
+    path.write_text(json.dumps(entries, indent=2))
+
+    parsed = list(iter_json_array(str(path), block_size=64))
+
+    assert parsed == entries
+    assert detect_format(str(path)) == "json"
+
+def test_stream_syslog(setup_test_db, tmp_path):
+    path = tmp_path / "syslog"
+    path.write_text(
+        "May 15 12:00:01 web01 sshd[1234]: Failed password for root\n"
+        "not a syslog line\n"
+        "May 15 12:00:02 web01 kernel: eth0 link up\n"
+    )
+
+    stats = stream_logs(str(path))
+
+    assert stats.rows == 2
+    conn = sqlite3.connect(TEST_DB)
+    sources = [r[0] for r in conn.execute("SELECT source FROM logs ORDER BY id;")]
+    conn.close()
+    assert sources == ["web01/sshd", "web01/kernel"]
+
+def test_stream_tags_rows_with_templates(setup_test_db, tmp_path):
+    path = tmp_path / "auth.jsonl"
+    with open(path, "w") as f:
+        for user in ["alice", "bob", "carol"]:
+            f.write(json.dumps({"source": "auth", "message": f"Failed password for {user} from 10.0.0.1"}) + "\n")
+        f.write(json.dumps({"source": "kernel", "message": "eth0 link up"}) + "\n")
+
+    stream_logs(str(path), mine_templates=True)
+
+    conn = sqlite3.connect(TEST_DB)
+    template_ids = [r[0] for r in conn.execute("SELECT template_id FROM logs ORDER BY id;")]
+    sizes = dict(conn.execute("SELECT id, size FROM log_templates;").fetchall())
+    conn.close()
+    assert template_ids[0] == template_ids[1] == template_ids[2] != template_ids[3]
+    assert sizes[template_ids[0]] == 3
@@ -0,0 +1,63 @@
+import asyncio
+
+from security.ip_reputation import BloomFilter, IPReputationIndex, LocalUpdateBus
+
+
+def test_longest_prefix_match_and_removal():
+    index = IPReputationIndex("test", "blocked")
+    index.add("10.0.0.0/8", source="wide")
+    index.add("10.1.2.0/24", source="narrow")
+    index.add("10.1.2.3", source="exact")
+    index.add("2001:db8::/32")
+
+    assert index.lookup("10.1.2.3").source == "exact"
+    assert index.lookup("10.1.2.4").source == "narrow"
+    assert index.lookup("10.200.0.1").source == "wide"
+    assert index.lookup("::ffff:10.1.2.9").source == "narrow"
+    assert index.lookup("2001:db8:1::1").network == "2001:db8::/32"
+    assert index.lookup("11.0.0.1") is None and index.lookup("not-an-ip") is None
+
+    assert index.remove("10.1.2.0/24") and not index.remove("10.1.2.0/24")
+    assert index.lookup("10.1.2.4").source == "wide"
+    assert index.remove("10.1.2.3")
+    assert index.lookup("10.1.2.3").source == "wide"
+    assert len(index) == 2
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for key in range(0, 5000, 5):
+        bloom.add(key)
+    assert all(key in bloom for key in range(0, 5000, 5))
+    false_positives = sum(key in bloom for key in range(1, 5000, 5))
+    assert false_positives < 50
+
+
+def test_feed_load_expiry_and_updates_between_workers(tmp_path):
+    feed = tmp_path / "feed.netset"
+    feed.write_text("# sample feed\n203.0.113.0/24\n198.51.100.7  # scanner\nbogus\n\n")
+    index = IPReputationIndex("test", "malicious")
+    assert index.load_feed(str(feed)) == 2
+    assert index.lookup("203.0.113.99").source == "feed.netset"
+
+    index.add("192.0.2.1", ttl=60)
+    assert index.lookup("192.0.2.1") is not None
+    assert index.lookup("192.0.2.1", now=10 ** 12) is None
+
+    bus = LocalUpdateBus()
+    writer = IPReputationIndex("blocks", "blocked")
+    reader = IPReputationIndex("blocks", "blocked")
+
+    async def run():
+        listener = asyncio.create_task(reader.listen(bus))
+        await asyncio.sleep(0)
+        await writer.publish("add", "198.18.0.0/15", bus=bus)
+        await writer.publish("add", "198.51.100.1", bus=bus)
+        await writer.publish("remove", "198.51.100.1", bus=bus)
+        await asyncio.sleep(0.01)
+        listener.cancel()
+
+    asyncio.run(run())
+    assert reader.lookup("198.19.255.1").category == "blocked"
+    assert reader.lookup("198.51.100.1") is None
+    assert reader.stats["updates_applied"] == 3
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sqlite3
+
+import pytest
+
+from src.log_tail import FileTailer, LogPipeline
+
+
+def _create_logs_table(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, source TEXT, message TEXT, level TEXT)")
+    conn.commit()
+    conn.close()
+
+
+async def _collect(tailer, expected, timeout=5.0):
+    collected = []
+
+    async def run():
+        async for lines in tailer.lines(lambda: len(collected) < expected):
+            collected.extend(lines)
+
+    await asyncio.wait_for(run(), timeout)
+    return collected
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_tailer_follows_appends_rotation_and_truncation(tmp_path, use_inotify):
+    path = tmp_path / "app.log"
+    path.write_text("old line\n")
+
+    async def scenario():
+        tailer = FileTailer(str(path), idle_timeout=0.05, use_inotify=use_inotify)
+        task = asyncio.create_task(_collect(tailer, 4))
+        await asyncio.sleep(0.1)
+
+        with open(path, "a") as f:
+            f.write("first\nsecond\n")
+        await asyncio.sleep(0.1)
+
+        os.rename(path, tmp_path / "app.log.1")
+        path.write_text("after rotation\n")
+        await asyncio.sleep(0.2)
+
+        with open(path, "w") as f:
+            f.write("")
+        await asyncio.sleep(0.1)
+        with open(path, "a") as f:
+            f.write("after truncate\n")
+
+        return tailer, await task
+
+    tailer, lines = asyncio.run(scenario())
+
+    assert lines == ["first", "second", "after rotation", "after truncate"]
+    assert tailer.rotations == 1
+    assert tailer.truncations == 1
+
+
+def test_pipeline_group_commits_and_sheds_broadcasts(tmp_path):
+    db_path = str(tmp_path / "logs.db")
+    _create_logs_table(db_path)
+    received = []
+
+    async def slow_broadcast(entry):
+        await asyncio.sleep(0.01)
+        received.append(entry)
+
+    async def scenario():
+        pipeline = LogPipeline(db_path, broadcast=slow_broadcast, batch_size=100,
+                               flush_interval=0.05, broadcast_queue_size=10)
+        await pipeline.start()
+        for i in range(1000):
+            await pipeline.submit({"timestamp": "2025-01-01T00:00:00", "source": "file",
+                                   "message": f"line {i}", "level": "info"})
+        await pipeline.stop()
+        return pipeline.stats
+
+    stats = asyncio.run(scenario())
+
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    conn.close()
+    assert count == 1000
+    assert stats["written"] == 1000
+    assert stats["batches"] <= 20
+    assert stats["broadcast_dropped"] > 0
+    assert len(received) < 1000
+
+
+def test_pipeline_writes_through_shared_write_queue(tmp_path):
+    from database.connection_pool import SQLiteConnectionPool
+    from database.write_queue import WriteQueue
+
+    db_path = str(tmp_path / "logs.db")
+    _create_logs_table(db_path)
+
+    async def scenario():
+        pool = SQLiteConnectionPool(db_path)
+        queue = WriteQueue(pool)
+        pipeline = LogPipeline(db_path, batch_size=100, flush_interval=0.05, write_queue=queue)
+        await pipeline.start()
+        for i in range(250):
+            await pipeline.submit({"timestamp": "2025-01-01T00:00:00", "source": "file",
+                                   "message": f"line {i}", "level": "info"})
+        await pipeline.stop()
+        await queue.close()
+        await pool.close()
+        return pipeline.stats, queue.stats
+
+    stats, queue_stats = asyncio.run(scenario())
+
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    conn.close()
+    assert count == 250
+    assert stats["written"] == 250
+    assert queue_stats["written"] == 250
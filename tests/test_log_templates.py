@@ -0,0 +1,97 @@
+import sqlite3
+
+from src.log_templates import PARAM, TemplateMiner
+
+
+def test_similar_messages_share_a_template():
+    miner = TemplateMiner()
+    first = miner.add("Failed password for root from 10.0.0.1 port 2201 ssh2")
+    second = miner.add("Failed password for admin from 10.0.0.7 port 2202 ssh2")
+
+    assert first.is_new
+    assert not second.is_new
+    assert second.template_id == first.template_id
+    assert second.template == f"Failed password for {PARAM} from {PARAM} port {PARAM} ssh2"
+    assert second.parameters == ["admin", "10.0.0.7", "2202"]
+    assert miner.frequency(first.template_id) == 2
+
+
+def test_different_shapes_get_different_templates():
+    miner = TemplateMiner()
+    a = miner.add("Accepted publickey for alice from 10.1.1.1 port 22")
+    b = miner.add("kernel: eth0 link up")
+
+    assert a.template_id != b.template_id
+    assert miner.rarity(b.template_id) > 0
+    assert miner.match("kernel: eth0 link down").template_id == b.template_id
+    assert miner.match("something never seen before at all") is None
+
+
+def test_template_cache_is_bounded_with_lru_eviction():
+    miner = TemplateMiner(max_clusters=3)
+    ids = [miner.add(f"event{i} happened").template_id for i in range(3)]
+    miner.add("event0 happened")  # refresh the first template
+    miner.add("brand new shape of message")
+
+    assert len(miner.clusters) == 3
+    assert miner.evictions == 1
+    assert ids[0] in miner.clusters
+    assert ids[1] not in miner.clusters
+
+
+def test_templates_persist_between_runs(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "templates.db"))
+    miner = TemplateMiner()
+    template_id = miner.add("Login failed for user bob from 10.0.0.1").template_id
+    miner.add("Login failed for user eve from 10.0.0.2")
+    miner.save(conn)
+
+    restored = TemplateMiner.load(conn)
+    match = restored.add("Login failed for user joe from 10.0.0.3")
+    conn.close()
+
+    assert match.template_id == template_id
+    assert match.size == 3
+    assert restored.total == 3
+    assert restored.next_id == template_id + 1
+
+
+def test_concurrent_miners_share_ids_and_add_counts(tmp_path):
+    path = str(tmp_path / "templates.db")
+    ingest, scoring = sqlite3.connect(path), sqlite3.connect(path)
+    first, second = TemplateMiner.load(ingest), TemplateMiner.load(scoring)
+
+    kernel = first.add("kernel: eth0 link up").template_id
+    login = first.add("Login failed for user bob from 10.0.0.1").template_id
+    first.save(ingest)
+    disk = second.add("disk sda1 full on db01").template_id
+    assert second.add("Login failed for user bob from 10.0.0.2").template_id == login
+    second.save(scoring)
+    first.add("Login failed for user joe from 10.0.0.3")
+    first.save(ingest)
+
+    rows = {template: (template_id, size) for template_id, template, size in
+            ingest.execute("SELECT id, template, size FROM log_templates")}
+    ingest.close()
+    scoring.close()
+    assert len({kernel, login, disk}) == 3
+    assert rows == {
+        "kernel: eth0 link up": (kernel, 1),
+        f"Login failed for user {PARAM} from {PARAM}": (login, 3),
+        "disk sda1 full on db01": (disk, 1),
+    }
+
+
+def test_duplicate_legacy_templates_are_merged(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "templates.db"))
+    conn.execute("CREATE TABLE log_templates (id INTEGER PRIMARY KEY, template TEXT NOT NULL, "
+                 "size INTEGER NOT NULL, last_seen TEXT)")
+    conn.executemany("INSERT INTO log_templates VALUES (?, ?, ?, NULL)",
+                     [(1, "eth0 link up", 2), (2, "disk full", 1), (3, "eth0 link up", 5)])
+
+    miner = TemplateMiner.load(conn)
+    conn.close()
+
+    assert miner.frequency(1) == 7
+    assert miner.frequency(3) == 0
+    assert miner.total == 8
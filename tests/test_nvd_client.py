@@ -0,0 +1,170 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from security.cve_integration import CVEIntegration
+from security.cve_mirror import parse_cve_item
+from security.nvd_client import NVDClient, NVDClientError, SlidingWindowLimiter
+
+
+class MockNVD:
+    """Local stand-in for the NVD CVE API 2.0 endpoint"""
+
+    def __init__(self, total=25, delay=0.0):
+        self.items = [{"cve": {"id": f"CVE-2024-{i:04d}", "lastModified": "2024-01-01T00:00:00.000"}}
+                      for i in range(total)]
+        self.delay = delay
+        self.hits = Counter()
+        self.failures = Counter()  # startIndex -> remaining 503s (-1: always)
+
+    async def handle(self, request):
+        start = int(request.query.get("startIndex", 0))
+        size = int(request.query.get("resultsPerPage", 2000))
+        self.hits[start] += 1
+        await asyncio.sleep(self.delay)
+        if self.failures[start]:
+            self.failures[start] -= 1
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        etag = f'"page-{start}-{size}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response({"resultsPerPage": size, "startIndex": start, "totalResults": len(self.items),
+                                  "vulnerabilities": self.items[start:start + size]}, headers={"ETag": etag})
+
+    async def serve(self, test):
+        app = web.Application()
+        app.router.add_get("/rest/json/cves/2.0", self.handle)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await test(str(server.make_url("/rest/json/cves/2.0")))
+        finally:
+            await server.close()
+
+
+def _client(url, tmp_path, **kwargs):
+    kwargs.setdefault("requests_per_window", 1000)
+    return NVDClient(base_url=url, cache_dir=str(tmp_path / "nvd"), retry_backoff=0.0, **kwargs)
+
+
+def test_no_window_holds_more_than_the_limit():
+    limiter = SlidingWindowLimiter(limit=5, window=0.2)
+
+    async def run():
+        started = time.monotonic()
+        stamps = []
+
+        async def call():
+            await limiter.acquire()
+            stamps.append(time.monotonic() - started)
+
+        await asyncio.gather(*(call() for _ in range(12)))
+        return stamps
+
+    stamps = asyncio.run(run())
+    assert stamps == sorted(stamps)
+    # The first five go at once, then each waits for the one five places back to age out
+    assert stamps[4] < 0.05 and stamps[5] >= 0.2 and stamps[10] >= 0.4
+    assert all(later - earlier > 0.199 for earlier, later in zip(stamps, stamps[5:]))
+
+
+def test_identical_queries_coalesce_then_hit_the_cache(tmp_path):
+    nvd = MockNVD(delay=0.05)
+
+    async def test(url):
+        client = _client(url, tmp_path)
+        params = {"keywordSearch": "cisco", "resultsPerPage": 10, "startIndex": 0}
+        bodies = await asyncio.gather(*(client.get(params) for _ in range(10)))
+        assert all(body == bodies[0] for body in bodies) and len(bodies[0]["vulnerabilities"]) == 10
+        assert nvd.hits[0] == 1 and client.stats["coalesced"] == 9
+
+        # Fresh: no request at all; stale: a conditional request answered with 304
+        assert await client.get(params) == bodies[0] and nvd.hits[0] == 1
+        client.cache.ttl = 0
+        assert await client.get(params) == bodies[0]
+        assert nvd.hits[0] == 2 and client.stats["revalidated"] == 1
+        await client.close()
+
+    asyncio.run(nvd.serve(test))
+
+
+def test_retries_then_serves_stale_when_api_is_down(tmp_path):
+    nvd = MockNVD()
+
+    async def test(url):
+        client = _client(url, tmp_path, max_retries=2)
+        params = {"keywordSearch": "fortinet"}
+        nvd.failures[0] = 1
+        assert len((await client.get(params))["vulnerabilities"]) == 25
+        assert client.stats["retries"] == 1
+
+        client.cache.ttl = 0
+        nvd.failures[0] = -1
+        assert len((await client.get(params))["vulnerabilities"]) == 25
+        assert client.stats["stale"] == 1
+        await client.close()
+
+    asyncio.run(nvd.serve(test))
+
+
+def test_pagination_resumes_after_an_interrupted_walk(tmp_path):
+    nvd = MockNVD(total=25)
+
+    async def test(url):
+        client = _client(url, tmp_path, max_retries=0)
+        params = {"lastModStartDate": "2024-01-01T00:00:00.000", "lastModEndDate": "2024-02-01T00:00:00.000"}
+        seen = []
+        nvd.failures[10] = -1
+        with pytest.raises(NVDClientError):
+            async for page in client.iter_pages(params, page_size=10):
+                seen += [item["cve"]["id"] for item in page["vulnerabilities"]]
+        assert len(seen) == 10
+
+        nvd.failures[10] = 0
+        client.cache.ttl = 0  # the resume must come from the progress record, not the cache
+        async for page in client.iter_pages(params, page_size=10):
+            seen += [item["cve"]["id"] for item in page["vulnerabilities"]]
+        assert seen == [item["cve"]["id"] for item in nvd.items]
+        assert nvd.hits[0] == 1 and nvd.hits[20] == 1
+
+        # A completed walk starts from the beginning next time
+        pages = [page async for page in client.iter_pages(params, page_size=10)]
+        assert len(pages) == 3 and nvd.hits[0] == 2
+        await client.close()
+
+    asyncio.run(nvd.serve(test))
+
+
+def test_mirror_sync_resumes_its_window_after_a_failed_page(tmp_path):
+    nvd = MockNVD(total=25)
+    for i, item in enumerate(nvd.items):
+        item["cve"]["lastModified"] = f"2026-10-01T00:00:{i:02d}.000"
+
+    async def test(url):
+        integration = CVEIntegration(db_path=str(tmp_path / "cve.db"))
+        integration.client = _client(url, tmp_path, max_retries=0)
+        seed = {"cve": {"id": "CVE-2020-0001", "lastModified": "2026-09-01T00:00:00.000"}}
+        integration.mirror.import_records([parse_cve_item(seed)])
+
+        nvd.failures[10] = -1
+        first = await integration.sync_cve_mirror(page_size=10)
+        assert first["status"] == "partial" and first["imported"] == 10
+        assert integration.mirror.get_state("sync_window") is not None
+
+        nvd.failures[10] = 0
+        second = await integration.sync_cve_mirror(page_size=10)
+        assert second == {"status": "completed", "imported": 15, "last_modified": "2026-10-01T00:00:24.000"}
+        assert integration.mirror.get_state("sync_window") is None
+        assert integration.mirror.count() == 26
+        # The interrupted window resumed at startIndex 10 (page 0 was not fetched again); the
+        # other full walk is the short window modified since the first sync began
+        assert nvd.hits[0] == 2 and nvd.hits[10] == 3
+        await integration.client.close()
+
+    asyncio.run(nvd.serve(test))
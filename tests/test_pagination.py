@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from database.pagination import (KEYSET_ORDER, CountCache, decode_cursor, encode_cursor,
+                                 keyset_condition, next_cursor)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    cursor = encode_cursor("2025-01-01T00:00:00", 42)
+    assert decode_cursor(cursor) == ("2025-01-01T00:00:00", 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_pages_cover_every_row_once_with_timestamp_ties():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, timestamp TEXT, level TEXT)")
+    conn.execute("CREATE INDEX idx_logs_level_ts_id ON logs(level, timestamp, id)")
+    # Five rows share each timestamp, so paging on timestamp alone would skip rows
+    conn.executemany("INSERT INTO logs (timestamp, level) VALUES (?, ?)",
+                     [(f"2025-01-01T00:00:{i // 5:02d}", "error" if i % 2 else "info") for i in range(100)])
+
+    seen = []
+    cursor = None
+    while True:
+        conditions, params = ["level = ?"], ["error"]
+        keyset, keyset_params = keyset_condition(cursor)
+        if keyset:
+            conditions.append(keyset)
+            params.extend(keyset_params)
+        rows = [dict(r) for r in conn.execute(
+            f"SELECT * FROM logs WHERE {' AND '.join(conditions)} {KEYSET_ORDER} LIMIT 7", params
+        )]
+        seen.extend(row["id"] for row in rows)
+        cursor = next_cursor(rows, 7)
+        if cursor is None:
+            break
+
+    expected = [r[0] for r in conn.execute(f"SELECT id FROM logs WHERE level = 'error' {KEYSET_ORDER}")]
+    assert seen == expected
+    assert len(seen) == 50
+
+
+def test_count_cache_expires_and_ignores_empty_filters(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("database.pagination.time.monotonic", lambda: now[0])
+    cache = CountCache(ttl=30)
+    key = cache.key("logs", {"level": "error", "source": None})
+    assert key == cache.key("logs", {"level": "error"})
+
+    cache.set(key, 12)
+    assert cache.get(key) == 12
+    now[0] += 31
+    assert cache.get(key) is None
+
+
+def test_postgresql_keyset_condition_and_list_signatures():
+    pytest.importorskip("asyncpg")
+    pytest.importorskip("greenlet")
+    import inspect
+
+    from sqlalchemy.dialects import postgresql
+
+    from database.database_postgresql import PostgreSQLDatabase
+    from database.models import SystemLog
+
+    cursor = encode_cursor("2025-01-01T00:00:00+00:00", "3f2c8a56-6a43-4b4a-9d0b-1f0e6c1e2a11")
+    condition = PostgreSQLDatabase._keyset_condition(SystemLog.timestamp, SystemLog.id, cursor)
+    assert str(condition.compile(dialect=postgresql.dialect())).startswith(
+        "(system_logs.timestamp, system_logs.id) <")
+    assert PostgreSQLDatabase._keyset_condition(SystemLog.timestamp, SystemLog.id, None) is None
+    with pytest.raises(ValueError):
+        PostgreSQLDatabase._keyset_condition(SystemLog.timestamp, SystemLog.id, encode_cursor("x", 1))
+
+    # The API handlers call both backends with these keywords
+    for name, params in [("get_logs", {"page", "page_size", "filters", "cursor"}),
+                         ("get_anomalies", {"page", "page_size", "filters", "cursor"}),
+                         ("get_security_findings", {"page_size", "filters", "cursor"}),
+                         ("get_security_findings_count", {"filters"})]:
+        assert params <= set(inspect.signature(getattr(PostgreSQLDatabase, name)).parameters)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from security.rule_engine import RuleEngine, RuleError, compile_sql
+
+RULES = """
+rules:
+  - name: admin_probe
+    match:
+      event_type: {in: [api_access, data_access]}
+      resource: {contains: [admin, root]}
+  - name: api_burst
+    match:
+      event_type: api_access
+      status: {gte: 400}
+    group_by: [source_ip]
+    window: 60
+    threshold: 3
+  - name: any_ip
+    detector: malicious_ip
+    match:
+      source_ip: {not_in: [unknown]}
+  - name: nightly
+    scope: activity_log
+    any_of:
+      - hour: {lt: 9}
+"""
+
+
+def test_rules_index_threshold_and_stats(tmp_path):
+    path = tmp_path / "rules.yaml"
+    path.write_text(RULES)
+    engine = RuleEngine(str(path))
+    assert [rule.name for rule in engine.rules()] == ["admin_probe", "api_burst", "any_ip"]
+
+    login = {"event_type": "login_success", "source_ip": "10.0.0.1"}
+    assert [m.rule.name for m in engine.evaluate(login)] == ["any_ip"]
+    assert engine.rule("admin_probe").evaluations == 0  # not a candidate for logins
+
+    probe = {"event_type": "data_access", "resource": "/api/ADMIN/users", "source_ip": "unknown"}
+    assert [m.rule.name for m in engine.evaluate(probe)] == ["admin_probe"]
+
+    fired = []
+    for i in range(5):
+        event = {"event_type": "api_access", "status": 429, "source_ip": "10.0.0.7", "resource": "/api/logs"}
+        fired += [m for m in engine.evaluate(event, now=1000 + i) if m.rule.name == "api_burst"]
+    # Fires once as the per-IP count reaches the threshold
+    assert [(m.key, m.count) for m in fired] == [("10.0.0.7", 3)]
+
+    stats = engine.rule_stats()["api_burst"]
+    assert stats["evaluations"] == 5 and stats["matched"] == 5 and stats["fired"] == 1
+    assert stats["avg_us"] > 0
+
+
+def test_hot_reload_keeps_rules_on_error_and_counters_for_unchanged_rules(tmp_path):
+    path = tmp_path / "rules.yaml"
+    path.write_text(RULES)
+    engine = RuleEngine(str(path))
+    event = {"event_type": "api_access", "status": 500, "source_ip": "10.0.0.7"}
+    engine.evaluate(event, now=1000)
+    engine.evaluate(event, now=1001)
+
+    path.write_text(RULES.replace("name: admin_probe", "name: admin_probe\n    description: renamed"))
+    os.utime(path, (2000, 2000))
+    assert engine.reload_if_changed()
+    assert engine.rule("admin_probe").description == "renamed"
+    assert engine.rule("api_burst").evaluations == 2
+    assert [m.count for m in engine.evaluate(event, now=1002) if m.rule.name == "api_burst"] == [3]
+
+    path.write_text("rules:\n  - name: broken\n    match: {status: {between: [1, 2]}}\n")
+    os.utime(path, (3000, 3000))
+    assert not engine.reload_if_changed()
+    assert engine.stats["reload_errors"] == 1
+    assert engine.rule("api_burst") is not None
+
+
+def test_compile_sql_quotes_literals_and_rejects_regex():
+    sql = compile_sql({"activity_type": {"in": ["a'b", "c"]}, "user_id": {"exists": True}},
+                      [{"hour": {"lt": 9}}, {"hour": {"gte": 18}}], {"hour": "H"})
+    assert sql == "(activity_type IN ('a''b', 'c') AND user_id IS NOT NULL) AND ((H < 9) OR (H >= 18))"
+    assert compile_sql({"details": {"contains": "Priv"}}) == "instr(LOWER(details), 'priv') > 0"
+    with pytest.raises(RuleError):
+        compile_sql({"details": {"regex": "x+"}})
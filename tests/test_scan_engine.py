@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from security.scan_engine import AsyncScanEngine, RttEstimator, count_targets, iter_targets, read_neighbor_table
+
+
+def test_targets_accept_networks_addresses_and_ranges():
+    targets = ["10.0.0.0/30", "10.0.1.7", "10.0.2.250-10.0.3.2"]
+    addresses = list(iter_targets(targets))
+    assert addresses[:3] == ["10.0.0.1", "10.0.0.2", "10.0.1.7"]
+    assert addresses[3:] == ["10.0.2.250", "10.0.2.251", "10.0.2.252", "10.0.2.253",
+                             "10.0.2.254", "10.0.2.255", "10.0.3.0", "10.0.3.1", "10.0.3.2"]
+    assert count_targets(targets) == len(addresses)
+    assert count_targets(["10.0.0.0/16"]) == 65534
+
+
+def test_rtt_estimator_tightens_timeout_within_bounds():
+    estimator = RttEstimator(initial=1.0, min_timeout=0.05, max_timeout=3.0)
+    assert estimator.timeout == 1.0
+    for _ in range(20):
+        estimator.observe(0.002)
+    assert estimator.timeout == 0.05
+    estimator.observe(10.0)
+    assert estimator.timeout == 3.0
+
+
+def test_neighbor_table_skips_incomplete_entries(tmp_path):
+    path = tmp_path / "arp"
+    path.write_text(
+        "IP address       HW type     Flags       HW address            Mask     Device\n"
+        "192.168.1.1      0x1         0x2         aa:bb:cc:dd:ee:ff     *        eth0\n"
+        "192.168.1.9      0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+    )
+    assert read_neighbor_table(str(path)) == {"192.168.1.1": "AA:BB:CC:DD:EE:FF"}
+
+
+def test_scan_finds_loopback_listeners_and_streams_progress(tmp_path):
+    farm = {"127.0.3.1": [22, 8080], "127.0.3.2": [443], "127.0.3.5": [5900, 80]}
+
+    async def run():
+        servers = []
+        try:
+            for ip, ports in farm.items():
+                for port in ports:
+                    servers.append(await asyncio.start_server(lambda r, w: w.close(), ip, port))
+        except OSError:
+            pytest.skip("cannot bind loopback listener farm")
+        engine = AsyncScanEngine(ports=(22, 80, 443, 5900, 8080), discovery_ports=(80, 443, 22),
+                                 resolve_hostnames=False, neighbor_table_path=str(tmp_path / "none"),
+                                 initial_timeout=0.5)
+        events = [event async for event in engine.scan_iter(["127.0.3.0/29"], progress_interval=0.001)]
+        for server in servers:
+            server.close()
+        return engine, events
+
+    engine, events = asyncio.run(run())
+    hosts = {e["host"]["ip"]: e["host"]["open_ports"] for e in events if e["event"] == "host"}
+    for ip, ports in farm.items():
+        assert hosts[ip] == sorted(ports)
+    # Loopback refuses other ports, so listener-less addresses are up with nothing open
+    assert hosts["127.0.3.3"] == []
+    assert events[-1]["event"] == "complete" and events[-1]["scanned"] == 6
+    assert engine.rtt.timeout < 0.5
+
+
+def test_concurrency_is_clamped_below_the_descriptor_limit(monkeypatch):
+    import security.scan_engine as scan_engine
+
+    monkeypatch.setattr(scan_engine.resource, "getrlimit", lambda which: (1024, 4096))
+    assert scan_engine.clamp_to_fd_limit(1024) == 1024 - scan_engine.FD_HEADROOM
+    assert scan_engine.clamp_to_fd_limit(100) == 100
+    assert AsyncScanEngine(concurrency=4096).concurrency == 1024 - scan_engine.FD_HEADROOM
+
+
+def test_probe_waits_out_descriptor_exhaustion(monkeypatch):
+    import errno
+    import socket
+
+    import security.scan_engine as scan_engine
+
+    monkeypatch.setattr(scan_engine, "SOCKET_BACKOFF", 0.001)
+    real_socket = socket.socket
+    failures = []
+
+    def exhausted(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise OSError(errno.EMFILE, "Too many open files")
+        return real_socket(*args, **kwargs)
+
+    async def run():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        engine = AsyncScanEngine(resolve_hostnames=False)
+        monkeypatch.setattr(scan_engine.socket, "socket", exhausted)
+        try:
+            return engine, await engine.probe("127.0.0.1", port, 1.0)
+        finally:
+            monkeypatch.setattr(scan_engine.socket, "socket", real_socket)
+            server.close()
+
+    engine, (state, rtt) = asyncio.run(run())
+    assert state == scan_engine.OPEN and rtt is not None
+    assert engine.stats["socket_retries"] == 2
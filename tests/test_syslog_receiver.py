@@ -0,0 +1,142 @@
+import asyncio
+import socket
+import sqlite3
+
+from src.log_tail import LogPipeline
+from src.syslog_receiver import SyslogReceiver, _SyslogStreamProtocol, parse_syslog
+
+
+def test_parse_rfc5424():
+    msg = parse_syslog('<165>1 2003-10-11T22:14:15.003Z mymachine.example.com evntslog - ID47 '
+                       '[exampleSDID@32473 iut="3" eventSource="Application"] \ufeffAn application event')
+    assert (msg.facility, msg.severity) == (20, 5)
+    assert msg.timestamp == "2003-10-11T22:14:15.003Z"
+    assert msg.hostname == "mymachine.example.com"
+    assert msg.app_name == "evntslog"
+    assert msg.procid is None
+    assert msg.msgid == "ID47"
+    assert msg.message == "An application event"
+
+
+def test_parse_rfc3164_and_fallback():
+    msg = parse_syslog("<34>Oct 11 22:14:15 mymachine su[42]: 'su root' failed for lonvick")
+    assert (msg.facility, msg.severity) == (4, 2)
+    assert msg.hostname == "mymachine"
+    assert msg.app_name == "su"
+    assert msg.procid == "42"
+    assert msg.message == "'su root' failed for lonvick"
+
+    raw = parse_syslog("<13>just some text")
+    assert raw.severity == 5
+    assert raw.message == "just some text"
+
+
+def test_receiver_udp_and_tcp_framing(tmp_path):
+    db_path = str(tmp_path / "logs.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, source TEXT, message TEXT, level TEXT)")
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        pipeline = LogPipeline(db_path, flush_interval=0.02)
+        receiver = SyslogReceiver(pipeline, host="127.0.0.1", udp_port=0, tcp_port=0)
+        await receiver.start()
+
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for i in range(50):
+            udp.sendto(f"<11>1 2025-05-15T12:00:00Z web01 app - - - udp {i}".encode(),
+                       ("127.0.0.1", receiver.udp_port))
+        udp.close()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", receiver.tcp_port)
+        framed = b""
+        for i in range(20):
+            body = f"<14>1 2025-05-15T12:00:01Z db01 pg - - - tcp {i}\nwith newline".encode()
+            framed += str(len(body)).encode() + b" " + body
+        framed += b"<14>Oct 11 22:14:15 db02 cron[7]: lf framed\n"
+        # Split mid-frame to exercise reassembly
+        writer.write(framed[:37])
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        writer.write(framed[37:])
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+        for _ in range(100):
+            if pipeline.stats["submitted"] >= 71:
+                break
+            await asyncio.sleep(0.02)
+        await receiver.stop()
+        await pipeline.stop()
+        return receiver.stats()
+
+    stats = asyncio.run(scenario())
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT source, message, level FROM logs").fetchall()
+    conn.close()
+    assert len(rows) == 71
+    assert ("web01/app", "udp 0", "error") in rows
+    assert ("db01/pg", "tcp 19\nwith newline", "info") in rows
+    assert ("db02/cron", "lf framed", "info") in rows
+    assert stats["127.0.0.1"]["received"] == 71
+    assert stats["127.0.0.1"]["dropped"] == 0
+
+
+def test_tcp_framing_digit_led_lf_lines():
+    protocol = _SyslogStreamProtocol(receiver=None)
+    protocol._buffer += b"12:00:01 host msg\n5 hello12"
+    assert list(protocol._frames()) == [b"12:00:01 host msg", b"hello"]
+    # An all-digit prefix without its space yet waits for more data
+    assert bytes(protocol._buffer) == b"12"
+    protocol._buffer += b" hello world!"
+    assert list(protocol._frames()) == [b"hello world!"]
+
+
+def test_stop_closes_open_tcp_connections_and_flushes_them(tmp_path):
+    db_path = str(tmp_path / "logs.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "timestamp TEXT, source TEXT, message TEXT, level TEXT)")
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        pipeline = LogPipeline(db_path, flush_interval=0.02)
+        receiver = SyslogReceiver(pipeline, host="127.0.0.1", udp_port=None, tcp_port=0)
+        await receiver.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", receiver.tcp_port)
+        # Unterminated line from a client that never disconnects
+        writer.write(b"<14>Oct 11 22:14:15 db02 cron[7]: still open")
+        await writer.drain()
+        for _ in range(100):
+            if receiver._connections and receiver.stats():
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(receiver.stop(), timeout=2)
+        await pipeline.stop()
+        writer.close()
+        return pipeline.stats["submitted"]
+
+    assert asyncio.run(scenario()) == 1
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT message FROM logs").fetchall() == [("still open",)]
+    conn.close()
+
+
+def test_peer_counters_are_bounded():
+    pipeline = LogPipeline(":memory:")
+    receiver = SyslogReceiver(pipeline, max_peers=3)
+    receiver.pipeline.submit_nowait = lambda entry: True
+    for i in range(10):
+        receiver.handle_frame(b"<13>spoofed", f"198.51.100.{i}")
+    receiver.handle_frame(b"<13>again", "198.51.100.8")
+
+    stats = receiver.stats()
+    assert list(stats) == ["other", "198.51.100.7", "198.51.100.9", "198.51.100.8"]
+    assert stats["other"]["received"] == 7
+    assert stats["198.51.100.8"]["received"] == 2
+    assert sum(peer["received"] for peer in stats.values()) == 11
@@ -0,0 +1,146 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.executemany_calls = []
+
+    async def fetch(self, sql, *args):
+        return []
+
+    async def fetchval(self, sql, *args):
+        return None
+
+    async def execute(self, sql, *args):
+        pass
+
+    async def executemany(self, sql, rows):
+        self.executemany_calls.append((sql, list(rows)))
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """threat_detection with recording database, alert and audit backends"""
+    conn = RecordingConnection()
+
+    @asynccontextmanager
+    async def recording_db_connection():
+        yield conn
+
+    import database.postgresql_adapter as adapter
+    monkeypatch.setattr(adapter, "get_db_connection", recording_db_connection, raising=False)
+    import security.threat_detection as td
+    monkeypatch.setattr(td, "get_db_connection", recording_db_connection)
+
+    alerts = []
+
+    async def record_alert(**kwargs):
+        alerts.append(kwargs)
+
+    async def record_audit(**kwargs):
+        return "event"
+
+    monkeypatch.setattr(td, "send_security_alert", record_alert)
+    monkeypatch.setattr(td.security_audit_logger, "log_event", record_audit)
+
+    engine = td.ThreatDetectionEngine()
+
+    async def no_response(threat):
+        pass
+
+    monkeypatch.setattr(engine, "_execute_automated_response", no_response)
+    return td, engine, conn, alerts
+
+
+def _failed_logins(source_ip, username, count):
+    return [{"event_type": "login_failed", "source_ip": source_ip, "username": username}] * count
+
+
+def test_batch_groups_per_detector_and_inserts_once(pipeline):
+    td, engine, conn, alerts = pipeline
+
+    async def run():
+        for _ in range(6):
+            await td.failed_login_counters.record("203.0.113.71", "alice")
+        await td.failed_login_counters.record("203.0.113.72", "bob")
+        activities = _failed_logins("203.0.113.71", "alice", 6) + _failed_logins("203.0.113.72", "bob", 1)
+        threats = await engine.process_threat_detection_batch(activities)
+        await engine.drain_notifications()
+        return threats
+
+    threats = asyncio.run(run())
+
+    brute_force = [t for t in threats if t.threat_type == td.ThreatType.BRUTE_FORCE]
+    assert len(brute_force) == 1
+    assert (brute_force[0].source_ip, brute_force[0].username) == ("203.0.113.71", "alice")
+    assert brute_force[0].evidence["failed_attempts"] == 6
+
+    # Every threat in the batch goes to the database in one executemany
+    assert len(conn.executemany_calls) == 1
+    sql, rows = conn.executemany_calls[0]
+    assert "INSERT INTO threat_events" in sql
+    assert len(rows) == len(threats)
+    assert engine.metrics["batches_processed"] == 1
+    assert engine.metrics["activities_processed"] == 7
+
+
+def test_notifications_fan_out_in_background(pipeline, monkeypatch):
+    td, engine, conn, alerts = pipeline
+    release = asyncio.Event()
+
+    async def slow_alert(**kwargs):
+        await release.wait()
+        alerts.append(kwargs)
+
+    monkeypatch.setattr(td, "send_security_alert", slow_alert)
+
+    async def run():
+        for _ in range(5):
+            await td.failed_login_counters.record("203.0.113.81", "carol")
+        threats = await engine.process_threat_detection_batch(_failed_logins("203.0.113.81", "carol", 5))
+        # The batch returned without waiting on notification delivery
+        pending = len(engine._notification_tasks)
+        assert alerts == []
+        release.set()
+        await engine.drain_notifications()
+        return threats, pending
+
+    threats, pending = asyncio.run(run())
+
+    assert threats and pending == len(threats)
+    assert len(alerts) == len(threats)
+    assert not engine._notification_tasks
+
+
+def test_stream_batches_by_size_and_flush_interval(pipeline, monkeypatch):
+    td, engine, conn, alerts = pipeline
+    batches = []
+
+    async def record_batch(activities):
+        batches.append(len(activities))
+        return []
+
+    monkeypatch.setattr(engine, "process_threat_detection_batch", record_batch)
+
+    async def burst(count):
+        for activity in _failed_logins("203.0.113.91", "dave", count):
+            yield activity
+
+    async def trickle():
+        for activity in _failed_logins("203.0.113.92", "erin", 2):
+            yield activity
+        await asyncio.sleep(0.2)
+        yield _failed_logins("203.0.113.92", "erin", 1)[0]
+
+    async def run(stream, **kwargs):
+        return [threats async for threats in engine.process_activity_stream(stream, **kwargs)]
+
+    assert asyncio.run(run(burst(5), batch_size=2, flush_interval=5)) == [[], [], []]
+    assert batches == [2, 2, 1]
+
+    batches.clear()
+    asyncio.run(run(trickle(), batch_size=10, flush_interval=0.05))
+    assert batches == [2, 1]
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import sqlite3
+
+from security.cve_integration import CVEIntegration
+from security.vuln_correlation import score_tasks
+
+
+def _cve(cve_id, matches, score):
+    return {"cve": {
+        "id": cve_id,
+        "published": "2024-01-01T00:00:00.000",
+        "lastModified": "2024-01-02T00:00:00.000",
+        "descriptions": [{"lang": "en", "value": f"{cve_id} issue"}],
+        "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": score, "baseSeverity": "HIGH"}}]},
+        "configurations": [{"nodes": [{"cpeMatch": [dict(match, vulnerable=True) for match in matches]}]}],
+    }}
+
+
+FEED = [
+    _cve("CVE-2024-1001", [{"criteria": "cpe:2.3:o:cisco:ios_xe:*:*:*:*:*:*:*:*",
+                            "versionStartIncluding": "17.3", "versionEndExcluding": "17.9.4"}], 9.8),
+    _cve("CVE-2024-1002", [{"criteria": "cpe:2.3:o:cisco:nx-os:9.3\\(5\\):*:*:*:*:*:*:*"}], 7.5),
+    _cve("CVE-2024-1003", [{"criteria": "cpe:2.3:o:fortinet:fortios:*:*:*:*:*:*:*:*",
+                            "versionEndIncluding": "7.2.5"}], 5.0),
+    # Same vendor, unrelated product: vendor keyword matching used to report it for every Cisco device
+    _cve("CVE-2024-1004", [{"criteria": "cpe:2.3:a:cisco:webex_meetings:*:*:*:*:*:*:*:*"}], 8.8),
+]
+
+# name, type, ip_address column, metadata
+DEVICES = [
+    ("cisco-edge-1", "router", "10.0.0.1", {"ip": "10.0.0.1", "ports": [22, 80], "version": "17.6.1"}),
+    ("cisco-edge-2", "router", "10.0.0.2", {"ip": "10.0.0.2", "ports": [80, 22, 5000], "version": "17.6.1"}),
+    ("cisco-edge-3", "router", "10.0.0.3", {"ip": "10.0.0.3", "ports": [22], "version": "17.9.4"}),
+    ("nexus-core", "switch", "10.0.0.4", {"ip": "10.0.0.4", "ports": []}),
+    ("fortigate-1", "firewall", None, {"ip": "10.0.0.5", "open_ports": [443], "version": "7.2.1"}),  # older row
+    ("printer", "printer", "10.0.0.6", {"ports": [9100]}),
+    ("cisco-lab", "router", None, {}),
+]
+
+
+def _integration(tmp_path, devices=DEVICES):
+    db_path = str(tmp_path / "securenet.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE network_devices (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL, ip_address TEXT, mac_address TEXT,
+            status TEXT NOT NULL, last_seen TEXT, metadata TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO network_devices (id, name, type, ip_address, status, metadata, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, 'active', ?, 't0', 't0')",
+        [(f"dev_{i}", name, kind, ip, json.dumps(metadata)) for i, (name, kind, ip, metadata) in enumerate(devices)]
+    )
+    conn.commit()
+    conn.close()
+    integration = CVEIntegration(db_path=db_path)
+    integration.mirror.import_items(FEED)
+    return integration
+
+
+def _findings(integration):
+    conn = sqlite3.connect(integration.db_path)
+    rows = conn.execute("SELECT device_ip, cve_id, detection_confidence, affected_services "
+                        "FROM device_vulnerabilities").fetchall()
+    conn.close()
+    return sorted((ip, cve_id, round(confidence, 6), json.loads(services))
+                  for ip, cve_id, confidence, services in rows)
+
+
+def test_grouped_scan_matches_per_device_analysis(tmp_path):
+    integration = _integration(tmp_path)
+    result = asyncio.run(integration.full_vulnerability_scan())
+    assert result["devices_scanned"] == 6 and result["devices_skipped"] == 1
+    # The two edge routers on 17.6.1 share a fingerprint; the printer has no vendor
+    assert result["device_groups"] == 4
+    assert set(result["stage_timings"]) == {"load", "group", "lookup", "score", "write"}
+
+    expected = []
+    for name, kind, ip, metadata in DEVICES[:6]:
+        device = {"ip": ip or metadata["ip"], "name": name, "type": kind, "version": metadata.get("version"),
+                  "open_ports": metadata.get("ports", metadata.get("open_ports", []))}
+        for vuln in asyncio.run(integration.analyze_device_vulnerabilities(device)):
+            expected.append((vuln.device_ip, vuln.cve_id, round(vuln.detection_confidence, 6),
+                             vuln.affected_services))
+    assert _findings(integration) == sorted(expected)
+    assert result["vulnerabilities_found"] == len(expected)
+    # 17.9.4 is past the fixed release and the webex CVE matches no device product
+    assert [(ip, cve_id, confidence) for ip, cve_id, confidence, _ in sorted(expected)] == [
+        ("10.0.0.1", "CVE-2024-1001", 0.9),
+        ("10.0.0.2", "CVE-2024-1001", 0.9),
+        ("10.0.0.4", "CVE-2024-1002", 0.6),
+        ("10.0.0.5", "CVE-2024-1003", 1.0),
+    ]
+
+
+def test_rescans_upsert_and_drop_resolved_findings(tmp_path):
+    integration = _integration(tmp_path)
+    asyncio.run(integration.full_vulnerability_scan())
+    first = _findings(integration)
+
+    assert asyncio.run(integration.full_vulnerability_scan())["vulnerabilities_found"] == len(first)
+    assert _findings(integration) == first
+
+    # The fortigate is replaced by an unidentified device at the same address
+    conn = sqlite3.connect(integration.db_path)
+    conn.execute("UPDATE network_devices SET name = 'nas', type = 'server' WHERE name = 'fortigate-1'")
+    conn.commit()
+    conn.close()
+    asyncio.run(integration.full_vulnerability_scan())
+    assert _findings(integration) == [row for row in first if row[0] != "10.0.0.5"]
+
+
+def test_pooled_scoring_keeps_task_order():
+    candidates = [(f"CVE-{i}", [("o", i % 2 == 0), ("a", False)]) for i in range(40)]
+    tasks = [(evidence, kind, ports, candidates[i:])
+             for i, (evidence, kind, ports) in enumerate([("product", "router", (22,)), ("platform", "printer", ()),
+                                                          ("platform", "switch", (443,))] * 4)]
+    inline = asyncio.run(score_tasks(tasks, workers=1))
+    pooled = asyncio.run(score_tasks(tasks, workers=2, pool_min=0))
+    assert pooled == inline
+    # A platform guess on a printer without services only reaches the threshold through an application CPE
+    assert [len(scored) for scored in inline][:3] == [40, 39, 38]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from utils.windowed_counters import FailedLoginCounters, SlidingWindowCounter, WindowedCounterStore
+
+
+def test_sliding_window_expires_old_buckets():
+    counter = SlidingWindowCounter(window=60, resolution=60)
+    for second in range(30):
+        counter.add(1000 + second)
+    assert counter.count(1029) == 30
+    # 1000..1014 have left the 60 s window by t=1074
+    assert counter.count(1074) == 15
+    # A late event inside the window still counts; one outside it does not
+    counter.add(1070)
+    counter.add(1000)
+    assert counter.count(1074) == 16
+    assert counter.count(5000) == 0
+
+
+def test_store_evicts_least_recently_updated_key():
+    store = WindowedCounterStore(window=60, max_keys=2)
+    store.increment("a", now=100)
+    store.increment("b", now=100)
+    store.increment("a", now=101)
+    store.increment("c", now=102)
+    assert store.count("a", now=102) == 2
+    assert store.count("b", now=102) == 0
+    assert store.count("c", now=102) == 1
+    assert store.evictions == 1
+
+
+def test_failed_login_counters_track_dimensions_and_windows():
+    counters = FailedLoginCounters(windows=(60, 300), backend="local")
+
+    async def run():
+        for i in range(6):
+            await counters.record("10.0.0.5", "admin", now=1000 + i * 30)
+        await counters.record("10.0.0.5", "root", now=1150)
+        await counters.record("10.0.0.9", "admin", now=1150)
+        now = 1160
+        return (
+            await counters.count("ip", 60, source_ip="10.0.0.5", now=now),
+            await counters.count("ip", 300, source_ip="10.0.0.5", now=now),
+            await counters.count("user", 300, username="admin", now=now),
+            await counters.count("ip_user", 300, source_ip="10.0.0.5", username="admin", now=now),
+        )
+
+    assert asyncio.run(run()) == (3, 7, 7, 6)
+    with pytest.raises(ValueError):
+        asyncio.run(counters.count("ip", 900, source_ip="10.0.0.5"))
@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from database.connection_pool import SQLiteConnectionPool
+from database.write_queue import WriteQueue
+
+
+def _setup(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY, message TEXT)")
+    conn.execute("CREATE TABLE usage (org TEXT PRIMARY KEY, hits INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def test_concurrent_writes_are_group_committed(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _setup(db_path)
+    pool = SQLiteConnectionPool(db_path)
+    queue = WriteQueue(pool, batch_size=1000, flush_interval=0.05)
+
+    async def run():
+        await asyncio.gather(*(
+            queue.write("INSERT INTO logs (message) VALUES (?)", (f"m{i}",)) for i in range(300)
+        ), *(
+            queue.write("INSERT INTO usage (org, hits) VALUES (?, 1) "
+                        "ON CONFLICT(org) DO UPDATE SET hits = hits + 1", ("acme",)) for _ in range(50)
+        ))
+        await queue.close()
+        await pool.close()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 300
+    assert conn.execute("SELECT hits FROM usage WHERE org = 'acme'").fetchone()[0] == 50
+    conn.close()
+    assert queue.stats["written"] == 350
+    assert queue.stats["batches"] < 10
+
+
+def test_failing_row_only_fails_its_own_future(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _setup(db_path)
+    pool = SQLiteConnectionPool(db_path)
+    queue = WriteQueue(pool, flush_interval=0.05)
+
+    async def run():
+        good = queue.submit("INSERT INTO logs (id, message) VALUES (?, ?)", (1, "first"))
+        dup = queue.submit("INSERT INTO logs (id, message) VALUES (?, ?)", (1, "duplicate"))
+        other = queue.submit("INSERT INTO logs (id, message) VALUES (?, ?)", (2, "second"))
+        await good
+        await other
+        with pytest.raises(sqlite3.IntegrityError):
+            await dup
+        await queue.close()
+        await pool.close()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT message FROM logs ORDER BY id").fetchall() == [("first",), ("second",)]
+    conn.close()
+    assert queue.stats["write_errors"] == 1
+
+
+def test_close_flushes_fire_and_forget_writes(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _setup(db_path)
+    pool = SQLiteConnectionPool(db_path)
+    queue = WriteQueue(pool, flush_interval=10)
+
+    async def run():
+        for i in range(20):
+            queue.submit("INSERT INTO logs (message) VALUES (?)", (f"m{i}",))
+        await queue.close()
+        await pool.close()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0] == 20
+    conn.close()
+
+
+def test_statements_keep_submission_order(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _setup(db_path)
+    pool = SQLiteConnectionPool(db_path)
+    queue = WriteQueue(pool, flush_interval=0.05)
+
+    async def run():
+        insert = "INSERT INTO logs (id, message) VALUES (?, ?)"
+        await asyncio.gather(
+            queue.submit(insert, (1, "old")),
+            queue.submit("DELETE FROM logs WHERE id = ?", (1,)),
+            queue.submit(insert, (1, "new")),
+        )
+        await queue.close()
+        await pool.close()
+
+    asyncio.run(run())
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT id, message FROM logs").fetchall() == [(1, "new")]
+    conn.close()
+    assert queue.stats["write_errors"] == 0
+
+
+def test_writer_task_does_not_inherit_held_connection(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _setup(db_path)
+    pool = SQLiteConnectionPool(db_path)
+    queue = WriteQueue(pool, flush_interval=0.05)
+
+    async def run():
+        async with pool.writer():
+            # Starts the writer task while this task holds the writer connection
+            pending = queue.submit("INSERT INTO logs (message) VALUES (?)", ("m",))
+        await pending
+        await queue.close()
+        await pool.close()
+
+    asyncio.run(run())
+
+    assert pool.stats["reentrant_acquires"] == 0
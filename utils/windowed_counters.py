@@ -0,0 +1,203 @@
+"""
+SecureNet Sliding-Window Counters
+
+Streaming event counters for detectors that ask "how many X in the last N
+seconds?" on every event (failed logins per IP, per username, per IP+user):
+- ``SlidingWindowCounter`` is a ring of time buckets with a running total, so
+  both ``add`` and ``count`` are O(1) (amortised over bucket expiry)
+- ``WindowedCounterStore`` keeps one counter per key with LRU eviction, so a
+  credential-stuffing wave over millions of IPs has bounded memory
+- ``FailedLoginCounters`` tracks every dimension and window in-process and,
+  with ``THREAT_COUNTERS_BACKEND=redis``, shares counts between workers via
+  Redis sorted sets (falling back to the local counters if Redis is down)
+
+Counts are approximate at bucket granularity: an event can stay counted for
+up to one bucket (``window / resolution`` seconds) past its window, which errs
+on the side of alerting.
+"""
+
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowCounter:
+    """Event count over the trailing ``window`` seconds, in ``resolution`` buckets."""
+
+    __slots__ = ("bucket_seconds", "_counts", "_head", "_total")
+
+    def __init__(self, window: float, resolution: int = 60):
+        self.bucket_seconds = window / resolution
+        self._counts = [0] * resolution
+        self._head = None  # tick of the newest bucket
+        self._total = 0
+
+    def _advance(self, tick: int):
+        if self._head is None:
+            self._head = tick
+            return
+        steps = tick - self._head
+        if steps <= 0:
+            return
+        size = len(self._counts)
+        if steps >= size:
+            self._counts = [0] * size
+            self._total = 0
+        else:
+            for offset in range(1, steps + 1):
+                index = (self._head + offset) % size
+                self._total -= self._counts[index]
+                self._counts[index] = 0
+        self._head = tick
+
+    def add(self, now: float, amount: int = 1) -> int:
+        """Count ``amount`` events at ``now``; returns the window total."""
+        tick = int(now // self.bucket_seconds)
+        self._advance(tick)
+        if tick > self._head - len(self._counts):  # ignore events older than the window
+            self._counts[tick % len(self._counts)] += amount
+            self._total += amount
+        return self._total
+
+    def count(self, now: float) -> int:
+        self._advance(int(now // self.bucket_seconds))
+        return self._total
+
+
+class WindowedCounterStore:
+    """Per-key ``SlidingWindowCounter``s, least recently updated keys evicted first."""
+
+    def __init__(self, window: float, resolution: int = 60, max_keys: int = 100000):
+        self.window = window
+        self.resolution = resolution
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, SlidingWindowCounter]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def increment(self, key: str, now: Optional[float] = None, amount: int = 1) -> int:
+        now = time.time() if now is None else now
+        counter = self._counters.get(key)
+        if counter is None:
+            if len(self._counters) >= self.max_keys:
+                self._counters.popitem(last=False)
+                self.evictions += 1
+            counter = self._counters[key] = SlidingWindowCounter(self.window, self.resolution)
+        else:
+            self._counters.move_to_end(key)
+        return counter.add(now, amount)
+
+    def count(self, key: str, now: Optional[float] = None) -> int:
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0
+        return counter.count(time.time() if now is None else now)
+
+
+class FailedLoginCounters:
+    """
+    Failed-login counts per ``ip``, ``user`` and ``ip_user`` over tracked windows.
+
+    ``SecurityAuditLogger`` records each LOGIN_FAILED event once; detectors
+    then read counts here instead of running ``COUNT(*)`` over ``audit_logs``.
+    """
+
+    DIMENSIONS = ("ip", "user", "ip_user")
+    REDIS_PREFIX = "threat:failed_logins"
+
+    def __init__(self, windows: Iterable[int] = (60, 300), resolution: int = 60,
+                 max_keys: int = 100000, backend: Optional[str] = None):
+        self.resolution = resolution
+        self.max_keys = max_keys
+        self.backend = backend or os.getenv("THREAT_COUNTERS_BACKEND", "local")
+        self._stores: Dict[Tuple[str, int], WindowedCounterStore] = {}
+        self.stats = {
+            "recorded": 0,
+            "redis_errors": 0,
+        }
+        for window in windows:
+            self.track_window(window)
+
+    @property
+    def windows(self) -> List[int]:
+        return sorted({window for _, window in self._stores})
+
+    def track_window(self, window: int):
+        """Start counting over ``window`` seconds (counts begin empty)."""
+        for dimension in self.DIMENSIONS:
+            if (dimension, window) not in self._stores:
+                self._stores[(dimension, window)] = WindowedCounterStore(window, self.resolution, self.max_keys)
+
+    @staticmethod
+    def _key(dimension: str, source_ip: Optional[str], username: Optional[str]) -> Optional[str]:
+        if dimension == "ip":
+            return source_ip or None
+        if dimension == "user":
+            return username or None
+        if source_ip and username:
+            return f"{source_ip}|{username}"
+        return None
+
+    def _use_redis(self) -> bool:
+        return self.backend == "redis" and cache_service.connected
+
+    async def record(self, source_ip: Optional[str], username: Optional[str] = None,
+                     now: Optional[float] = None):
+        """Count one failed login from ``source_ip`` for ``username``."""
+        now = time.time() if now is None else now
+        keys = []
+        for (dimension, window), store in self._stores.items():
+            key = self._key(dimension, source_ip, username)
+            if key is not None:
+                store.increment(key, now)
+                keys.append(f"{self.REDIS_PREFIX}:{dimension}:{key}")
+        self.stats["recorded"] += 1
+
+        if not self._use_redis() or not keys:
+            return
+        horizon = max(self.windows)
+        member = f"{now:.6f}:{uuid.uuid4().hex[:12]}"
+        try:
+            pipe = cache_service.redis_client.pipeline(transaction=False)
+            for redis_key in dict.fromkeys(keys):
+                pipe.zadd(redis_key, {member: now})
+                pipe.zremrangebyscore(redis_key, "-inf", now - horizon)
+                pipe.expire(redis_key, int(horizon) + 1)
+            await pipe.execute()
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.warning(f"Shared failed-login counter update failed: {str(e)}")
+
+    async def count(self, dimension: str, window: int, source_ip: Optional[str] = None,
+                    username: Optional[str] = None, now: Optional[float] = None) -> int:
+        """Failed logins in the last ``window`` seconds for one dimension's key."""
+        store = self._stores.get((dimension, window))
+        if store is None:
+            raise ValueError(f"Window {window}s is not tracked for '{dimension}'; call track_window first")
+        key = self._key(dimension, source_ip, username)
+        if key is None:
+            return 0
+        now = time.time() if now is None else now
+
+        if self._use_redis():
+            try:
+                return await cache_service.redis_client.zcount(
+                    f"{self.REDIS_PREFIX}:{dimension}:{key}", now - window, "+inf"
+                )
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Shared failed-login counter read failed: {str(e)}")
+        return store.count(key, now)
+
+
+# Global counters shared by the audit logger and threat detection engine
+failed_login_counters = FailedLoginCounters()